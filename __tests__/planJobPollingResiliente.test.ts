@@ -182,3 +182,53 @@ describe('waitForPlanJob — resiliência a rede instável', () => {
     expect(resultado.error?.code).toBe('ia_indisponivel');
   });
 });
+
+describe('waitForPlanJob — long-poll por versão', () => {
+  let esperas: number[];
+
+  beforeEach(() => {
+    mockedGet.mockReset();
+    esperas = [];
+    jest.spyOn(global, 'setTimeout').mockImplementation(((cb: () => void, ms?: number) => {
+      esperas.push(ms ?? 0);
+      cb();
+      return 0 as unknown as NodeJS.Timeout;
+    }) as unknown as typeof setTimeout);
+  });
+
+  afterEach(() => {
+    (global.setTimeout as unknown as jest.SpyInstance).mockRestore();
+  });
+
+  const comVersao = (resposta: { data: Record<string, unknown> }, version: number) => ({
+    data: { ...resposta.data, version },
+  });
+
+  it('devolve a última versão em `since` e não espera depois de uma mudança', async () => {
+    mockedGet
+      .mockResolvedValueOnce(comVersao(emAndamento('gerando_molde'), 1))
+      .mockResolvedValueOnce(comVersao(emAndamento('expandindo'), 2))
+      .mockResolvedValueOnce(comVersao(concluido(), 4));
+
+    const resultado = await waitForPlanJob('job-1');
+
+    expect(resultado.status).toBe('salvo');
+    expect(mockedGet.mock.calls[0][1]).toBeUndefined();
+    expect(mockedGet.mock.calls[1][1].params).toEqual({ since: 1, wait: 25 });
+    expect(mockedGet.mock.calls[2][1].params).toEqual({ since: 2, wait: 25 });
+    expect(mockedGet.mock.calls[1][1].timeout).toBeGreaterThan(25000);
+    expect(esperas).toEqual([0, 0]);
+  });
+
+  it('resposta rápida sem versão nova (sem vaga de long-poll) respeita o intervalo', async () => {
+    mockedGet
+      .mockResolvedValueOnce(comVersao(emAndamento('gerando_molde'), 1))
+      .mockResolvedValueOnce(comVersao(emAndamento('gerando_molde'), 1))
+      .mockResolvedValueOnce(comVersao(concluido(), 2));
+
+    await waitForPlanJob('job-1');
+
+    expect(esperas[0]).toBe(0);
+    expect(esperas[1]).toBeGreaterThan(4000);
+  });
+});
@@ -0,0 +1,604 @@
+# backend/asgi.py
+# Modo de servir ASGI (FORCA_SERVIDOR_ASGI=true no backend/Dockerfile, via
+# uvicorn). No gthread do gunicorn cada chamada síncrona à IA prende uma thread
+# pela duração inteira da chamada — 25s de chat, minutos de plano — e o teto
+# AI_SYNC_MAX_CONCURRENT só escolhe quem recebe 503 quando elas acabam. Aqui
+# as rotas que esperam o modelo rodam no event loop:
+#
+#   POST /api/chat             (JSON e server-sent events)
+#   POST /api/consolidate-chat
+#   POST /api/generate-plan    (modo legado; com FORCA_USE_MOLDE_ARCHITECTURE
+#                               a rota já responde 202 na hora e vai pela ponte)
+#
+# Tudo o que elas esperam é awaitable: auth (validate_token_async), reserva da
+# quota (reservar_async), o modelo (AsyncAnthropic do perfil, com o mesmo
+# retry de deadline) e a gravação do plano (persistir_plano_async). As fases
+# sem I/O — validação, prompt, cache, respostas — são as MESMAS funções de
+# backend/app.py, então os dois modos não divergem no que respondem.
+#
+# Qualquer outra rota (health, CRUD, jobs, push, métricas, preflight CORS)
+# atravessa uma ponte WSGI para o app Flask, num pool de ASGI_WSGI_THREADS
+# threads. A resposta da ponte é bufferizada: as rotas em fluxo são nativas.
+#
+# Uma chamada em voo aqui custa uma conexão e um pouco de memória, não uma
+# thread. O teto vira admissão: AI_ASYNC_MAX_CONCURRENT chamadas de IA em voo
+# no processo, e a próxima recebe o mesmo 503 + Retry-After do modo WSGI.
+# "ia_assincrona" em /api/metrics mostra em voo, pico e recusas.
+
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from flask_cors.core import get_cors_headers, get_cors_options
+from werkzeug.datastructures import Headers, MIMEAccept
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_accept_header, parse_options_header
+
+import backend.app as rotas
+from backend.services.anthropic_clients import fechar_clientes_async
+from backend.services.plan_repository import PlanPersistenceError, persistir_plano_async
+from backend.services import ai_quota
+from backend.utils import auth, metricas
+from backend.utils.anthropic_retry import criar_mensagem_com_deadline_async
+from backend.utils.http_async import fechar_cliente_http_async
+
+# Chamadas de IA em voo no processo. Não é thread: o limite real é o pool
+# assíncrono da Anthropic (ANTHROPIC_ASYNC_POOL_MAX_CONNECTIONS) e o gasto,
+# que a quota diária já segura por usuário.
+AI_ASYNC_MAX_CONCURRENT = int(os.environ.get("AI_ASYNC_MAX_CONCURRENT", "100"))
+# Threads da ponte WSGI. Sobra para o que não é IA: health, CRUD e o
+# long-poll dos jobs (que continua limitado por JOB_LONG_POLL_MAX_CONCURRENT).
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "16"))
+
+
+class VagasDeIa:
+    """
+    Chamadas de IA em voo no event loop, sem espera — como o
+    `_ia_sincrona_vagas.acquire(blocking=False)` do modo WSGI.
+    """
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self._lock = threading.Lock()
+        self._zerar()
+
+    def _zerar(self) -> None:
+        self.em_voo = 0
+        self.pico = 0
+        self.recusas = 0
+
+    def ocupar(self) -> bool:
+        with self._lock:
+            if self.em_voo >= self.total:
+                self.recusas += 1
+                return False
+            self.em_voo += 1
+            self.pico = max(self.pico, self.em_voo)
+            return True
+
+    def soltar(self) -> None:
+        with self._lock:
+            self.em_voo -= 1
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {"vagas": self.total, "em_voo": self.em_voo, "pico": self.pico, "recusas": self.recusas}
+
+    def limpar(self) -> None:
+        """Zera pico e recusas (testes); quem está em voo continua contado."""
+        with self._lock:
+            em_voo = self.em_voo
+            self._zerar()
+            self.em_voo = self.pico = em_voo
+
+
+_vagas = VagasDeIa(AI_ASYNC_MAX_CONCURRENT)
+metricas.registrar("ia_assincrona", _vagas.estatisticas, _vagas.limpar)
+
+_cors = get_cors_options(rotas.app, {"origins": rotas.allowed_origins})
+_ponte: Optional[ThreadPoolExecutor] = None
+_ponte_lock = threading.Lock()
+
+
+class _Pedido:
+    """O que as rotas nativas leem da requisição já autenticada."""
+
+    def __init__(self, cabecalhos: Headers, corpo: bytes, user: Dict[str, Any], token: str):
+        self.cabecalhos = cabecalhos
+        self.corpo = corpo
+        self.user = user
+        self.token = token
+
+    def json(self) -> Tuple[Any, Optional[Tuple[Dict[str, str], int]]]:
+        """(objeto, None), ou (None, (corpo, 400)) como o `is_json`/`get_json` das rotas."""
+        mimetype, _ = parse_options_header(self.cabecalhos.get("Content-Type", ""))
+        if not (mimetype == "application/json" or (
+            mimetype.startswith("application/") and mimetype.endswith("+json")
+        )):
+            return None, ({"error": "Requisição inválida. Esperado JSON."}, 400)
+        try:
+            data = rotas.app.json.loads(self.corpo)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return None, ({"error": "Corpo JSON inválido. Esperado objeto."}, 400)
+        return data, None
+
+
+# --- Rotas nativas ---------------------------------------------------------
+
+def _ia_ocupada(rota, user_id):
+    rotas.app_logger.warning(f"{rota}: vagas de IA assíncrona esgotadas; usuário {user_id} recebeu 503.")
+    return rotas._corpo_ia_ocupada(), 503, {"Retry-After": str(rotas.AI_SYNC_RETRY_AFTER_SECONDS)}
+
+
+async def _reservar_quota(pedido, rota, modelo, caracteres_prompt, max_tokens_saida, user_id):
+    """`_reservar_quota_ia` do modo ASGI: o custo reservado, ou (corpo, status)."""
+    custo = ai_quota.custo_reservado_usd(rota, modelo, caracteres_prompt, max_tokens_saida)
+    try:
+        await ai_quota.reservar_async(pedido.token, rota, custo, user_id=str(user_id))
+    except (ai_quota.QuotaExcedida, ai_quota.QuotaIndisponivel) as recusa:
+        return rotas._recusa_da_quota(recusa, user_id)
+    return custo
+
+
+def _prazo_do_chat():
+    return min(rotas.get_anthropic_timeout_seconds(), rotas.CHAT_ANTHROPIC_TIMEOUT_SECONDS)
+
+
+async def _chat(pedido):
+    user_id = (pedido.user or {}).get('id', 'desconhecido')
+
+    if rotas._rate_limit_hit("chat", user_id, rotas.CHAT_RATE_LIMIT, rotas.CHAT_RATE_WINDOW_SECONDS):
+        rotas.app_logger.warning(f"Rate limit de chat excedido para usuário {user_id}.")
+        return {"error": "Muitas requisições. Tente novamente em instantes."}, 429
+
+    data, invalido = pedido.json()
+    if invalido:
+        return invalido
+
+    preparo, erro = rotas._preparar_chat(data)
+    if erro:
+        return {"error": erro}, 400
+    kwargs_chat, caracteres_prompt = preparo
+    modelo_chat = kwargs_chat["model"]
+
+    rotas.app_logger.info(f"Chat: usuário {user_id} enviou {len(kwargs_chat['messages'])} mensagens.")
+
+    em_fluxo = rotas._pede_fluxo(parse_accept_header(pedido.cabecalhos.get("Accept"), MIMEAccept))
+
+    if not _vagas.ocupar():
+        return _ia_ocupada("chat", user_id)
+    vaga_com_o_fluxo = False
+    try:
+        reservado = await _reservar_quota(
+            pedido, "chat", modelo_chat, caracteres_prompt, rotas.CHAT_MAX_TOKENS, user_id
+        )
+        if isinstance(reservado, tuple):
+            return reservado
+
+        if em_fluxo:
+            vaga_com_o_fluxo = True  # quem solta a vaga agora é o fluxo
+            return _chat_em_fluxo(pedido, kwargs_chat, reservado, caracteres_prompt, user_id), 200, dict(
+                rotas._CABECALHOS_DO_FLUXO, **{"Content-Type": "text/event-stream; charset=utf-8"}
+            )
+
+        try:
+            client = rotas._get_chat_anthropic_client_async()
+            response = await criar_mensagem_com_deadline_async(client, _prazo_do_chat(), **kwargs_chat)
+        except Exception as e:
+            rotas.app_logger.error(f"Erro ao chamar a API Claude no chat para usuário {user_id}: {e}", exc_info=True)
+            return {"error": "Erro ao comunicar com o serviço de IA."}, 502
+    finally:
+        if not vaga_com_o_fluxo:
+            _vagas.soltar()
+
+    rotas._acertar_quota(
+        pedido.token, pedido.user, "chat", modelo_chat, reservado,
+        getattr(response, "usage", None), caracteres_prompt,
+    )
+    return rotas._resposta_do_chat(response, user_id)
+
+
+async def _chat_em_fluxo(pedido, kwargs_chat, reservado, caracteres_prompt, user_id):
+    """Eventos do /api/chat em SSE; ver `_responder_chat_em_fluxo` em backend/app.py."""
+    prazo = time.monotonic() + _prazo_do_chat()
+    estado = {}
+    try:
+        client = rotas._get_chat_anthropic_client_async()
+        async with client.messages.stream(**kwargs_chat) as fluxo:
+            async for evento in fluxo:
+                texto = rotas._delta_de_texto(evento, estado)
+                if texto is not None:
+                    yield rotas._evento_sse("delta", {"text": texto})
+                if time.monotonic() > prazo:
+                    raise TimeoutError("prazo do chat esgotado no meio do fluxo")
+            final = await fluxo.get_final_message()
+    except Exception as e:
+        # Reserva mantida: sem o usage final, o lado seguro é o reservado.
+        yield rotas._erro_do_fluxo(e, user_id)
+        return
+    finally:
+        # Também no aclose() de quem desconectou no meio.
+        _vagas.soltar()
+
+    rotas._acertar_quota(
+        pedido.token, pedido.user, "chat", kwargs_chat["model"], reservado,
+        getattr(final, "usage", None), caracteres_prompt,
+    )
+    yield rotas._fim_do_fluxo(final, user_id)
+
+
+async def _consolidar(pedido):
+    user_id = (pedido.user or {}).get('id', 'desconhecido')
+
+    if rotas._rate_limit_hit("chat", user_id, rotas.CHAT_RATE_LIMIT, rotas.CHAT_RATE_WINDOW_SECONDS):
+        rotas.app_logger.warning(f"Rate limit de consolidação excedido para usuário {user_id}.")
+        return {"error": "Muitas requisições. Tente novamente em instantes."}, 429
+
+    data, invalido = pedido.json()
+    if invalido:
+        return invalido
+
+    preparo, erro = rotas._preparar_consolidacao(data, user_id)
+    if erro:
+        return {"error": erro}, 400
+    if preparo["diretrizes"] is not None:
+        rotas.app_logger.info(f"Consolidate-chat: diretrizes do cache para usuário {user_id}.")
+        return {"diretrizes": preparo["diretrizes"]}, 200
+    kwargs_consolidacao = preparo["kwargs"]
+    modelo_consolidacao = kwargs_consolidacao["model"]
+    caracteres_prompt = preparo["caracteres_prompt"]
+
+    if not _vagas.ocupar():
+        return _ia_ocupada("consolidate-chat", user_id)
+    try:
+        reservado = await _reservar_quota(
+            pedido, "consolidate", modelo_consolidacao, caracteres_prompt,
+            rotas.CONSOLIDATE_MAX_TOKENS, user_id,
+        )
+        if isinstance(reservado, tuple):
+            return reservado
+
+        try:
+            client = rotas._get_chat_anthropic_client_async()
+            response = await client.messages.create(**kwargs_consolidacao)
+        except Exception as e:
+            rotas.app_logger.error(f"Erro ao consolidar chat para usuário {user_id}: {e}", exc_info=True)
+            return {"error": "Erro ao comunicar com o serviço de IA."}, 502
+    finally:
+        _vagas.soltar()
+
+    rotas._acertar_quota(
+        pedido.token, pedido.user, "consolidate", modelo_consolidacao, reservado,
+        getattr(response, "usage", None), caracteres_prompt,
+    )
+    return rotas._diretrizes_da_resposta(response, user_id, preparo["chave_cache"])
+
+
+async def _gerar_plano_legado(pedido):
+    data, invalido = pedido.json()
+    if invalido:
+        if invalido[0]["error"].startswith("Requisição inválida"):
+            rotas.app_logger.warning("Requisição para /api/generate-plan não continha JSON.")
+        else:
+            rotas.app_logger.warning("Corpo JSON não-objeto recebido em /api/generate-plan.")
+        return invalido
+
+    user_id = (pedido.user or {}).get('id')
+    if rotas._rate_limit_hit("plan", user_id, rotas.PLAN_RATE_LIMIT, rotas.PLAN_RATE_WINDOW_SECONDS):
+        rotas.app_logger.warning(f"Rate limit de geração de plano excedido para usuário {user_id}.")
+        return {"error": "Muitas solicitações de plano. Tente novamente mais tarde."}, 429
+
+    if not user_id:
+        rotas.app_logger.warning("ID do usuário ausente no token validado.")
+        return {"error": "ID do usuário não fornecido."}, 400
+
+    questionnaire_data, erro = rotas._questionario_do_plano(data, user_id)
+    if erro:
+        return {"error": erro}, 400
+
+    preparo, recusa = rotas._preparar_plano_legado(data, questionnaire_data, user_id)
+    if recusa:
+        return recusa
+    dados_usuario_para_wrapper, dias_disponiveis_final = preparo
+
+    # A mesma trava anti-geração-dupla do modo WSGI: o set é do processo.
+    with rotas._plan_inflight_lock:
+        if user_id in rotas._plan_inflight:
+            rotas.app_logger.warning(f"Geração já em andamento para usuário {user_id}; nova solicitação rejeitada (409).")
+            return {"error": "Geração de plano já em andamento. Aguarde a conclusão e tente novamente."}, 409
+        rotas._plan_inflight.add(user_id)
+
+    try:
+        rotas.app_logger.info(f"Solicitando geração de plano para usuário {user_id}...")
+        if not _vagas.ocupar():
+            return _ia_ocupada("generate-plan", user_id)
+        try:
+            plano_gerado = await rotas.treinador.gerar_plano_async(dados_usuario_para_wrapper)
+        finally:
+            _vagas.soltar()
+
+        if not plano_gerado:
+            return rotas._plano_legado_nao_gerado(user_id)
+
+        try:
+            mapeado = rotas._mapear_plano_legado(plano_gerado, user_id, dias_disponiveis_final)
+            db_plan_id = await persistir_plano_async(mapeado, access_token=pedido.token)
+        except (ValueError, PlanPersistenceError) as e:
+            return rotas._plano_legado_nao_salvo(user_id, e)
+        return rotas._plano_legado_salvo(user_id, db_plan_id)
+
+    except (ConnectionError, RuntimeError) as e:
+        rotas.app_logger.error(f"Erro de comunicação ou runtime durante a geração do plano para {user_id}: {e}", exc_info=True)
+        return {"error": "Erro ao comunicar com o serviço de IA."}, 502
+    except Exception as e:
+        rotas.app_logger.error(f"Erro inesperado no endpoint /api/generate-plan para {user_id}: {e}", exc_info=True)
+        return {"error": "Ocorreu um erro inesperado no servidor."}, 500
+    finally:
+        with rotas._plan_inflight_lock:
+            rotas._plan_inflight.discard(user_id)
+
+
+_ROTAS_NATIVAS = {
+    ("POST", "/api/chat"): _chat,
+    ("POST", "/api/consolidate-chat"): _consolidar,
+    ("POST", "/api/generate-plan"): _gerar_plano_legado,
+}
+
+
+def _rota_nativa(scope):
+    rota = _ROTAS_NATIVAS.get((scope["method"], scope["path"]))
+    if rota is _gerar_plano_legado and rotas.FORCA_USE_MOLDE_ARCHITECTURE:
+        return None  # o modo job responde 202 na hora: a ponte basta
+    return rota
+
+
+# --- HTTP ------------------------------------------------------------------
+
+def _cabecalhos_do_scope(scope) -> Headers:
+    return Headers([(nome.decode("latin-1"), valor.decode("latin-1")) for nome, valor in scope["headers"]])
+
+
+def _cabecalhos_cors(cabecalhos: Headers, metodo: str) -> Headers:
+    """Os cabeçalhos que o flask_cors poria nesta resposta (mesmas opções do app)."""
+    saida = Headers()
+    for nome, valor in get_cors_headers(_cors, cabecalhos, metodo).items(multi=True):
+        if valor is not None:
+            saida.add(nome, valor)
+    origem = saida.get("Access-Control-Allow-Origin")
+    if origem and origem != "*" and _cors.get("vary_header"):
+        saida.add("Vary", "Origin")
+    return saida
+
+
+async def _ler_corpo(receive, limite: int) -> Tuple[bytes, bool]:
+    """(corpo, excedeu). Para de juntar bytes ao passar do limite."""
+    partes = []
+    total = 0
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "http.disconnect":
+            return b"".join(partes), False
+        pedaco = mensagem.get("body", b"")
+        total += len(pedaco)
+        if total > limite:
+            return b"".join(partes), True
+        partes.append(pedaco)
+        if not mensagem.get("more_body"):
+            return b"".join(partes), False
+
+
+def _excede_pelo_cabecalho(cabecalhos: Headers, limite: int) -> bool:
+    try:
+        return int(cabecalhos.get("Content-Length") or 0) > limite
+    except ValueError:
+        return False
+
+
+async def _enviar(send, status: int, cabecalhos: Headers, corpo: bytes) -> None:
+    cabecalhos["Content-Length"] = str(len(corpo))
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(n.lower().encode("latin-1"), v.encode("latin-1")) for n, v in cabecalhos.items()],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def _enviar_json(send, corpo, status, cors: Headers, extras=None) -> None:
+    resposta = rotas.app.json.response(corpo)
+    cabecalhos = Headers([("Content-Type", resposta.mimetype)])
+    cabecalhos.extend(extras or {})
+    cabecalhos.extend(cors)
+    await _enviar(send, status, cabecalhos, resposta.get_data())
+
+
+async def _enviar_fluxo(send, receive, cabecalhos: Headers, eventos) -> None:
+    """Transmite os eventos até o fim ou até o cliente desconectar."""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(n.lower().encode("latin-1"), v.encode("latin-1")) for n, v in cabecalhos.items()],
+    })
+
+    async def _transmitir():
+        async for evento in eventos:
+            await send({"type": "http.response.body", "body": evento.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _vigiar():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    transmissao = asyncio.ensure_future(_transmitir())
+    vigia = asyncio.ensure_future(_vigiar())
+    try:
+        await asyncio.wait({transmissao, vigia}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        vigia.cancel()
+        transmissao.cancel()
+        # Desconexão no meio: o cancelamento chega ao gerador parado no modelo
+        # e o `finally` dele solta a vaga de IA. Só depois dá para fechá-lo.
+        await asyncio.gather(transmissao, vigia, return_exceptions=True)
+        await eventos.aclose()
+    if not transmissao.cancelled() and transmissao.exception():
+        raise transmissao.exception()
+
+
+async def _atender_nativa(rota, scope, receive, send) -> None:
+    cabecalhos = _cabecalhos_do_scope(scope)
+    cors = _cabecalhos_cors(cabecalhos, scope["method"])
+
+    # Mesma ordem do @token_required: auth antes de ler o corpo.
+    token = auth.token_do_cabecalho(cabecalhos.get("Authorization", ""))
+    if not token:
+        return await _enviar_json(send, {"error": "Autenticação necessária."}, 401, cors)
+    try:
+        user = await auth.validate_token_async(token)
+    except RuntimeError as exc:
+        return await _enviar_json(send, {"error": str(exc)}, 503, cors)
+    if user is None:
+        return await _enviar_json(send, {"error": "Sessão inválida ou expirada."}, 401, cors)
+
+    limite = rotas.app.config["MAX_CONTENT_LENGTH"]
+    excedeu = _excede_pelo_cabecalho(cabecalhos, limite)
+    corpo = b""
+    if not excedeu:
+        corpo, excedeu = await _ler_corpo(receive, limite)
+    if excedeu:
+        # O mesmo 413 que o Flask devolve ao passar de MAX_CONTENT_LENGTH.
+        erro = RequestEntityTooLarge().get_response()
+        saida = Headers(erro.headers)
+        saida.extend(cors)
+        return await _enviar(send, erro.status_code, saida, erro.get_data())
+
+    resultado = await rota(_Pedido(cabecalhos, corpo, user, token))
+    corpo_resposta, status = resultado[0], resultado[1]
+    extras = resultado[2] if len(resultado) > 2 else None
+    if hasattr(corpo_resposta, "__aiter__"):
+        saida = Headers(extras or {})
+        saida.extend(cors)
+        return await _enviar_fluxo(send, receive, saida, corpo_resposta)
+    await _enviar_json(send, corpo_resposta, status, cors, extras)
+
+
+# --- Ponte WSGI --------------------------------------------------------------
+
+def _pool_da_ponte() -> ThreadPoolExecutor:
+    global _ponte
+    with _ponte_lock:
+        if _ponte is None:
+            _ponte = ThreadPoolExecutor(max(1, ASGI_WSGI_THREADS), thread_name_prefix="ponte-wsgi")
+        return _ponte
+
+
+def _environ(scope, corpo: bytes, tamanho_declarado: Optional[str]) -> Dict[str, Any]:
+    servidor = scope.get("server") or ("localhost", 80)
+    cliente = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(servidor[0]),
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": "HTTP/{}".format(scope.get("http_version", "1.1")),
+        "REMOTE_ADDR": cliente[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(corpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for nome, valor in scope["headers"]:
+        nome = nome.decode("latin-1").upper().replace("-", "_")
+        valor = valor.decode("latin-1")
+        if nome in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[nome] = valor
+            continue
+        chave = "HTTP_" + nome
+        environ[chave] = environ[chave] + "," + valor if chave in environ else valor
+    # Corpo sem Content-Length (chunked) já chega inteiro; acima do limite, o
+    # tamanho declarado faz o Flask responder o 413 dele.
+    environ["CONTENT_LENGTH"] = tamanho_declarado or str(len(corpo))
+    return environ
+
+
+def _rodar_wsgi(environ) -> Tuple[int, Any, bytes]:
+    inicio = {}
+    partes = []
+
+    def start_response(status, headers, exc_info=None):
+        inicio["status"] = int(status.split(" ", 1)[0])
+        inicio["headers"] = headers
+        return partes.append
+
+    resultado = rotas.app(environ, start_response)
+    try:
+        for parte in resultado:
+            partes.append(parte)
+    finally:
+        if hasattr(resultado, "close"):
+            resultado.close()
+    return inicio["status"], inicio["headers"], b"".join(partes)
+
+
+async def _atender_pela_ponte(scope, receive, send) -> None:
+    cabecalhos = _cabecalhos_do_scope(scope)
+    limite = rotas.app.config["MAX_CONTENT_LENGTH"]
+    tamanho_declarado = cabecalhos.get("Content-Length")
+    if _excede_pelo_cabecalho(cabecalhos, limite):
+        corpo = b""
+    else:
+        corpo, excedeu = await _ler_corpo(receive, limite)
+        if excedeu:
+            tamanho_declarado = str(limite + 1)
+    status, headers, corpo_resposta = await asyncio.get_running_loop().run_in_executor(
+        _pool_da_ponte(), _rodar_wsgi, _environ(scope, corpo, tamanho_declarado)
+    )
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(n.lower().encode("latin-1"), v.encode("latin-1")) for n, v in headers],
+    })
+    await send({"type": "http.response.body", "body": corpo_resposta})
+
+
+# --- ASGI ----------------------------------------------------------------------
+
+async def _ciclo_de_vida(receive, send) -> None:
+    global _ponte
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif mensagem["type"] == "lifespan.shutdown":
+            await fechar_clientes_async()
+            await fechar_cliente_http_async()
+            with _ponte_lock:
+                ponte, _ponte = _ponte, None
+            if ponte is not None:
+                ponte.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """Aplicação ASGI: `uvicorn backend.asgi:app`."""
+    if scope["type"] == "lifespan":
+        return await _ciclo_de_vida(receive, send)
+    if scope["type"] != "http":
+        # Sem websocket neste backend: recusa o handshake.
+        return await send({"type": "websocket.close"})
+    rota = _rota_nativa(scope)
+    if rota is None:
+        return await _atender_pela_ponte(scope, receive, send)
+    return await _atender_nativa(rota, scope, receive, send)
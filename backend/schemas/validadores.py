@@ -0,0 +1,93 @@
+# backend/schemas/validadores.py
+# Validadores compilados uma vez por processo para os schemas do backend.
+#
+# `jsonschema.validate(instance=..., schema=...)` refaz tudo a cada chamada:
+# descobre o draft pelo `$schema`, roda `check_schema` (o schema inteiro
+# validado contra o metaschema) e monta um validador novo — que por sua vez
+# resolve de novo cada `$ref`. Para o MOLDE_SCHEMA isso custava mais do que
+# validar o próprio molde, e acontecia em toda tentativa do molde, de novo no
+# expansor, e em cada consolidação, generate-plan e rascunho manual.
+#
+# Aqui cada schema é checado e compilado UMA vez, na importação, e `validar`
+# repete exatamente a semântica de `jsonschema.validate`: mesmo draft
+# (validator_for), mesmos erros, e o erro levantado é o `best_match` de
+# `iter_errors` — mesma `message`, mesmo `validator`, mesmo `path`. O
+# mapeamento pt-BR de _MENSAGENS_RASCUNHO_MANUAL e o retry dirigido do molde
+# dependem disso; um teste compara os dois caminho a caminho.
+#
+# MoldeValidado é a prova de que um molde já passou aqui: o pipeline do molde
+# valida cada candidato (é o que alimenta o retry dirigido) e o expansor, que
+# antes validava o MESMO objeto de novo, aceita a prova e pula a segunda
+# passada. Dict cru continua sendo validado no expansor — quem chama de fora
+# não perde a garantia.
+#
+# Sem fastjsonschema: não faz parte das dependências, e o código que ele gera
+# devolve outra mensagem e outro caminho para o mesmo erro.
+
+import copy
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import jsonschema
+from jsonschema.exceptions import best_match
+
+from backend.schemas.diretrizes_schema import DIRETRIZES_SCHEMA
+from backend.schemas.molde_schema import MOLDE_SCHEMA
+from backend.schemas.plano_manual_schema import PLANO_MANUAL_SCHEMA
+
+
+def compilar(schema: Dict[str, Any]):
+    """Validador do draft declarado em `schema`, depois de checar o schema."""
+    classe = jsonschema.validators.validator_for(schema)
+    classe.check_schema(schema)
+    return classe(schema)
+
+
+VALIDADOR_MOLDE = compilar(MOLDE_SCHEMA)
+VALIDADOR_DIRETRIZES = compilar(DIRETRIZES_SCHEMA)
+VALIDADOR_PLANO_MANUAL = compilar(PLANO_MANUAL_SCHEMA)
+
+
+def validar(validador, instancia: Any) -> None:
+    """
+    `jsonschema.validate` com um validador já compilado.
+
+    Raises:
+        jsonschema.exceptions.ValidationError: o mesmo erro que
+            `jsonschema.validate` levantaria para esta instância.
+    """
+    erro = best_match(validador.iter_errors(instancia))
+    if erro is not None:
+        raise erro
+
+
+@dataclass(frozen=True)
+class MoldeValidado:
+    """
+    Molde aprovado pelo VALIDADOR_MOLDE. Só `validar_molde` cria um.
+
+    A prova vale enquanto o dict não for mexido: quem recebe um MoldeValidado
+    lê `molde`, não escreve nele.
+    """
+
+    molde: Dict[str, Any]
+    validador: Any
+
+    def e_valido_para(self, validador) -> bool:
+        """True se a prova veio deste validador (o schema que vale agora)."""
+        return self.validador is validador
+
+    def __deepcopy__(self, memo):
+        # O validador é a prova, não dado: a cópia aponta para o mesmo.
+        return MoldeValidado(copy.deepcopy(self.molde, memo), self.validador)
+
+
+def validar_molde(molde: Dict[str, Any]) -> MoldeValidado:
+    """
+    Valida `molde` contra o MOLDE_SCHEMA e devolve a prova.
+
+    Raises:
+        jsonschema.exceptions.ValidationError: como `validar`.
+    """
+    validar(VALIDADOR_MOLDE, molde)
+    return MoldeValidado(molde, VALIDADOR_MOLDE)
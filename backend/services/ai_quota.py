@@ -9,27 +9,57 @@
 #
 # Modelo de uso, em duas etapas por chamada paga:
 #
-#   1. reservar(...)  ANTES de chamar o modelo, com o custo de pior caso.
+#   1. reservar(...)  ANTES de chamar o modelo, com o custo estimado
+#      (custo_reservado_usd: p95 calibrado da rota; pior caso até calibrar).
 #      Se o teto do dia já foi atingido, levanta QuotaExcedida e a chamada
 #      paga não acontece.
 #   2. ajustar(...)   DEPOIS, com o custo real lido de `response.usage`.
-#      Devolve à quota a diferença entre o pior caso reservado e o gasto real.
+#      Acerta a diferença entre o reservado e o gasto real, nos dois sentidos.
 #
 # A ordem importa: reservar depois da chamada deixaria a janela entre a
 # decisão e o débito sem proteção, que é exatamente onde uma rajada passa.
 #
+# Só a reserva fica no caminho da resposta. O ajuste entra numa fila em
+# segundo plano (FilaDeAcertos, abaixo): o delta não muda o que o usuário
+# recebe, e esperar a 2ª RPC (até 10s) só atrasava a resposta do chat. Os
+# deltas do mesmo token/rota que chegam dentro da janela viram UMA RPC.
+# Profundidade, envios e falhas saem em /api/metrics ("acertos_de_quota"), e
+# todo lote com falha deixa um warning no log.
+#
+# `reservar_async` é a mesma reserva para o modo ASGI (backend/asgi.py): só a
+# RPC troca `requests` por httpx assíncrono; sombra e regras são as mesmas.
+#
 # Uma tentativa que falha por reprovação semântica (o loop do molde) NÃO é
 # devolvida: o modelo gerou tokens e cobrou por eles. Só os retries de rede
 # (429/5xx/529 dentro de `criar_mensagem_com_deadline`) ficam de fora, porque
 # não retornam `usage` — a API não cobra uma resposta que não entregou.
 
+import atexit
+import datetime
+import logging
 import os
-from typing import Any, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
+import httpx
 import requests
 
+from backend.services import estimativa_tokens
+from backend.utils import metricas
+from backend.utils.http_async import cliente_http_async
+
+logger = logging.getLogger(__name__)
+
 REQUEST_TIMEOUT_SECONDS = 10
 
+# Janela de coalescência dos ajustes: a fila espera isto depois do primeiro
+# delta pendente antes de enviar, para juntar os que chegarem no meio. Curta
+# de propósito — o ajuste devolve quota, e devolver tarde deixa o aluno
+# barrado por um teto que ele ainda não atingiu.
+AI_QUOTA_ACERTO_JANELA_SECONDS = float(os.environ.get("AI_QUOTA_ACERTO_JANELA_SECONDS", "2"))
+
 # Tetos diários por usuário.
 #
 # O limite de CHAMADAS é por rota; o de CUSTO é do dia inteiro. A razão é que
@@ -56,6 +86,13 @@ LIMITE_CHAMADAS_POR_ROTA = {
 # Trava global de gasto, somando todas as rotas. É esta que segura o Opus.
 AI_DAILY_USD_LIMIT = float(os.environ.get("AI_DAILY_USD_LIMIT", "5.00"))
 
+# Sombra local dos totais do dia (ver "Sombra da quota" abaixo). O teto de
+# chamadas só cresce no dia, então estourado fica estourado até a virada; o
+# de custo pode voltar a ter folga quando um ajuste devolve a sobra de uma
+# reserva, então a recusa local por custo vale só por este TTL.
+AI_QUOTA_SOMBRA_TTL_CUSTO_SECONDS = float(os.environ.get("AI_QUOTA_SOMBRA_TTL_CUSTO_SECONDS", "60"))
+_SOMBRA_MAX_USUARIOS = 10_000
+
 # Preço por 1 milhão de tokens (USD), tabela pública da Anthropic conferida em
 # 31/07/2026. Só entra aqui modelo que o app realmente pode usar — ver os
 # defaults de CLAUDE_MODEL_NAME / CHAT_MODEL_NAME / PLAN_MODEL_NAME no
@@ -72,6 +109,13 @@ PRECOS_POR_MILHAO_USD = {
 # barato. Um preço subestimado aqui vira teto que não segura nada.
 PRECO_DESCONHECIDO = {"entrada": 5.00, "saida": 25.00}
 
+# Multiplicadores do prompt caching sobre o preço de entrada (tabela pública:
+# escrita com TTL de 5 min = 1,25x; leitura = 0,1x). A quota continua
+# cobrando cache a preço cheio (custo_real_usd, conservador); estes fatores
+# servem para medir quanto o cache economizou de verdade.
+FATOR_ESCRITA_CACHE = 1.25
+FATOR_LEITURA_CACHE = 0.10
+
 # Estimativa de tokens de entrada quando o prompt não foi medido. Serve só
 # para a reserva; o ajuste pós-chamada substitui pelo valor real de `usage`.
 CARACTERES_POR_TOKEN = 4
@@ -116,6 +160,31 @@ def custo_estimado_usd(modelo: str, caracteres_prompt: int, max_tokens_saida: in
     )
 
 
+def custo_reservado_usd(
+    rota: str, modelo: str, caracteres_prompt: int, max_tokens_saida: int
+) -> float:
+    """
+    O que a reserva debita: entrada e saída pelo p95 calibrado da rota
+    (backend/services/estimativa_tokens.py), saída nunca acima de
+    `max_tokens_saida`. Sem calibração ainda, é o `custo_estimado_usd`.
+    """
+    tokens_por_caractere = estimativa_tokens.tokens_por_caractere(rota, modelo)
+    saida_p95 = estimativa_tokens.tokens_de_saida(rota, modelo)
+    caracteres = max(0, int(caracteres_prompt))
+    teto_saida = max(0, int(max_tokens_saida))
+    tokens_entrada = (
+        caracteres * tokens_por_caractere
+        if tokens_por_caractere is not None
+        else caracteres / CARACTERES_POR_TOKEN
+    )
+    tokens_saida = teto_saida if saida_p95 is None else min(teto_saida, saida_p95)
+    preco = _preco(modelo)
+    return (
+        tokens_entrada * preco["entrada"] / 1_000_000
+        + tokens_saida * preco["saida"] / 1_000_000
+    )
+
+
 def custo_real_usd(modelo: str, usage: Any) -> Optional[float]:
     """
     Custo efetivo a partir do `usage` da resposta. Devolve None quando a
@@ -143,6 +212,25 @@ def custo_real_usd(modelo: str, usage: Any) -> Optional[float]:
     )
 
 
+def economia_de_cache_usd(modelo: str, usage: Any) -> float:
+    """
+    Quanto o prompt caching economizou nesta resposta, em USD: as leituras
+    saíram a 0,1x em vez do preço cheio, e as escritas custaram 0,25x A MAIS.
+    Negativo quando a chamada só escreveu cache — é o custo de um prefixo que
+    ninguém releu.
+    """
+    try:
+        escrita = int(getattr(usage, "cache_creation_input_tokens", 0) or 0)
+        leitura = int(getattr(usage, "cache_read_input_tokens", 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    preco_entrada = _preco(modelo)["entrada"] / 1_000_000
+    return (
+        leitura * preco_entrada * (1 - FATOR_LEITURA_CACHE)
+        - escrita * preco_entrada * (FATOR_ESCRITA_CACHE - 1)
+    )
+
+
 def _config():
     base_url = (os.environ.get("SUPABASE_URL") or "").rstrip("/")
     anon_key = os.environ.get("SUPABASE_ANON_KEY") or ""
@@ -153,24 +241,19 @@ def _config():
     return base_url, anon_key
 
 
-def _chamar_rpc(access_token: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+def _cabecalhos_da_rpc(access_token: str) -> Tuple[str, Dict[str, str]]:
     base_url, anon_key = _config()
     if not access_token:
         raise QuotaIndisponivel("Sem token de acesso do usuário para contabilizar a quota.")
-    try:
-        resposta = requests.post(
-            "{}/rest/v1/rpc/register_ai_usage".format(base_url),
-            headers={
-                "apikey": anon_key,
-                "Authorization": "Bearer {}".format(access_token),
-                "Content-Type": "application/json",
-            },
-            json=payload,
-            timeout=REQUEST_TIMEOUT_SECONDS,
-        )
-    except requests.RequestException as exc:
-        raise QuotaIndisponivel("Falha de rede ao consultar a quota de IA: {}".format(exc)) from exc
+    return "{}/rest/v1/rpc/register_ai_usage".format(base_url), {
+        "apikey": anon_key,
+        "Authorization": "Bearer {}".format(access_token),
+        "Content-Type": "application/json",
+    }
+
 
+def _corpo_da_rpc(resposta: Any) -> Dict[str, Any]:
+    """Corpo da resposta da RPC (requests ou httpx), ou QuotaIndisponivel."""
     if resposta.status_code >= 400:
         raise QuotaIndisponivel(
             "RPC de quota respondeu HTTP {}.".format(resposta.status_code)
@@ -186,32 +269,47 @@ def _chamar_rpc(access_token: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     return corpo
 
 
-def reservar(access_token: str, rota: str, custo_estimado: float) -> Dict[str, Any]:
-    """
-    Registra uma tentativa paga e devolve os totais do dia.
+def _chamar_rpc(access_token: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    url, headers = _cabecalhos_da_rpc(access_token)
+    try:
+        resposta = requests.post(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT_SECONDS)
+    except requests.RequestException as exc:
+        raise QuotaIndisponivel("Falha de rede ao consultar a quota de IA: {}".format(exc)) from exc
+    return _corpo_da_rpc(resposta)
 
-    Levanta QuotaExcedida se o teto foi atingido (a tentativa NÃO é contada) e
-    QuotaIndisponivel se a contabilidade não pôde ser feita.
 
-    Falha FECHADA de propósito: sem contabilidade não há teto, e a rota que
-    chama isto já depende do Supabase para persistir o resultado — um banco
-    fora do ar não deixaria o fluxo terminar de qualquer forma.
-    """
+async def _chamar_rpc_async(access_token: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    url, headers = _cabecalhos_da_rpc(access_token)
+    try:
+        resposta = await cliente_http_async().post(
+            url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT_SECONDS
+        )
+    except httpx.HTTPError as exc:
+        raise QuotaIndisponivel("Falha de rede ao consultar a quota de IA: {}".format(exc)) from exc
+    return _corpo_da_rpc(resposta)
+
+
+def _limite_de_chamadas(rota: str) -> int:
     # Rota fora do mapa não vira "sem limite": a RPC recusaria a rota de
     # qualquer forma, e um None aqui significaria teto ausente.
-    limite_chamadas = LIMITE_CHAMADAS_POR_ROTA.get(rota, AI_DAILY_CALL_LIMIT_PLAN)
-
-    corpo = _chamar_rpc(
-        access_token,
-        {
-            "p_rota": rota,
-            "p_chamadas": 1,
-            "p_custo_usd": round(float(custo_estimado), 6),
-            "p_limite_chamadas": limite_chamadas,
-            "p_limite_usd": AI_DAILY_USD_LIMIT,
-            "p_forcar": False,
-        },
-    )
+    return LIMITE_CHAMADAS_POR_ROTA.get(rota, AI_DAILY_CALL_LIMIT_PLAN)
+
+
+def _payload_da_reserva(custo_estimado: float, rota: str, limite_chamadas: int) -> Dict[str, Any]:
+    return {
+        "p_rota": rota,
+        "p_chamadas": 1,
+        "p_custo_usd": round(float(custo_estimado), 6),
+        "p_limite_chamadas": limite_chamadas,
+        "p_limite_usd": AI_DAILY_USD_LIMIT,
+        "p_forcar": False,
+    }
+
+
+def _conferir_reserva(corpo: Dict[str, Any], rota: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """Alimenta a sombra com a resposta da RPC e levanta QuotaExcedida se recusou."""
+    if user_id:
+        _atualizar_sombra(user_id, rota, corpo)
     if not corpo.get("permitido"):
         raise QuotaExcedida(
             motivo=str(corpo.get("motivo") or "desconhecido"),
@@ -222,19 +320,135 @@ def reservar(access_token: str, rota: str, custo_estimado: float) -> Dict[str, A
     return corpo
 
 
-def ajustar(access_token: str, rota: str, delta_usd: float) -> None:
+def reservar(
+    access_token: str, rota: str, custo_estimado: float, user_id: Optional[str] = None
+) -> Dict[str, Any]:
     """
-    Acerta o custo reservado para o valor real, depois da resposta.
+    Registra uma tentativa paga e devolve os totais do dia.
 
-    Nunca levanta: o gasto já aconteceu e já está contabilizado pela reserva
-    de pior caso. Derrubar a resposta do usuário porque o acerto falhou
-    trocaria um erro de centavos por um erro de produto — e o lado do qual
-    erramos (custo superestimado) é o seguro.
+    Levanta QuotaExcedida se o teto foi atingido (a tentativa NÃO é contada) e
+    QuotaIndisponivel se a contabilidade não pôde ser feita.
+
+    Falha FECHADA de propósito: sem contabilidade não há teto, e a rota que
+    chama isto já depende do Supabase para persistir o resultado — um banco
+    fora do ar não deixaria o fluxo terminar de qualquer forma.
+
+    Com `user_id`, quem já está claramente acima do teto é recusado pela
+    sombra local, sem a RPC.
     """
-    if not delta_usd:
+    limite_chamadas = _limite_de_chamadas(rota)
+    if user_id:
+        _recusar_pela_sombra(user_id, rota, limite_chamadas)
+    corpo = _chamar_rpc(access_token, _payload_da_reserva(custo_estimado, rota, limite_chamadas))
+    return _conferir_reserva(corpo, rota, user_id)
+
+
+async def reservar_async(
+    access_token: str, rota: str, custo_estimado: float, user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """`reservar` sem prender o event loop na RPC. Mesmas exceções."""
+    limite_chamadas = _limite_de_chamadas(rota)
+    if user_id:
+        _recusar_pela_sombra(user_id, rota, limite_chamadas)
+    corpo = await _chamar_rpc_async(
+        access_token, _payload_da_reserva(custo_estimado, rota, limite_chamadas)
+    )
+    return _conferir_reserva(corpo, rota, user_id)
+
+
+# --- Sombra da quota ---------------------------------------------------------
+#
+# Quem já passou do teto continuava custando uma RPC a cada retry do app antes
+# de receber o 429. A sombra guarda, por usuário, os totais que a própria RPC
+# devolveu (reserva e ajuste) e recusa localmente só quem está CLARAMENTE
+# acima: chamadas da rota já no teto, ou custo do dia já no teto há menos de
+# AI_QUOTA_SOMBRA_TTL_CUSTO_SECONDS. Qualquer um perto do limite segue para a
+# RPC, que continua sendo a fonte da verdade.
+#
+# O dia é o da RPC (current_date do Postgres = UTC, ver migration 0024), não o
+# fuso do aluno: com o de São Paulo, a sombra seguiria recusando por 3 horas
+# depois que o banco já zerou o dia.
+#
+# Recusas locais (acertos) e idas à RPC (desvios) saem em /api/metrics como
+# "sombra_de_quota".
+
+_sombra: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_sombra_lock = threading.Lock()
+_sombra_stats = {"acertos": 0, "desvios": 0}
+
+
+def _dia_da_quota() -> datetime.date:
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+def _atualizar_sombra(user_id: str, rota: str, corpo: Dict[str, Any]) -> None:
+    try:
+        chamadas = int(corpo.get("chamadas_rota") or 0)
+        custo = float(corpo.get("custo_dia_usd") or 0.0)
+    except (TypeError, ValueError):
         return
+    dia = _dia_da_quota()
+    with _sombra_lock:
+        entrada = _sombra.get(user_id)
+        if entrada is None or entrada["dia"] != dia:
+            entrada = {"dia": dia, "chamadas": {}, "custo_dia_usd": 0.0, "custo_visto_em": 0.0}
+            _sombra[user_id] = entrada
+        # `chamadas` só cresce no dia; a resposta mais nova de uma RPC que
+        # correu em paralelo pode chegar antes da mais velha.
+        entrada["chamadas"][rota] = max(entrada["chamadas"].get(rota, 0), chamadas)
+        entrada["custo_dia_usd"] = custo
+        entrada["custo_visto_em"] = time.monotonic()
+        _sombra.move_to_end(user_id)
+        while len(_sombra) > _SOMBRA_MAX_USUARIOS:
+            _sombra.popitem(last=False)
+
+
+def _recusar_pela_sombra(user_id: str, rota: str, limite_chamadas: int) -> None:
+    """Levanta QuotaExcedida se a sombra já sabe a resposta; senão, conta um desvio."""
+    dia = _dia_da_quota()
+    with _sombra_lock:
+        entrada = _sombra.get(user_id)
+        if entrada is not None and entrada["dia"] == dia:
+            chamadas = entrada["chamadas"].get(rota, 0)
+            custo = entrada["custo_dia_usd"]
+            motivo = None
+            if chamadas + 1 > limite_chamadas:
+                motivo = "chamadas"
+            elif (
+                custo >= AI_DAILY_USD_LIMIT
+                and time.monotonic() - entrada["custo_visto_em"] < AI_QUOTA_SOMBRA_TTL_CUSTO_SECONDS
+            ):
+                motivo = "custo"
+            if motivo is not None:
+                _sombra_stats["acertos"] += 1
+                raise QuotaExcedida(
+                    motivo=motivo, rota=rota, chamadas_rota=chamadas, custo_dia_usd=custo
+                )
+        _sombra_stats["desvios"] += 1
+
+
+def estatisticas_da_sombra() -> Dict[str, int]:
+    """Recusas locais (acertos), idas à RPC (desvios) e usuários na sombra."""
+    with _sombra_lock:
+        return {**_sombra_stats, "usuarios": len(_sombra)}
+
+
+def limpar_sombra() -> None:
+    with _sombra_lock:
+        _sombra.clear()
+        _sombra_stats["acertos"] = 0
+        _sombra_stats["desvios"] = 0
+
+
+metricas.registrar("sombra_de_quota", estatisticas_da_sombra, limpar_sombra)
+
+
+def _enviar_ajuste(
+    access_token: str, rota: str, delta_usd: float, user_id: Optional[str] = None
+) -> bool:
+    """Uma RPC de ajuste. True se gravou; falha é silenciosa (ver `ajustar`)."""
     try:
-        _chamar_rpc(
+        corpo = _chamar_rpc(
             access_token,
             {
                 "p_rota": rota,
@@ -246,16 +460,173 @@ def ajustar(access_token: str, rota: str, delta_usd: float) -> None:
             },
         )
     except QuotaIndisponivel:
-        # Silêncio deliberado: quem chama loga o contexto se quiser. A reserva
-        # já protege o teto; o acerto é refinamento.
-        pass
+        # Silêncio deliberado: a reserva já protege o teto; o acerto é
+        # refinamento.
+        return False
+    if user_id:
+        # O ajuste devolve o custo do dia JÁ com a sobra devolvida: é o que
+        # tira da recusa local quem voltou a ter folga.
+        _atualizar_sombra(user_id, rota, corpo)
+    return True
+
+
+class FilaDeAcertos:
+    """
+    Ajustes pendentes por (token, rota), somados e enviados em segundo plano.
+
+    Uma thread daemon, criada no primeiro ajuste, espera a janela e envia um
+    delta por chave. `drenar()` envia tudo na hora e roda no `atexit` — o
+    gunicorn encerra o worker com sys.exit, então um restart não perde o que
+    estava na fila. Um SIGKILL perde, e o erro fica do lado seguro: a reserva
+    de pior caso permanece.
+
+    A chave é o token e não o usuário porque é o token que a RPC usa para
+    saber de quem é a linha (auth.uid()); tokens diferentes do mesmo aluno
+    só deixam de ser somados entre si. O `user_id`, quando vem, só acompanha
+    o delta para a resposta do ajuste atualizar a sombra da quota. O dia é o do servidor na hora do
+    envio: um delta enfileirado segundos antes da meia-noite cai no dia
+    seguinte, como já acontecia com um molde que terminava depois dela.
+    """
+
+    def __init__(self, janela_s: float):
+        self._janela_s = janela_s
+        self._pendentes: Dict[Tuple[str, str, Optional[str]], float] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._enviando = 0
+        self._stats = {"enfileirados": 0, "enviados": 0, "falhas": 0}
+
+    def enfileirar(
+        self, access_token: str, rota: str, delta_usd: float, user_id: Optional[str] = None
+    ) -> None:
+        chave = (access_token, rota, user_id)
+        with self._cond:
+            self._pendentes[chave] = self._pendentes.get(chave, 0.0) + float(delta_usd)
+            self._stats["enfileirados"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="quota-acertos", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pendentes:
+                    self._cond.wait()
+            # Fora do lock: quem chega durante a janela soma na mesma chave.
+            time.sleep(self._janela_s)
+            self.drenar()
+
+    def drenar(self) -> int:
+        """Envia agora tudo o que está pendente. Devolve quantas RPCs fez."""
+        with self._cond:
+            lote, self._pendentes = self._pendentes, {}
+            self._enviando += len(lote)
+        enviados = falhas = 0
+        try:
+            for (access_token, rota, user_id), delta in lote.items():
+                if not round(delta, 6):
+                    continue  # deltas que se anularam: nada a gravar
+                if _enviar_ajuste(access_token, rota, delta, user_id):
+                    enviados += 1
+                else:
+                    falhas += 1
+        finally:
+            with self._cond:
+                self._enviando -= len(lote)
+                self._stats["enviados"] += enviados
+                self._stats["falhas"] += falhas
+                profundidade = len(self._pendentes) + self._enviando
+        if falhas:
+            # A reserva de pior caso fica no lugar do delta perdido: ninguém
+            # passa do teto por isso, mas a folga do aluno some até o dia virar.
+            logger.warning(
+                "Fila de acertos da quota: %d de %d ajustes falharam neste lote "
+                "(profundidade agora: %d).", falhas, len(lote), profundidade,
+            )
+        elif lote:
+            logger.debug(
+                "Fila de acertos da quota: %d ajustes enviados (profundidade agora: %d).",
+                enviados, profundidade,
+            )
+        return enviados
+
+    def profundidade(self) -> int:
+        """Chaves ainda sem RPC: pendentes na janela + lote em envio."""
+        with self._cond:
+            return len(self._pendentes) + self._enviando
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._cond:
+            return {**self._stats, "profundidade": len(self._pendentes) + self._enviando}
+
+    def limpar(self) -> None:
+        """Descarta o pendente sem enviar (testes)."""
+        with self._cond:
+            self._pendentes.clear()
+            self._stats = {"enfileirados": 0, "enviados": 0, "falhas": 0}
+
+
+_fila_de_acertos = FilaDeAcertos(AI_QUOTA_ACERTO_JANELA_SECONDS)
+atexit.register(_fila_de_acertos.drenar)
+
+
+def drenar_acertos() -> int:
+    return _fila_de_acertos.drenar()
+
+
+def profundidade_da_fila_de_acertos() -> int:
+    return _fila_de_acertos.profundidade()
+
+
+def estatisticas_de_acertos() -> Dict[str, int]:
+    """Ajustes enfileirados, RPCs enviadas, falhas e a profundidade atual."""
+    return _fila_de_acertos.estatisticas()
+
+
+def limpar_acertos() -> None:
+    _fila_de_acertos.limpar()
+
+
+metricas.registrar("acertos_de_quota", estatisticas_de_acertos, limpar_acertos)
+
+
+def ajustar(
+    access_token: str, rota: str, delta_usd: float, user_id: Optional[str] = None
+) -> None:
+    """
+    Acerta o custo reservado para o valor real, depois da resposta.
+
+    Não espera a RPC: o delta entra na FilaDeAcertos e sai em segundo plano,
+    somado aos outros do mesmo token/rota.
+
+    Nunca levanta: o gasto já aconteceu e já está contabilizado pela reserva
+    de pior caso. Derrubar a resposta do usuário porque o acerto falhou
+    trocaria um erro de centavos por um erro de produto — e o lado do qual
+    erramos (custo superestimado) é o seguro.
+    """
+    if not delta_usd:
+        return
+    _fila_de_acertos.enfileirar(access_token, rota, delta_usd, user_id)
 
 
 def acertar_custo_real(
-    access_token: str, rota: str, modelo: str, reservado_usd: float, usage: Any
+    access_token: str,
+    rota: str,
+    modelo: str,
+    reservado_usd: float,
+    usage: Any,
+    user_id: Optional[str] = None,
+    caracteres_prompt: Optional[int] = None,
 ) -> None:
-    """Conveniência: calcula o delta entre reservado e real e o aplica."""
+    """
+    Conveniência: calcula o delta entre reservado e real e o aplica. O
+    `usage` (e o tamanho do prompt, quando vem) também calibra as próximas
+    reservas da rota.
+    """
+    estimativa_tokens.registrar_uso(rota, modelo, caracteres_prompt, usage)
     real = custo_real_usd(modelo, usage)
     if real is None:
         return
-    ajustar(access_token, rota, real - reservado_usd)
+    estimativa_tokens.registrar_acerto(rota, reservado_usd, real)
+    ajustar(access_token, rota, real - reservado_usd, user_id)
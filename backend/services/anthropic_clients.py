@@ -0,0 +1,248 @@
+# backend/services/anthropic_clients.py
+# Registro de clientes Anthropic reaproveitáveis, com pool HTTP keep-alive
+# compartilhado e métricas de reuso de conexão.
+#
+# Cada job do molde criava um `anthropic.Anthropic(...)` novo — pool httpx novo,
+# DNS + TCP + TLS de novo — e jogava fora no fim. O chat tinha o seu cliente
+# preguiçoso e o TreinadorEspecialista outro, cada um com pool próprio. Aqui:
+#
+#   - um pool httpx por PERFIL de timeout ("chat", "molde", "treinador"),
+#     compartilhado entre jobs, rotas e famílias de modelo. Perfis separados
+#     de propósito: um molde prende a conexão por minutos, e o chat (que
+#     desiste em 25s) não pode esperar na fila do pool atrás dele;
+#   - um cliente Anthropic por (perfil, família do modelo), sobre o pool do
+#     perfil. A família não muda o transporte hoje; ela fica na chave para as
+#     métricas e para um ajuste futuro por família não exigir outra refatoração;
+#   - `estatisticas_de_clientes()` conta requests e conexões TCP abertas por
+#     perfil (via trace do httpcore): reuso = 1 - conexões/requests. Sai em
+#     /api/metrics como "clientes_anthropic".
+#
+# Limites do pool por env (ANTHROPIC_POOL_*). max_retries=0 em todos: o retry
+# é do helper de deadline (backend/utils/anthropic_retry.py), que nunca
+# re-tenta timeout.
+#
+# `cliente_anthropic_async` é o par para o modo ASGI (backend/asgi.py): um
+# `anthropic.AsyncAnthropic` sobre um pool httpx assíncrono por perfil. Um
+# pool assíncrono pertence ao event loop que abriu as conexões, então o
+# registro é POR LOOP (some junto com ele). Ali a conexão em espera não
+# prende thread nenhuma, e o teto de conexões é o seu próprio
+# (ANTHROPIC_ASYNC_POOL_MAX_CONNECTIONS). As métricas saem no mesmo
+# "clientes_anthropic", com o perfil sufixado por "_async".
+
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+from backend.utils import metricas
+
+# Teto de conexões simultâneas por perfil. Acima dele o request espera vaga no
+# pool (dentro do timeout do próprio request). O molde já é limitado pelo
+# PLAN_JOB_MAX_CONCURRENCY; o chat, pelas threads do gunicorn.
+ANTHROPIC_POOL_MAX_CONNECTIONS = int(os.environ.get("ANTHROPIC_POOL_MAX_CONNECTIONS", "20"))
+# Conexões ociosas mantidas abertas por perfil, e por quanto tempo.
+ANTHROPIC_POOL_MAX_KEEPALIVE = int(os.environ.get("ANTHROPIC_POOL_MAX_KEEPALIVE", "10"))
+ANTHROPIC_POOL_KEEPALIVE_SECONDS = int(os.environ.get("ANTHROPIC_POOL_KEEPALIVE_SECONDS", "60"))
+# Teto do pool assíncrono por perfil. Cada chat em voo segura uma conexão; o
+# limite de quantos entram é o AI_ASYNC_MAX_CONCURRENT do backend/asgi.py.
+ANTHROPIC_ASYNC_POOL_MAX_CONNECTIONS = int(
+    os.environ.get("ANTHROPIC_ASYNC_POOL_MAX_CONNECTIONS", "100")
+)
+
+_FAMILIAS = ("haiku", "sonnet", "opus")
+
+# perfil -> {"http": httpx.Client, "requests": int, "conexoes": int}
+_pools: Dict[str, Dict[str, Any]] = {}
+# (perfil, família) -> (api_key, timeout, cliente)
+_clientes: Dict[Tuple[str, str], Tuple[str, float, Any]] = {}
+_lock = threading.Lock()
+
+# loop -> {"pools": {perfil: httpx.AsyncClient}, "clientes": {(perfil, família): (api_key, timeout, cliente)}}
+_por_loop: "weakref.WeakKeyDictionary[Any, Dict[str, Dict[Any, Any]]]" = weakref.WeakKeyDictionary()
+# perfil -> {"requests": int, "conexoes": int}, somando os loops
+_stats_async: Dict[str, Dict[str, int]] = {}
+
+
+def familia_do_modelo(modelo: Optional[str]) -> str:
+    """'claude-haiku-4-5' -> 'haiku'. Modelo desconhecido cai em 'outros'."""
+    nome = (modelo or "").lower()
+    for familia in _FAMILIAS:
+        if familia in nome:
+            return familia
+    return "outros"
+
+
+def _contar(perfil: str, campo: str) -> None:
+    with _lock:
+        pool = _pools.get(perfil)
+        if pool is not None:
+            pool[campo] += 1
+
+
+def _novo_pool(perfil: str) -> Dict[str, Any]:
+    import anthropic  # import tardio: só exige a lib quando alguma rota de IA é usada
+    import httpx
+
+    def _trace(evento: str, _info: Any) -> None:
+        # Só o request que não achou conexão ociosa passa por connect_tcp.
+        if evento == "connection.connect_tcp.complete":
+            _contar(perfil, "conexoes")
+
+    def _marcar_request(request: "httpx.Request") -> None:
+        _contar(perfil, "requests")
+        request.extensions["trace"] = _trace
+
+    http = anthropic.DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=ANTHROPIC_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=ANTHROPIC_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=ANTHROPIC_POOL_KEEPALIVE_SECONDS,
+        ),
+        event_hooks={"request": [_marcar_request]},
+    )
+    return {"http": http, "requests": 0, "conexoes": 0}
+
+
+def cliente_anthropic(perfil: str, modelo: Optional[str], api_key: str, timeout: float) -> Any:
+    """
+    Cliente Anthropic do perfil/família, criado uma vez e reaproveitado.
+
+    Troca de chave ou de timeout (env alterado em runtime, testes) recria o
+    cliente sobre o MESMO pool — as conexões abertas continuam valendo.
+    """
+    import anthropic
+
+    chave = (perfil, familia_do_modelo(modelo))
+    with _lock:
+        guardado = _clientes.get(chave)
+        if guardado is not None and guardado[0] == api_key and guardado[1] == timeout:
+            return guardado[2]
+        pool = _pools.get(perfil)
+    if pool is None:
+        novo = _novo_pool(perfil)
+        with _lock:
+            pool = _pools.setdefault(perfil, novo)
+        if pool is not novo:
+            novo["http"].close()  # outra thread criou o pool do perfil antes
+    cliente = anthropic.Anthropic(
+        api_key=api_key,
+        timeout=timeout,
+        max_retries=0,
+        http_client=pool["http"],
+    )
+    with _lock:
+        _clientes[chave] = (api_key, timeout, cliente)
+    return cliente
+
+
+def _novo_pool_async(perfil: str) -> Any:
+    import anthropic
+    import httpx
+
+    def _contar_async(campo: str) -> None:
+        with _lock:
+            _stats_async.setdefault(perfil, {"requests": 0, "conexoes": 0})[campo] += 1
+
+    async def _trace(evento: str, _info: Any) -> None:
+        if evento == "connection.connect_tcp.complete":
+            _contar_async("conexoes")
+
+    async def _marcar_request(request: "httpx.Request") -> None:
+        _contar_async("requests")
+        request.extensions["trace"] = _trace
+
+    return anthropic.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=ANTHROPIC_ASYNC_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=ANTHROPIC_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=ANTHROPIC_POOL_KEEPALIVE_SECONDS,
+        ),
+        event_hooks={"request": [_marcar_request]},
+    )
+
+
+def cliente_anthropic_async(perfil: str, modelo: Optional[str], api_key: str, timeout: float) -> Any:
+    """
+    `cliente_anthropic` para o event loop corrente: AsyncAnthropic sobre o
+    pool assíncrono do perfil NESTE loop. Só chama de dentro de uma corrotina.
+    """
+    import asyncio
+
+    import anthropic
+
+    loop = asyncio.get_running_loop()
+    chave = (perfil, familia_do_modelo(modelo))
+    with _lock:
+        registro = _por_loop.setdefault(loop, {"pools": {}, "clientes": {}})
+        guardado = registro["clientes"].get(chave)
+        if guardado is not None and guardado[0] == api_key and guardado[1] == timeout:
+            return guardado[2]
+        pool = registro["pools"].get(perfil)
+        if pool is None:
+            # Sob o lock: um loop é uma thread só, e criar o pool não faz I/O.
+            pool = registro["pools"][perfil] = _novo_pool_async(perfil)
+        cliente = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=0,
+            http_client=pool,
+        )
+        registro["clientes"][chave] = (api_key, timeout, cliente)
+    return cliente
+
+
+async def fechar_clientes_async() -> None:
+    """Fecha os pools assíncronos do loop corrente (shutdown do ASGI)."""
+    import asyncio
+
+    with _lock:
+        registro = _por_loop.pop(asyncio.get_running_loop(), None)
+    for pool in (registro or {}).get("pools", {}).values():
+        await pool.aclose()
+
+
+def estatisticas_de_clientes() -> Dict[str, Dict[str, Any]]:
+    """
+    Por perfil: requests enviados, conexões TCP abertas, taxa de reuso e as
+    famílias de modelo com cliente criado.
+    """
+    with _lock:
+        saida = {
+            perfil: {"requests": p["requests"], "conexoes": p["conexoes"], "familias": []}
+            for perfil, p in _pools.items()
+        }
+        for perfil, familia in _clientes:
+            if perfil in saida:
+                saida[perfil]["familias"].append(familia)
+        for perfil, contagem in _stats_async.items():
+            saida[perfil + "_async"] = {**contagem, "familias": []}
+        for registro in _por_loop.values():
+            for perfil, familia in registro["clientes"]:
+                familias = saida.setdefault(
+                    perfil + "_async", {"requests": 0, "conexoes": 0, "familias": []}
+                )["familias"]
+                if familia not in familias:
+                    familias.append(familia)
+    for m in saida.values():
+        m["familias"].sort()
+        m["reuso"] = 1 - m["conexoes"] / m["requests"] if m["requests"] else 0.0
+    return saida
+
+
+def limpar_clientes() -> None:
+    """
+    Fecha os pools e esquece os clientes (testes e shutdown). Os pools
+    assíncronos só são esquecidos: fechá-los exige o loop deles
+    (`fechar_clientes_async`).
+    """
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _clientes.clear()
+        _por_loop.clear()
+        _stats_async.clear()
+    for pool in pools:
+        pool["http"].close()
+
+
+metricas.registrar("clientes_anthropic", estatisticas_de_clientes, limpar_clientes)
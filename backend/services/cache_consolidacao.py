@@ -0,0 +1,110 @@
+# backend/services/cache_consolidacao.py
+# Cache endereçado por conteúdo das diretrizes do /api/consolidate-chat.
+#
+# O app reenvia o MESMO histórico em retry de rede, ao voltar do segundo plano
+# e no toque duplo em "gerar plano", e cada reenvio era outra chamada paga ao
+# modelo (e outra reserva de quota) para devolver praticamente as mesmas
+# diretrizes. Aqui a resposta validada fica guardada pelo hash do que a
+# determina:
+#
+#   - as mensagens já sanitizadas (depois do corte do assistant final, quando
+#     há corte);
+#   - o questionário como entra no prompt (_questionario_para_prompt);
+#   - modelo, flag de structured output e versão do prompt da consolidação.
+#
+# A chave é o conteúdo, não o usuário: só acerta quem mandou exatamente o
+# mesmo histórico e o mesmo questionário, e nesse caso a resposta é a que ele
+# mesmo receberia. Só entra diretriz que passou no DIRETRIZES_SCHEMA — erro
+# nunca é guardado.
+#
+# LRU com teto e TTL (CONSOLIDATE_CACHE_TTL_SECONDS, 0 desliga). O estado é
+# por processo, como o memo de fragmentos do prompt; acertos, faltas e taxa de
+# acerto saem em /api/metrics como "cache_de_consolidacao".
+
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.utils import metricas
+from backend.utils.json_codec import serializar_compacto
+
+CONSOLIDATE_CACHE_TTL_SECONDS = int(os.environ.get("CONSOLIDATE_CACHE_TTL_SECONDS", "600"))
+CONSOLIDATE_CACHE_MAX = int(os.environ.get("CONSOLIDATE_CACHE_MAX", "512"))
+
+# chave -> (expira_em monotonic, diretrizes)
+_entradas: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_lock = threading.Lock()
+_acertos = 0
+_faltas = 0
+
+
+def chave_de_consolidacao(
+    messages: List[Dict[str, str]],
+    questionario_prompt: str,
+    modelo: str,
+    structured_output: bool,
+    versao_prompt: int,
+) -> str:
+    """sha256 do que determina as diretrizes. Mesma entrada, mesma chave."""
+    material = serializar_compacto(
+        [versao_prompt, modelo, bool(structured_output), questionario_prompt, messages]
+    )
+    return hashlib.sha256(material).hexdigest()
+
+
+def obter_diretrizes(chave: str) -> Optional[Dict[str, Any]]:
+    """Cópia das diretrizes guardadas em `chave`, ou None (falta ou vencida)."""
+    global _acertos, _faltas
+    if CONSOLIDATE_CACHE_TTL_SECONDS <= 0:
+        return None
+    with _lock:
+        entrada = _entradas.get(chave)
+        if entrada is not None and entrada[0] <= time.monotonic():
+            del _entradas[chave]
+            entrada = None
+        if entrada is None:
+            _faltas += 1
+            return None
+        _entradas.move_to_end(chave)
+        _acertos += 1
+        diretrizes = entrada[1]
+    return copy.deepcopy(diretrizes)
+
+
+def guardar_diretrizes(chave: str, diretrizes: Dict[str, Any]) -> None:
+    """Guarda diretrizes JÁ validadas. Quem chama continua dono do dict."""
+    if CONSOLIDATE_CACHE_TTL_SECONDS <= 0:
+        return
+    copia = copy.deepcopy(diretrizes)
+    with _lock:
+        _entradas[chave] = (time.monotonic() + CONSOLIDATE_CACHE_TTL_SECONDS, copia)
+        _entradas.move_to_end(chave)
+        while len(_entradas) > max(1, CONSOLIDATE_CACHE_MAX):
+            _entradas.popitem(last=False)
+
+
+def estatisticas_de_consolidacao() -> Dict[str, float]:
+    """Acertos, faltas, entradas e taxa de acerto desde o início (ou do último limpar)."""
+    with _lock:
+        consultas = _acertos + _faltas
+        return {
+            "acertos": _acertos,
+            "faltas": _faltas,
+            "entradas": len(_entradas),
+            "taxa_de_acerto": _acertos / consultas if consultas else 0.0,
+        }
+
+
+def limpar_cache_de_consolidacao() -> None:
+    global _acertos, _faltas
+    with _lock:
+        _entradas.clear()
+        _acertos = 0
+        _faltas = 0
+
+
+metricas.registrar("cache_de_consolidacao", estatisticas_de_consolidacao, limpar_cache_de_consolidacao)
@@ -0,0 +1,162 @@
+# backend/services/cache_molde.py
+# Memo dos moldes validados, com voo único para gerações idênticas.
+#
+# Cada job pagava uma geração Opus inteira, mesmo quando o prompt era
+# idêntico ao de um molde já validado: o aluno que regenera depois de uma
+# falha ao salvar, ou depois de um erro transitório na expansão, manda o mesmo
+# questionário e as mesmas diretrizes. Aqui o molde que passou no schema E no
+# contrato de cardio fica guardado pelo hash do que o determina:
+#
+#   - o questionário como entra no prompt e as diretrizes serializadas;
+#   - o ETag do catálogo (catálogo novo, cardápio novo no prompt);
+#   - o modelo e as flags do prompt (versão, layout, structured output,
+#     esforço).
+#
+# Voo único: um segundo job com a mesma chave, chegando enquanto o primeiro
+# ainda gera, espera o resultado dele em vez de abrir outra geração. Se o
+# primeiro falhar (quota dele, erro da API, molde reprovado duas vezes), quem
+# esperava gera por conta própria — a falha de um job nunca vira a de outro.
+#
+# LRU com teto e TTL (MOLDE_CACHE_MAX, MOLDE_CACHE_TTL_SECONDS; TTL 0 desliga
+# tudo, inclusive o voo único). O estado é por processo, como o memo de
+# fragmentos do prompt; acertos, junções e faltas saem em /api/metrics como
+# "cache_de_moldes".
+
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.utils import metricas
+from backend.utils.json_codec import serializar_compacto
+
+MOLDE_CACHE_TTL_SECONDS = int(os.environ.get("MOLDE_CACHE_TTL_SECONDS", "3600"))
+MOLDE_CACHE_MAX = int(os.environ.get("MOLDE_CACHE_MAX", "64"))
+
+# Quanto quem chegou depois espera a geração em voo. Acima das duas
+# tentativas de 240s do molde: passar disso é o primeiro job travado, e aí
+# esperar mais não ajuda.
+_ESPERA_DO_VOO_SECONDS = 600.0
+
+# chave -> (expira_em monotonic, molde)
+_moldes: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_em_voo: Dict[str, threading.Event] = {}
+_lock = threading.Lock()
+_acertos = 0
+_juncoes = 0
+_faltas = 0
+
+
+def chave_do_molde(
+    questionario_prompt: str,
+    diretrizes_prompt: str,
+    etag_catalogo: str,
+    modelo: str,
+    flags: Tuple[Any, ...],
+) -> str:
+    """sha256 do que determina o molde. Mesma entrada, mesma chave."""
+    material = serializar_compacto(
+        [list(flags), modelo, etag_catalogo, questionario_prompt, diretrizes_prompt]
+    )
+    return hashlib.sha256(material).hexdigest()
+
+
+def _guardado(chave: str) -> Optional[Dict[str, Any]]:
+    """Molde vivo em `chave`. Chamar com _lock."""
+    entrada = _moldes.get(chave)
+    if entrada is None:
+        return None
+    if entrada[0] <= time.monotonic():
+        del _moldes[chave]
+        return None
+    _moldes.move_to_end(chave)
+    return entrada[1]
+
+
+def _guardar(chave: str, molde: Dict[str, Any]) -> None:
+    copia = copy.deepcopy(molde)
+    with _lock:
+        _moldes[chave] = (time.monotonic() + MOLDE_CACHE_TTL_SECONDS, copia)
+        _moldes.move_to_end(chave)
+        while len(_moldes) > max(1, MOLDE_CACHE_MAX):
+            _moldes.popitem(last=False)
+
+
+def molde_com_voo_unico(
+    chave: str, gerar: Callable[[], Optional[Dict[str, Any]]]
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Devolve (molde, origem). Origem: "cache" (já estava guardado), "voo"
+    (outro job gerou enquanto este esperava) ou "gerado" (`gerar()` rodou
+    aqui). `gerar` devolve o molde validado ou None; None nunca é guardado.
+
+    O molde devolvido é uma cópia: o expansor pode mexer nele à vontade.
+    """
+    global _acertos, _juncoes, _faltas
+    if MOLDE_CACHE_TTL_SECONDS <= 0:
+        return gerar(), "gerado"
+
+    esperou = False
+    while True:
+        with _lock:
+            molde = _guardado(chave)
+            if molde is not None:
+                if esperou:
+                    _juncoes += 1
+                else:
+                    _acertos += 1
+                return copy.deepcopy(molde), ("voo" if esperou else "cache")
+            voo = _em_voo.get(chave)
+            if voo is None:
+                voo = _em_voo[chave] = threading.Event()
+                _faltas += 1
+                break
+        esperou = True
+        if not voo.wait(_ESPERA_DO_VOO_SECONDS):
+            with _lock:
+                _faltas += 1
+            return gerar(), "gerado"
+        # Acordou: ou o molde está guardado, ou o outro job falhou e a vez
+        # de gerar passa para cá (a volta do laço decide).
+
+    try:
+        molde = gerar()
+        if molde is not None:
+            _guardar(chave, molde)
+        return molde, "gerado"
+    finally:
+        with _lock:
+            _em_voo.pop(chave, None)
+        voo.set()
+
+
+def estatisticas_de_moldes() -> Dict[str, float]:
+    """
+    Acertos (cache), junções (esperou um voo em andamento), faltas (gerou),
+    entradas, gerações em voo e taxa de reaproveitamento.
+    """
+    with _lock:
+        consultas = _acertos + _juncoes + _faltas
+        return {
+            "acertos": _acertos,
+            "juncoes": _juncoes,
+            "faltas": _faltas,
+            "entradas": len(_moldes),
+            "em_voo": len(_em_voo),
+            "taxa_de_reaproveitamento": (_acertos + _juncoes) / consultas if consultas else 0.0,
+        }
+
+
+def limpar_cache_de_moldes() -> None:
+    global _acertos, _juncoes, _faltas
+    with _lock:
+        _moldes.clear()
+        _acertos = 0
+        _juncoes = 0
+        _faltas = 0
+
+
+metricas.registrar("cache_de_moldes", estatisticas_de_moldes, limpar_cache_de_moldes)
@@ -0,0 +1,132 @@
+# backend/services/estimativa_tokens.py
+# Estimativa de tokens para a reserva de quota, calibrada pelo `usage` real.
+#
+# A reserva (ai_quota) media a entrada como caracteres/4 e a saída no teto de
+# `max_tokens`: 32768 no molde, quando uma geração real fica bem abaixo disso.
+# Duas gerações honestas em paralelo reservavam o bastante para bater no teto
+# diário em dólares antes de gastar metade dele. Aqui, por (rota, modelo):
+#
+#   - entrada: tokens por caractere do prompt medidos nas respostas recentes.
+#     Usa o p95 da razão, não a média: o prompt com mais JSON e acento é o que
+#     sai mais caro por caractere, e é ele que a reserva precisa cobrir;
+#   - saída: p95 dos output_tokens recentes, nunca acima de `max_tokens`;
+#   - razão reservado/real de cada chamada acertada, para acompanhar quanto a
+#     reserva sobra (ou falta) por rota — em /api/metrics como
+#     "reservas_de_quota".
+#
+# Sem AMOSTRAS_MINIMAS amostras as funções devolvem None e a reserva fica como
+# era (caracteres/4 e saída no teto): processo novo começa no lado seguro e só
+# afrouxa depois de ver tráfego real. O estado é por processo, como o memo do
+# catálogo.
+#
+# p95 quer dizer que ~1 chamada em 20 gasta mais do que reservou. O ajuste
+# pós-chamada cobra a diferença (a RPC aceita o débito forçado acima do teto),
+# então o teto diário pode ser ultrapassado por essa diferença, uma vez — é a
+# troca por não barrar o aluno com dinheiro que ele não gastou.
+
+import math
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from backend.utils import metricas
+
+JANELA_DE_AMOSTRAS = 200
+AMOSTRAS_MINIMAS = 20
+
+_Chave = Tuple[str, str]
+
+_tokens_por_caractere: Dict[_Chave, Deque[float]] = {}
+_tokens_de_saida: Dict[_Chave, Deque[int]] = {}
+_razoes: Dict[str, Deque[float]] = {}
+_subreservas: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def _p95(amostras) -> float:
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, math.ceil(0.95 * len(ordenadas)) - 1)]
+
+
+def _janela(mapa: Dict[Any, Deque], chave: Any) -> Deque:
+    janela = mapa.get(chave)
+    if janela is None:
+        janela = mapa[chave] = deque(maxlen=JANELA_DE_AMOSTRAS)
+    return janela
+
+
+def tokens_por_caractere(rota: str, modelo: str) -> Optional[float]:
+    """p95 dos tokens de entrada por caractere do prompt; None sem calibração."""
+    with _lock:
+        janela = _tokens_por_caractere.get((rota, modelo))
+        if not janela or len(janela) < AMOSTRAS_MINIMAS:
+            return None
+        return _p95(janela)
+
+
+def tokens_de_saida(rota: str, modelo: str) -> Optional[int]:
+    """p95 dos output_tokens recentes; None sem calibração."""
+    with _lock:
+        janela = _tokens_de_saida.get((rota, modelo))
+        if not janela or len(janela) < AMOSTRAS_MINIMAS:
+            return None
+        return int(math.ceil(_p95(janela)))
+
+
+def registrar_uso(rota: str, modelo: str, caracteres_prompt: Optional[int], usage: Any) -> None:
+    """Alimenta a calibração com o `usage` de uma resposta. Nunca levanta."""
+    if usage is None:
+        return
+    try:
+        entrada = int(getattr(usage, "input_tokens", 0) or 0)
+        entrada += int(getattr(usage, "cache_creation_input_tokens", 0) or 0)
+        entrada += int(getattr(usage, "cache_read_input_tokens", 0) or 0)
+        saida = int(getattr(usage, "output_tokens", 0) or 0)
+    except (TypeError, ValueError):
+        return
+    with _lock:
+        if saida > 0:
+            _janela(_tokens_de_saida, (rota, modelo)).append(saida)
+        if caracteres_prompt and entrada > 0:
+            _janela(_tokens_por_caractere, (rota, modelo)).append(entrada / caracteres_prompt)
+
+
+def registrar_acerto(rota: str, reservado_usd: float, real_usd: float) -> None:
+    """Guarda a razão reservado/real de uma chamada acertada."""
+    if real_usd <= 0:
+        return
+    with _lock:
+        _janela(_razoes, rota).append(reservado_usd / real_usd)
+        if reservado_usd < real_usd:
+            _subreservas[rota] = _subreservas.get(rota, 0) + 1
+
+
+def estatisticas_de_reserva() -> Dict[str, Dict[str, float]]:
+    """
+    Por rota: amostras, razão reservado/real mediana e p95, e quantas
+    chamadas gastaram mais do que reservaram (subreservas).
+    """
+    with _lock:
+        copia = {rota: list(janela) for rota, janela in _razoes.items()}
+        subreservas = dict(_subreservas)
+    saida = {}
+    for rota, razoes in copia.items():
+        ordenadas = sorted(razoes)
+        saida[rota] = {
+            "amostras": len(ordenadas),
+            "razao_mediana": ordenadas[len(ordenadas) // 2],
+            "razao_p95": _p95(ordenadas),
+            "subreservas": subreservas.get(rota, 0),
+        }
+    return saida
+
+
+def limpar_estimativas() -> None:
+    with _lock:
+        _tokens_por_caractere.clear()
+        _tokens_de_saida.clear()
+        _razoes.clear()
+        _subreservas.clear()
+
+
+metricas.registrar("reservas_de_quota", estatisticas_de_reserva, limpar_estimativas)
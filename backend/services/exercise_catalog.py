@@ -15,7 +15,9 @@ from __future__ import annotations
 import hashlib
 import json
 import re
+import threading
 import unicodedata
+from collections import OrderedDict
 from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
@@ -33,6 +35,11 @@ _STOPWORDS = frozenset({
 # (exercícios de peso corporal). O motor de adaptação assume incremento > 0.
 _INCREMENTO_PADRAO_KG = 2.5
 
+# Teto do memo de `resolver_exercicio`. O vocabulário real do modelo cabe folgado
+# (catálogo + variações de grafia); o teto só existe para que nome livre
+# adversarial não faça o processo crescer sem limite.
+_RESOLUCOES_MAX = 4096
+
 # Um token anatômico não coberto pelo candidato VETA o casamento: "Rosca Direta
 # de Perna" não pode virar "Rosca Direta com Barra" (bíceps) só porque duas
 # palavras batem. Falhar fechado preserva o nome da IA; casar errado grava
@@ -215,10 +222,15 @@ def _indice() -> Dict[str, Any]:
     Índices de busca. Um alias que aponte para DUAS chaves diferentes é erro de
     catálogo e explode no carregamento — ambiguidade silenciosa canonizaria
     errado para sempre.
+
+    `postings` é o índice invertido token → ids de forma (posição em
+    `formas`): o casamento por tokens só visita formas que dividem ao menos
+    um token com a consulta, em vez de varrer o catálogo inteiro.
     """
     exato: Dict[str, ExercicioCanonico] = {}
     formas: List[Tuple[frozenset, ExercicioCanonico]] = []
     por_chave: Dict[str, ExercicioCanonico] = {}
+    postings: Dict[str, List[int]] = {}
 
     for ex in carregar_catalogo():
         por_chave[ex.chave] = ex
@@ -233,9 +245,17 @@ def _indice() -> Dict[str, Any]:
                     f"'{anterior.chave}' e '{ex.chave}'."
                 )
             exato[n] = ex
-            formas.append((_tokens(n), ex))
+            tokens_forma = _tokens(n)
+            for token in tokens_forma:
+                postings.setdefault(token, []).append(len(formas))
+            formas.append((tokens_forma, ex))
 
-    return {"exato": exato, "formas": formas, "por_chave": por_chave}
+    return {
+        "exato": exato,
+        "formas": formas,
+        "por_chave": por_chave,
+        "postings": {token: tuple(ids) for token, ids in postings.items()},
+    }
 
 
 def _melhor_por_tokens(consulta: frozenset) -> Optional[ExercicioCanonico]:
@@ -248,17 +268,32 @@ def _melhor_por_tokens(consulta: frozenset) -> Optional[ExercicioCanonico]:
     if not consulta:
         return None
 
+    idx = _indice()
+    formas = idx["formas"]
+    postings = idx["postings"]
+
+    # Quantos tokens da consulta cada forma candidata tem. Como toda forma é
+    # um conjunto, `forma <= consulta` ⇔ acertos == len(forma) e
+    # `consulta <= forma` ⇔ acertos == len(consulta) — o teste de subconjunto
+    # sai da contagem, sem tocar nas formas que não dividem token nenhum.
+    acertos: Dict[int, int] = {}
+    for token in consulta:
+        for id_forma in postings.get(token, ()):
+            acertos[id_forma] = acertos.get(id_forma, 0) + 1
+
     melhor_score = 0.0
     # chave → (melhor score, entrada, união dos tokens da consulta que as
     # formas dessa entrada cobrem, união dos tokens QUE A FORMA TEM A MAIS e a
     # consulta não pediu — só populado no ramo `consulta <= tokens_forma`)
     candidatos: Dict[str, Tuple[float, ExercicioCanonico, frozenset, frozenset]] = {}
 
-    for tokens_forma, ex in _indice()["formas"]:
-        if not tokens_forma:
-            continue
+    # A ordem das formas não muda o resultado (uniões e máximos por chave,
+    # vencedor só se único); `sorted` mantém a ordem do catálogo por clareza.
+    for id_forma in sorted(acertos):
+        tokens_forma, ex = formas[id_forma]
+        n_acertos = acertos[id_forma]
         extras_desta_forma: frozenset = frozenset()
-        if tokens_forma <= consulta:
+        if n_acertos == len(tokens_forma):
             score = len(tokens_forma) / len(consulta)
             minimo = (
                 _COBERTURA_MINIMA_FORMA_LONGA if len(tokens_forma) >= 2
@@ -266,7 +301,7 @@ def _melhor_por_tokens(consulta: frozenset) -> Optional[ExercicioCanonico]:
             )
             if score < minimo:
                 continue
-        elif consulta <= tokens_forma:
+        elif n_acertos == len(consulta):
             score = len(consulta) / len(tokens_forma)
             # A forma é mais longa que a consulta: o que ela tem a mais fica
             # marcado para o veto de qualificador direcional logo abaixo.
@@ -348,13 +383,56 @@ def _equipamento_no_qualificador(qualificador: Optional[str]) -> str:
     return chave if chave in _equipamentos_do_catalogo() else ""
 
 
+# Memo LRU de resolver_exercicio, chaveado também pelo ETag do catálogo: um
+# catálogo novo nunca devolve a resolução do antigo. `ResultadoResolucao` é
+# congelado, então a mesma instância pode ser devolvida a todos os chamadores.
+_resolucoes: "OrderedDict[Tuple[str, Any, Any], ResultadoResolucao]" = OrderedDict()
+_resolucoes_lock = threading.Lock()
+
+
+def _chave_de_memo(nome: Any, equipamento: Any) -> Optional[Tuple[Any, Any]]:
+    """(nome, equipamento) memoizável, ou None. Só texto: 1, 1.0 e True têm o
+    mesmo hash mas resolvem diferente."""
+    if (nome is None or isinstance(nome, str)) and (equipamento is None or isinstance(equipamento, str)):
+        return nome, equipamento
+    return None
+
+
+def limpar_cache_de_resolucao() -> None:
+    with _resolucoes_lock:
+        _resolucoes.clear()
+
+
 def resolver_exercicio(nome: Any, equipamento: Any = None) -> ResultadoResolucao:
     """
     Resolve o nome livre do modelo contra o catálogo.
 
     O equipamento declarado pelo modelo só é usado como desempate quando o nome
     sozinho não decide (ex.: 'Supino' + 'Halteres').
+
+    Memoizado (LRU de `_RESOLUCOES_MAX` entradas por ETag do catálogo): o mesmo
+    nome passa por aqui dezenas de vezes por plano, e cada passagem custava
+    `normalizar` + até quatro casamentos por tokens.
     """
+    par = _chave_de_memo(nome, equipamento)
+    if par is None:
+        return _resolver_sem_memo(nome, equipamento)
+    chave = (etag_catalogo(), *par)
+    with _resolucoes_lock:
+        resultado = _resolucoes.get(chave)
+        if resultado is not None:
+            _resolucoes.move_to_end(chave)
+            return resultado
+    resultado = _resolver_sem_memo(nome, equipamento)
+    with _resolucoes_lock:
+        _resolucoes[chave] = resultado
+        _resolucoes.move_to_end(chave)
+        while len(_resolucoes) > _RESOLUCOES_MAX:
+            _resolucoes.popitem(last=False)
+    return resultado
+
+
+def _resolver_sem_memo(nome: Any, equipamento: Any) -> ResultadoResolucao:
     nome_original = str(nome).strip() if nome is not None else ""
     if not nome_original:
         return ResultadoResolucao(
@@ -508,6 +586,42 @@ def catalogo_para_prompt(
     return "\n".join(f"{grupo}: {' | '.join(nomes)}" for grupo, nomes in agrupado.items())
 
 
+class ContextoDeResolucao:
+    """
+    Resoluções de UMA execução do pipeline (expansor + mapper do mesmo plano).
+
+    O expansor pergunta a métrica de cada exercício a cada regra de cada
+    semana, e o mapper resolve de novo cada exercício de cada semana para
+    gravar. Com um contexto compartilhado, cada (nome, equipamento) distinto é
+    resolvido uma vez por plano — sem lock e sem consultar o ETag, porque o
+    contexto vive numa thread só e dura uma geração.
+    """
+
+    def __init__(self) -> None:
+        self._resolucoes: Dict[Tuple[Any, Any], ResultadoResolucao] = {}
+
+    def resolver(self, nome: Any, equipamento: Any = None) -> ResultadoResolucao:
+        par = _chave_de_memo(nome, equipamento)
+        if par is None:
+            return resolver_exercicio(nome, equipamento)
+        resultado = self._resolucoes.get(par)
+        if resultado is None:
+            resultado = self._resolucoes[par] = resolver_exercicio(nome, equipamento)
+        return resultado
+
+    def __len__(self) -> int:
+        return len(self._resolucoes)
+
+
+def _resolver_no_contexto(
+    exercicio: Dict[str, Any],
+    contexto: Optional[ContextoDeResolucao],
+) -> ResultadoResolucao:
+    if contexto is not None:
+        return contexto.resolver(exercicio.get("nome"), exercicio.get("equipamento"))
+    return resolver_exercicio(exercicio.get("nome"), exercicio.get("equipamento"))
+
+
 # --- Decisão ÚNICA de métrica ------------------------------------------------
 # O mapper e o expansor precisam concordar sobre o que é exercício "por tempo".
 # Quando cada metade decidia sozinha, o mesmo exercício progredia como carga no
@@ -546,7 +660,10 @@ def _numero_positivo(valor: Any) -> bool:
     return isinstance(valor, (int, float)) and not isinstance(valor, bool) and valor > 0
 
 
-def metrica_do_exercicio(exercicio: Dict[str, Any]) -> str:
+def metrica_do_exercicio(
+    exercicio: Dict[str, Any],
+    contexto: Optional[ContextoDeResolucao] = None,
+) -> str:
     """
     Métrica de um exercício do molde, pela mesma regra em todo o pipeline.
 
@@ -559,7 +676,7 @@ def metrica_do_exercicio(exercicio: Dict[str, Any]) -> str:
        duração/distância prescrita seria descartada.
     4. Carga × repetição.
     """
-    canonico = resolver_exercicio(exercicio.get("nome"), exercicio.get("equipamento"))
+    canonico = _resolver_no_contexto(exercicio, contexto)
     if canonico.chave is not None:
         return canonico.metrica
 
@@ -589,12 +706,18 @@ def metrica_do_exercicio(exercicio: Dict[str, Any]) -> str:
     return canonico.metrica
 
 
-def e_por_tempo(exercicio: Dict[str, Any]) -> bool:
+def e_por_tempo(
+    exercicio: Dict[str, Any],
+    contexto: Optional[ContextoDeResolucao] = None,
+) -> bool:
     """Exercício medido por duração (e distância), nunca por carga × repetição."""
-    return metrica_do_exercicio(exercicio) in (METRICA_TEMPO, METRICA_TEMPO_DISTANCIA)
+    return metrica_do_exercicio(exercicio, contexto) in (METRICA_TEMPO, METRICA_TEMPO_DISTANCIA)
 
 
-def progride_por_series(exercicio: Dict[str, Any]) -> bool:
+def progride_por_series(
+    exercicio: Dict[str, Any],
+    contexto: Optional[ContextoDeResolucao] = None,
+) -> bool:
     """
     O exercício aceita `delta_series` (mais séries por semana)?
 
@@ -606,9 +729,9 @@ def progride_por_series(exercicio: Dict[str, Any]) -> bool:
     """
     if exercicio.get("progressivel") is False:
         return False
-    if not e_por_tempo(exercicio):
+    if not e_por_tempo(exercicio, contexto):
         return True  # carga × repetição progride por série, sempre
-    canonico = resolver_exercicio(exercicio.get("nome"), exercicio.get("equipamento"))
+    canonico = _resolver_no_contexto(exercicio, contexto)
     if canonico.chave is None:
         # Nome livre medido por tempo: não sabemos se é uma prancha de 45 s ou
         # um bloco de 20 min. Sem essa informação, não inventamos volume.
@@ -1,15 +1,24 @@
 # backend/services/job_manager.py
 # Gerenciador de jobs assíncronos de geração de plano.
-# MVP: jobs rodam em thread dentro do processo Flask.
+# MVP: jobs rodam em threads dentro do processo Flask, num pool de tamanho
+# fixo (PLAN_JOB_MAX_CONCURRENCY) com fila FIFO limitada (PLAN_JOB_QUEUE_MAX).
 # Produção multi-worker: trocar por fila externa (Redis/PostgreSQL).
 
 import datetime
+import heapq
+import itertools
 import logging
 import os
+import sqlite3
 import threading
+import time
 import uuid
+import zlib
+from collections import deque
 from enum import Enum
-from typing import Any, Callable, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.services.job_store import criar_job_store
 
 logger = logging.getLogger(__name__)
 
@@ -34,8 +43,53 @@ class PlanJob:
         self.progress: Dict[str, str] = {"step": "created", "detail": "Aguardando início da geração."}
         self.plan_id: Optional[str] = None
         self.error: Optional[Dict[str, str]] = None
-        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.created_at = _agora()
         self._lock = threading.Lock()
+        # Long-poll (?wait=&since=): cada mudança incrementa `versao` e acorda
+        # quem espera em `_mudou`, que usa o MESMO lock do job.
+        self.versao = 0
+        self._mudou = threading.Condition(self._lock)
+        # Write-through para o store durável (job_store.py). Chamado sob o
+        # lock do job: as gravações saem na mesma ordem das transições.
+        self._ao_mudar: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    @classmethod
+    def de_linha(cls, linha: Dict[str, Any]) -> "PlanJob":
+        """Retrato de um job lido do store (de outro processo ou de antes do restart)."""
+        job = cls(job_id=linha["job_id"], user_id=linha["user_id"])
+        job.status = JobStatus(linha["status"])
+        job.progress = dict(linha["progress"])
+        job.plan_id = linha["plan_id"]
+        job.error = linha["error"]
+        job.created_at = datetime.datetime.fromtimestamp(linha["criado_em"], datetime.timezone.utc)
+        job.versao = linha["versao"]
+        return job
+
+    def _linha(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "status": self.status.value,
+            "progress": dict(self.progress),
+            "plan_id": self.plan_id,
+            "error": self.error,
+            "criado_em": self.created_at.timestamp(),
+            "versao": self.versao,
+        }
+
+    def _gravar(self) -> None:
+        """Fecha uma mudança de estado. Chamar com o lock do job."""
+        self.versao += 1
+        self._mudou.notify_all()
+        if self._ao_mudar is not None:
+            self._ao_mudar(self._linha())
+
+    def aguardar(self, desde: int, timeout: float) -> None:
+        """Bloqueia até `versao > desde`, estado terminal ou `timeout`."""
+        with self._lock:
+            self._mudou.wait_for(
+                lambda: self.versao > desde or self.status in _TERMINAIS, timeout,
+            )
 
     def to_dict(self) -> Dict[str, Any]:
         with self._lock:
@@ -45,12 +99,48 @@ class PlanJob:
                 "progress": dict(self.progress),
                 "plan_id": self.plan_id,
                 "error": self.error,
+                "version": self.versao,
             }
 
     def transition(self, status: JobStatus, step: str, detail: str) -> None:
         with self._lock:
             self.status = status
             self.progress = {"step": step, "detail": detail}
+            self._gravar()
+
+    def marcar_na_fila(self, posicao: int) -> None:
+        # Só enquanto o pipeline não começou: depois disso quem escreve o
+        # progress é ele, e uma atualização de posição atrasada não pode
+        # sobrescrever "gerando_molde".
+        with self._lock:
+            if self.status != JobStatus.CREATED:
+                return
+            self.progress = {
+                "step": "na_fila",
+                "detail": f"Na fila ({posicao}º).",
+                "posicao": posicao,
+            }
+            self._gravar()
+
+    def marcar_treinos_prontos(self, prontos: int, previstos: Optional[int]) -> None:
+        # Progresso parcial do molde em fluxo. Mesma guarda da fila: só vale
+        # enquanto o molde está sendo gerado.
+        with self._lock:
+            if self.status != JobStatus.GERANDO_MOLDE:
+                return
+            detalhe = (
+                f"{prontos} de {max(prontos, previstos)} treinos prontos."
+                if previstos
+                else f"{prontos} {'treino pronto' if prontos == 1 else 'treinos prontos'}."
+            )
+            self.progress = {
+                "step": "gerando_molde",
+                "detail": detalhe,
+                "treinos_prontos": prontos,
+            }
+            if previstos:
+                self.progress["treinos_previstos"] = max(prontos, previstos)
+            self._gravar()
 
     def marcar_salvo(self, plan_id: str) -> None:
         # Status e plan_id mudam juntos, sob o lock: um poll concorrente nunca
@@ -63,72 +153,334 @@ class PlanJob:
                 "detail": "Plano salvo com sucesso.",
                 "plan_id": plan_id,
             }
+            self._gravar()
 
     def set_error(self, code: str, message: str) -> None:
         with self._lock:
             self.status = JobStatus.ERRO
             self.error = {"code": code, "message": message}
+            self._gravar()
 
 
 # Armazenamento em memória (MVP). Terminais expiram no TTL (1h default);
 # não-terminais ganham 2×TTL — ver comentário em _limpar_jobs_expirados.
+#
+# Três estruturas, nenhuma varrida no caminho da requisição:
+#   _jobs        job_id -> job (obter_job é um get O(1));
+#   _fatias      user_id -> job vivo, com lock por fatia (dedup O(1); usuários
+#                diferentes quase nunca disputam o mesmo lock);
+#   _expiracoes  min-heap de (prazo, seq, job_id), consumido pela thread
+#                ceifadora, que dorme até o próximo prazo.
+# Ordem de locks: fatia -> _jobs_lock. Nunca o contrário.
 _jobs: Dict[str, PlanJob] = {}
 _jobs_lock = threading.Lock()
+_expiracoes: List[Tuple[float, int, str]] = []
+_seq = itertools.count()
+_ceifador_acordar = threading.Condition(_jobs_lock)
+_ceifador: Optional[threading.Thread] = None
 
 _JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "3600"))
 
+# Teto do sono da ceifadora: mesmo sem prazo vencendo, ela acorda de vez em
+# quando (barato: só olha o topo do heap).
+_CEIFADOR_SONO_MAXIMO_S = 60.0
+
+_JOB_SHARDS = 16
+
+# Store durável (JOB_STORE_BACKEND=sqlite) ou None. Com store, a ceifadora
+# também é o heartbeat: acorda a cada 1/3 do lease para renová-lo.
+_store = criar_job_store()
+
+
+class _Fatia:
+    __slots__ = ("lock", "vivos")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.vivos: Dict[str, PlanJob] = {}
+
+
+_fatias = [_Fatia() for _ in range(_JOB_SHARDS)]
+
+
+def _fatia(user_id: str) -> _Fatia:
+    return _fatias[zlib.crc32(str(user_id).encode("utf-8")) % len(_fatias)]
+
+
+def _agora() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _agendar(job: PlanJob, ttls: int) -> None:
+    """Empilha o prazo created_at + ttls×TTL. Chamar com _jobs_lock."""
+    prazo = job.created_at.timestamp() + ttls * _JOB_TTL_SECONDS
+    if not _expiracoes or prazo < _expiracoes[0][0]:
+        _ceifador_acordar.notify()
+    heapq.heappush(_expiracoes, (prazo, next(_seq), job.job_id))
+
+
+def _expira_em(linha: Dict[str, Any]) -> float:
+    ttls = 1 if linha["status"] in (s.value for s in _TERMINAIS) else 2
+    return linha["criado_em"] + ttls * _JOB_TTL_SECONDS
+
+
+def _persistir(linha: Dict[str, Any]) -> None:
+    if _store is None:
+        return
+    try:
+        _store.salvar(linha, _expira_em(linha))
+    except sqlite3.Error:
+        logger.exception(f"Job {linha['job_id']}: falha ao gravar no store; seguindo só em memória.")
+
+
+def _heartbeat() -> None:
+    """Renova o lease dos jobs vivos deste processo e varre órfãos no store."""
+    if _store is None:
+        return
+    vivos = []
+    for fatia in _fatias:
+        with fatia.lock:
+            vivos.extend(job.job_id for job in fatia.vivos.values() if job.status not in _TERMINAIS)
+    _store.renovar_leases(vivos)
+    _store.varrer()
+
 
 def _limpar_jobs_expirados() -> None:
     # Job em estado não-terminal ganha 2×TTL: apagá-lo no TTL normal liberava
     # o dedup com a thread antiga ainda viva (duas gerações concorrentes).
     # Além de 2×TTL nenhuma geração real está viva — é zumbi de thread morta,
     # e mantê-lo bloquearia o usuário até o restart do processo.
-    agora = datetime.datetime.now(datetime.timezone.utc)
+    #
+    # Cada job entra no heap com prazo de 1×TTL. Vencido o prazo: terminal sai;
+    # não-terminal volta ao heap com prazo de 2×TTL, e aí sai de qualquer jeito.
+    # Custo O(k log n) para k prazos vencidos — nunca O(n).
+    agora = _agora().timestamp()
+    removidos = []
     with _jobs_lock:
-        expirados = []
-        for jid, job in _jobs.items():
-            idade = (agora - job.created_at).total_seconds()
-            limite = _JOB_TTL_SECONDS if job.status in _TERMINAIS else 2 * _JOB_TTL_SECONDS
-            if idade > limite:
-                expirados.append(jid)
-        for jid in expirados:
+        while _expiracoes and _expiracoes[0][0] <= agora:
+            prazo, _, jid = heapq.heappop(_expiracoes)
+            job = _jobs.get(jid)
+            if job is None:
+                continue
+            if job.status not in _TERMINAIS and prazo < job.created_at.timestamp() + 2 * _JOB_TTL_SECONDS:
+                _agendar(job, 2)
+                continue
             del _jobs[jid]
+            removidos.append(job)
+    for job in removidos:
+        fatia = _fatia(job.user_id)
+        with fatia.lock:
+            if fatia.vivos.get(job.user_id) is job:
+                del fatia.vivos[job.user_id]
+
+
+def _loop_do_ceifador() -> None:
+    while True:
+        try:
+            _limpar_jobs_expirados()
+            _heartbeat()
+        except Exception:
+            logger.exception("Ceifadora de jobs: falha na limpeza; seguindo.")
+        with _jobs_lock:
+            sono = _CEIFADOR_SONO_MAXIMO_S
+            if _store is not None:
+                sono = min(sono, _store.lease_s / 3)
+            if _expiracoes:
+                sono = min(sono, max(0.0, _expiracoes[0][0] - _agora().timestamp()))
+            if sono > 0:
+                _ceifador_acordar.wait(sono)
+
+
+def _garantir_ceifador() -> None:
+    """Sobe a thread ceifadora no primeiro job (import do módulo não cria thread)."""
+    global _ceifador
+    if _ceifador is not None and _ceifador.is_alive():
+        return
+    with _jobs_lock:
+        if _ceifador is not None and _ceifador.is_alive():
+            return
+        _ceifador = threading.Thread(target=_loop_do_ceifador, name="job-ceifador", daemon=True)
+        _ceifador.start()
 
 
 def criar_job(user_id: str) -> Tuple[PlanJob, bool]:
     """Devolve (job, created). created=False significa job já em andamento
     para este usuário — o chamador NÃO deve disparar o pipeline de novo.
 
-    Dedup e inserção acontecem sob a MESMA aquisição do lock: exatamente um
-    chamador concorrente recebe created=True.
+    Dedup e inserção acontecem sob o lock da fatia do usuário: exatamente um
+    chamador concorrente recebe created=True. Com store, o dedup vale também
+    entre processos (BEGIN IMMEDIATE no SQLite) — e aí o job devolvido com
+    created=False pode ser o retrato de um job que roda em outro worker.
     """
-    _limpar_jobs_expirados()
-    with _jobs_lock:
-        for job in _jobs.values():
-            if job.user_id == user_id and job.status not in _TERMINAIS:
-                return job, False
-        job_id = str(uuid.uuid4())
-        job = PlanJob(job_id=job_id, user_id=user_id)
-        _jobs[job_id] = job
+    _garantir_ceifador()
+    fatia = _fatia(user_id)
+    with fatia.lock:
+        vivo = fatia.vivos.get(user_id)
+        if vivo is not None and vivo.status not in _TERMINAIS:
+            return vivo, False
+        job = PlanJob(job_id=str(uuid.uuid4()), user_id=user_id)
+        if _store is not None:
+            linha = job._linha()
+            try:
+                existente = _store.criar(linha, _expira_em(linha))
+            except sqlite3.Error:
+                logger.exception("Store de jobs indisponível; dedup só neste processo.")
+            else:
+                if existente is not None:
+                    return PlanJob.de_linha(existente), False
+                job._ao_mudar = _persistir
+        with _jobs_lock:
+            _jobs[job.job_id] = job
+            _agendar(job, 1)
+        fatia.vivos[user_id] = job
         return job, True
 
 
 def obter_job(job_id: str) -> Optional[PlanJob]:
-    _limpar_jobs_expirados()
+    """Job local (O(1) no dict) ou, com store, uma leitura pela chave primária."""
     with _jobs_lock:
-        return _jobs.get(job_id)
+        job = _jobs.get(job_id)
+    if job is not None or _store is None:
+        return job
+    try:
+        linha = _store.obter(job_id)
+    except sqlite3.Error:
+        logger.exception(f"Job {job_id}: store indisponível na leitura.")
+        return None
+    return PlanJob.de_linha(linha) if linha is not None else None
 
 
-def executar_job(job: PlanJob, func: Callable[[PlanJob], None]) -> None:
-    """Dispara o job em uma thread daemon."""
+# Com store e job de OUTRO processo não há variável de condição para esperar:
+# relê a linha (uma leitura pela chave) neste intervalo até mudar.
+_INTERVALO_RELEITURA_STORE_S = 1.0
+
+
+def aguardar_job(job_id: str, desde: int, timeout: float) -> Optional[PlanJob]:
+    """Long-poll: devolve o job assim que `versao > desde`, terminal ou timeout."""
+    with _jobs_lock:
+        local = _jobs.get(job_id)
+    if local is not None:
+        local.aguardar(desde, timeout)
+        return local
+
+    prazo = time.monotonic() + timeout
+    while True:
+        job = obter_job(job_id)
+        restante = prazo - time.monotonic()
+        if job is None or job.versao > desde or job.status in _TERMINAIS or restante <= 0:
+            return job
+        time.sleep(min(_INTERVALO_RELEITURA_STORE_S, restante))
+
+
+def limpar_jobs() -> None:
+    """Esvazia o registro inteiro (testes). A ceifadora, se viva, continua."""
+    for fatia in _fatias:
+        with fatia.lock:
+            fatia.vivos.clear()
+    with _jobs_lock:
+        _jobs.clear()
+        _expiracoes.clear()
+    if _store is not None:
+        _store.limpar()
+
+
+# Pool dos jobs de geração. Cada job segura uma chamada Opus de até 240s:
+# sem teto, um pico de /api/generate-plan prendia dezenas delas no mesmo
+# processo e disputava CPU/GIL com as 8 threads de request do gunicorn.
+PLAN_JOB_MAX_CONCURRENCY = int(os.environ.get("PLAN_JOB_MAX_CONCURRENCY", "2"))
+PLAN_JOB_QUEUE_MAX = int(os.environ.get("PLAN_JOB_QUEUE_MAX", "16"))
+# Sugestão de Retry-After quando a fila está cheia: da ordem de uma geração.
+PLAN_JOB_RETRY_AFTER_SECONDS = int(os.environ.get("PLAN_JOB_RETRY_AFTER_SECONDS", "60"))
 
-    def _wrapper():
-        try:
-            func(job)
-        except Exception:
-            logger.exception(f"Job {job.job_id}: exceção não tratada no pipeline.")
-            if job.status != JobStatus.ERRO:
-                job.set_error("internal_error", "Erro interno no servidor. Tente novamente.")
 
-    t = threading.Thread(target=_wrapper, daemon=True)
-    t.start()
+class FilaDeJobsCheia(RuntimeError):
+    """Pool ocupado e fila no teto: o chamador deve responder 503 + Retry-After."""
+
+    def __init__(self, retry_after_s: int):
+        super().__init__(f"Fila de geração cheia; tente em {retry_after_s}s.")
+        self.retry_after_s = retry_after_s
+
+
+def _rodar(job: PlanJob, func: Callable[[PlanJob], None]) -> None:
+    try:
+        func(job)
+    except Exception:
+        logger.exception(f"Job {job.job_id}: exceção não tratada no pipeline.")
+        if job.status != JobStatus.ERRO:
+            job.set_error("internal_error", "Erro interno no servidor. Tente novamente.")
+
+
+class ExecutorDeJobs:
+    """Pool de threads daemon com fila FIFO limitada.
+
+    `_ocupados` conta as vagas comprometidas (jobs rodando ou já entregues a
+    uma thread). Com as vagas esgotadas o job espera em `_fila`, com a posição
+    publicada no `progress`; além de `max_fila`, `submeter` recusa. Ao
+    terminar um job, a própria thread puxa o primeiro da fila — a vaga passa
+    de mão sem nunca ficar livre, então a ordem FIFO não é furada.
+    """
+
+    def __init__(self, max_concorrentes: int, max_fila: int, retry_after_s: int = PLAN_JOB_RETRY_AFTER_SECONDS):
+        self._max_concorrentes = max(1, int(max_concorrentes))
+        self._max_fila = max(0, int(max_fila))
+        self._retry_after_s = retry_after_s
+        self._cond = threading.Condition()
+        self._despachados: deque = deque()
+        self._fila: deque = deque()
+        self._threads: List[threading.Thread] = []
+        self._ocupados = 0
+
+    def submeter(self, job: PlanJob, func: Callable[[PlanJob], None]) -> None:
+        with self._cond:
+            if self._ocupados < self._max_concorrentes:
+                self._ocupados += 1
+                self._despachados.append((job, func))
+                if len(self._threads) < self._ocupados:
+                    t = threading.Thread(target=self._loop, name=f"plan-job-{len(self._threads) + 1}", daemon=True)
+                    self._threads.append(t)
+                    t.start()
+                else:
+                    self._cond.notify()
+                return
+            if len(self._fila) >= self._max_fila:
+                raise FilaDeJobsCheia(self._retry_after_s)
+            self._fila.append((job, func))
+            job.marcar_na_fila(len(self._fila))
+
+    def _loop(self) -> None:
+        with self._cond:
+            while not self._despachados:
+                self._cond.wait()
+            job, func = self._despachados.popleft()
+        while True:
+            if job.status == JobStatus.CREATED:
+                job.transition(JobStatus.CREATED, "created", "Geração iniciando.")
+            _rodar(job, func)
+            with self._cond:
+                if self._fila:
+                    job, func = self._fila.popleft()
+                    # A fila é limitada (PLAN_JOB_QUEUE_MAX): renumerar é barato.
+                    for posicao, (na_fila, _func) in enumerate(self._fila, start=1):
+                        na_fila.marcar_na_fila(posicao)
+                    continue
+                self._ocupados -= 1
+                while not self._despachados:
+                    self._cond.wait()
+                job, func = self._despachados.popleft()
+
+    def estado(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "ativos": self._ocupados,
+                "na_fila": len(self._fila),
+                "max_concorrentes": self._max_concorrentes,
+                "max_fila": self._max_fila,
+            }
+
+
+_executor = ExecutorDeJobs(PLAN_JOB_MAX_CONCURRENCY, PLAN_JOB_QUEUE_MAX)
+
+
+def executar_job(job: PlanJob, func: Callable[[PlanJob], None]) -> None:
+    """Entrega o job ao pool. Levanta FilaDeJobsCheia quando não cabe."""
+    _executor.submeter(job, func)
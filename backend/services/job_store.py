@@ -0,0 +1,210 @@
+# backend/services/job_store.py
+# Persistência dos jobs de geração de plano (job_manager.py).
+#
+# O registro em memória do job_manager continua sendo a fonte da verdade dos
+# jobs que rodam NESTE processo (é lá que moram a thread e o lock do PlanJob).
+# O store é a cópia durável, escolhida por JOB_STORE_BACKEND:
+#
+#   memoria (default)  sem store: comportamento de sempre — restart perde os
+#                      jobs e outro worker responde 404.
+#   sqlite             uma linha por job num SQLite em WAL. Toda transição é
+#                      gravada (write-through); um poll que cai noutro worker,
+#                      ou no processo novo depois de um restart, lê a linha
+#                      pela chave primária.
+#
+# Lease + heartbeat: o processo dono renova `lease_expira_em` dos seus jobs
+# vivos (ceifadora do job_manager). Job não-terminal com lease vencido é órfão
+# — o processo que o rodava morreu — e vira ERRO "job_interrompido" na
+# primeira leitura ou varredura. Retomar não é opção segura: o payload do
+# questionário não é persistido e a chamada ao modelo já pode ter sido cobrada.
+#
+# Postgres via PostgREST ficou de fora: a execução do job é in-process, então
+# um store entre hosts não mudaria nada sem uma fila externa junto.
+#
+# Falha ABERTA, como o rate limiter: erro de SQLite é logado e o job segue só
+# em memória. Perder durabilidade não pode derrubar a geração.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_SQLITE_PATH_DEFAULT = "/tmp/forca-jobs.sqlite3"
+
+# Lease de 90s com heartbeat a cada 30s: dois heartbeats perdidos ainda não
+# matam o job; um processo morto é detectado em até 90s.
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "90"))
+
+STATUS_TERMINAIS = ("salvo", "erro")
+
+ERRO_ORFAO = {
+    "code": "job_interrompido",
+    "message": "A geração foi interrompida por um reinício do servidor. Tente novamente.",
+}
+
+
+class JobStoreSqlite:
+    """
+    Tabela `plan_jobs` com índices em (user_id) para o dedup entre processos
+    e em (lease_expira_em) / (expira_em) para as varreduras. Conexão por
+    thread; `BEGIN IMMEDIATE` serializa o dedup-e-insere entre workers.
+    """
+
+    def __init__(self, caminho: str, relogio=time.time, dono: Optional[str] = None,
+                 lease_s: int = JOB_LEASE_SECONDS):
+        self._caminho = caminho
+        self._relogio = relogio
+        self.dono = dono or "{}:{}".format(os.getpid(), uuid.uuid4().hex[:8])
+        self.lease_s = lease_s
+        self._local = threading.local()
+        self._conexao()  # cria a tabela já no startup: erro de caminho aparece no boot
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self._caminho, timeout=5.0, isolation_level=None)
+            conexao.row_factory = sqlite3.Row
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS plan_jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " user_id TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " progress TEXT NOT NULL,"
+                " plan_id TEXT,"
+                " error TEXT,"
+                " criado_em REAL NOT NULL,"
+                " versao INTEGER NOT NULL DEFAULT 0,"
+                " dono TEXT NOT NULL,"
+                " lease_expira_em REAL NOT NULL,"
+                " expira_em REAL NOT NULL)"
+            )
+            conexao.execute("CREATE INDEX IF NOT EXISTS plan_jobs_user_id ON plan_jobs (user_id)")
+            conexao.execute("CREATE INDEX IF NOT EXISTS plan_jobs_lease ON plan_jobs (lease_expira_em)")
+            conexao.execute("CREATE INDEX IF NOT EXISTS plan_jobs_expira_em ON plan_jobs (expira_em)")
+            self._local.conexao = conexao
+        return conexao
+
+    @staticmethod
+    def _linha_para_dict(linha: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": linha["job_id"],
+            "user_id": linha["user_id"],
+            "status": linha["status"],
+            "progress": json.loads(linha["progress"]),
+            "plan_id": linha["plan_id"],
+            "error": json.loads(linha["error"]) if linha["error"] else None,
+            "criado_em": linha["criado_em"],
+            "versao": linha["versao"],
+        }
+
+    def _orfanar(self, conexao: sqlite3.Connection, agora: float, job_id: Optional[str] = None) -> None:
+        filtro = "status NOT IN (?, ?) AND lease_expira_em < ?"
+        params = [*STATUS_TERMINAIS, agora]
+        if job_id is not None:
+            filtro = "job_id = ? AND " + filtro
+            params.insert(0, job_id)
+        conexao.execute(
+            "UPDATE plan_jobs SET status = 'erro', error = ?, progress = ?, versao = versao + 1"
+            " WHERE " + filtro,
+            (json.dumps(ERRO_ORFAO), json.dumps({"step": "erro", "detail": ERRO_ORFAO["message"]}), *params),
+        )
+
+    def criar(self, linha: Dict[str, Any], expira_em: float) -> Optional[Dict[str, Any]]:
+        """
+        Insere o job se o usuário não tiver outro vivo em NENHUM processo.
+        Devolve o job vivo existente (dict) ou None quando inseriu.
+        """
+        agora = self._relogio()
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            for existente in conexao.execute(
+                "SELECT * FROM plan_jobs WHERE user_id = ? AND status NOT IN (?, ?)",
+                (linha["user_id"], *STATUS_TERMINAIS),
+            ).fetchall():
+                if existente["lease_expira_em"] >= agora:
+                    conexao.execute("COMMIT")
+                    return self._linha_para_dict(existente)
+                self._orfanar(conexao, agora, existente["job_id"])
+            conexao.execute(
+                "INSERT INTO plan_jobs (job_id, user_id, status, progress, plan_id, error,"
+                " criado_em, versao, dono, lease_expira_em, expira_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    linha["job_id"], linha["user_id"], linha["status"], json.dumps(linha["progress"]),
+                    linha["plan_id"], None, linha["criado_em"], linha["versao"], self.dono,
+                    agora + self.lease_s, expira_em,
+                ),
+            )
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+        return None
+
+    def salvar(self, linha: Dict[str, Any], expira_em: float) -> None:
+        """Write-through de uma transição; renova o lease de quebra."""
+        self._conexao().execute(
+            "UPDATE plan_jobs SET status = ?, progress = ?, plan_id = ?, error = ?, versao = ?,"
+            " lease_expira_em = ?, expira_em = ? WHERE job_id = ?",
+            (
+                linha["status"], json.dumps(linha["progress"]), linha["plan_id"],
+                json.dumps(linha["error"]) if linha["error"] else None, linha["versao"],
+                self._relogio() + self.lease_s, expira_em, linha["job_id"],
+            ),
+        )
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Leitura pela chave primária; órfão vira ERRO antes de ser devolvido."""
+        conexao = self._conexao()
+        linha = conexao.execute("SELECT * FROM plan_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if linha is None:
+            return None
+        agora = self._relogio()
+        if linha["status"] not in STATUS_TERMINAIS and linha["lease_expira_em"] < agora:
+            self._orfanar(conexao, agora, job_id)
+            linha = conexao.execute("SELECT * FROM plan_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if linha["expira_em"] <= agora:
+            return None
+        return self._linha_para_dict(linha)
+
+    def renovar_leases(self, job_ids: Iterable[str]) -> None:
+        """Heartbeat do processo dono: só renova linhas vivas que são dele."""
+        ids = list(job_ids)
+        if not ids:
+            return
+        conexao = self._conexao()
+        lease = self._relogio() + self.lease_s
+        conexao.executemany(
+            "UPDATE plan_jobs SET lease_expira_em = ? WHERE job_id = ? AND dono = ? AND status NOT IN (?, ?)",
+            [(lease, job_id, self.dono, *STATUS_TERMINAIS) for job_id in ids],
+        )
+
+    def varrer(self) -> None:
+        """Marca órfãos e apaga linhas além do TTL. Índices, nunca full scan."""
+        agora = self._relogio()
+        conexao = self._conexao()
+        self._orfanar(conexao, agora)
+        conexao.execute("DELETE FROM plan_jobs WHERE expira_em <= ?", (agora,))
+
+    def limpar(self) -> None:
+        self._conexao().execute("DELETE FROM plan_jobs")
+
+
+def criar_job_store(backend: Optional[str] = None) -> Optional[JobStoreSqlite]:
+    """Instancia o store de JOB_STORE_BACKEND (memoria | sqlite); None = sem store."""
+    escolhido = (backend or os.environ.get("JOB_STORE_BACKEND") or "memoria").strip().lower()
+    if escolhido == "sqlite":
+        caminho = os.environ.get("JOB_STORE_SQLITE_PATH") or JOB_STORE_SQLITE_PATH_DEFAULT
+        return JobStoreSqlite(caminho)
+    if escolhido != "memoria":
+        logger.warning("JOB_STORE_BACKEND=%r desconhecido; usando 'memoria'.", escolhido)
+    return None
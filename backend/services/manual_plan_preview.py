@@ -0,0 +1,108 @@
+# backend/services/manual_plan_preview.py
+# Prévia do plano manual sem materializar o plano inteiro.
+#
+# A prévia mostra três semanas (a 1ª, a do meio e a última), mas rodava o
+# pipeline de gravação completo — construir_molde_manual → expandir_plano →
+# mapear_plano_ia — para até 52 semanas: cada sessão, cada exercício e cada
+# série virando linha de banco com UUID, para jogar quase tudo fora. Era isso
+# que segurava a prévia num balde próprio de 60/h.
+#
+# Aqui as peças são as MESMAS do pipeline, só que sob demanda:
+#   - o molde é o de construir_molde_manual, validado pelo expansor;
+#   - cada semana mostrada sai direto das regras (ExpansaoSobDemanda), sem
+#     materializar as outras;
+#   - dia, título, duração estimada e alvos vêm de
+#     plan_mapper.sessoes_para_exibicao, com as funções que o mapper usa para
+#     gravar;
+#   - o teto MAX_TOTAL_SETS continua valendo para o plano inteiro: as semanas
+#     não mostradas entram só com o número de séries de cada exercício, na
+#     ordem em que o mapper as contaria, e o erro sai com o mesmo total.
+#
+# Ou seja: TODAS as semanas ainda são avaliadas (`series_da_semana`, no laço
+# do teto) — não dá para saber se o plano estoura o teto sem contar cada uma.
+# O que só as semanas mostradas pagam é a materialização: sessões montadas,
+# nomes resolvidos, alvos formatados. Nenhuma semana vira linha de banco.
+#
+# Sem projeção paralela: nenhuma regra do pipeline é reescrita aqui. Um teste
+# de propriedade compara a prévia com o pipeline completo em rascunhos
+# sorteados.
+
+from typing import Any, Dict, List
+
+from backend.services.exercise_catalog import ContextoDeResolucao
+from backend.services.manual_plan_builder import construir_molde_manual
+from backend.services.plan_expander import ExpansaoSobDemanda
+from backend.services.plan_mapper import series_planejadas_da_semana, sessoes_para_exibicao
+
+
+def semanas_da_previa(duracao_semanas: int) -> List[int]:
+    """A 1ª semana, a do meio e a última, sem repetir."""
+    escolhidas: List[int] = []
+    for semana in (1, (duracao_semanas + 1) // 2, duracao_semanas):
+        if semana not in escolhidas:
+            escolhidas.append(semana)
+    return escolhidas
+
+
+def _numero_legivel(valor):
+    numero = float(valor)
+    return str(int(numero)) if numero.is_integer() else str(round(numero, 2)).replace(".", ",")
+
+
+def _alvo(exercicio: Dict[str, Any]) -> str:
+    quantidade = exercicio["series"]
+    rotulo_series = "série" if quantidade == 1 else "séries"
+    duracao = exercicio["duracao_segundos"]
+    distancia = exercicio["distancia_metros"]
+    if duracao is not None:
+        if duracao >= 60:
+            alvo = "{} min".format(_numero_legivel(duracao / 60))
+        else:
+            alvo = "{} s".format(_numero_legivel(duracao))
+        if distancia is not None:
+            alvo += " / {} km".format(_numero_legivel(float(distancia) / 1000))
+    else:
+        alvo = exercicio["reps_raw"]
+        if not alvo:
+            minimo = exercicio["reps_min"]
+            maximo = exercicio["reps_max"]
+            alvo = str(minimo) if minimo == maximo else "{}-{}".format(minimo, maximo)
+        alvo = "{} reps".format(alvo)
+    return "{} {} × {}".format(quantidade, rotulo_series, alvo)
+
+
+def previa_do_rascunho(rascunho: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rascunho JÁ validado → {"semanas": [{"semana", "treinos"}]}, a resposta
+    de /api/manual-plan/preview.
+
+    Raises:
+        ValueError: os mesmos do pipeline completo (molde inválido, teto de
+            séries), com a mesma mensagem.
+    """
+    contexto = ContextoDeResolucao()
+    expansao = ExpansaoSobDemanda(construir_molde_manual(rascunho), contexto)
+    duracao = expansao.duracao_semanas
+
+    total_sets = 0
+    for semana in range(1, duracao + 1):
+        total_sets = series_planejadas_da_semana(expansao.series_da_semana(semana), total_sets)
+
+    resposta = []
+    for numero_semana in semanas_da_previa(duracao):
+        treinos = []
+        for sessao in sessoes_para_exibicao(expansao.sessoes_da_semana(numero_semana), contexto):
+            exercicios = sorted(sessao["exercicios"], key=lambda exercicio: exercicio["ordem"])
+            treinos.append(
+                {
+                    "nome": sessao["titulo"],
+                    "dia": sessao["dia"],
+                    "exercicios": [
+                        {"nome": exercicio["nome"], "alvo": _alvo(exercicio)}
+                        for exercicio in exercicios
+                    ],
+                    "minutos": sessao["minutos"],
+                }
+            )
+        resposta.append({"semana": numero_semana, "treinos": treinos})
+    return {"semanas": resposta}
@@ -0,0 +1,259 @@
+# backend/services/molde_em_fluxo.py
+# Geração do molde em fluxo, com validação incremental e corte antecipado.
+#
+# Sem fluxo, o job espera o molde inteiro (até 240s de Opus), e só então
+# extrai o JSON e valida contra o MOLDE_SCHEMA: um exercício sem alvo de
+# prescrição na primeira sessão só é descoberto depois de pagas todas as
+# outras. Aqui o texto chega por `messages.stream` e passa por um leitor
+# incremental que acompanha o aninhamento do JSON; cada subárvore que FECHA em
+#
+#   semanas_tipo[i]                               (semana-tipo)
+#   semanas_tipo[i].sessoes[j]                    (sessão — um "treino pronto")
+#   semanas_tipo[i].sessoes[j].exercicios[k]      (exercício)
+#
+# é parseada, recebe os mesmos reparos de forma do normalizar_molde e é
+# validada contra o subschema correspondente. Uma violação ali é definitiva:
+# a validação final aplicaria exatamente esse subschema a exatamente essa
+# subárvore, então ela reprovaria de qualquer jeito. O fluxo é cortado e o
+# erro vai direto para o retry dirigido, sem gastar o resto da saída.
+#
+# O leitor nunca corta por dúvida própria: texto antes do JSON (cerca de
+# markdown, prosa) é ignorado, e se o que chega deixa de parecer JSON ele
+# para de olhar e a geração segue até o fim, para a validação de sempre.
+
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import jsonschema
+
+from backend.schemas.molde_schema import MOLDE_SCHEMA
+from backend.schemas.validadores import compilar
+from backend.services.molde_normalizer import normalizar_molde
+from backend.utils.anthropic_retry import executar_com_deadline
+from backend.utils.json_codec import desserializar
+
+_SEMANA = MOLDE_SCHEMA["properties"]["semanas_tipo"]["items"]
+_SESSAO = _SEMANA["properties"]["sessoes"]["items"]
+_EXERCICIO = _SESSAO["properties"]["exercicios"]["items"]
+
+
+def _compilar_subschema(subschema):
+    """`compilar` do subschema no draft do MOLDE_SCHEMA (ele não declara o seu)."""
+    return compilar({"$schema": MOLDE_SCHEMA["$schema"], **subschema})
+
+
+_VALIDADORES = {
+    "semana": _compilar_subschema(_SEMANA),
+    "sessao": _compilar_subschema(_SESSAO),
+    "exercicio": _compilar_subschema(_EXERCICIO),
+}
+
+
+def _nivel(caminho: tuple) -> Optional[str]:
+    """Qual subárvore do molde o caminho endereça, ou None."""
+    if len(caminho) < 2 or caminho[0] != "semanas_tipo" or not isinstance(caminho[1], int):
+        return None
+    if len(caminho) == 2:
+        return "semana"
+    if len(caminho) < 4 or caminho[2] != "sessoes" or not isinstance(caminho[3], int):
+        return None
+    if len(caminho) == 4:
+        return "sessao"
+    if len(caminho) == 6 and caminho[4] == "exercicios" and isinstance(caminho[5], int):
+        return "exercicio"
+    return None
+
+
+def _normalizado(nivel: str, valor: Any) -> Any:
+    """Os reparos de forma do normalizar_molde, aplicados à subárvore."""
+    if nivel == "exercicio":
+        normalizar_molde({"semanas_tipo": [{"sessoes": [{"exercicios": [valor]}]}]})
+    elif nivel == "sessao":
+        normalizar_molde({"semanas_tipo": [{"sessoes": [valor]}]})
+    else:
+        normalizar_molde({"semanas_tipo": [valor]})
+    return valor
+
+
+class _Nivel:
+    __slots__ = ("tipo", "inicio", "caminho", "indice", "chave", "esperando_chave", "valor_inicio")
+
+    def __init__(self, tipo: str, inicio: int, caminho: tuple):
+        self.tipo = tipo
+        self.inicio = inicio
+        self.caminho = caminho
+        self.indice = 0  # arrays: posição do elemento atual
+        self.chave = None  # objetos: última chave lida
+        self.esperando_chave = True
+        self.valor_inicio = inicio
+
+
+class ValidadorIncrementalDoMolde:
+    """
+    Lê o texto do molde em pedaços (`alimentar`) e devolve o primeiro erro de
+    schema de uma subárvore já fechada, com o caminho absoluto no molde.
+    """
+
+    def __init__(self):
+        self.sessoes_prontas = 0
+        self.semanas_iniciadas = 0
+        self.frequencia_semanal: Optional[int] = None
+        self._junto = ""
+        self._pendentes: List[str] = []
+        self._tamanho = 0
+        self._pilha: List[_Nivel] = []
+        self._em_string = False
+        self._escape = False
+        self._chave: Optional[List[str]] = None
+        self._encerrado = False
+
+    @property
+    def sessoes_previstas(self) -> Optional[int]:
+        """Sessões esperadas até a semana-tipo atual, se o molde já disse a frequência."""
+        if not self.frequencia_semanal:
+            return None
+        return self.frequencia_semanal * max(1, self.semanas_iniciadas)
+
+    def _trecho(self, inicio: int, fim: int) -> str:
+        if self._pendentes:
+            self._junto += "".join(self._pendentes)
+            self._pendentes.clear()
+        return self._junto[inicio:fim]
+
+    def alimentar(self, texto: str) -> Optional[jsonschema.exceptions.ValidationError]:
+        if self._encerrado or not texto:
+            return None
+        base = self._tamanho
+        self._pendentes.append(texto)
+        self._tamanho += len(texto)
+        pilha = self._pilha
+
+        for i, c in enumerate(texto):
+            if self._em_string:
+                if self._chave is not None:
+                    self._chave.append(c)
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._em_string = False
+                    if self._chave is not None:
+                        try:
+                            pilha[-1].chave = desserializar('"' + "".join(self._chave))
+                        except ValueError:
+                            self._encerrado = True
+                            return None
+                        self._chave = None
+                continue
+
+            if not pilha:
+                if c == "{":  # o que vem antes do objeto raiz não é do molde
+                    pilha.append(_Nivel("{", base + i, ()))
+                continue
+
+            topo = pilha[-1]
+            if c == '"':
+                self._em_string = True
+                self._chave = [] if topo.tipo == "{" and topo.esperando_chave else None
+            elif c in "{[":
+                segmento = topo.chave if topo.tipo == "{" else topo.indice
+                novo = _Nivel(c, base + i, topo.caminho + (segmento,))
+                pilha.append(novo)
+                if _nivel(novo.caminho) == "semana":
+                    self.semanas_iniciadas = novo.caminho[1] + 1
+            elif c in "}]":
+                if (c == "}") != (topo.tipo == "{"):
+                    self._encerrado = True  # não é JSON: desiste, a validação final decide
+                    return None
+                if c == "}":
+                    self._fim_de_valor(topo, base + i)
+                pilha.pop()
+                erro = self._fechou(topo, base + i + 1)
+                if erro is not None or self._encerrado:
+                    self._encerrado = True
+                    return erro
+                if not pilha:
+                    self._encerrado = True  # raiz fechada: o resto não é do molde
+                    return None
+            elif c == ":" and topo.tipo == "{":
+                topo.esperando_chave = False
+                topo.valor_inicio = base + i + 1
+            elif c == ",":
+                if topo.tipo == "{":
+                    self._fim_de_valor(topo, base + i)
+                    topo.esperando_chave = True
+                else:
+                    topo.indice += 1
+        return None
+
+    def _fim_de_valor(self, nivel: _Nivel, fim: int) -> None:
+        # Único escalar que interessa: a frequência, para o "N de M treinos".
+        if nivel.caminho == () and nivel.chave == "frequencia_semanal":
+            try:
+                valor = desserializar(self._trecho(nivel.valor_inicio, fim).strip())
+            except ValueError:
+                return
+            if isinstance(valor, int) and not isinstance(valor, bool) and valor > 0:
+                self.frequencia_semanal = valor
+
+    def _fechou(self, nivel: _Nivel, fim: int) -> Optional[jsonschema.exceptions.ValidationError]:
+        qual = _nivel(nivel.caminho)
+        if qual is None:
+            return None
+        try:
+            valor = desserializar(self._trecho(nivel.inicio, fim))
+        except ValueError:
+            self._encerrado = True
+            return None
+        erro = jsonschema.exceptions.best_match(
+            _VALIDADORES[qual].iter_errors(_normalizado(qual, valor))
+        )
+        if erro is not None:
+            raiz = erro
+            while raiz.parent is not None:
+                raiz = raiz.parent
+            raiz.relative_path.extendleft(reversed(nivel.caminho))
+            return erro
+        if qual == "sessao":
+            self.sessoes_prontas += 1
+        return None
+
+
+def gerar_molde_em_fluxo(
+    cliente,
+    orcamento_segundos: float,
+    ao_progredir: Optional[Callable[[int, Optional[int]], None]] = None,
+    **kwargs,
+) -> Tuple[Any, Optional[jsonschema.exceptions.ValidationError]]:
+    """
+    Gera o molde em fluxo. Devolve (mensagem, violação):
+
+    - fluxo até o fim: a mensagem final (mesma forma do messages.create) e None;
+    - cortado: o retrato parcial da mensagem (texto até o corte; `usage` sem a
+      saída, que só chega no message_delta final) e o erro de schema.
+
+    O retry seletivo e o deadline absoluto são os do messages.create: um
+    429/529 na abertura do fluxo re-tenta uma vez. O prazo também é conferido
+    a cada evento — o timeout do httpx é por leitura, não pelo fluxo inteiro.
+    `ao_progredir(prontas, previstas)` é chamado a cada sessão validada.
+    """
+
+    def _tentativa(restante):
+        prazo = time.monotonic() + restante
+        validador = ValidadorIncrementalDoMolde()
+        with cliente.messages.stream(timeout=restante, **kwargs) as fluxo:
+            for evento in fluxo:
+                if evento.type == "content_block_delta" and getattr(evento.delta, "type", None) == "text_delta":
+                    prontas = validador.sessoes_prontas
+                    violacao = validador.alimentar(evento.delta.text)
+                    if violacao is not None:
+                        # Sair do `with` fecha a conexão: o modelo para de gerar.
+                        return fluxo.current_message_snapshot, violacao
+                    if ao_progredir is not None and validador.sessoes_prontas != prontas:
+                        ao_progredir(validador.sessoes_prontas, validador.sessoes_previstas)
+                if time.monotonic() > prazo:
+                    raise TimeoutError("prazo do molde esgotado no meio do fluxo")
+            return fluxo.get_final_message(), None
+
+    return executar_com_deadline(_tentativa, orcamento_segundos)
@@ -6,11 +6,11 @@
 # paga e descartada. Um delta de 0 é um no-op semântico: remover a regra
 # produz exatamente o plano pretendido.
 
-import json
 import re
 from typing import Optional
 
 from backend.schemas.molde_schema import CAMPOS_NULAVEIS_DO_EXERCICIO
+from backend.utils.json_codec import desserializar
 
 _TIPOS_DELTA = ("delta_rm_percentual", "delta_series")
 
@@ -25,8 +25,8 @@ def extrair_molde_do_texto(texto: str) -> Optional[dict]:
     if not match:
         return None
     try:
-        candidato = json.loads(match.group(0))
-    except json.JSONDecodeError:
+        candidato = desserializar(match.group(0))
+    except ValueError:
         return None
     return candidato if isinstance(candidato, dict) else None
 
@@ -11,15 +11,16 @@ import copy
 import datetime
 import math
 import uuid
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
 
-from backend.schemas.molde_schema import MOLDE_SCHEMA
+from backend.schemas.validadores import VALIDADOR_MOLDE, MoldeValidado, validar
 from backend.services.exercise_catalog import (
     METRICA_TEMPO,
     METRICA_TEMPO_DISTANCIA,
+    ContextoDeResolucao,
     e_por_tempo,
     progride_por_series,
-    resolver_exercicio,
 )
 
 # --- Constantes do expansor ---
@@ -34,17 +35,21 @@ _TETO_CARDIO_MULTIPLICADOR = 2.0
 
 
 def expandir_plano(
-    molde: Dict[str, Any],
+    molde: Union[MoldeValidado, Dict[str, Any]],
     dados_usuario: Dict[str, Any],
     start_date: Optional[datetime.date] = None,
+    contexto: Optional[ContextoDeResolucao] = None,
 ) -> Dict[str, Any]:
     """
     Molde → plano completo no contrato atual.
 
     Args:
-        molde: dict validado contra MOLDE_SCHEMA.
+        molde: MoldeValidado (a validação já feita vale, o schema não roda
+            de novo) ou dict cru, validado aqui contra o MOLDE_SCHEMA.
         dados_usuario: dict com id, nome, nivel, objetivos, restricoes, lesoes.
         start_date: data de início (default: hoje).
+        contexto: resoluções do catálogo compartilhadas com o mapper do mesmo
+            plano (default: um contexto novo, só desta expansão).
 
     Returns:
         dict com a estrutura { treinamento_id, versao, data_criacao, usuario, plano_principal }
@@ -53,12 +58,7 @@ def expandir_plano(
     Raises:
         ValueError: se o molde for inválido.
     """
-    import jsonschema
-
-    try:
-        jsonschema.validate(instance=molde, schema=MOLDE_SCHEMA)
-    except jsonschema.exceptions.ValidationError as e:
-        raise ValueError(f"Molde inválido: regra '{e.validator}' violada em {list(e.path)}") from e
+    molde = _molde_validado(molde)
 
     calendario = molde["calendario"]
     semanas_tipo = {st["id"]: st for st in molde["semanas_tipo"]}
@@ -77,7 +77,10 @@ def expandir_plano(
         "restricoes": dados_usuario.get("restricoes", []),
     }
 
-    ciclos = _construir_ciclos(calendario, semanas_tipo, regras, semanas_avulsas)
+    ciclos = _construir_ciclos(
+        calendario, semanas_tipo, regras, semanas_avulsas,
+        contexto if contexto is not None else ContextoDeResolucao(),
+    )
     duracao = len(calendario)
     freq = _calcular_frequencia_semanal(semanas_tipo)
 
@@ -100,11 +103,118 @@ def expandir_plano(
     }
 
 
+def _molde_validado(molde: Union[MoldeValidado, Dict[str, Any]]) -> Dict[str, Any]:
+    """O dict do molde, validado contra o MOLDE_SCHEMA se ainda não houver prova."""
+    import jsonschema
+
+    ja_validado = isinstance(molde, MoldeValidado) and molde.e_valido_para(VALIDADOR_MOLDE)
+    if isinstance(molde, MoldeValidado):
+        molde = molde.molde
+    if not ja_validado:
+        try:
+            validar(VALIDADOR_MOLDE, molde)
+        except jsonschema.exceptions.ValidationError as e:
+            raise ValueError(f"Molde inválido: regra '{e.validator}' violada em {list(e.path)}") from e
+    return molde
+
+
+class ExpansaoSobDemanda:
+    """
+    As semanas do `expandir_plano`, uma de cada vez e só as pedidas.
+
+    A semana N sai direto das regras (`_regras_ativas(regras, N)`), sem
+    materializar as anteriores: é o que a prévia do plano manual precisa para
+    mostrar três semanas de um plano de até 52. Mesmas sessões e mesmos
+    números da expansão completa, sem IDs.
+    """
+
+    def __init__(
+        self,
+        molde: Union[MoldeValidado, Dict[str, Any]],
+        contexto: Optional[ContextoDeResolucao] = None,
+    ) -> None:
+        molde = _molde_validado(molde)
+        self._semanas = _Semanas(
+            molde["calendario"],
+            {st["id"]: st for st in molde["semanas_tipo"]},
+            molde.get("progressao", {}).get("regras", []),
+            molde.get("semanas_avulsas", {}) or {},
+            contexto if contexto is not None else ContextoDeResolucao(),
+        )
+        self.duracao_semanas = len(molde["calendario"])
+
+    def sessoes_da_semana(self, semana: int) -> List[Dict[str, Any]]:
+        """Sessões da semana `semana` (1..duracao_semanas), sem IDs."""
+        return self._semanas.sessoes(semana, com_ids=False)
+
+    def series_da_semana(self, semana: int) -> List[List[Any]]:
+        """
+        Só o campo `series` de cada exercício, sessão a sessão. Para contar o
+        plano inteiro sem montar as sessões das semanas que ninguém vai ver.
+        """
+        return self._semanas.series(semana)
+
+
+class _Semanas:
+    """Qualquer semana do calendário, direto das regras de progressão."""
+
+    def __init__(
+        self,
+        calendario: List[str],
+        semanas_tipo: Dict[str, Dict[str, Any]],
+        regras: List[Dict[str, Any]],
+        semanas_avulsas: Dict[str, Any],
+        contexto: ContextoDeResolucao,
+    ) -> None:
+        self._calendario = calendario
+        self._semanas_tipo = semanas_tipo
+        self._regras = regras
+        self._semanas_avulsas = semanas_avulsas
+        self._contexto = contexto
+        self._compiladas: Dict[str, _SemanaTipoCompilada] = {}
+
+    def _avulsa(self, num_semana: int) -> Optional[List[Dict[str, Any]]]:
+        """Sessões da semana avulsa (válvula de escape) de `num_semana`, se houver."""
+        avulsa = self._semanas_avulsas.get(f"semana_{num_semana}")
+        if isinstance(avulsa, dict) and avulsa.get("sessoes"):
+            return avulsa["sessoes"]
+        return None
+
+    def _compilada(self, num_semana: int) -> "_SemanaTipoCompilada":
+        tipo_id = self._calendario[num_semana - 1]
+        compilada = self._compiladas.get(tipo_id)
+        if compilada is None:
+            tipo = self._semanas_tipo.get(tipo_id)
+            if not tipo:
+                raise ValueError(f"Semana-tipo '{tipo_id}' referenciada no calendário mas não definida.")
+            compilada = self._compiladas[tipo_id] = _SemanaTipoCompilada(tipo, self._regras, self._contexto)
+        return compilada
+
+    def sessoes(self, num_semana: int, com_ids: bool = True) -> List[Dict[str, Any]]:
+        avulsa = self._avulsa(num_semana)
+        if avulsa is not None:
+            return _copiar_sessoes(avulsa, com_ids)
+        # Aplica regras de progressão
+        return self._compilada(num_semana).materializar(
+            _regras_ativas(self._regras, num_semana), com_ids
+        )
+
+    def series(self, num_semana: int) -> List[List[Any]]:
+        avulsa = self._avulsa(num_semana)
+        if avulsa is not None:
+            return [
+                [ex.get("series") for ex in (sessao.get("exercicios") or [])]
+                for sessao in avulsa
+            ]
+        return self._compilada(num_semana).series(_regras_ativas(self._regras, num_semana))
+
+
 def _construir_ciclos(
     calendario: List[str],
     semanas_tipo: Dict[str, Dict[str, Any]],
     regras: List[Dict[str, Any]],
     semanas_avulsas: Dict[str, Any],
+    contexto: ContextoDeResolucao,
 ) -> List[Dict[str, Any]]:
     """Constrói os ciclos/microciclos a partir do calendário e regras de progressão."""
 
@@ -112,6 +222,7 @@ def _construir_ciclos(
     total_semanas = len(calendario)
     ciclos: List[Dict[str, Any]] = []
     ordem_ciclo = 0
+    semanas = _Semanas(calendario, semanas_tipo, regras, semanas_avulsas, contexto)
 
     for semana_inicio in range(0, total_semanas, 4):
         ordem_ciclo += 1
@@ -121,31 +232,7 @@ def _construir_ciclos(
         microciclos = []
         for idx in range(semana_inicio, semana_fim):
             num_semana = idx + 1
-            tipo_id = calendario[idx]
-
-            # Verifica se é uma semana avulsa (válvula de escape)
-            chave_avulsa = f"semana_{num_semana}"
-            if chave_avulsa in semanas_avulsas:
-                avulsa = semanas_avulsas[chave_avulsa]
-                if isinstance(avulsa, dict) and avulsa.get("sessoes"):
-                    sessoes = _copiar_sessoes(avulsa["sessoes"])
-                    microciclos.append({
-                        "semana": num_semana,
-                        "volume": _classificar_volume(sessoes),
-                        "intensidade": _classificar_intensidade(sessoes),
-                        "foco": None,
-                        "sessoes": sessoes,
-                    })
-                    continue
-
-            tipo = semanas_tipo.get(tipo_id)
-            if not tipo:
-                raise ValueError(f"Semana-tipo '{tipo_id}' referenciada no calendário mas não definida.")
-
-            sessoes = _copiar_sessoes(tipo.get("sessoes", []))
-
-            # Aplica regras de progressão
-            _aplicar_progressao(sessoes, regras, num_semana)
+            sessoes = semanas.sessoes(num_semana)
 
             microciclos.append({
                 "semana": num_semana,
@@ -167,99 +254,216 @@ def _construir_ciclos(
     return ciclos
 
 
-def _copiar_sessoes(sessoes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _copiar_sessoes(sessoes: List[Dict[str, Any]], com_ids: bool = True) -> List[Dict[str, Any]]:
     """Deep copy das sessões, gerando IDs novos para sessões e exercícios."""
     copia = []
     for sessao in sessoes:
         s = copy.deepcopy(sessao)
-        s["sessao_id"] = str(uuid.uuid4())
-        if "exercicios" in s:
-            for ex in s["exercicios"]:
-                ex["exercicio_id"] = str(uuid.uuid4())
+        if com_ids:
+            s["sessao_id"] = str(uuid.uuid4())
+            if "exercicios" in s:
+                for ex in s["exercicios"]:
+                    ex["exercicio_id"] = str(uuid.uuid4())
         copia.append(s)
     return copia
 
 
-def _aplicar_progressao(
-    sessoes: List[Dict[str, Any]],
-    regras: List[Dict[str, Any]],
-    semana: int,
-) -> None:
-    """Aplica regras de progressão NUMÉRICAS às sessões de uma semana."""
-    for regra in regras:
-        tipo = regra.get("tipo")
+# --- Expansão por semana-tipo ------------------------------------------------
+# Um plano de N semanas repete poucas semanas-tipo. Copiar a árvore inteira
+# (deepcopy) e reavaliar a métrica de cada exercício a cada regra, em CADA
+# semana do calendário, fazia um plano de 52 semanas custar 52 cópias quase
+# idênticas. Cada semana-tipo é compilada uma vez numa tabela achatada de
+# exercícios, com a métrica e as regras que alcançam cada um já decididas; a
+# semana só recalcula os números que a progressão mexe, e um exercício que vê
+# o mesmo conjunto de regras ativas em duas semanas (nenhuma, quase sempre,
+# depois de `semana_fim`) reaproveita a conta.
+#
+# O resto da árvore é COMPARTILHADO entre as semanas: sessão e exercício são
+# dicts novos (com IDs próprios), mas valores aninhados — grupos_musculares,
+# aquecimento — são os mesmos objetos. O plano expandido é só-leitura.
 
-        if tipo == "delta_rm_percentual":
+_CAMPOS_PROGRESSIVOS = ("percentual_rm", "series", "duracao_minutos", "distancia_km")
+
+_Ativas = Tuple[Tuple[int, int], ...]
+
+
+@dataclass
+class _ExercicioCompilado:
+    base: Dict[str, Any]
+    numeros: Dict[str, Any]
+    regras: FrozenSet[int]  # índices das regras que podem mexer neste exercício
+    por_tempo: bool
+    por_semana: Dict[_Ativas, Dict[str, Any]] = field(default_factory=dict)
+
+    def numeros_da_semana(self, regras: List[Dict[str, Any]], ativas: _Ativas) -> Dict[str, Any]:
+        relevantes = tuple(a for a in ativas if a[0] in self.regras)
+        numeros = self.por_semana.get(relevantes)
+        if numeros is None:
+            numeros = self.por_semana[relevantes] = _progredir(self, regras, relevantes)
+        return numeros
+
+
+def _regras_ativas(regras: List[Dict[str, Any]], semana: int) -> _Ativas:
+    """(índice da regra, semanas decorridas) de cada regra que vale na semana, em ordem."""
+    ativas = []
+    for indice, regra in enumerate(regras):
+        tipo = regra.get("tipo")
+        if tipo in ("delta_rm_percentual", "delta_series", "delta_cardio_percentual"):
             ini = regra.get("semana_inicio", 1)
             fim = regra.get("semana_fim", 1)
-            valor = regra.get("valor", 0)
-            grupo_alvo = regra.get("grupo_alvo", "todos")
             if ini <= semana <= fim:
-                semanas_decorridas = semana - ini + 1
-                incremento = valor * semanas_decorridas
-                for sessao in sessoes:
-                    for ex in sessao.get("exercicios", []):
-                        # Cardio não tem %RM: progride por tempo/distância.
-                        if not _progressivel(ex):
-                            continue
-                        if _atinge_grupo(ex, grupo_alvo) and not _e_por_tempo(ex):
-                            rm_atual = ex.get("percentual_rm")
-                            if isinstance(rm_atual, (int, float)):
-                                novo_rm = min(rm_atual + incremento, _TETO_PERCENTUAL_RM)
-                                ex["percentual_rm"] = round(novo_rm)
+                ativas.append((indice, semana - ini + 1))
+        elif tipo == "deload_percentual" and semana == regra.get("semana"):
+            ativas.append((indice, 0))
+    return tuple(ativas)
+
+
+def _regra_alcanca(
+    regra: Dict[str, Any],
+    exercicio: Dict[str, Any],
+    por_tempo: bool,
+    por_series: bool,
+) -> bool:
+    """A regra pode mexer neste exercício em alguma semana?"""
+    tipo = regra.get("tipo")
+    if tipo == "delta_series":
+        # Multiplicar SÉRIE de cardio é sem sentido: uma corrida de 20 min
+        # virava 5 corridas de 28 min e o aquecimento de 5 min prometido pela
+        # UI virava 35. Cardio progride por tempo/distância. Isometria
+        # CATALOGADA (prancha) continua ganhando série: congelá-la deixaria o
+        # core parado enquanto o resto do plano progride. A regra é única e
+        # mora em exercise_catalog.progride_por_series.
+        return por_series and _atinge_grupo(
+            exercicio, regra.get("grupo_alvo", "todos")
+        )
+    if not _progressivel(exercicio):
+        return False
+    if tipo == "delta_rm_percentual":
+        # Cardio não tem %RM: progride por tempo/distância.
+        return not por_tempo and _atinge_grupo(exercicio, regra.get("grupo_alvo", "todos"))
+    if tipo == "delta_cardio_percentual":
+        return por_tempo and bool(regra.get("valor", 0))
+    return tipo == "deload_percentual"
+
+
+class _SemanaTipoCompilada:
+    """Semana-tipo pronta para virar qualquer semana do calendário."""
+
+    def __init__(
+        self,
+        tipo: Dict[str, Any],
+        regras: List[Dict[str, Any]],
+        contexto: ContextoDeResolucao,
+    ) -> None:
+        self._regras = regras
+        self._sessoes: List[Tuple[Dict[str, Any], Optional[List[_ExercicioCompilado]]]] = []
+        self._series_por_ativas: Dict[_Ativas, List[List[Any]]] = {}
+        # Cópia própria, uma vez: o plano não pode apontar para o molde de entrada.
+        for sessao in copy.deepcopy(tipo.get("sessoes", [])):
+            exercicios = None
+            if "exercicios" in sessao:
+                exercicios = []
+                for ex in sessao["exercicios"]:
+                    por_tempo = _e_por_tempo(ex, contexto)
+                    por_series = progride_por_series(ex, contexto)
+                    exercicios.append(_ExercicioCompilado(
+                        base=ex,
+                        numeros={c: ex[c] for c in _CAMPOS_PROGRESSIVOS if c in ex},
+                        regras=frozenset(
+                            i for i, regra in enumerate(regras)
+                            if _regra_alcanca(regra, ex, por_tempo, por_series)
+                        ),
+                        por_tempo=por_tempo,
+                    ))
+            self._sessoes.append((sessao, exercicios))
+
+    def materializar(self, ativas: _Ativas, com_ids: bool = True) -> List[Dict[str, Any]]:
+        """Sessões de uma semana com IDs novos e a progressão de `ativas` aplicada."""
+        sessoes = []
+        for sessao, exercicios in self._sessoes:
+            s = dict(sessao)
+            if com_ids:
+                s["sessao_id"] = str(uuid.uuid4())
+            if exercicios is not None:
+                s["exercicios"] = [
+                    {
+                        **ex.base,
+                        **({"exercicio_id": str(uuid.uuid4())} if com_ids else {}),
+                        **ex.numeros_da_semana(self._regras, ativas),
+                    }
+                    for ex in exercicios
+                ]
+            sessoes.append(s)
+        return sessoes
+
+    def series(self, ativas: _Ativas) -> List[List[Any]]:
+        """O `series` de cada exercício na semana de `ativas`, sem montar a sessão."""
+        series = self._series_por_ativas.get(ativas)
+        if series is None:
+            series = self._series_por_ativas[ativas] = [
+                [ex.numeros_da_semana(self._regras, ativas).get("series") for ex in (exercicios or [])]
+                for _sessao, exercicios in self._sessoes
+            ]
+        return series
+
+
+def _progredir(
+    ex: _ExercicioCompilado,
+    regras: List[Dict[str, Any]],
+    relevantes: _Ativas,
+) -> Dict[str, Any]:
+    """
+    Aplica as regras de progressão NUMÉRICAS a um exercício, na ordem do
+    molde. Só chegam aqui regras que alcançam o exercício (`_regra_alcanca`).
+    """
+    numeros = dict(ex.numeros)
+    for indice, semanas_decorridas in relevantes:
+        regra = regras[indice]
+        tipo = regra.get("tipo")
+
+        if tipo == "delta_rm_percentual":
+            rm_atual = numeros.get("percentual_rm")
+            if isinstance(rm_atual, (int, float)):
+                incremento = regra.get("valor", 0) * semanas_decorridas
+                numeros["percentual_rm"] = round(min(rm_atual + incremento, _TETO_PERCENTUAL_RM))
 
         elif tipo == "delta_series":
-            ini = regra.get("semana_inicio", 1)
-            fim = regra.get("semana_fim", 1)
-            valor = regra.get("valor", 0)
-            grupo_alvo = regra.get("grupo_alvo", "todos")
-            if ini <= semana <= fim:
-                semanas_decorridas = semana - ini + 1
-                incremento = valor * semanas_decorridas
-                for sessao in sessoes:
-                    for ex in sessao.get("exercicios", []):
-                        # Multiplicar SÉRIE de cardio é sem sentido: uma corrida
-                        # de 20 min virava 5 corridas de 28 min e o aquecimento
-                        # de 5 min prometido pela UI virava 35. Cardio progride
-                        # por tempo/distância. Isometria CATALOGADA (prancha)
-                        # continua ganhando série: congelá-la deixaria o core
-                        # parado enquanto o resto do plano progride. A regra é
-                        # única e mora em exercise_catalog.progride_por_series.
-                        if not progride_por_series(ex):
-                            continue
-                        if _atinge_grupo(ex, grupo_alvo):
-                            series_atual = ex.get("series", 1)
-                            if isinstance(series_atual, int):
-                                novo = max(series_atual + incremento, _PISO_SERIES)
-                                ex["series"] = min(novo, 10)  # schema max
+            series_atual = numeros.get("series", 1)
+            if isinstance(series_atual, int):
+                incremento = regra.get("valor", 0) * semanas_decorridas
+                novo = max(series_atual + incremento, _PISO_SERIES)
+                numeros["series"] = min(novo, 10)  # schema max
 
         elif tipo == "delta_cardio_percentual":
-            _aplicar_progressao_cardio(sessoes, regra, semana)
+            # Aumenta duração/distância do cardio em X% por semana, com teto.
+            valor = regra.get("valor", 0)
+            fator = min(1 + (valor / 100.0) * semanas_decorridas, _TETO_CARDIO_MULTIPLICADOR)
+            alvo = regra.get("alvo", "ambos")
+            if alvo in ("duracao", "ambos"):
+                _escalar(numeros, "duracao_minutos", fator, 1)
+            if alvo in ("distancia", "ambos"):
+                _escalar(numeros, "distancia_km", fator, 2)
 
         elif tipo == "deload_percentual":
-            semana_deload = regra.get("semana")
-            if semana == semana_deload:
-                fator_rm = regra.get("fator_rm", 0.8)
-                fator_series = regra.get("fator_series", 0.8)
-                for sessao in sessoes:
-                    for ex in sessao.get("exercicios", []):
-                        if not _progressivel(ex):
-                            continue
-                        if _e_por_tempo(ex):
-                            # Deload de cardio = menos tempo/distância.
-                            duracao = ex.get("duracao_minutos")
-                            if isinstance(duracao, (int, float)) and duracao > 0:
-                                ex["duracao_minutos"] = round(duracao * fator_rm, 1)
-                            distancia = ex.get("distancia_km")
-                            if isinstance(distancia, (int, float)) and distancia > 0:
-                                ex["distancia_km"] = round(distancia * fator_rm, 2)
-                            continue
-                        rm_atual = ex.get("percentual_rm")
-                        if isinstance(rm_atual, (int, float)):
-                            ex["percentual_rm"] = round(rm_atual * fator_rm)
-                        series_atual = ex.get("series")
-                        if isinstance(series_atual, int):
-                            ex["series"] = max(int(series_atual * fator_series), _PISO_SERIES)
+            fator_rm = regra.get("fator_rm", 0.8)
+            if ex.por_tempo:
+                # Deload de cardio = menos tempo/distância.
+                _escalar(numeros, "duracao_minutos", fator_rm, 1)
+                _escalar(numeros, "distancia_km", fator_rm, 2)
+                continue
+            rm_atual = numeros.get("percentual_rm")
+            if isinstance(rm_atual, (int, float)):
+                numeros["percentual_rm"] = round(rm_atual * fator_rm)
+            series_atual = numeros.get("series")
+            if isinstance(series_atual, int):
+                numeros["series"] = max(int(series_atual * regra.get("fator_series", 0.8)), _PISO_SERIES)
+    return numeros
+
+
+def _escalar(numeros: Dict[str, Any], campo: str, fator: float, casas: int) -> None:
+    valor = numeros.get(campo)
+    if isinstance(valor, (int, float)) and valor > 0:
+        numeros[campo] = round(valor * fator, casas)
 
 
 def _progressivel(exercicio: Dict[str, Any]) -> bool:
@@ -271,7 +475,10 @@ def _progressivel(exercicio: Dict[str, Any]) -> bool:
     return exercicio.get("progressivel") is not False
 
 
-def _e_por_tempo(exercicio: Dict[str, Any]) -> bool:
+def _e_por_tempo(
+    exercicio: Dict[str, Any],
+    contexto: Optional[ContextoDeResolucao] = None,
+) -> bool:
     """
     Cardio/isometria: medido por tempo (e distância), nunca por %RM.
 
@@ -281,35 +488,7 @@ def _e_por_tempo(exercicio: Dict[str, Any]) -> bool:
     era gravado lá como cardio: uma corrida de 5 min virava 9 séries de 5 min e
     o %RM que o expansor subiu era jogado fora na persistência.
     """
-    return e_por_tempo(exercicio)
-
-
-def _aplicar_progressao_cardio(
-    sessoes: List[Dict[str, Any]],
-    regra: Dict[str, Any],
-    semana: int,
-) -> None:
-    """Aumenta duração/distância do cardio em X% por semana, com teto."""
-    ini = regra.get("semana_inicio", 1)
-    fim = regra.get("semana_fim", 1)
-    valor = regra.get("valor", 0)
-    alvo = regra.get("alvo", "ambos")
-    if not (ini <= semana <= fim) or not valor:
-        return
-    semanas_decorridas = semana - ini + 1
-    fator = min(1 + (valor / 100.0) * semanas_decorridas, _TETO_CARDIO_MULTIPLICADOR)
-    for sessao in sessoes:
-        for ex in sessao.get("exercicios", []):
-            if not _e_por_tempo(ex) or not _progressivel(ex):
-                continue
-            if alvo in ("duracao", "ambos"):
-                duracao = ex.get("duracao_minutos")
-                if isinstance(duracao, (int, float)) and duracao > 0:
-                    ex["duracao_minutos"] = round(duracao * fator, 1)
-            if alvo in ("distancia", "ambos"):
-                distancia = ex.get("distancia_km")
-                if isinstance(distancia, (int, float)) and distancia > 0:
-                    ex["distancia_km"] = round(distancia * fator, 2)
+    return e_por_tempo(exercicio, contexto)
 
 
 def _atinge_grupo(exercicio: Dict[str, Any], grupo_alvo: str) -> bool:
@@ -10,16 +10,17 @@
 
 import datetime
 import math
+import os
 import re
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from backend.services.exercise_catalog import (
     METRICA_TEMPO,
     METRICA_TEMPO_DISTANCIA,
+    ContextoDeResolucao,
     metrica_do_exercicio,
     normalizar,
-    resolver_exercicio,
 )
 
 # Faixa padrão INTERNA quando a IA não dá número de reps (ex.: "AMRAP").
@@ -33,9 +34,11 @@ DEFAULT_REPS_MAX = 12
 DEFAULT_DURACAO_CARDIO_SEGUNDOS = 20 * 60
 
 # Tetos de sanidade contra JSON malicioso/decoerente da IA (achado #6 do review):
-# sem eles, "series": 100000000 explodiria a memória do processo.
+# sem eles, "series": 100000000 explodiria a memória do processo. O teto total é
+# configurável para periodizações longas: no modo em fluxo o pico de memória
+# é uma semana de linhas, não o plano inteiro.
 MAX_SERIES_POR_EXERCICIO = 10
-MAX_TOTAL_SETS = 2000
+MAX_TOTAL_SETS = int(os.environ.get("PLAN_MAX_TOTAL_SETS", "2000"))
 
 # Vocabulário livre de lesão → grupos musculares do catálogo. O aluno fala
 # "ombro"/"joelho"/"perna"; o catálogo grava "Ombros"/"Quadríceps". Sem esta
@@ -285,18 +288,30 @@ def _estimar_minutos(
     total_segundos = 0
     for exercicio in exercicios_mapeados:
         series_exercicio = sets_por_exercicio.get(exercicio["id"], [])
-        descanso = exercicio.get("rest_seconds") or DESCANSO_PADRAO_SEGUNDOS
-        if exercicio.get("metric") in (METRICA_TEMPO, METRICA_TEMPO_DISTANCIA):
-            total_segundos += sum(
-                int(serie.get("target_duration_seconds") or 0)
-                for serie in series_exercicio
-            )
-            total_segundos += max(len(series_exercicio) - 1, 0) * descanso
-        else:
-            total_segundos += len(series_exercicio) * (
-                SEGUNDOS_EXECUCAO_POR_SERIE + descanso
-            )
+        total_segundos += _segundos_estimados(
+            exercicio.get("metric"),
+            exercicio.get("rest_seconds"),
+            [serie.get("target_duration_seconds") for serie in series_exercicio],
+        )
+
+    return _minutos_estimados(total_segundos)
 
+
+def _segundos_estimados(
+    metrica: Optional[str],
+    descanso: Optional[int],
+    duracoes_das_series: List[Optional[int]],
+) -> int:
+    """Segundos de um exercício: execução (ou duração alvo) + descanso entre séries."""
+    descanso = descanso or DESCANSO_PADRAO_SEGUNDOS
+    if metrica in (METRICA_TEMPO, METRICA_TEMPO_DISTANCIA):
+        return sum(int(duracao or 0) for duracao in duracoes_das_series) + max(
+            len(duracoes_das_series) - 1, 0
+        ) * descanso
+    return len(duracoes_das_series) * (SEGUNDOS_EXECUCAO_POR_SERIE + descanso)
+
+
+def _minutos_estimados(total_segundos: int) -> int:
     return max(1, math.ceil(total_segundos / 60))
 
 
@@ -346,6 +361,7 @@ def _grupos_do_termo(termo: Any) -> set:
 def _injury_flags(
     canonico: Any,
     restricoes_lesao: Optional[List[Dict[str, Any]]],
+    contexto: ContextoDeResolucao,
 ) -> List[str]:
     """Casa lesões estruturadas por chave de exercício ou grupo muscular."""
     flags: List[str] = []
@@ -355,7 +371,7 @@ def _injury_flags(
         casou = False
         exercicio_afetado = restricao.get("exercicio_afetado")
         if exercicio_afetado and canonico.chave:
-            afetado = resolver_exercicio(exercicio_afetado)
+            afetado = contexto.resolver(exercicio_afetado)
             casou = afetado.chave is not None and afetado.chave == canonico.chave
         grupo_afetado = restricao.get("grupo_afetado")
         if grupo_afetado and canonico.grupo_muscular:
@@ -437,6 +453,132 @@ def _offset_com_agenda(
     return offset_preferido
 
 
+def _series_planejadas(valor: Any) -> int:
+    """Séries que o mapper grava para o `series` de um exercício do plano."""
+    if not isinstance(valor, int) or valor < 1:
+        valor = 1
+    return min(valor, MAX_SERIES_POR_EXERCICIO)
+
+
+def _conferir_teto_de_series(total_sets: int) -> None:
+    if total_sets > MAX_TOTAL_SETS:
+        # O total vai na mensagem porque é o único número REAL do teto: quem
+        # conta séries é quem as grava. Toda tentativa de projetar isso antes
+        # divergiu do pipeline.
+        raise ValueError(
+            "Plano inválido: excede o teto de {} séries totais "
+            "(o plano passa de {}).".format(MAX_TOTAL_SETS, total_sets)
+        )
+
+
+def _exercicios_da_sessao(sessao: Dict[str, Any]) -> List[Dict[str, Any]]:
+    exercicios = [e for e in (sessao.get("exercicios") or []) if isinstance(e, dict)]
+    if not exercicios:
+        # Achado #5: sessão sem exercício não pode virar treino vazio com 200
+        raise ValueError(
+            "Plano inválido: a sessão '{}' veio sem exercícios.".format(
+                sessao.get("nome") or "sem nome"
+            )
+        )
+    return exercicios
+
+
+def _alvo_da_serie(
+    ex: Dict[str, Any], metrica: str
+) -> Tuple[Optional[int], Optional[int], Optional[int], Optional[float]]:
+    """(reps_min, reps_max, duração em s, distância em m) de cada série do exercício."""
+    if metrica not in (METRICA_TEMPO, METRICA_TEMPO_DISTANCIA):
+        reps_min, reps_max = _parse_reps(ex.get("repeticoes"))
+        return reps_min, reps_max, None, None
+    duracao_alvo = (
+        _parse_duracao_segundos(ex.get("duracao_minutos"))
+        or _parse_duracao_segundos(ex.get("repeticoes"))
+        or _parse_duracao_segundos(ex.get("tempo"))
+    )
+    distancia_alvo = None
+    if metrica == METRICA_TEMPO_DISTANCIA:
+        distancia_km = ex.get("distancia_km")
+        distancia_alvo = (
+            float(distancia_km) * 1000
+            if isinstance(distancia_km, (int, float)) and distancia_km > 0
+            else _parse_distancia_metros(ex.get("repeticoes"))
+        )
+    # A série tem de prescrever reps OU duração (CHECK
+    # planned_sets_alvo_coerente da 0014). Distância sozinha NÃO satisfaz o
+    # CHECK, então todo exercício por tempo sem duração legível cai no
+    # default — mesmo quando há distância (ex.: "Corrida 5km, ritmo livre").
+    # Sem isso a RPC save_training_plan aborta e a geração inteira cai.
+    if duracao_alvo is None:
+        duracao_alvo = DEFAULT_DURACAO_CARDIO_SEGUNDOS
+    return None, None, duracao_alvo, distancia_alvo
+
+
+def sessoes_para_exibicao(
+    sessoes: List[Dict[str, Any]],
+    contexto: Optional[ContextoDeResolucao] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Uma semana do plano expandido como a prévia a mostra: o mesmo dia, título,
+    duração estimada, nome canônico e alvos que `_semanas_mapeadas` grava —
+    sem IDs, sem datas e sem uma linha por série. Sem agenda de dias, como o
+    plano manual.
+
+    Cada sessão vira {"titulo", "dia", "ordem", "minutos", "exercicios"} e cada
+    exercício {"ordem", "nome", "series", "reps_raw", "reps_min", "reps_max",
+    "duracao_segundos", "distancia_metros"}, nas ordens em que o mapper grava.
+    """
+    if contexto is None:
+        contexto = ContextoDeResolucao()
+    exibidas: List[Dict[str, Any]] = []
+    dias_ocupados: set = set()
+    sessoes_semana = [s for s in sessoes if isinstance(s, dict)]
+    for ordem_na_semana, sessao in enumerate(sessoes_semana, start=1):
+        _, rotulo_dia = _resolver_dia(sessao, ordem_na_semana, dias_ocupados)
+        exercicios = []
+        total_segundos = 0
+        for posicao, ex in enumerate(_exercicios_da_sessao(sessao), start=1):
+            series = _series_planejadas(ex.get("series"))
+            metrica = metrica_do_exercicio(ex, contexto)
+            reps_min, reps_max, duracao_alvo, distancia_alvo = _alvo_da_serie(ex, metrica)
+            total_segundos += _segundos_estimados(
+                metrica, _parse_descanso_segundos(ex.get("tempo_descanso")), [duracao_alvo] * series,
+            )
+            exercicios.append({
+                "ordem": ex.get("ordem") if isinstance(ex.get("ordem"), int) else posicao,
+                "nome": contexto.resolver(ex.get("nome"), ex.get("equipamento")).nome,
+                "series": series,
+                "reps_raw": str(ex.get("repeticoes")) if ex.get("repeticoes") is not None else None,
+                "reps_min": reps_min,
+                "reps_max": reps_max,
+                "duracao_segundos": duracao_alvo,
+                "distancia_metros": distancia_alvo,
+            })
+        exibidas.append({
+            "titulo": str(sessao.get("nome") or "Treino"),
+            "dia": rotulo_dia,
+            "ordem": ordem_na_semana,
+            "minutos": sessao.get("duracao_minutos")
+            if isinstance(sessao.get("duracao_minutos"), int)
+            else _minutos_estimados(total_segundos),
+            "exercicios": exercicios,
+        })
+    return exibidas
+
+
+def series_planejadas_da_semana(series_por_sessao: List[List[Any]], total_sets: int) -> int:
+    """
+    Soma ao `total_sets` as séries que o mapper gravaria numa semana (o
+    `series` de cada exercício, sessão a sessão) e confere o teto
+    MAX_TOTAL_SETS exatamente onde `_semanas_mapeadas` conferiria. Devolve o
+    novo total.
+    """
+    for series_da_sessao in series_por_sessao:
+        for series in series_da_sessao:
+            total_sets += _series_planejadas(series)
+            _conferir_teto_de_series(total_sets)
+    return total_sets
+
+
 def mapear_plano_ia(
     plano: Dict[str, Any],
     user_id: str,
@@ -444,6 +586,7 @@ def mapear_plano_ia(
     restricoes_lesao: Optional[List[Dict[str, Any]]] = None,
     created_by: str = "ai",
     dias_disponiveis: Optional[List[str]] = None,
+    contexto: Optional[ContextoDeResolucao] = None,
 ) -> Dict[str, Any]:
     """
     Converte o plano da IA em linhas prontas para o PostgREST.
@@ -454,6 +597,43 @@ def mapear_plano_ia(
     - dias_disponiveis: Lista de dias da semana em português ['segunda', 'terca', ...]
       Quando fornecido, respeita a agenda e não empilha múltiplas sessões no mesmo dia.
       Quando None ou vazio, usa o comportamento atual (fallback posicional + clamp).
+    - contexto: resoluções do catálogo já feitas pelo expansor do mesmo plano;
+      cada exercício distinto é resolvido uma vez por execução do pipeline.
+    """
+    em_fluxo = mapear_plano_ia_em_fluxo(
+        plano,
+        user_id,
+        start_date=start_date,
+        restricoes_lesao=restricoes_lesao,
+        created_by=created_by,
+        dias_disponiveis=dias_disponiveis,
+        contexto=contexto,
+    )
+    mapeado: Dict[str, Any] = {"plan": em_fluxo["plan"], "sessions": [], "exercises": [], "sets": []}
+    for semana in em_fluxo["semanas"]:
+        for tabela in ("sessions", "exercises", "sets"):
+            mapeado[tabela].extend(semana[tabela])
+    return mapeado
+
+
+def mapear_plano_ia_em_fluxo(
+    plano: Dict[str, Any],
+    user_id: str,
+    start_date: Optional[datetime.date] = None,
+    restricoes_lesao: Optional[List[Dict[str, Any]]] = None,
+    created_by: str = "ai",
+    dias_disponiveis: Optional[List[str]] = None,
+    contexto: Optional[ContextoDeResolucao] = None,
+) -> Dict[str, Any]:
+    """
+    Mesmo mapeamento de `mapear_plano_ia`, entregue semana a semana.
+
+    Retorna {"plan": {...}, "semanas": <gerador>}: cada item do gerador é
+    {"sessions": [...], "exercises": [...], "sets": [...]} de UMA semana, e só
+    existe em memória até quem consome (plan_repository.persistir_plano)
+    serializá-lo. O teto MAX_TOTAL_SETS é conferido série a série, e os
+    ValueError de conteúdo saem do gerador. `plan["duration_weeks"]` só é
+    definitivo depois que o gerador se esgota.
     """
     if not isinstance(plano, dict):
         raise ValueError("Plano inválido: esperado objeto JSON.")
@@ -461,6 +641,8 @@ def mapear_plano_ia(
     if not isinstance(principal, dict):
         raise ValueError("Plano inválido: 'plano_principal' ausente.")
 
+    if contexto is None:
+        contexto = ContextoDeResolucao()
     inicio = start_date or datetime.date.today()
     # Semana 1 = semana-calendário de start_date, ancorada na segunda-feira
     segunda_semana1 = inicio - datetime.timedelta(days=inicio.weekday())
@@ -497,10 +679,6 @@ def mapear_plano_ia(
         "training_days": dias_disponiveis,
     }
 
-    sessions: List[Dict[str, Any]] = []
-    exercises: List[Dict[str, Any]] = []
-    sets: List[Dict[str, Any]] = []
-
     # Calcula a âncora uma única vez ANTES do laço dos ciclos/microciclos
     # Procura n_sessoes_semana1 varrendo os microciclos
     n_sessoes_semana1 = 0
@@ -531,6 +709,29 @@ def mapear_plano_ia(
     if offsets_agenda and n_sessoes_semana1 > 0:
         ancora = _ancora_semana1(inicio, offsets_agenda, n_sessoes_semana1)
 
+    semanas = _semanas_mapeadas(
+        principal, plan_row, user_id, inicio, segunda_semana1, ancora, offsets_agenda,
+        restricoes_lesao, created_by, contexto,
+    )
+    return {"plan": plan_row, "semanas": semanas}
+
+
+def _semanas_mapeadas(
+    principal: Dict[str, Any],
+    plan_row: Dict[str, Any],
+    user_id: str,
+    inicio: datetime.date,
+    segunda_semana1: datetime.date,
+    ancora: datetime.date,
+    offsets_agenda: Optional[List[int]],
+    restricoes_lesao: Optional[List[Dict[str, Any]]],
+    created_by: str,
+    contexto: ContextoDeResolucao,
+) -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+    """Linhas de cada microciclo, na ordem do plano (ver mapear_plano_ia_em_fluxo)."""
+    plan_id = plan_row["id"]
+    total_sets = 0
+    semana_maxima = 0
     for ciclo in principal.get("ciclos") or []:
         if not isinstance(ciclo, dict):
             continue
@@ -541,6 +742,9 @@ def mapear_plano_ia(
             if not isinstance(semana, int) or semana < 1:
                 semana = 1
             sessoes_semana = [s for s in (micro.get("sessoes") or []) if isinstance(s, dict)]
+            sessions: List[Dict[str, Any]] = []
+            exercises: List[Dict[str, Any]] = []
+            sets: List[Dict[str, Any]] = []
 
             # Escopo do desempate é a SEMANA: dois treinos em semanas
             # diferentes podem (e devem) cair no mesmo dia da semana.
@@ -586,27 +790,17 @@ def mapear_plano_ia(
                 }
                 sessions.append(session_row)
 
-                exercicios = [e for e in (sessao.get("exercicios") or []) if isinstance(e, dict)]
-                if not exercicios:
-                    # Achado #5: sessão sem exercício não pode virar treino vazio com 200
-                    raise ValueError(
-                        "Plano inválido: a sessão '{}' veio sem exercícios.".format(
-                            sessao.get("nome") or "sem nome"
-                        )
-                    )
+                exercicios = _exercicios_da_sessao(sessao)
                 inicio_exercicios = len(exercises)
                 inicio_sets = len(sets)
                 for posicao, ex in enumerate(exercicios, start=1):
                     exercise_id = str(uuid.uuid4())
-                    series = ex.get("series")
-                    if not isinstance(series, int) or series < 1:
-                        series = 1
-                    series = min(series, MAX_SERIES_POR_EXERCICIO)
+                    series = _series_planejadas(ex.get("series"))
                     rm = ex.get("percentual_rm")
                     # Canonização pelo catálogo: nome de academia em PT-BR,
                     # grupo muscular e incremento de carga por exercício. Nome
                     # fora do catálogo passa intacto, com chave/grupo nulos.
-                    canonico = resolver_exercicio(ex.get("nome"), ex.get("equipamento"))
+                    canonico = contexto.resolver(ex.get("nome"), ex.get("equipamento"))
                     # Decisão ÚNICA de métrica, compartilhada com o expansor
                     # (exercise_catalog.metrica_do_exercicio). Quando cada
                     # metade do motor decidia sozinha, o mesmo exercício
@@ -616,39 +810,13 @@ def mapear_plano_ia(
                     # Cardio/isometria não se mede em carga × repetição: a
                     # prescrição vira duração (e distância), e %RM/reps ficam
                     # NULOS em vez de virar lixo ("20min" → 20 repetições).
-                    metrica = metrica_do_exercicio(ex)
+                    metrica = metrica_do_exercicio(ex, contexto)
                     eh_tempo = metrica in (METRICA_TEMPO, METRICA_TEMPO_DISTANCIA)
-                    if eh_tempo:
-                        reps_min = reps_max = None
-                        duracao_alvo = (
-                            _parse_duracao_segundos(ex.get("duracao_minutos"))
-                            or _parse_duracao_segundos(ex.get("repeticoes"))
-                            or _parse_duracao_segundos(ex.get("tempo"))
-                        )
-                        distancia_alvo = None
-                        if metrica == METRICA_TEMPO_DISTANCIA:
-                            distancia_km = ex.get("distancia_km")
-                            distancia_alvo = (
-                                float(distancia_km) * 1000
-                                if isinstance(distancia_km, (int, float)) and distancia_km > 0
-                                else _parse_distancia_metros(ex.get("repeticoes"))
-                            )
-                        # A série tem de prescrever reps OU duração (CHECK
-                        # planned_sets_alvo_coerente da 0014). Distância sozinha
-                        # NÃO satisfaz o CHECK, então todo exercício por tempo
-                        # sem duração legível cai no default — mesmo quando há
-                        # distância (ex.: "Corrida 5km, ritmo livre"). Sem isso
-                        # a RPC save_training_plan aborta e a geração inteira cai.
-                        if duracao_alvo is None:
-                            duracao_alvo = DEFAULT_DURACAO_CARDIO_SEGUNDOS
-                    else:
-                        reps_min, reps_max = _parse_reps(ex.get("repeticoes"))
-                        duracao_alvo = None
-                        distancia_alvo = None
+                    reps_min, reps_max, duracao_alvo, distancia_alvo = _alvo_da_serie(ex, metrica)
                     injury_flags = (
                         ["limitacao_aluno"]
                         if created_by == "user" and ex.get("tem_limitacao") is True
-                        else _injury_flags(canonico, restricoes_lesao)
+                        else _injury_flags(canonico, restricoes_lesao, contexto)
                     )
                     exercises.append({
                         "id": exercise_id,
@@ -688,26 +856,21 @@ def mapear_plano_ia(
                             "target_duration_seconds": duracao_alvo,
                             "target_distance_m": distancia_alvo,
                         })
-                    if len(sets) > MAX_TOTAL_SETS:
-                        # O total vai na mensagem porque é o único número REAL
-                        # do teto: quem conta séries é quem as grava. Toda
-                        # tentativa de projetar isso antes divergiu do pipeline.
-                        raise ValueError(
-                            "Plano inválido: excede o teto de {} séries totais "
-                            "(o plano passa de {}).".format(MAX_TOTAL_SETS, len(sets))
-                        )
+                    total_sets += series
+                    _conferir_teto_de_series(total_sets)
                 if not isinstance(sessao.get("duracao_minutos"), int):
                     session_row["estimated_minutes"] = _estimar_minutos(
                         exercises[inicio_exercicios:],
                         sets[inicio_sets:],
                     )
 
-    if not sessions:
+            if sessions:
+                semana_maxima = max(semana_maxima, semana)
+                yield {"sessions": sessions, "exercises": exercises, "sets": sets}
+
+    if not semana_maxima:
         raise ValueError("Plano inválido: nenhuma sessão de treino encontrada.")
 
     # Achado #5: a duração registrada reflete a cobertura REAL do plano gerado,
     # não a declarada — IA que promete 12 semanas e entrega 2 não vira "12".
-    semanas_mapeadas = max(s["week_number"] for s in sessions)
-    plan_row["duration_weeks"] = semanas_mapeadas
-
-    return {"plan": plan_row, "sessions": sessions, "exercises": exercises, "sets": sets}
+    plan_row["duration_weeks"] = semana_maxima
@@ -2,14 +2,22 @@
 # Persiste o plano completo por uma única RPC transacional no Supabase.
 # A chamada usa o JWT do usuário + anon key; SECURITY INVOKER e RLS continuam
 # valendo, sem service role no backend.
+# `persistir_plano_async` é a mesma gravação para o modo ASGI (backend/asgi.py).
 
 import os
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
 
+import httpx
 import requests
 
+from backend.utils.http_async import cliente_http_async
+from backend.utils.json_codec import serializar_compacto
+
 REQUEST_TIMEOUT_SECONDS = 20
 
+# Fatia do corpo entregue ao socket por vez no modo em fluxo.
+_TAMANHO_DO_PEDACO = 64 * 1024
+
 
 class PlanPersistenceError(RuntimeError):
     """Falha ao confirmar a transação que grava o plano completo."""
@@ -31,40 +39,30 @@ def _headers(anon_key: str, access_token: str) -> Dict[str, str]:
     }
 
 
-def persistir_plano(mapeado: Dict[str, Any], access_token: str) -> str:
-    """
-    Arquiva o plano ativo anterior e grava plan → sessions → exercises → sets na
-    mesma transação Postgres (`save_training_plan`, migration 0006).
-
-    Não há DELETE compensatório: qualquer erro SQL reverte também o arquivamento.
-    Em timeout a resposta é conservadora (erro), embora o servidor possa ter
-    confirmado a transação; repetir o mesmo payload/id é suportado pela RPC.
-    """
+def _preparar_gravacao(mapeado: Dict[str, Any], access_token: str) -> Tuple[str, str, Dict[str, str], Any]:
+    """(url, plan_id, headers, corpo) da RPC; o corpo é bytes ou _CorpoEmPedacos."""
     base_url, anon_key = _config()
     headers = _headers(anon_key, access_token)
     try:
         plan_id = mapeado["plan"]["id"]
-        payload = {
-            "p_plan": mapeado["plan"],
-            "p_sessions": mapeado["sessions"],
-            "p_exercises": mapeado["exercises"],
-            "p_sets": mapeado["sets"],
-        }
+        if "semanas" in mapeado:
+            # Saída de mapear_plano_ia_em_fluxo. ValueError de conteúdo (teto de
+            # séries, sessão vazia) sai daqui, antes de qualquer byte ir à rede.
+            corpo = _CorpoEmPedacos(mapeado)
+        else:
+            corpo = serializar_compacto({
+                "p_plan": mapeado["plan"],
+                "p_sessions": mapeado["sessions"],
+                "p_exercises": mapeado["exercises"],
+                "p_sets": mapeado["sets"],
+            })
     except (KeyError, TypeError) as exc:
         raise PlanPersistenceError("Mapeamento do plano incompleto.") from exc
+    return "{}/rest/v1/rpc/save_training_plan".format(base_url), plan_id, headers, corpo
 
-    try:
-        response = requests.post(
-            "{}/rest/v1/rpc/save_training_plan".format(base_url),
-            headers=headers,
-            json=payload,
-            timeout=REQUEST_TIMEOUT_SECONDS,
-        )
-    except requests.RequestException as exc:
-        raise PlanPersistenceError(
-            "Falha de rede ao confirmar a gravação atômica do plano: {}".format(exc)
-        ) from exc
 
+def _conferir_gravacao(response: Any, plan_id: str) -> str:
+    """Confere a resposta da RPC (requests ou httpx) e devolve o plan_id."""
     if response.status_code >= 400:
         raise PlanPersistenceError(
             "Falha ao gravar o plano de forma atômica (HTTP {}).".format(
@@ -84,3 +82,91 @@ def persistir_plano(mapeado: Dict[str, Any], access_token: str) -> str:
         )
 
     return plan_id
+
+
+def persistir_plano(mapeado: Dict[str, Any], access_token: str) -> str:
+    """
+    Arquiva o plano ativo anterior e grava plan → sessions → exercises → sets na
+    mesma transação Postgres (`save_training_plan`, migration 0006).
+
+    Não há DELETE compensatório: qualquer erro SQL reverte também o arquivamento.
+    Em timeout a resposta é conservadora (erro), embora o servidor possa ter
+    confirmado a transação; repetir o mesmo payload/id é suportado pela RPC.
+    """
+    url, plan_id, headers, corpo = _preparar_gravacao(mapeado, access_token)
+    try:
+        response = requests.post(
+            url,
+            headers=headers,
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            data=corpo,
+        )
+    except requests.RequestException as exc:
+        raise PlanPersistenceError(
+            "Falha de rede ao confirmar a gravação atômica do plano: {}".format(exc)
+        ) from exc
+
+    return _conferir_gravacao(response, plan_id)
+
+
+async def persistir_plano_async(mapeado: Dict[str, Any], access_token: str) -> str:
+    """`persistir_plano` sem prender o event loop na RPC. Mesmas exceções."""
+    url, plan_id, headers, corpo = _preparar_gravacao(mapeado, access_token)
+    if isinstance(corpo, _CorpoEmPedacos):
+        # httpx só manda Content-Length de corpo iterável se ele vier no header.
+        headers = {**headers, "Content-Length": str(len(corpo))}
+        corpo = corpo.pedacos_async()
+    try:
+        response = await cliente_http_async().post(
+            url,
+            headers=headers,
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            content=corpo,
+        )
+    except httpx.HTTPError as exc:
+        raise PlanPersistenceError(
+            "Falha de rede ao confirmar a gravação atômica do plano: {}".format(exc)
+        ) from exc
+
+    return _conferir_gravacao(response, plan_id)
+
+
+class _CorpoEmPedacos:
+    """
+    Corpo JSON da RPC montado semana a semana a partir do mapeamento em fluxo.
+
+    Cada linha vira bytes assim que o gerador a entrega e o dict é descartado:
+    o pico de memória é o corpo serializado, não quatro listas de dicts MAIS o
+    corpo inteiro montado por cima. `p_plan` vai por
+    último porque `duration_weeks` só fecha no fim do gerador (a ordem das
+    chaves não importa à RPC). Com `__len__`, o requests manda Content-Length
+    e itera os pedaços, sem juntar tudo numa string só.
+    """
+
+    def __init__(self, mapeado: Dict[str, Any]) -> None:
+        tabelas = {"p_sessions": bytearray(), "p_exercises": bytearray(), "p_sets": bytearray()}
+        origem = {"p_sessions": "sessions", "p_exercises": "exercises", "p_sets": "sets"}
+        for semana in mapeado["semanas"]:
+            for chave, buffer in tabelas.items():
+                for linha in semana[origem[chave]]:
+                    if buffer:
+                        buffer += b","
+                    buffer += serializar_compacto(linha)
+        self._partes: List[bytes] = []
+        for chave, buffer in tabelas.items():
+            self._partes += [b"," if self._partes else b"{", b'"' + chave.encode() + b'":[', buffer, b"]"]
+        self._partes += [b',"p_plan":', serializar_compacto(mapeado["plan"]), b"}"]
+        self._tamanho = sum(len(parte) for parte in self._partes)
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+    def __iter__(self) -> Iterator[bytes]:
+        for parte in self._partes:
+            visao = memoryview(parte)
+            for inicio in range(0, len(visao), _TAMANHO_DO_PEDACO):
+                yield visao[inicio:inicio + _TAMANHO_DO_PEDACO]
+
+    async def pedacos_async(self) -> AsyncIterator[bytes]:
+        for pedaco in self:
+            yield bytes(pedaco)
@@ -0,0 +1,105 @@
+# backend/services/prompt_cache.py
+# Montagem do `system` com breakpoints de prompt caching e métricas de cache
+# por rota, para as três chamadas pagas (chat, consolidate, plan).
+#
+# Só o molde v2 marcava `cache_control`; /api/chat e /api/consolidate-chat
+# mandavam as instruções fixas sem breakpoint, e o custo_real_usd da quota
+# soma leitura de cache como entrada cheia (de propósito, é o lado seguro do
+# teto) — ninguém conseguia ver se o cache se pagava. Aqui:
+#
+#   - `bloco(texto, cachear=True)` marca o FIM de um prefixo estável. O cache
+#     da API casa por prefixo: tudo antes do breakpoint precisa ser idêntico
+#     byte a byte entre chamadas, então o que muda por aluno vem depois.
+#   - `system_com_cache(...)` junta os blocos, descarta texto vazio (a API
+#     recusa bloco de texto vazio) e confere o teto de 4 breakpoints.
+#   - `registrar_uso(rota, modelo, usage)` acumula tokens de entrada, escrita
+#     e leitura de cache por rota, a taxa de acerto e a economia real em USD.
+#
+# Prefixo abaixo do mínimo cacheável do modelo não é erro: a API ignora o
+# breakpoint e cobra a entrada normal — o que as métricas mostram (taxa de
+# acerto zero na rota), em /api/metrics como "cache_de_prompt".
+
+import threading
+from typing import Any, Dict, List
+
+from backend.services.ai_quota import economia_de_cache_usd
+from backend.utils import metricas
+
+MAX_BREAKPOINTS = 4
+
+_metricas: Dict[str, Dict[str, float]] = {}
+_metricas_lock = threading.Lock()
+
+
+def bloco(texto: str, cachear: bool = False) -> Dict[str, Any]:
+    """Bloco de texto do `system`; `cachear` põe o breakpoint no fim dele."""
+    conteudo: Dict[str, Any] = {"type": "text", "text": texto}
+    if cachear:
+        conteudo["cache_control"] = {"type": "ephemeral"}
+    return conteudo
+
+
+def system_com_cache(*blocos: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Lista de blocos pronta para o parâmetro `system`, na ordem dada."""
+    enviados = [b for b in blocos if b.get("text")]
+    breakpoints = sum(1 for b in enviados if "cache_control" in b)
+    if breakpoints > MAX_BREAKPOINTS:
+        # A API rejeita a request inteira: é erro de montagem, não de runtime.
+        raise ValueError(
+            "system com {} breakpoints de cache (máximo {}).".format(breakpoints, MAX_BREAKPOINTS)
+        )
+    return enviados
+
+
+def texto_do_system(system: Any) -> str:
+    """O texto corrido do `system`, venha ele como string ou como blocos."""
+    if isinstance(system, str):
+        return system
+    return "".join(b.get("text", "") for b in system or [] if isinstance(b, dict))
+
+
+def registrar_uso(rota: str, modelo: str, usage: Any) -> None:
+    """Soma o `usage` da resposta às métricas da rota. Nunca levanta."""
+    if usage is None:
+        return
+    try:
+        entrada = int(getattr(usage, "input_tokens", 0) or 0)
+        escrita = int(getattr(usage, "cache_creation_input_tokens", 0) or 0)
+        leitura = int(getattr(usage, "cache_read_input_tokens", 0) or 0)
+    except (TypeError, ValueError):
+        return
+    economia = economia_de_cache_usd(modelo, usage)
+    with _metricas_lock:
+        m = _metricas.setdefault(rota, {
+            "chamadas": 0, "tokens_entrada": 0, "tokens_escrita_cache": 0,
+            "tokens_leitura_cache": 0, "economia_usd": 0.0,
+        })
+        m["chamadas"] += 1
+        m["tokens_entrada"] += entrada
+        m["tokens_escrita_cache"] += escrita
+        m["tokens_leitura_cache"] += leitura
+        m["economia_usd"] += economia
+
+
+def estatisticas_de_cache() -> Dict[str, Dict[str, float]]:
+    """
+    Métricas acumuladas por rota desde o início do processo.
+
+    `taxa_de_acerto` é a fração dos tokens de entrada servida pelo cache
+    (leitura / entrada total); `economia_usd` já desconta o prêmio pago nas
+    escritas, então pode ficar negativa numa rota cujo prefixo nunca é relido.
+    """
+    with _metricas_lock:
+        copia = {rota: dict(m) for rota, m in _metricas.items()}
+    for m in copia.values():
+        total = m["tokens_entrada"] + m["tokens_escrita_cache"] + m["tokens_leitura_cache"]
+        m["taxa_de_acerto"] = m["tokens_leitura_cache"] / total if total else 0.0
+    return copia
+
+
+def limpar_metricas_de_cache() -> None:
+    with _metricas_lock:
+        _metricas.clear()
+
+
+metricas.registrar("cache_de_prompt", estatisticas_de_cache, limpar_metricas_de_cache)
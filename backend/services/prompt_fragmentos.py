@@ -0,0 +1,73 @@
+# backend/services/prompt_fragmentos.py
+# Fragmentos de prompt prontos para envio, montados uma vez por combinação.
+#
+# Todo job do molde remontava as mesmas strings grandes: o cardápio filtrado do
+# catálogo (_catalogo_para_questionario), o bloco estável persona + instruções
+# + catálogo (+ schema) de _montar_chamada_do_molde e o schema colado na
+# correção do retry. Nada disso depende do aluno além de poucos flags, então
+# cada fragmento é guardado pela chave do que o determina — ETag do catálogo,
+# inclui_cardio/inclui_alongamento, modalidades de cardio e versão do prompt —
+# e montar um prompt vira consulta a dicionário. Acertos e faltas saem em
+# /api/metrics (backend/utils/metricas.py).
+#
+# LRU com teto, como o memo de resolver_exercicio: as chaves são combinações
+# de flags do questionário, um conjunto pequeno na prática, mas modalidades
+# vêm do cliente e não podem crescer a memória sem limite.
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, TypeVar
+
+from backend.utils import metricas
+
+T = TypeVar("T")
+
+_FRAGMENTOS_MAX = 256
+
+_fragmentos: "OrderedDict[Hashable, Any]" = OrderedDict()
+_fragmentos_lock = threading.Lock()
+_acertos = 0
+_faltas = 0
+
+
+def fragmento(chave: Hashable, montar: Callable[[], T]) -> T:
+    """
+    Devolve o fragmento guardado em `chave` ou o monta com `montar()`.
+
+    O valor é compartilhado entre jobs: guarde só str ou tuplas (imutáveis).
+    Quem precisa de lista/dict mutável copia na saída. Duas threads que
+    falham juntas montam duas vezes e a última grava — o fragmento é
+    determinístico, então isso só custa o tempo de montar.
+    """
+    global _acertos, _faltas
+    with _fragmentos_lock:
+        valor = _fragmentos.get(chave)
+        if valor is not None:
+            _fragmentos.move_to_end(chave)
+            _acertos += 1
+            return valor
+        _faltas += 1
+    valor = montar()
+    with _fragmentos_lock:
+        _fragmentos[chave] = valor
+        _fragmentos.move_to_end(chave)
+        while len(_fragmentos) > _FRAGMENTOS_MAX:
+            _fragmentos.popitem(last=False)
+    return valor
+
+
+def estatisticas_de_fragmentos() -> Dict[str, int]:
+    """Acertos, faltas e entradas desde o início do processo (ou do último limpar)."""
+    with _fragmentos_lock:
+        return {"acertos": _acertos, "faltas": _faltas, "entradas": len(_fragmentos)}
+
+
+def limpar_fragmentos() -> None:
+    global _acertos, _faltas
+    with _fragmentos_lock:
+        _fragmentos.clear()
+        _acertos = 0
+        _faltas = 0
+
+
+metricas.registrar("fragmentos_de_prompt", estatisticas_de_fragmentos, limpar_fragmentos)
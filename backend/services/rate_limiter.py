@@ -0,0 +1,246 @@
+# backend/services/rate_limiter.py
+# Barreira de burst por (balde, usuário) das rotas do app.py.
+#
+# O limitador antigo guardava um deque de timestamps por (balde, usuário) atrás
+# de um único lock global: a memória crescia com cada usuário já visto (nada
+# expirava), toda rota disputava o mesmo lock, e o estado morava no processo —
+# o Dockerfile fixava `--workers 1` só porque mais workers multiplicariam o
+# limite efetivo.
+#
+# Agora há uma interface (RateLimiter) e dois backends, escolhidos por
+# RATE_LIMIT_BACKEND:
+#
+#   memoria (default)  janela deslizante por contador: O(1) de memória por
+#                      chave (janela atual + anterior), locks fatiados por
+#                      shard e despejo de chaves ociosas.
+#   sqlite             o MESMO algoritmo numa tabela SQLite em WAL. Vários
+#                      processos apontando para o mesmo arquivo (os workers do
+#                      gunicorn, no mesmo container) compartilham o limite.
+#
+# Janela deslizante por contador: a contagem da janela anterior entra
+# ponderada pela fração dela que ainda cabe na janela deslizante. É uma
+# aproximação (assume chegada uniforme na janela anterior), mas nunca deixa
+# passar mais do que o limite dentro da janela atual — e é isso que a barreira
+# de burst precisa garantir. O teto de gasto de verdade é a quota persistente
+# (ai_quota.py), não isto.
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Número de fatias de lock do backend em memória. Chaves de usuários
+# diferentes quase nunca disputam o mesmo lock.
+RATE_LIMIT_SHARDS = int(os.environ.get("RATE_LIMIT_SHARDS", "16"))
+
+# A cada N operações numa fatia, ela é varrida atrás de chaves ociosas. A
+# varredura é O(tamanho da fatia), então amortizada fica O(1) por chamada.
+VARREDURA_A_CADA = 1024
+
+RATE_LIMIT_SQLITE_PATH_DEFAULT = "/tmp/forca-rate-limit.sqlite3"
+
+
+def _estimativa(agora: float, janela_s: float, indice: int, atual: int, anterior: int) -> Tuple[int, int, int, float]:
+    """
+    Avança o estado (indice, atual, anterior) até a janela de `agora` e devolve
+    (indice, atual, anterior, estimativa_da_janela_deslizante).
+    """
+    indice_agora = int(agora // janela_s)
+    if indice_agora != indice:
+        anterior = atual if indice_agora == indice + 1 else 0
+        atual = 0
+        indice = indice_agora
+    decorrido = (agora - indice * janela_s) / janela_s
+    return indice, atual, anterior, anterior * (1.0 - decorrido) + atual
+
+
+class RateLimiter:
+    """Contrato dos backends: `hit` registra a chamada e diz se estourou."""
+
+    def hit(self, bucket: str, key, limit: int, window_seconds: float) -> bool:
+        """True quando o limite foi excedido — e aí a chamada NÃO é contada."""
+        raise NotImplementedError
+
+    def limpar(self) -> None:
+        """Zera todos os contadores (testes e troca de configuração)."""
+        raise NotImplementedError
+
+
+class _Fatia:
+    __slots__ = ("lock", "entradas", "operacoes")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # chave -> [indice_da_janela, contagem_atual, contagem_anterior, janela_s]
+        self.entradas: Dict[Tuple[str, str], List] = {}
+        self.operacoes = 0
+
+
+class JanelaDeslizanteEmMemoria(RateLimiter):
+    """Backend por processo: dict fatiado, O(1) por chave, despejo de ociosos."""
+
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, relogio=time.monotonic):
+        self._fatias = [_Fatia() for _ in range(max(1, int(shards)))]
+        self._relogio = relogio
+
+    def _fatia(self, chave: Tuple[str, str]) -> _Fatia:
+        # crc32 e não hash(): estável entre execuções, então o teste de
+        # distribuição não depende de PYTHONHASHSEED.
+        bruto = "{}\0{}".format(*chave).encode("utf-8")
+        return self._fatias[zlib.crc32(bruto) % len(self._fatias)]
+
+    def hit(self, bucket, key, limit, window_seconds):
+        agora = self._relogio()
+        chave = (str(bucket), str(key))
+        janela_s = float(window_seconds)
+        fatia = self._fatia(chave)
+        with fatia.lock:
+            fatia.operacoes += 1
+            if fatia.operacoes % VARREDURA_A_CADA == 0:
+                self._despejar_ociosos(fatia, agora)
+
+            estado = fatia.entradas.get(chave)
+            if estado is None or estado[3] != janela_s:
+                estado = [int(agora // janela_s), 0, 0, janela_s]
+                fatia.entradas[chave] = estado
+            indice, atual, anterior, estimativa = _estimativa(
+                agora, janela_s, estado[0], estado[1], estado[2]
+            )
+            estado[0], estado[1], estado[2] = indice, atual, anterior
+            if estimativa >= limit:
+                return True
+            estado[1] += 1
+            return False
+
+    @staticmethod
+    def _despejar_ociosos(fatia: _Fatia, agora: float) -> None:
+        # Duas janelas sem chamada: o estado é indistinguível de uma chave
+        # nova, então apagá-lo não muda nenhuma decisão futura.
+        ociosas = [
+            chave
+            for chave, (indice, _atual, _anterior, janela_s) in fatia.entradas.items()
+            if agora >= (indice + 2) * janela_s
+        ]
+        for chave in ociosas:
+            del fatia.entradas[chave]
+
+    def despejar_ociosos(self) -> None:
+        agora = self._relogio()
+        for fatia in self._fatias:
+            with fatia.lock:
+                self._despejar_ociosos(fatia, agora)
+
+    def limpar(self):
+        for fatia in self._fatias:
+            with fatia.lock:
+                fatia.entradas.clear()
+                fatia.operacoes = 0
+
+    def __len__(self) -> int:
+        return sum(len(fatia.entradas) for fatia in self._fatias)
+
+
+class JanelaDeslizanteSqlite(RateLimiter):
+    """
+    Backend compartilhado entre processos: uma linha por chave num SQLite em
+    WAL. `BEGIN IMMEDIATE` serializa leitura-e-escrita da linha entre workers,
+    então o check-and-increment continua atômico com N processos.
+
+    Relógio de parede (time.time), e não monotônico: o estado é comparado
+    entre processos diferentes.
+
+    Falha ABERTA: esta é a barreira de burst, não o teto de custo (a quota
+    persistente segue falhando fechada). Um arquivo corrompido não pode
+    derrubar todas as rotas autenticadas do app.
+    """
+
+    def __init__(self, caminho: str, relogio=time.time):
+        self._caminho = caminho
+        self._relogio = relogio
+        self._local = threading.local()
+        self._operacoes = 0
+        self._conexao()  # cria a tabela já no startup: erro de caminho aparece no boot
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self._caminho, timeout=5.0, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                " chave TEXT PRIMARY KEY,"
+                " indice INTEGER NOT NULL,"
+                " atual INTEGER NOT NULL,"
+                " anterior INTEGER NOT NULL,"
+                " janela_s REAL NOT NULL,"
+                " expira_em REAL NOT NULL)"
+            )
+            conexao.execute("CREATE INDEX IF NOT EXISTS rate_limit_expira_em ON rate_limit (expira_em)")
+            self._local.conexao = conexao
+        return conexao
+
+    def hit(self, bucket, key, limit, window_seconds):
+        agora = self._relogio()
+        janela_s = float(window_seconds)
+        chave = "{}\0{}".format(bucket, key)
+        try:
+            conexao = self._conexao()
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                linha = conexao.execute(
+                    "SELECT indice, atual, anterior, janela_s FROM rate_limit WHERE chave = ?",
+                    (chave,),
+                ).fetchone()
+                if linha is None or linha[3] != janela_s:
+                    linha = (int(agora // janela_s), 0, 0, janela_s)
+                indice, atual, anterior, estimativa = _estimativa(
+                    agora, janela_s, linha[0], linha[1], linha[2]
+                )
+                excedido = estimativa >= limit
+                if not excedido:
+                    atual += 1
+                conexao.execute(
+                    "INSERT INTO rate_limit (chave, indice, atual, anterior, janela_s, expira_em)"
+                    " VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (chave) DO UPDATE SET indice = excluded.indice,"
+                    " atual = excluded.atual, anterior = excluded.anterior,"
+                    " janela_s = excluded.janela_s, expira_em = excluded.expira_em",
+                    (chave, indice, atual, anterior, janela_s, (indice + 2) * janela_s),
+                )
+                self._operacoes += 1
+                if self._operacoes % VARREDURA_A_CADA == 0:
+                    conexao.execute("DELETE FROM rate_limit WHERE expira_em <= ?", (agora,))
+                conexao.execute("COMMIT")
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            logger.exception("Rate limit (sqlite) indisponível; requisição liberada.")
+            return False
+        return excedido
+
+    def despejar_ociosos(self) -> None:
+        self._conexao().execute("DELETE FROM rate_limit WHERE expira_em <= ?", (self._relogio(),))
+
+    def limpar(self):
+        self._conexao().execute("DELETE FROM rate_limit")
+
+    def __len__(self) -> int:
+        return self._conexao().execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]
+
+
+def criar_rate_limiter(backend: Optional[str] = None) -> RateLimiter:
+    """Instancia o backend de RATE_LIMIT_BACKEND (memoria | sqlite)."""
+    escolhido = (backend or os.environ.get("RATE_LIMIT_BACKEND") or "memoria").strip().lower()
+    if escolhido == "sqlite":
+        caminho = os.environ.get("RATE_LIMIT_SQLITE_PATH") or RATE_LIMIT_SQLITE_PATH_DEFAULT
+        return JanelaDeslizanteSqlite(caminho)
+    if escolhido != "memoria":
+        logger.warning("RATE_LIMIT_BACKEND=%r desconhecido; usando 'memoria'.", escolhido)
+    return JanelaDeslizanteEmMemoria()
@@ -38,17 +38,32 @@ def _quota_ia_neutra(request, monkeypatch):
     responderiam 503 em vez do que o teste realmente quer verificar.
 
     Um teste que QUER exercitar a quota marca `@pytest.mark.quota_real` e
-    mocka `ai_quota._chamar_rpc` do seu jeito.
-    """
-    if request.node.get_closest_marker("quota_real"):
-        return
+    mocka `ai_quota._chamar_rpc` (ou `_chamar_rpc_async`, no modo ASGI) do
+    seu jeito.
 
+    No fim do teste, todo estado de processo registrado em
+    backend/utils/metricas.py volta a zero. Entre outros: ajustes que ficaram
+    na fila de segundo plano (enviados depois, iriam para a RPC real ou para o
+    mock do próximo), a sombra da quota (um teto estourado num teste recusaria
+    o mesmo usuário no seguinte sem nem chamar o mock), a calibração das
+    reservas (o `usage` dos testes anteriores mudaria o valor reservado), o
+    cache de diretrizes do consolidate-chat e o memo de moldes validados (a
+    mesma entrada em dois testes responderia o segundo sem chamar o mock).
+    """
     from backend.services import ai_quota
+    from backend.utils import metricas
 
-    def _rpc_permissiva(access_token, payload):
-        return {"permitido": True, "chamadas_dia": 1, "custo_dia_usd": 0.0}
+    if not request.node.get_closest_marker("quota_real"):
+        def _rpc_permissiva(access_token, payload):
+            return {"permitido": True, "chamadas_dia": 1, "custo_dia_usd": 0.0}
 
-    monkeypatch.setattr(ai_quota, "_chamar_rpc", _rpc_permissiva)
+        async def _rpc_permissiva_async(access_token, payload):
+            return _rpc_permissiva(access_token, payload)
+
+        monkeypatch.setattr(ai_quota, "_chamar_rpc", _rpc_permissiva)
+        monkeypatch.setattr(ai_quota, "_chamar_rpc_async", _rpc_permissiva_async)
+    yield
+    metricas.limpar_todas()
 
 
 def pytest_configure(config):
@@ -26,13 +26,15 @@ import pytest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from backend.utils.anthropic_retry import criar_mensagem_com_deadline  # noqa: E402
+from backend.utils.anthropic_retry import (  # noqa: E402
+    criar_mensagem_com_deadline, criar_mensagem_com_deadline_async,
+)
 
 HELPER = "criar_mensagem_com_deadline"
 BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
 
-def _call_sites():
+def _call_sites(helper=HELPER):
     """Devolve (arquivo, linha, n_posicionais, nomes_keyword) de cada chamada ao helper."""
     encontrados = []
     for raiz, _, arquivos in os.walk(BACKEND_DIR):
@@ -54,7 +56,7 @@ def _call_sites():
                     continue
                 alvo = no.func
                 chamado = getattr(alvo, "id", None) or getattr(alvo, "attr", None)
-                if chamado != HELPER:
+                if chamado != helper:
                     continue
                 # Chamadas com *args/**kwargs dinâmicos não são verificáveis estaticamente.
                 if any(isinstance(a, ast.Starred) for a in no.args):
@@ -99,6 +101,19 @@ def test_call_site_respeita_a_assinatura(sitio):
         )
 
 
+@pytest.mark.parametrize(
+    "sitio", _call_sites(HELPER + "_async"), ids=lambda s: f"{s[0]}:{s[1]}"
+)
+def test_call_site_async_respeita_a_assinatura(sitio):
+    """O par assíncrono (modo ASGI) tem a mesma assinatura e o mesmo risco."""
+    arquivo, linha, n_posicionais, keywords = sitio
+    assinatura = inspect.signature(criar_mensagem_com_deadline_async)
+    try:
+        assinatura.bind(*[mock.sentinel.arg] * n_posicionais, **{k: mock.sentinel.kw for k in keywords})
+    except TypeError as e:
+        pytest.fail(f"{arquivo}:{linha} chama {HELPER}_async() fora da assinatura: {e}")
+
+
 def test_pipeline_do_molde_nao_quebra_na_chamada_do_helper(monkeypatch):
     """Roda o pipeline do molde com autospec ligado — sem mock permissivo.
 
@@ -0,0 +1,163 @@
+# backend/tests/test_anthropic_clients.py
+# Registro de clientes Anthropic (backend/services/anthropic_clients.py):
+# 1. o mesmo perfil/família devolve o MESMO cliente entre jobs e rotas;
+# 2. requests em sequência reaproveitam a conexão keep-alive do pool, e as
+#    métricas mostram isso — também em /api/metrics (servidor HTTP local,
+#    sem rede externa);
+# 3. perfis têm pools separados — o molde não ocupa a vaga do chat;
+# 4. chave/timeout novos recriam o cliente sobre o mesmo pool;
+# 5. limites do pool e max_retries=0 chegam ao cliente.
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.services.anthropic_clients as ac  # noqa: E402
+from backend.utils import metricas  # noqa: E402
+
+RESPOSTA = {
+    "id": "msg_teste", "type": "message", "role": "assistant", "model": "claude-haiku-4-5",
+    "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+    "stop_sequence": None, "usage": {"input_tokens": 3, "output_tokens": 1},
+}
+
+
+class _Messages(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: a conexão fica aberta entre requests
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        corpo = json.dumps(RESPOSTA).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture()
+def api_local(monkeypatch):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Messages)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", "http://127.0.0.1:{}".format(servidor.server_port))
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    yield
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _registro_limpo():
+    ac.limpar_clientes()
+    yield
+    ac.limpar_clientes()
+
+
+def _perguntar(cliente):
+    return cliente.messages.create(
+        model="claude-haiku-4-5", max_tokens=8, messages=[{"role": "user", "content": "oi"}]
+    )
+
+
+def test_mesmo_perfil_e_familia_reaproveita_o_cliente():
+    a = ac.cliente_anthropic("molde", "claude-opus-5", "sk-teste", 240.0)
+    b = ac.cliente_anthropic("molde", "claude-opus-5-20261001", "sk-teste", 240.0)
+    assert a is b
+    assert ac.cliente_anthropic("molde", "claude-haiku-4-5", "sk-teste", 240.0) is not a
+
+
+def test_requests_em_sequencia_reusam_a_conexao(api_local):
+    for _ in range(3):  # três "jobs", cada um pedindo o cliente de novo
+        assert _perguntar(ac.cliente_anthropic("molde", "claude-opus-5", "sk-teste", 240.0)).id == "msg_teste"
+
+    molde = ac.estatisticas_de_clientes()["molde"]
+    assert molde["requests"] == 3
+    assert molde["conexoes"] == 1
+    assert molde["reuso"] == pytest.approx(2 / 3)
+    assert molde["familias"] == ["opus"]
+    assert metricas.coletar()["clientes_anthropic"]["molde"] == molde
+
+
+def test_perfis_tem_pools_separados(api_local):
+    chat = ac.cliente_anthropic("chat", "claude-haiku-4-5", "sk-teste", 25.0)
+    molde = ac.cliente_anthropic("molde", "claude-haiku-4-5", "sk-teste", 240.0)
+    assert chat._client is not molde._client
+
+    _perguntar(chat)
+    _perguntar(molde)
+    stats = ac.estatisticas_de_clientes()
+    assert stats["chat"]["conexoes"] == 1 and stats["molde"]["conexoes"] == 1
+
+
+def test_chave_ou_timeout_novos_recriam_o_cliente_no_mesmo_pool():
+    a = ac.cliente_anthropic("chat", "claude-haiku-4-5", "sk-antiga", 25.0)
+    b = ac.cliente_anthropic("chat", "claude-haiku-4-5", "sk-nova", 25.0)
+    c = ac.cliente_anthropic("chat", "claude-haiku-4-5", "sk-nova", 20.0)
+    assert len({id(a), id(b), id(c)}) == 3
+    assert a._client is b._client is c._client
+    assert (b.api_key, c.timeout) == ("sk-nova", 20.0)
+
+
+def test_limites_do_pool_e_sem_retry_do_sdk(monkeypatch):
+    monkeypatch.setattr(ac, "ANTHROPIC_POOL_MAX_CONNECTIONS", 7)
+    monkeypatch.setattr(ac, "ANTHROPIC_POOL_MAX_KEEPALIVE", 3)
+    cliente = ac.cliente_anthropic("treinador", "claude-sonnet-4-6", "sk-teste", 150.0)
+
+    pool = cliente._client._transport._pool
+    assert (pool._max_connections, pool._max_keepalive_connections) == (7, 3)
+    assert cliente.max_retries == 0
+
+
+@pytest.mark.parametrize("modelo, familia", [
+    ("claude-haiku-4-5", "haiku"),
+    ("claude-sonnet-4-6", "sonnet"),
+    ("claude-opus-5", "opus"),
+    ("modelo-novo", "outros"),
+    (None, "outros"),
+])
+def test_familia_do_modelo(modelo, familia):
+    assert ac.familia_do_modelo(modelo) == familia
+
+
+def test_cliente_async_e_por_event_loop_e_reusa_a_conexao(api_local):
+    import asyncio
+
+    async def _tres_perguntas():
+        clientes = []
+        for _ in range(3):
+            cliente = ac.cliente_anthropic_async("chat", "claude-haiku-4-5", "sk-teste", 25.0)
+            resposta = await cliente.messages.create(
+                model="claude-haiku-4-5", max_tokens=8, messages=[{"role": "user", "content": "oi"}]
+            )
+            assert resposta.id == "msg_teste"
+            clientes.append(cliente)
+        await ac.fechar_clientes_async()
+        return clientes
+
+    primeiro_loop = asyncio.run(_tres_perguntas())
+    segundo_loop = asyncio.run(_tres_perguntas())
+
+    assert primeiro_loop[0] is primeiro_loop[1] is primeiro_loop[2]
+    # Conexões assíncronas são do loop que as abriu: outro loop, outro pool.
+    assert segundo_loop[0] is not primeiro_loop[0]
+    assert segundo_loop[0]._client is not primeiro_loop[0]._client
+
+    chat = ac.estatisticas_de_clientes()["chat_async"]
+    assert chat["requests"] == 6
+    assert chat["conexoes"] == 2
+    # O pool síncrono do chat não foi tocado.
+    assert "chat" not in ac.estatisticas_de_clientes()
@@ -0,0 +1,427 @@
+# backend/tests/test_asgi.py
+# Modo ASGI (backend/asgi.py), via httpx.ASGITransport — sem servidor e sem
+# rede: o Supabase Auth e a API de mensagens são MockTransport assíncronos.
+# 1. carga: 64 chats simultâneos com a ponte WSGI em 4 threads — as 64
+#    chamadas ficam em voo no modelo ao mesmo tempo, sem uma thread por
+#    chamada, e /api/health responde no meio delas;
+# 2. acima de AI_ASYNC_MAX_CONCURRENT o próximo recebe 503 + Retry-After na
+#    hora, sem reservar quota, e a vaga volta quando a chamada termina;
+# 3. as mesmas respostas do modo WSGI: 401 antes de ler o corpo, 400 de
+#    validação, 413 acima de MAX_CONTENT_LENGTH, CORS;
+# 4. /api/chat em SSE, /api/consolidate-chat e o /api/generate-plan legado
+#    (geração e gravação awaitable);
+# 5. a quota é reservada pela RPC assíncrona e acertada com o usage.
+# 6. o app desconectando no meio do fluxo solta a vaga de IA.
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import unittest.mock as mock
+
+import anthropic
+import httpx
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app_module  # noqa: E402
+import backend.asgi as asgi  # noqa: E402
+from backend.services import ai_quota  # noqa: E402
+from backend.services.plan_repository import PlanPersistenceError  # noqa: E402
+
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+AUTH = {"Authorization": "Bearer token-valido"}
+CHAT = {"messages": [{"role": "user", "content": "Quero focar em peito"}], "questionnaireData": {"idade": 30}}
+DIRETRIZES = {"preferencias": ["sem perna nas duas primeiras semanas"], "restricoes": [], "excecoes_estruturais": []}
+
+
+def _mensagem(texto, output_tokens=37):
+    return {
+        "id": "msg_teste", "type": "message", "role": "assistant", "model": "claude-haiku-4-5",
+        "content": [{"type": "text", "text": texto}] if texto is not None else [],
+        "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": 120, "output_tokens": output_tokens},
+    }
+
+
+def _eventos_do_modelo(pedacos):
+    inicio = dict(_mensagem(None, 1), stop_reason=None)
+    eventos = [
+        ("message_start", {"type": "message_start", "message": inicio}),
+        ("content_block_start", {"type": "content_block_start", "index": 0,
+                                 "content_block": {"type": "text", "text": ""}}),
+    ]
+    for pedaco in pedacos:
+        eventos.append(("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                "delta": {"type": "text_delta", "text": pedaco}}))
+    eventos += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {"type": "message_delta",
+                           "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                           "usage": {"output_tokens": 37}}),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return "".join("event: {}\ndata: {}\n\n".format(n, json.dumps(d)) for n, d in eventos).encode()
+
+
+class _Modelo:
+    """
+    API de mensagens falsa. Conta as chamadas em voo e, com `segurar`, prende
+    cada uma até `soltar` — o que uma chamada lenta de verdade faria.
+    """
+
+    def __init__(self, texto="Bora treinar peito!", segurar=False):
+        self.texto = texto
+        self.segurar = segurar
+        self.soltar = asyncio.Event()
+        self.em_voo = 0
+        self.pico = 0
+        self.chamadas = 0
+
+    async def __call__(self, request):
+        pedido = json.loads(request.content)
+        self.chamadas += 1
+        self.em_voo += 1
+        self.pico = max(self.pico, self.em_voo)
+        try:
+            if self.segurar:
+                await asyncio.wait_for(self.soltar.wait(), 10)
+        finally:
+            self.em_voo -= 1
+        if pedido.get("stream"):
+            return httpx.Response(
+                200, headers={"Content-Type": "text/event-stream"},
+                content=_eventos_do_modelo(["Bora ", "treinar ", "peito!"]),
+            )
+        return httpx.Response(200, json=_mensagem(self.texto))
+
+    def cliente(self):
+        return anthropic.AsyncAnthropic(
+            api_key="sk-teste", max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self)),
+        )
+
+
+def _supabase_auth(request):
+    if request.headers.get("Authorization") != "Bearer token-valido":
+        return httpx.Response(401, json={"msg": "invalid JWT"})
+    return httpx.Response(200, json={"id": USER_ID, "email": "user@teste.com"})
+
+
+@pytest.fixture(autouse=True)
+def _ambiente(monkeypatch):
+    app_module._rate_limiter.limpar()
+    monkeypatch.setenv("SUPABASE_AUTH_VERIFICATION", "remote")
+    supabase = httpx.AsyncClient(transport=httpx.MockTransport(_supabase_auth))
+    monkeypatch.setattr("backend.utils.auth.cliente_http_async", lambda: supabase)
+    # As rotas da ponte continuam no @token_required síncrono.
+    resposta_auth = mock.Mock(status_code=200)
+    resposta_auth.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    monkeypatch.setattr("backend.utils.auth.requests.get", mock.Mock(return_value=resposta_auth))
+    monkeypatch.setattr(app_module, "CHAT_RATE_LIMIT", 1000)
+    monkeypatch.setattr(asgi, "_vagas", asgi.VagasDeIa(100))
+    # Acerto síncrono no event loop: nos testes, direto para o contador.
+    monkeypatch.setattr(ai_quota, "acertar_custo_real", mock.Mock())
+    yield
+
+
+def _rodar(corrotina_de, modelo=None):
+    """Roda `corrotina_de(cliente)` num loop novo, com o modelo falso no lugar do real."""
+    async def _principal():
+        with mock.patch.object(
+            app_module, "_get_chat_anthropic_client_async",
+            side_effect=lambda: modelo.cliente() if modelo else None,
+        ):
+            transporte = httpx.ASGITransport(app=asgi.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                return await corrotina_de(cliente)
+
+    return asyncio.run(_principal())
+
+
+# --- 1. Carga ------------------------------------------------------------------
+
+def test_chamadas_em_voo_passam_do_numero_de_threads(monkeypatch):
+    simultaneos = 64
+    monkeypatch.setattr(asgi, "ASGI_WSGI_THREADS", 4)
+    monkeypatch.setattr(asgi, "_ponte", None)
+    modelo = _Modelo(segurar=True)
+    threads_antes = threading.active_count()
+
+    async def _carga(cliente):
+        chats = [asyncio.ensure_future(cliente.post("/api/chat", json=CHAT, headers=AUTH))
+                 for _ in range(simultaneos)]
+        for _ in range(500):
+            if modelo.em_voo == simultaneos:
+                break
+            await asyncio.sleep(0.01)
+        em_voo = modelo.em_voo
+        threads_em_voo = threading.active_count()
+        health = await cliente.get("/api/health")
+        modelo.soltar.set()
+        return em_voo, threads_em_voo, health, await asyncio.gather(*chats)
+
+    em_voo, threads_em_voo, health, respostas = _rodar(_carga, modelo)
+    asgi._ponte.shutdown()
+
+    assert em_voo == simultaneos
+    assert modelo.pico == simultaneos
+    assert simultaneos > asgi.ASGI_WSGI_THREADS
+    # Nenhuma thread por chamada em voo.
+    assert threads_em_voo - threads_antes <= asgi.ASGI_WSGI_THREADS
+    assert health.status_code == 200 and health.json() == {"status": "ok"}
+    assert [r.status_code for r in respostas] == [200] * simultaneos
+    assert {r.json()["reply"] for r in respostas} == {"Bora treinar peito!"}
+    assert asgi._vagas.estatisticas() == {"vagas": 100, "em_voo": 0, "pico": simultaneos, "recusas": 0}
+
+
+# --- 2. Admissão -----------------------------------------------------------------
+
+def test_acima_do_teto_responde_503_na_hora_sem_reservar_quota(monkeypatch):
+    monkeypatch.setattr(asgi, "_vagas", asgi.VagasDeIa(2))
+    monkeypatch.setattr(app_module, "AI_SYNC_RETRY_AFTER_SECONDS", 7)
+    modelo = _Modelo(segurar=True)
+    reservas = []
+
+    async def _rpc(access_token, payload):
+        reservas.append(payload)
+        return {"permitido": True, "chamadas_dia": 1, "custo_dia_usd": 0.0}
+
+    monkeypatch.setattr(ai_quota, "_chamar_rpc_async", _rpc)
+
+    async def _lotar(cliente):
+        lentos = [asyncio.ensure_future(cliente.post("/api/chat", json=CHAT, headers=AUTH)) for _ in range(2)]
+        while modelo.em_voo < 2:
+            await asyncio.sleep(0.01)
+        recusado = await cliente.post("/api/consolidate-chat", json=CHAT, headers=AUTH)
+        modelo.soltar.set()
+        lentos = await asyncio.gather(*lentos)
+        depois = await cliente.post("/api/chat", json=CHAT, headers=AUTH)
+        return recusado, lentos, depois
+
+    recusado, lentos, depois = _rodar(_lotar, modelo)
+
+    assert recusado.status_code == 503
+    assert recusado.headers["Retry-After"] == "7"
+    assert recusado.json() == app_module._corpo_ia_ocupada()
+    assert len(reservas) == 3  # os dois lentos e o de depois; o recusado não
+    assert [r.status_code for r in lentos] == [200, 200]
+    assert depois.status_code == 200
+    assert asgi._vagas.estatisticas()["recusas"] == 1
+
+
+def test_quota_excedida_responde_429_e_solta_a_vaga(monkeypatch):
+    async def _rpc(access_token, payload):
+        return {"permitido": False, "motivo": "custo_dia", "chamadas_dia": 9, "custo_dia_usd": 5.0}
+
+    monkeypatch.setattr(ai_quota, "_chamar_rpc_async", _rpc)
+    modelo = _Modelo()
+
+    resposta = _rodar(lambda c: c.post("/api/chat", json=CHAT, headers=AUTH), modelo)
+
+    assert resposta.status_code == 429
+    assert modelo.chamadas == 0
+    assert asgi._vagas.estatisticas()["em_voo"] == 0
+
+
+# --- 3. Paridade com o modo WSGI ---------------------------------------------------
+
+@pytest.mark.parametrize("cabecalhos, erro", [
+    ({}, "Autenticação necessária."),
+    ({"Authorization": "Bearer token-ruim"}, "Sessão inválida ou expirada."),
+])
+def test_sem_sessao_valida_responde_401_como_o_flask(cabecalhos, erro):
+    resposta = _rodar(lambda c: c.post("/api/chat", json=CHAT, headers=cabecalhos))
+    assert resposta.status_code == 401
+    assert resposta.json() == {"error": erro}
+    assert resposta.content == app_module.app.json.response({"error": erro}).get_data()
+
+
+def test_validacao_responde_400_sem_chamar_o_modelo():
+    modelo = _Modelo()
+
+    async def _invalidos(cliente):
+        sem_json = await cliente.post("/api/chat", content=b"oi", headers=AUTH)
+        lista = await cliente.post("/api/chat", json=[1, 2], headers=AUTH)
+        sem_mensagens = await cliente.post("/api/chat", json={"questionnaireData": {}}, headers=AUTH)
+        return sem_json, lista, sem_mensagens
+
+    sem_json, lista, sem_mensagens = _rodar(_invalidos, modelo)
+
+    assert (sem_json.status_code, sem_json.json()) == (400, {"error": "Requisição inválida. Esperado JSON."})
+    assert (lista.status_code, lista.json()) == (400, {"error": "Corpo JSON inválido. Esperado objeto."})
+    assert sem_mensagens.status_code == 400
+    assert modelo.chamadas == 0
+
+
+@pytest.mark.parametrize("rota", ["/api/chat", "/api/manual-plan/preview"])
+def test_corpo_acima_do_limite_responde_413(rota):
+    grande = b'{"x": "' + b"a" * (app_module.app.config["MAX_CONTENT_LENGTH"] + 10) + b'"}'
+    resposta = _rodar(lambda c: c.post(
+        rota, content=grande, headers=dict(AUTH, **{"Content-Type": "application/json"}),
+    ))
+    assert resposta.status_code == 413
+
+
+def test_cors_igual_ao_do_flask():
+    origem = app_module.allowed_origins[0]
+
+    async def _com_origens(cliente):
+        permitida = await cliente.post("/api/chat", json={}, headers=dict(AUTH, Origin=origem))
+        estranha = await cliente.post("/api/chat", json={}, headers=dict(AUTH, Origin="https://mal.example"))
+        preflight = await cliente.options("/api/chat", headers={
+            "Origin": origem, "Access-Control-Request-Method": "POST",
+        })
+        return permitida, estranha, preflight
+
+    permitida, estranha, preflight = _rodar(_com_origens)
+
+    assert permitida.headers["Access-Control-Allow-Origin"] == origem
+    assert "Origin" in permitida.headers["Vary"]
+    assert "Access-Control-Allow-Origin" not in estranha.headers
+    assert preflight.headers["Access-Control-Allow-Origin"] == origem  # pela ponte
+
+
+# --- 4. Rotas nativas ------------------------------------------------------------------
+
+def test_chat_em_fluxo_entrega_deltas_e_acerta_a_quota():
+    modelo = _Modelo()
+    resposta = _rodar(lambda c: c.post(
+        "/api/chat", json=CHAT, headers=dict(AUTH, Accept="text/event-stream"),
+    ), modelo)
+
+    assert resposta.status_code == 200
+    assert resposta.headers["Content-Type"].startswith("text/event-stream")
+    assert resposta.headers["Cache-Control"] == "no-cache"
+    blocos = [b for b in resposta.text.split("\n\n") if b]
+    deltas = [json.loads(b.split("data: ", 1)[1])["text"] for b in blocos if b.startswith("event: delta")]
+    assert deltas == ["Bora ", "treinar ", "peito!"]
+    assert blocos[-1].startswith("event: done")
+    assert json.loads(blocos[-1].split("data: ", 1)[1]) == {"reply": "Bora treinar peito!"}
+    usage = ai_quota.acertar_custo_real.call_args.args[4]
+    assert (usage.input_tokens, usage.output_tokens) == (120, 37)
+    assert asgi._vagas.estatisticas()["em_voo"] == 0
+
+
+def test_consolidate_devolve_as_diretrizes_validadas():
+    modelo = _Modelo(texto=json.dumps(DIRETRIZES))
+    resposta = _rodar(lambda c: c.post("/api/consolidate-chat", json=CHAT, headers=AUTH), modelo)
+
+    assert resposta.status_code == 200
+    assert resposta.json()["diretrizes"]["preferencias"] == DIRETRIZES["preferencias"]
+    assert ai_quota.acertar_custo_real.call_args.args[1] == "consolidate"
+
+
+def _plano_valido():
+    return {
+        "treinamento_id": "0b6c1c2d-1111-4222-8333-444455556666",
+        "plano_principal": {
+            "nome": "Plano Teste",
+            "ciclos": [{"microciclos": [{"semana": 1, "sessoes": [
+                {"nome": "Treino A", "dia_semana": "segunda", "exercicios": [
+                    {"nome": "Supino", "ordem": 1, "series": 3, "repeticoes": "8-12"}
+                ]}
+            ]}]}],
+        },
+    }
+
+
+class _TreinadorAssincrono:
+    def __init__(self, plano):
+        self._plano = plano
+
+    async def gerar_plano_async(self, dados_usuario):
+        await asyncio.sleep(0)
+        return self._plano
+
+
+def _gerar_plano(cliente):
+    return cliente.post(
+        "/api/generate-plan", json={"questionnaireData": {"nivelExperiencia": "iniciante"}}, headers=AUTH,
+    )
+
+
+def test_plano_legado_gera_e_grava_sem_bloquear(monkeypatch):
+    monkeypatch.setattr(app_module, "FORCA_USE_MOLDE_ARCHITECTURE", False)
+    monkeypatch.setattr(app_module, "treinador", _TreinadorAssincrono(_plano_valido()))
+    persistir = mock.AsyncMock(return_value="db-plan-42")
+    monkeypatch.setattr(asgi, "persistir_plano_async", persistir)
+
+    resposta = _rodar(_gerar_plano)
+
+    assert resposta.status_code == 200
+    assert resposta.json()["plan_id"] == "db-plan-42"
+    mapeado = persistir.await_args.args[0]
+    assert mapeado["plan"]["user_id"] == USER_ID
+    assert persistir.await_args.kwargs["access_token"] == "token-valido"
+    assert USER_ID not in app_module._plan_inflight
+
+
+def test_plano_legado_com_falha_na_gravacao_responde_502(monkeypatch):
+    monkeypatch.setattr(app_module, "FORCA_USE_MOLDE_ARCHITECTURE", False)
+    monkeypatch.setattr(app_module, "treinador", _TreinadorAssincrono(_plano_valido()))
+    monkeypatch.setattr(asgi, "persistir_plano_async", mock.AsyncMock(
+        side_effect=PlanPersistenceError("banco indisponível"),
+    ))
+
+    resposta = _rodar(_gerar_plano)
+
+    assert resposta.status_code == 502
+    assert "plan_id" not in resposta.json()
+
+
+def test_modo_molde_vai_pela_ponte(monkeypatch):
+    monkeypatch.setattr(app_module, "FORCA_USE_MOLDE_ARCHITECTURE", True)
+    assert asgi._rota_nativa({"method": "POST", "path": "/api/generate-plan"}) is None
+    assert asgi._rota_nativa({"method": "POST", "path": "/api/chat"}) is asgi._chat
+    assert asgi._rota_nativa({"method": "GET", "path": "/api/chat"}) is None
+
+
+def test_desconexao_no_meio_do_fluxo_solta_a_vaga():
+    modelo = _Modelo(segurar=True)
+    corpo = json.dumps(CHAT).encode()
+    enviados = []
+
+    async def _principal():
+        desconectar = asyncio.Event()
+        pedidos = iter([{"type": "http.request", "body": corpo, "more_body": False}])
+
+        async def receive():
+            try:
+                return next(pedidos)
+            except StopIteration:
+                await desconectar.wait()
+                return {"type": "http.disconnect"}
+
+        async def send(mensagem):
+            enviados.append(mensagem)
+
+        scope = {
+            "type": "http", "method": "POST", "path": "/api/chat", "query_string": b"",
+            "headers": [
+                (b"authorization", b"Bearer token-valido"),
+                (b"content-type", b"application/json"),
+                (b"accept", b"text/event-stream"),
+            ],
+        }
+        with mock.patch.object(app_module, "_get_chat_anthropic_client_async", side_effect=modelo.cliente):
+            atendimento = asyncio.ensure_future(asgi.app(scope, receive, send))
+            while modelo.em_voo < 1:
+                await asyncio.sleep(0.01)
+            assert asgi._vagas.estatisticas()["em_voo"] == 1
+            desconectar.set()  # o app fechou a tela com o modelo ainda gerando
+            await asyncio.wait_for(atendimento, 5)
+
+    asyncio.run(_principal())
+
+    assert enviados[0]["type"] == "http.response.start" and enviados[0]["status"] == 200
+    assert asgi._vagas.estatisticas()["em_voo"] == 0
+    assert modelo.em_voo == 0
+    assert ai_quota.acertar_custo_real.call_count == 0  # sem usage final, fica a reserva
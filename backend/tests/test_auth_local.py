@@ -0,0 +1,304 @@
+# backend/tests/test_auth_local.py
+# Verificação local do JWT do Supabase (SUPABASE_AUTH_VERIFICATION=local):
+# 1. token válido passa SEM chamar o Supabase Auth, e o 2º request sai do cache;
+# 2. tudo que não prova "usuário logado deste projeto" é 401 (assinatura,
+#    exp, aud, role anon/service_role, alg none, sub fora de UUID);
+# 3. o cache nunca estende a vida do token (exp vence o TTL) e é limitado;
+# 4. a checagem de revogação (opt-in) consulta o Supabase por token NOVO;
+# 5. ES256 via JWKS publicado pelo projeto; a busca do JWKS roda fora do lock,
+#    uma thread por vez, e releitura que falha mantém as chaves na carência;
+# 6. o modo default (remote) continua sendo o GET /auth/v1/user de sempre.
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import unittest.mock as mock
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+os.environ.pop("ANTHROPIC_API_KEY", None)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from backend.app import app  # noqa: E402
+from backend.utils import auth, jwt_local  # noqa: E402
+
+SEGREDO = "segredo-jwt-de-teste-com-32-bytes!!"
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode("ascii")
+
+
+def _claims(**extra):
+    claims = {
+        "sub": USER_ID,
+        "email": "user@teste.com",
+        "role": "authenticated",
+        "aud": "authenticated",
+        "iss": "https://teste.supabase.co/auth/v1",
+        "iat": int(time.time()) - 10,
+        "exp": int(time.time()) + 3600,
+    }
+    claims.update(extra)
+    return {k: v for k, v in claims.items() if v is not None}
+
+
+def _token_hs256(segredo=SEGREDO, alg="HS256", **extra):
+    header = _b64(json.dumps({"alg": alg, "typ": "JWT"}).encode())
+    corpo = _b64(json.dumps(_claims(**extra)).encode())
+    entrada = "{}.{}".format(header, corpo).encode()
+    assinatura = hmac.new(segredo.encode(), entrada, hashlib.sha256).digest()
+    return "{}.{}.{}".format(header, corpo, _b64(assinatura))
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setenv("SUPABASE_AUTH_VERIFICATION", "local")
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SEGREDO)
+    monkeypatch.delenv("SUPABASE_AUTH_REVOCATION_CHECK", raising=False)
+    auth._cache_de_tokens.limpar()
+    jwt_local._jwks.limpar()
+    app.config["TESTING"] = True
+    with app.test_client() as test_client:
+        yield test_client
+    auth._cache_de_tokens.limpar()
+
+
+def _get_catalogo(client, token):
+    return client.get("/api/exercise-catalog", headers={"Authorization": "Bearer " + token})
+
+
+def _sem_rede():
+    return mock.patch(
+        "backend.utils.auth.requests.get",
+        side_effect=AssertionError("o modo local não pode chamar o Supabase Auth"),
+    )
+
+
+def test_token_valido_passa_sem_rede_e_segundo_request_sai_do_cache(client):
+    token = _token_hs256()
+    verificacoes = mock.Mock(wraps=jwt_local.verificar_jwt)
+    with _sem_rede(), mock.patch("backend.utils.auth.verificar_jwt", verificacoes):
+        primeira = _get_catalogo(client, token)
+        segunda = _get_catalogo(client, token)
+
+    assert primeira.status_code == 200
+    assert segunda.status_code == 200
+    assert verificacoes.call_count == 1
+
+
+@pytest.mark.parametrize("token_ruim", [
+    lambda: _token_hs256(segredo="outro-segredo"),
+    lambda: _token_hs256(exp=int(time.time()) - 1),
+    lambda: _token_hs256(aud="outra-audiencia"),
+    lambda: _token_hs256(role="anon", sub=None),
+    lambda: _token_hs256(role="service_role"),
+    lambda: _token_hs256(sub="nao-e-uuid"),
+    lambda: _token_hs256(iss="https://outro-projeto.supabase.co/auth/v1"),
+    lambda: _token_hs256(nbf=int(time.time()) + 3600),
+    lambda: _token_hs256(alg="none").rsplit(".", 1)[0] + ".",
+    lambda: "isto-nao-e-um-jwt",
+])
+def test_token_que_nao_prova_usuario_logado_e_401(client, token_ruim):
+    with _sem_rede():
+        response = _get_catalogo(client, token_ruim())
+    assert response.status_code == 401
+    assert len(auth._cache_de_tokens) == 0
+
+
+def test_hs256_sem_segredo_configurado_e_recusado(client, monkeypatch):
+    monkeypatch.delenv("SUPABASE_JWT_SECRET")
+    with _sem_rede():
+        response = _get_catalogo(client, _token_hs256())
+    assert response.status_code == 401
+
+
+def test_cache_nunca_estende_a_vida_do_token():
+    cache = jwt_local.CacheDeTokens(max_entradas=10, ttl_seconds=600)
+    cache.guardar("t", {"id": USER_ID}, exp=1_000.0, agora=900.0)
+
+    assert cache.obter("t", agora=999.0) == {"id": USER_ID}
+    assert cache.obter("t", agora=1_000.0) is None
+
+
+def test_cache_respeita_ttl_quando_o_token_vive_mais():
+    cache = jwt_local.CacheDeTokens(max_entradas=10, ttl_seconds=60)
+    cache.guardar("t", {"id": USER_ID}, exp=10_000.0, agora=0.0)
+
+    assert cache.obter("t", agora=59.0) is not None
+    assert cache.obter("t", agora=61.0) is None
+
+
+def test_cache_e_limitado_e_descarta_o_menos_usado():
+    cache = jwt_local.CacheDeTokens(max_entradas=2, ttl_seconds=60)
+    cache.guardar("a", {"id": "a"}, exp=100.0, agora=0.0)
+    cache.guardar("b", {"id": "b"}, exp=100.0, agora=0.0)
+    cache.obter("a", agora=1.0)
+    cache.guardar("c", {"id": "c"}, exp=100.0, agora=1.0)
+
+    assert len(cache) == 2
+    assert cache.obter("b", agora=2.0) is None
+    assert cache.obter("a", agora=2.0) == {"id": "a"}
+
+
+def test_cache_guarda_hash_e_nao_o_token():
+    cache = jwt_local.CacheDeTokens(max_entradas=2, ttl_seconds=60)
+    cache.guardar("token-secreto", {"id": USER_ID}, exp=100.0, agora=0.0)
+    assert "token-secreto" not in repr(cache._entradas)
+
+
+def test_checagem_de_revogacao_consulta_o_supabase_uma_vez_por_token(client, monkeypatch):
+    monkeypatch.setenv("SUPABASE_AUTH_REVOCATION_CHECK", "true")
+    remoto = mock.Mock(status_code=200)
+    remoto.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    token = _token_hs256()
+    with mock.patch("backend.utils.auth.requests.get", return_value=remoto) as get:
+        assert _get_catalogo(client, token).status_code == 200
+        assert _get_catalogo(client, token).status_code == 200
+    assert get.call_count == 1
+
+
+def test_token_revogado_no_supabase_e_401_mesmo_com_assinatura_valida(client, monkeypatch):
+    monkeypatch.setenv("SUPABASE_AUTH_REVOCATION_CHECK", "true")
+    revogado = mock.Mock(status_code=401)
+    with mock.patch("backend.utils.auth.requests.get", return_value=revogado):
+        response = _get_catalogo(client, _token_hs256())
+    assert response.status_code == 401
+    assert len(auth._cache_de_tokens) == 0
+
+
+def test_es256_confere_contra_o_jwks_do_projeto(client):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+
+    privada = ec.generate_private_key(ec.SECP256R1())
+    numeros = privada.public_key().public_numbers()
+    jwk = {
+        "kty": "EC", "crv": "P-256", "kid": "chave-1", "alg": "ES256",
+        "x": _b64(numeros.x.to_bytes(32, "big")),
+        "y": _b64(numeros.y.to_bytes(32, "big")),
+    }
+    header = _b64(json.dumps({"alg": "ES256", "kid": "chave-1", "typ": "JWT"}).encode())
+    corpo = _b64(json.dumps(_claims()).encode())
+    entrada = "{}.{}".format(header, corpo).encode()
+    r, s = decode_dss_signature(privada.sign(entrada, ec.ECDSA(hashes.SHA256())))
+    token = "{}.{}.{}".format(header, corpo, _b64(r.to_bytes(32, "big") + s.to_bytes(32, "big")))
+    adulterado = "{}.{}.{}".format(
+        header, _b64(json.dumps(_claims(sub="00000000-0000-4000-8000-000000000000")).encode()),
+        token.rsplit(".", 1)[1],
+    )
+
+    resposta_jwks = mock.Mock(status_code=200)
+    resposta_jwks.json.return_value = {"keys": [jwk]}
+    # auth e jwt_local compartilham o mesmo `requests`: todo GET feito aqui
+    # tem de ser o do JWKS, nunca o /auth/v1/user.
+    with mock.patch("backend.utils.jwt_local.requests.get", return_value=resposta_jwks) as get:
+        assert _get_catalogo(client, token).status_code == 200
+        assert _get_catalogo(client, adulterado).status_code == 401
+
+    assert {chamada[0][0] for chamada in get.call_args_list} == {
+        "https://teste.supabase.co/auth/v1/.well-known/jwks.json"
+    }
+    assert get.call_count == 1
+
+
+def test_jwks_fora_do_ar_e_503_e_nao_401(client):
+    import requests
+
+    header = _b64(json.dumps({"alg": "ES256", "kid": "k"}).encode())
+    token = "{}.{}.{}".format(header, _b64(json.dumps(_claims()).encode()), _b64(b"x" * 64))
+    with mock.patch(
+        "backend.utils.jwt_local.requests.get", side_effect=requests.ConnectionError("fora")
+    ):
+        response = _get_catalogo(client, token)
+    assert response.status_code == 503
+
+
+URL_JWKS = "https://teste.supabase.co/auth/v1/.well-known/jwks.json"
+JWK = {"kty": "EC", "crv": "P-256", "kid": "chave-1", "x": "x", "y": "y"}
+
+
+def _resposta_jwks(*jwks):
+    resposta = mock.Mock(status_code=200)
+    resposta.json.return_value = {"keys": list(jwks)}
+    return resposta
+
+
+def test_releitura_do_jwks_que_falha_mantem_as_chaves_na_carencia():
+    import requests
+
+    chaves = jwt_local.ChavesJwks(ttl_seconds=600, carencia_seconds=3600)
+    with mock.patch("backend.utils.jwt_local.requests.get", return_value=_resposta_jwks(JWK)):
+        assert chaves.chave(URL_JWKS, "chave-1") == JWK
+
+    chaves._lido_em -= 700  # TTL vencido
+    with mock.patch(
+        "backend.utils.jwt_local.requests.get", side_effect=requests.ConnectionError("fora")
+    ) as get:
+        assert chaves.chave(URL_JWKS, "chave-1") == JWK
+        assert chaves.chave(URL_JWKS, "chave-1") == JWK
+        assert get.call_count == 1, "depois da falha, o piso vale antes de tentar de novo"
+        with pytest.raises(RuntimeError):
+            chaves.chave(URL_JWKS, "chave-nova")  # kid que o JWKS velho não tem
+
+        chaves._lido_em -= 3600  # passou da carência
+        chaves._tentado_em -= jwt_local.JWKS_REFRESH_MIN_INTERVAL_SECONDS + 1
+        with pytest.raises(RuntimeError):
+            chaves.chave(URL_JWKS, "chave-1")
+
+
+def test_busca_do_jwks_fora_do_lock_e_uma_por_vez():
+    chaves = jwt_local.ChavesJwks(ttl_seconds=600)
+    with mock.patch("backend.utils.jwt_local.requests.get", return_value=_resposta_jwks(JWK)):
+        chaves.chave(URL_JWKS, "chave-1")
+    chaves._lido_em -= 700
+
+    liberar = threading.Event()
+    buscando = threading.Event()
+    nova = dict(JWK, kid="chave-2")
+
+    def _get_lento(*_args, **_kwargs):
+        buscando.set()
+        liberar.wait(5)
+        return _resposta_jwks(JWK, nova)
+
+    resultados = {}
+    with mock.patch("backend.utils.jwt_local.requests.get", side_effect=_get_lento) as get:
+        dono = threading.Thread(target=lambda: resultados.update(dono=chaves.chave(URL_JWKS, "chave-1")))
+        dono.start()
+        assert buscando.wait(5)
+        # Com a busca presa no Supabase, quem tem a chave não espera...
+        assert chaves.chave(URL_JWKS, "chave-1") == JWK
+        # ...e quem não tem espera a MESMA busca, sem abrir outra.
+        espera = threading.Thread(target=lambda: resultados.update(espera=chaves.chave(URL_JWKS, "chave-2")))
+        espera.start()
+        liberar.set()
+        dono.join(5)
+        espera.join(5)
+
+    assert resultados == {"dono": JWK, "espera": nova}
+    assert get.call_count == 1
+
+
+def test_modo_remoto_continua_sendo_o_default(monkeypatch):
+    monkeypatch.delenv("SUPABASE_AUTH_VERIFICATION", raising=False)
+    remoto = mock.Mock(status_code=200)
+    remoto.json.return_value = {"id": USER_ID}
+    app.config["TESTING"] = True
+    with app.test_client() as client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=remoto) as get:
+        _get_catalogo(client, "token-opaco")
+        _get_catalogo(client, "token-opaco")
+    assert get.call_count == 2
@@ -0,0 +1,142 @@
+# backend/tests/test_cache_consolidacao.py
+# Cache endereçado por conteúdo do /api/consolidate-chat
+# (backend/services/cache_consolidacao.py):
+# 1. o mesmo histórico reenviado responde do cache — sem modelo e sem reserva
+#    de quota;
+# 2. qualquer parte da chave mudando (mensagem, questionário, flag de
+#    structured output) é outra consulta ao modelo;
+# 3. com structured output, o assistant final descartado não muda a chave;
+# 4. resposta que não passou na validação nunca é guardada;
+# 5. TTL vencido e TTL 0 voltam ao modelo; métricas de acerto.
+
+import json
+import os
+import sys
+import types
+import unittest.mock as mock
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app_module  # noqa: E402
+import backend.services.cache_consolidacao as cc  # noqa: E402
+from backend.app import app  # noqa: E402
+from backend.utils import metricas  # noqa: E402
+
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+DIRETRIZES = {"preferencias": ["focar em peito"], "restricoes": [], "excecoes_estruturais": []}
+HISTORICO = [
+    {"role": "user", "content": "Quero focar em peito"},
+    {"role": "assistant", "content": "Combinado!"},
+]
+
+
+@pytest.fixture()
+def client():
+    app_module._rate_limiter.limpar()
+    resposta_auth = mock.Mock(status_code=200)
+    resposta_auth.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    app.config["TESTING"] = True
+    with app.test_client() as test_client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=resposta_auth):
+        yield test_client
+
+
+@pytest.fixture()
+def modelo():
+    cliente = mock.Mock()
+    cliente.messages.create.return_value = types.SimpleNamespace(
+        content=[types.SimpleNamespace(type="text", text=json.dumps(DIRETRIZES))], usage=None,
+    )
+    with mock.patch("backend.app._get_chat_anthropic_client", return_value=cliente), \
+         mock.patch("backend.app._reservar_quota_ia", wraps=app_module._reservar_quota_ia) as reserva:
+        cliente.reserva = reserva
+        yield cliente
+
+
+def _consolidar(client, historico=HISTORICO, questionario=None):
+    return client.post(
+        "/api/consolidate-chat",
+        json={"messages": historico, "questionnaireData": questionario or {"idade": 30}},
+        headers={"Authorization": "Bearer token-valido"},
+    )
+
+
+def test_reenvio_do_mesmo_historico_nao_chama_modelo_nem_reserva_quota(client, modelo):
+    primeira = _consolidar(client)
+    segunda = _consolidar(client)
+
+    assert primeira.status_code == segunda.status_code == 200
+    assert segunda.get_json() == primeira.get_json() == {"diretrizes": DIRETRIZES}
+    assert modelo.messages.create.call_count == 1
+    assert modelo.reserva.call_count == 1
+    assert cc.estatisticas_de_consolidacao() == {
+        "acertos": 1, "faltas": 1, "entradas": 1, "taxa_de_acerto": 0.5,
+    }
+    assert metricas.coletar()["cache_de_consolidacao"] == cc.estatisticas_de_consolidacao()
+
+
+def test_cada_parte_da_chave_muda_a_consulta(client, modelo, monkeypatch):
+    _consolidar(client)
+    _consolidar(client, historico=HISTORICO + [{"role": "user", "content": "E sem perna"}])
+    _consolidar(client, questionario={"idade": 31})
+    monkeypatch.setattr(app_module, "FORCA_STRUCTURED_OUTPUT", True)
+    _consolidar(client)
+
+    assert modelo.messages.create.call_count == 4
+    assert cc.estatisticas_de_consolidacao()["acertos"] == 0
+
+
+def test_assistant_final_descartado_nao_muda_a_chave(client, modelo, monkeypatch):
+    monkeypatch.setattr(app_module, "FORCA_STRUCTURED_OUTPUT", True)
+    _consolidar(client, historico=HISTORICO)
+    _consolidar(client, historico=HISTORICO[:1])
+
+    assert modelo.messages.create.call_count == 1
+
+
+def test_diretrizes_invalidas_nao_sao_guardadas(client, modelo):
+    modelo.messages.create.return_value = types.SimpleNamespace(
+        content=[types.SimpleNamespace(type="text", text='{"preferencias": "não é lista"}')], usage=None,
+    )
+    assert _consolidar(client).status_code == 502
+    assert _consolidar(client).status_code == 502
+
+    assert modelo.messages.create.call_count == 2
+    assert cc.estatisticas_de_consolidacao()["entradas"] == 0
+
+
+def test_ttl_vencido_volta_ao_modelo(client, modelo, monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cc.time, "monotonic", lambda: agora[0])
+    _consolidar(client)
+    agora[0] += cc.CONSOLIDATE_CACHE_TTL_SECONDS + 1
+    _consolidar(client)
+
+    assert modelo.messages.create.call_count == 2
+
+
+def test_ttl_zero_desliga_o_cache(client, modelo, monkeypatch):
+    monkeypatch.setattr(cc, "CONSOLIDATE_CACHE_TTL_SECONDS", 0)
+    _consolidar(client)
+    _consolidar(client)
+
+    assert modelo.messages.create.call_count == 2
+    assert cc.estatisticas_de_consolidacao()["entradas"] == 0
+
+
+def test_lru_respeita_o_teto_e_devolve_copia(monkeypatch):
+    monkeypatch.setattr(cc, "CONSOLIDATE_CACHE_MAX", 2)
+    for chave in ("a", "b", "c"):
+        cc.guardar_diretrizes(chave, {"chave": chave})
+
+    assert cc.obter_diretrizes("a") is None
+    copia = cc.obter_diretrizes("c")
+    copia["chave"] = "mexido"
+    assert cc.obter_diretrizes("c") == {"chave": "c"}
@@ -0,0 +1,185 @@
+# backend/tests/test_cache_molde.py
+# Memo de moldes validados e voo único (backend/services/cache_molde.py):
+# 1. regenerar com a mesma entrada depois de uma falha ao salvar pula direto
+#    para a expansão — sem outra geração paga;
+# 2. diretrizes diferentes são outra geração; molde reprovado nunca é guardado;
+# 3. dois pedidos idênticos ao mesmo tempo dividem UMA geração;
+# 4. se a geração em voo falha, quem esperava gera por conta própria;
+# 5. TTL e teto de entradas.
+
+import copy
+import json
+import os
+import sys
+import threading
+import types
+import unittest.mock as mock
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.services.cache_molde as cm  # noqa: E402
+import backend.services.job_manager as jm  # noqa: E402
+from backend.app import _executar_geracao_molde, app  # noqa: E402
+from backend.services.plan_repository import PlanPersistenceError  # noqa: E402
+from backend.utils import metricas  # noqa: E402
+
+MOLDE_VALIDO = {
+    "nome": "Plano Teste",
+    "frequencia_semanal": 1,
+    "semanas_tipo": [{
+        "id": "tipo_a", "nome": "A",
+        "sessoes": [{
+            "nome": "Treino A", "tipo": "Hipertrofia", "dia_offset": 0,
+            "grupos_musculares": [{"nome": "Peito"}],
+            "exercicios": [{"nome": "Supino", "ordem": 1, "series": 3, "repeticoes": "10"}],
+        }],
+    }],
+    "calendario": ["tipo_a"] * 4,
+    "progressao": {"regras": []},
+}
+DIRETRIZES = {"preferencias": [], "restricoes": [], "excecoes_estruturais": []}
+
+
+def _resposta(molde):
+    return types.SimpleNamespace(
+        content=[types.SimpleNamespace(type="text", text=json.dumps(molde))], stop_reason="end_turn",
+    )
+
+
+def _gerar(monkeypatch, respostas, persistir, diretrizes=DIRETRIZES):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
+    monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
+    job, _ = jm.criar_job(user_id="user-memo-{}".format(len(jm._jobs)))
+    with mock.patch(
+        "backend.utils.anthropic_retry.criar_mensagem_com_deadline", side_effect=respostas,
+    ) as chamada, mock.patch("backend.app.persistir_plano", persistir), app.app_context():
+        _executar_geracao_molde(
+            job, {"nivelExperiencia": "iniciante"}, diretrizes, job.user_id, "fake-token",
+        )
+    return job.to_dict(), chamada
+
+
+def test_regenerar_depois_de_falha_ao_salvar_nao_paga_outro_molde(monkeypatch):
+    jm.limpar_jobs()
+    falhou, primeira = _gerar(
+        monkeypatch, [_resposta(MOLDE_VALIDO)],
+        mock.Mock(side_effect=PlanPersistenceError("rpc fora")),
+    )
+    salvo, segunda = _gerar(monkeypatch, [], mock.Mock(return_value="db-plan-memo"))
+
+    assert falhou["error"]["code"] == "persist_error"
+    assert salvo["status"] == "salvo"
+    assert primeira.call_count == 1 and segunda.call_count == 0
+    assert cm.estatisticas_de_moldes()["acertos"] == 1
+    assert metricas.coletar()["cache_de_moldes"] == cm.estatisticas_de_moldes()
+
+
+def test_outra_entrada_ou_molde_reprovado_sempre_geram(monkeypatch):
+    jm.limpar_jobs()
+    persistir = mock.Mock(return_value="db-plan-memo")
+    _gerar(monkeypatch, [_resposta(MOLDE_VALIDO)], persistir)
+    _, outra = _gerar(
+        monkeypatch, [_resposta(MOLDE_VALIDO)], persistir,
+        diretrizes={**DIRETRIZES, "preferencias": ["sem perna"]},
+    )
+    assert outra.call_count == 1
+
+    reprovado = copy.deepcopy(MOLDE_VALIDO)
+    reprovado["semanas_tipo"][0]["sessoes"][0]["exercicios"][0]["series"] = 99
+    diretrizes = {**DIRETRIZES, "preferencias": ["reprovado"]}
+    erro, _ = _gerar(monkeypatch, [_resposta(reprovado)] * 2, persistir, diretrizes=diretrizes)
+    _, de_novo = _gerar(monkeypatch, [_resposta(MOLDE_VALIDO)], persistir, diretrizes=diretrizes)
+
+    assert erro["error"]["code"] == "molde_validation"
+    assert de_novo.call_count == 1
+
+
+class _EventoObservado(threading.Event):
+    """Event que avisa quando alguém passa a esperar nele."""
+
+    esperando = None
+
+    def wait(self, timeout=None):
+        _EventoObservado.esperando.release()
+        return super().wait(timeout)
+
+
+def _em_paralelo(monkeypatch, gerar, quantos=2):
+    _EventoObservado.esperando = threading.Semaphore(0)
+    monkeypatch.setattr(cm, "threading", types.SimpleNamespace(Event=_EventoObservado))
+    resultados = []
+    threads = [
+        threading.Thread(target=lambda: resultados.append(cm.molde_com_voo_unico("k", gerar)))
+        for _ in range(quantos)
+    ]
+    for t in threads:
+        t.start()
+    return threads, resultados
+
+
+def test_pedidos_identicos_simultaneos_dividem_uma_geracao(monkeypatch):
+    soltar = threading.Event()
+    chamadas = []
+
+    def gerar():
+        chamadas.append(1)
+        assert soltar.wait(5)
+        return {"molde": 1}
+
+    threads, resultados = _em_paralelo(monkeypatch, gerar)
+    assert _EventoObservado.esperando.acquire(timeout=5), "o segundo pedido não esperou o voo"
+    soltar.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(chamadas) == 1
+    assert sorted(origem for _, origem in resultados) == ["gerado", "voo"]
+    assert all(molde == {"molde": 1} for molde, _ in resultados)
+    assert resultados[0][0] is not resultados[1][0]
+
+
+def test_falha_do_voo_passa_a_vez_para_quem_esperava(monkeypatch):
+    soltar = threading.Event()
+    chamadas = []
+
+    def gerar():
+        chamadas.append(1)
+        if len(chamadas) == 1:
+            assert soltar.wait(5)
+            return None  # o primeiro job falhou (quota dele, API, molde reprovado)
+        return {"molde": 2}
+
+    threads, resultados = _em_paralelo(monkeypatch, gerar)
+    assert _EventoObservado.esperando.acquire(timeout=5), "o segundo pedido não esperou o voo"
+    soltar.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(chamadas) == 2
+    assert sorted(resultados, key=str) == [(None, "gerado"), ({"molde": 2}, "gerado")]
+
+
+def test_ttl_e_teto_de_entradas(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cm.time, "monotonic", lambda: agora[0])
+    monkeypatch.setattr(cm, "MOLDE_CACHE_MAX", 2)
+    for chave in ("a", "b", "c"):
+        cm.molde_com_voo_unico(chave, lambda: {"chave": chave})
+
+    assert cm.molde_com_voo_unico("a", lambda: {"chave": "a2"}) == ({"chave": "a2"}, "gerado")
+    assert cm.molde_com_voo_unico("c", lambda: None) == ({"chave": "c"}, "cache")
+
+    agora[0] += cm.MOLDE_CACHE_TTL_SECONDS + 1
+    assert cm.molde_com_voo_unico("c", lambda: {"chave": "c2"}) == ({"chave": "c2"}, "gerado")
+
+
+def test_ttl_zero_desliga_memo_e_voo_unico(monkeypatch):
+    monkeypatch.setattr(cm, "MOLDE_CACHE_TTL_SECONDS", 0)
+    cm.molde_com_voo_unico("a", lambda: {"chave": "a"})
+    assert cm.molde_com_voo_unico("a", lambda: {"chave": "a2"}) == ({"chave": "a2"}, "gerado")
+    assert cm.estatisticas_de_moldes()["entradas"] == 0
@@ -0,0 +1,149 @@
+"""
+Casamento por tokens do catálogo via índice invertido (_melhor_por_tokens).
+
+Teste DIFERENCIAL: a varredura linear antiga fica aqui como referência, e o
+índice invertido precisa devolver exatamente o mesmo exercício (ou o mesmo
+None) para consultas derivadas de TODAS as formas do catálogo — nome, aliases,
+com equipamento somado, com um token a menos e misturadas com outra forma.
+Cobertura mínima, desempate por cobertura, veto anatômico e veto de
+qualificador direcional saem da mesma função, então qualquer divergência de
+semântica aparece aqui.
+"""
+
+import dataclasses
+
+import pytest
+
+import backend.services.exercise_catalog as exercise_catalog
+from backend.services.exercise_catalog import (
+    _COBERTURA_MINIMA,
+    _COBERTURA_MINIMA_FORMA_LONGA,
+    _indice,
+    _melhor_por_tokens,
+    _sem_veto_anatomico,
+    _tokens,
+    carregar_catalogo,
+    normalizar,
+)
+
+
+def _referencia_linear(consulta, formas):
+    """A implementação anterior, copiada sem mudança de semântica."""
+    if not consulta:
+        return None
+    melhor_score = 0.0
+    candidatos = {}
+    for tokens_forma, ex in formas:
+        if not tokens_forma:
+            continue
+        extras_desta_forma = frozenset()
+        if tokens_forma <= consulta:
+            score = len(tokens_forma) / len(consulta)
+            minimo = (
+                _COBERTURA_MINIMA_FORMA_LONGA if len(tokens_forma) >= 2
+                else _COBERTURA_MINIMA
+            )
+            if score < minimo:
+                continue
+        elif consulta <= tokens_forma:
+            score = len(consulta) / len(tokens_forma)
+            extras_desta_forma = tokens_forma - consulta
+        else:
+            continue
+        anterior = candidatos.get(ex.chave)
+        cobertos = (tokens_forma & consulta) | (anterior[2] if anterior else frozenset())
+        extras = extras_desta_forma | (anterior[3] if anterior else frozenset())
+        melhor_da_chave = max(score, anterior[0]) if anterior else score
+        candidatos[ex.chave] = (melhor_da_chave, ex, cobertos, extras)
+        melhor_score = max(melhor_score, score)
+    if melhor_score <= 0:
+        return None
+    vencedores = [c for c in candidatos.values() if c[0] >= melhor_score - 1e-9]
+    if len(vencedores) == 1:
+        return _sem_veto_anatomico(vencedores[0], consulta)
+    cobertura_maxima = max(len(c[2]) for c in vencedores)
+    finalistas = [c for c in vencedores if len(c[2]) == cobertura_maxima]
+    if len(finalistas) != 1:
+        return None
+    return _sem_veto_anatomico(finalistas[0], consulta)
+
+
+def _consultas_derivadas(formas):
+    equipamentos = sorted({normalizar(ex.equipamento) for _t, ex in formas})
+    vistas = set()
+    for i, (tokens_forma, _ex) in enumerate(formas):
+        outra = formas[(i * 7 + 3) % len(formas)][0]
+        variantes = [tokens_forma, tokens_forma | outra]
+        variantes += [tokens_forma | _tokens(e) for e in equipamentos]
+        variantes += [tokens_forma - {t} for t in tokens_forma]
+        for consulta in variantes:
+            if consulta and consulta not in vistas:
+                vistas.add(consulta)
+                yield consulta
+
+
+def _chave(ex):
+    return ex.chave if ex is not None else None
+
+
+def test_indice_invertido_casa_igual_a_varredura_linear_em_todo_o_catalogo():
+    formas = _indice()["formas"]
+    consultas = list(_consultas_derivadas(formas))
+    assert len(consultas) > 5 * len(formas)
+
+    divergencias = [
+        (sorted(c), _chave(_melhor_por_tokens(c)), _chave(_referencia_linear(c, formas)))
+        for c in consultas
+        if _melhor_por_tokens(c) is not _referencia_linear(c, formas)
+    ]
+    assert divergencias == []
+
+
+@pytest.mark.parametrize("consulta", [
+    "rosca direta de perna",          # veto anatômico
+    "alongamento de coxa",            # veto de qualificador direcional
+    "rosca direta inclinada halteres",  # desempate por cobertura
+    "supino",                         # ambíguo
+    "flexao",
+    "token inexistente no catalogo",
+])
+def test_casos_de_semantica_conhecidos_batem_com_a_referencia(consulta):
+    tokens = _tokens(normalizar(consulta))
+    assert _melhor_por_tokens(tokens) is _referencia_linear(tokens, _indice()["formas"])
+
+
+@pytest.fixture()
+def catalogo_10x(monkeypatch):
+    """Catálogo sintético 10x: cada entrada real ganha 9 variantes com um
+    token próprio ('v1'…'v9') em todas as formas."""
+    reais = carregar_catalogo()
+    sinteticas = list(reais)
+    for k in range(1, 10):
+        for ex in reais:
+            sinteticas.append(dataclasses.replace(
+                ex,
+                chave="{}__v{}".format(ex.chave, k),
+                nome="{} v{}".format(ex.nome, k),
+                aliases=tuple("{} v{}".format(a, k) for a in ex.aliases),
+            ))
+    monkeypatch.setattr(exercise_catalog, "carregar_catalogo", lambda: tuple(sinteticas))
+    _indice.cache_clear()
+    yield _indice()
+    _indice.cache_clear()
+
+
+def test_catalogo_10x_continua_diferencialmente_igual(catalogo_10x):
+    formas = catalogo_10x["formas"]
+    consultas = list(_consultas_derivadas(formas))[::25]
+    for consulta in consultas:
+        assert _melhor_por_tokens(consulta) is _referencia_linear(consulta, formas), sorted(consulta)
+
+
+def test_so_formas_que_dividem_token_sao_visitadas(catalogo_10x):
+    consulta = _tokens(normalizar("Agachamento Livre v3"))
+    candidatas = set()
+    for token in consulta:
+        candidatas.update(catalogo_10x["postings"].get(token, ()))
+    # 'v3' sozinho já está em 1/10 das formas sintéticas; o resto vem de
+    # 'agachamento'/'livre'. Bem longe da varredura das 5.840 formas.
+    assert 0 < len(candidatas) < len(catalogo_10x["formas"]) / 5
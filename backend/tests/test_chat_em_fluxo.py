@@ -0,0 +1,203 @@
+# backend/tests/test_chat_em_fluxo.py
+# /api/chat em server-sent events (Accept: text/event-stream), contra um
+# servidor local que fala o protocolo de streaming da API de mensagens:
+# 1. cada text_delta do modelo vira um `event: delta`, e o fim um `event: done`
+#    com a mesma resposta que o JSON devolveria — inclusive com mais de um
+#    bloco de texto (o mesmo servidor local responde aos dois caminhos);
+# 2. a quota é acertada com o usage FINAL (message_start + message_delta);
+# 3. sem o Accept de SSE, o JSON de sempre — o app de hoje não muda;
+# 4. validação continua respondendo JSON 400, antes de abrir o fluxo;
+# 5. a vaga de IA síncrona volta ao fim do fluxo, inclusive com erro da IA.
+
+import json
+import os
+import sys
+import threading
+import unittest.mock as mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app_module  # noqa: E402
+from backend.app import app  # noqa: E402
+from backend.services.anthropic_clients import limpar_clientes  # noqa: E402
+
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+PEDACOS = ["Bora ", "treinar ", "peito!  "]
+
+
+def _mensagem(content, output_tokens):
+    return {
+        "id": "msg_teste", "type": "message", "role": "assistant", "model": "claude-haiku-4-5",
+        "content": content, "stop_reason": None, "stop_sequence": None,
+        "usage": {"input_tokens": 120, "output_tokens": output_tokens},
+    }
+
+
+def _eventos_do_modelo(blocos):
+    eventos = [("message_start", {"type": "message_start", "message": _mensagem([], 1)})]
+    for indice, pedacos in enumerate(blocos):
+        eventos.append(("content_block_start", {"type": "content_block_start", "index": indice,
+                                                "content_block": {"type": "text", "text": ""}}))
+        for pedaco in pedacos:
+            eventos.append(("content_block_delta", {"type": "content_block_delta", "index": indice,
+                                                    "delta": {"type": "text_delta", "text": pedaco}}))
+        eventos.append(("content_block_stop", {"type": "content_block_stop", "index": indice}))
+    eventos += [
+        ("message_delta", {"type": "message_delta",
+                           "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                           "usage": {"output_tokens": 37}}),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return "".join("event: {}\ndata: {}\n\n".format(n, json.dumps(d)) for n, d in eventos).encode()
+
+
+class _ModeloEmFluxo(BaseHTTPRequestHandler):
+    """Responde em SSE a `"stream": true` e com a mensagem inteira em JSON ao resto."""
+
+    protocol_version = "HTTP/1.1"
+    status = 200
+    blocos = [PEDACOS]
+
+    def do_POST(self):
+        pedido = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        em_fluxo = bool(pedido.get("stream"))
+        if self.status != 200:
+            corpo = json.dumps({"type": "error", "error": {"type": "api_error", "message": "fora"}}).encode()
+        elif em_fluxo:
+            corpo = _eventos_do_modelo(self.blocos)
+        else:
+            corpo = json.dumps(_mensagem(
+                [{"type": "text", "text": "".join(pedacos)} for pedacos in self.blocos], 37,
+            )).encode()
+        self.send_response(self.status)
+        self.send_header(
+            "Content-Type", "text/event-stream" if self.status == 200 and em_fluxo else "application/json"
+        )
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture()
+def modelo_local(monkeypatch):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _ModeloEmFluxo)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-teste")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", "http://127.0.0.1:{}".format(servidor.server_port))
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    monkeypatch.setattr(_ModeloEmFluxo, "status", 200)
+    monkeypatch.setattr(_ModeloEmFluxo, "blocos", [PEDACOS])
+    monkeypatch.setattr(app_module, "_ia_sincrona_vagas", threading.BoundedSemaphore(1))
+    limpar_clientes()
+    yield
+    limpar_clientes()
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture()
+def client():
+    app_module._rate_limiter.limpar()
+    resposta_auth = mock.Mock(status_code=200)
+    resposta_auth.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    app.config["TESTING"] = True
+    with app.test_client() as test_client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=resposta_auth):
+        yield test_client
+
+
+def _post(client, corpo=None, sse=True):
+    headers = {"Authorization": "Bearer token-valido"}
+    if sse:
+        headers["Accept"] = "text/event-stream"
+    return client.post(
+        "/api/chat",
+        json=corpo if corpo is not None else {
+            "messages": [{"role": "user", "content": "Quero focar em peito"}],
+            "questionnaireData": {"idade": 30},
+        },
+        headers=headers,
+    )
+
+
+def _ler_eventos(resposta):
+    eventos = []
+    for bloco in resposta.get_data(as_text=True).strip().split("\n\n"):
+        linhas = dict(linha.split(": ", 1) for linha in bloco.splitlines())
+        eventos.append((linhas["event"], json.loads(linhas["data"])))
+    return eventos
+
+
+def test_deltas_do_modelo_chegam_como_eventos_e_done_traz_a_resposta(modelo_local, client):
+    resposta = _post(client)
+
+    assert resposta.status_code == 200
+    assert resposta.mimetype == "text/event-stream"
+    assert resposta.headers["Cache-Control"] == "no-cache"
+    assert resposta.headers["X-Accel-Buffering"] == "no"
+    eventos = _ler_eventos(resposta)
+    assert eventos[:-1] == [("delta", {"text": p}) for p in PEDACOS]
+    assert eventos[-1] == ("done", {"reply": "Bora treinar peito!"})
+
+
+def test_com_dois_blocos_de_texto_done_e_json_devolvem_a_mesma_resposta(
+    modelo_local, client, monkeypatch
+):
+    monkeypatch.setattr(_ModeloEmFluxo, "blocos", [PEDACOS, ["Outro ", "bloco."]])
+
+    eventos = _ler_eventos(_post(client))
+    pelo_json = _post(client, sse=False)
+
+    assert pelo_json.status_code == 200
+    assert eventos[-1] == ("done", pelo_json.get_json())
+    # O que passou em `delta` é o que o `done` confirma: só o primeiro bloco.
+    assert eventos[:-1] == [("delta", {"text": p}) for p in PEDACOS]
+
+
+def test_quota_acertada_com_o_usage_final_do_fluxo(modelo_local, client):
+    with mock.patch("backend.app._acertar_quota_ia") as acerto:
+        _post(client).get_data()
+
+    rota, _modelo, _reservado, usage, caracteres = acerto.call_args.args
+    assert rota == "chat"
+    assert (usage.input_tokens, usage.output_tokens) == (120, 37)
+    assert caracteres > 0
+
+
+def test_sem_accept_de_sse_o_json_de_sempre(modelo_local, client):
+    resposta = mock.Mock()
+    resposta.messages.create.return_value = mock.Mock(
+        content=[mock.Mock(type="text", text=" Resposta ")], usage=None,
+    )
+    with mock.patch("backend.app._get_chat_anthropic_client", return_value=resposta):
+        r = _post(client, sse=False)
+
+    assert r.status_code == 200
+    assert r.get_json() == {"reply": "Resposta"}
+    resposta.messages.stream.assert_not_called()
+
+
+def test_validacao_continua_em_json_400(modelo_local, client):
+    r = _post(client, corpo={"messages": "não é lista", "questionnaireData": {}})
+    assert r.status_code == 400
+    assert r.is_json
+
+
+def test_vaga_volta_no_fim_do_fluxo_mesmo_com_erro_da_ia(modelo_local, client, monkeypatch):
+    monkeypatch.setattr(_ModeloEmFluxo, "status", 500)
+    eventos = _ler_eventos(_post(client))
+    assert eventos == [("error", {"error": "Erro ao comunicar com o serviço de IA."})]
+
+    monkeypatch.setattr(_ModeloEmFluxo, "status", 200)
+    assert _ler_eventos(_post(client))[-1][0] == "done"  # a única vaga foi devolvida
@@ -40,9 +40,7 @@ def client():
 
 @pytest.fixture(autouse=True)
 def _limpa_rate_limits():
-    buckets = getattr(app_module, "_rate_buckets", None)
-    if isinstance(buckets, dict):
-        buckets.clear()
+    app_module._rate_limiter.limpar()
     yield
 
 
@@ -45,8 +45,7 @@ def test_thinking_config_por_modelo(modelo, esperado):
 
 
 def _job():
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
     job, _ = jm.criar_job(user_id="user-smoke")
     return job
 
@@ -8,7 +8,8 @@
 #    do lock — duas requisições concorrentes criavam dois jobs.
 # 3. executar_job engolia exceção sem log — falha fora dos try/except internos
 #    do pipeline ficava invisível.
-# 4. TTL apagava job ainda em execução, liberando o dedup com a thread antiga viva.
+# 4. TTL apagava job ainda em execução, liberando o dedup com a thread antiga viva
+#    (e a varredura O(n) do registro rodava a cada poll).
 # 5. transition(SALVO) antes de plan_id (e progress mutado fora do lock): um
 #    poll na janela via status=salvo com plan_id=None.
 
@@ -16,6 +17,7 @@ import datetime
 import os
 import sys
 import threading
+import time
 import unittest.mock as mock
 
 import pytest
@@ -42,17 +44,13 @@ def client():
 def _limpa():
     import backend.app as app_module
 
-    buckets = getattr(app_module, "_rate_buckets", None)
-    if isinstance(buckets, dict):
-        buckets.clear()
+    app_module._rate_limiter.limpar()
 
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
 
     yield
 
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
 
 
 def _fake_user_response(user_id="3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"):
@@ -181,24 +179,26 @@ def test_executar_job_loga_excecao_com_traceback(caplog):
 
 # ==================== 4. TTL não apaga job em execução ====================
 
-def _envelhecer(job, segundos):
-    job.created_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=segundos)
+def _criado_ha(user_id, segundos):
+    # O prazo de expiração vai para o heap na criação: envelhecer o job é
+    # criá-lo com o relógio do registro recuado, não mexer em created_at depois.
+    passado = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=segundos)
+    with mock.patch.object(jm, "_agora", lambda: passado):
+        job, _ = jm.criar_job(user_id=user_id)
+    return job
 
 
 def test_ttl_preserva_job_em_execucao_e_apaga_terminais():
     ttl = jm._JOB_TTL_SECONDS
 
-    em_execucao, _ = jm.criar_job(user_id="user-vivo")
+    em_execucao = _criado_ha("user-vivo", ttl + 60)
     em_execucao.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "...")
-    _envelhecer(em_execucao, ttl + 60)
 
-    terminal, _ = jm.criar_job(user_id="user-terminal")
+    terminal = _criado_ha("user-terminal", ttl + 60)
     terminal.set_error("x", "acabou")
-    _envelhecer(terminal, ttl + 60)
 
-    zumbi, _ = jm.criar_job(user_id="user-zumbi")
+    zumbi = _criado_ha("user-zumbi", (2 * ttl) + 60)
     zumbi.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "...")
-    _envelhecer(zumbi, (2 * ttl) + 60)
 
     jm._limpar_jobs_expirados()
 
@@ -206,6 +206,70 @@ def test_ttl_preserva_job_em_execucao_e_apaga_terminais():
     assert jm.obter_job(terminal.job_id) is None, "job terminal além do TTL deve sumir"
     assert jm.obter_job(zumbi.job_id) is None, "job não-terminal além de 2×TTL é zumbi e deve sumir"
 
+    # O zumbi some também do índice por usuário: o dedup libera nova geração.
+    _, created = jm.criar_job(user_id="user-zumbi")
+    assert created is True
+
+
+def test_job_em_execucao_expira_quando_passa_de_2x_ttl(monkeypatch):
+    ttl = jm._JOB_TTL_SECONDS
+    job = _criado_ha("user-lento", ttl + 60)
+    job.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "...")
+
+    jm._limpar_jobs_expirados()
+    assert jm.obter_job(job.job_id) is job
+
+    # O prazo foi reempilhado em 2×TTL; passado ele, sai.
+    futuro = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=ttl)
+    monkeypatch.setattr(jm, "_agora", lambda: futuro)
+    jm._limpar_jobs_expirados()
+    assert jm.obter_job(job.job_id) is None
+
+
+def test_ceifadora_remove_expirados_sem_ninguem_fazer_poll(monkeypatch):
+    monkeypatch.setattr(jm, "_JOB_TTL_SECONDS", 0.05)
+    job, _ = jm.criar_job(user_id="user-ceifado")
+    job.set_error("x", "acabou")
+
+    prazo = time.monotonic() + 5
+    while jm.obter_job(job.job_id) is not None and time.monotonic() < prazo:
+        time.sleep(0.02)
+
+    assert jm.obter_job(job.job_id) is None
+    assert jm._ceifador.is_alive()
+
+
+def test_dedup_nao_varre_jobs_de_outros_usuarios():
+    for i in range(2_000):
+        jm.criar_job(user_id="usuario-{}".format(i))
+
+    class _SemIteracao(dict):
+        def values(self):
+            raise AssertionError("criar_job não pode varrer o registro")
+
+        def items(self):
+            raise AssertionError("criar_job não pode varrer o registro")
+
+    with jm._jobs_lock:
+        original = jm._jobs
+        jm._jobs = _SemIteracao(original)
+    try:
+        job, created = jm.criar_job(user_id="usuario-7")
+        assert created is False
+        assert jm.obter_job(job.job_id) is job
+    finally:
+        with jm._jobs_lock:
+            jm._jobs = original
+
+
+def test_job_terminal_libera_o_dedup_do_usuario():
+    job1, _ = jm.criar_job(user_id="user-de-novo")
+    job1.marcar_salvo("plan-1")
+    job2, created = jm.criar_job(user_id="user-de-novo")
+    assert created is True
+    assert job2.job_id != job1.job_id
+    assert jm.obter_job(job1.job_id) is job1, "terminal continua consultável até o TTL"
+
 
 # ==================== 5. SALVO nunca aparece sem plan_id ====================
 
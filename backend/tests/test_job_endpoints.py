@@ -32,12 +32,9 @@ def _limpa():
     import backend.app as app_module
     import backend.services.job_manager as jm
 
-    buckets = getattr(app_module, "_rate_buckets", None)
-    if isinstance(buckets, dict):
-        buckets.clear()
+    app_module._rate_limiter.limpar()
 
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
 
     yield
 
@@ -0,0 +1,149 @@
+# backend/tests/test_job_executor.py
+# Pool limitado + fila de admissão dos jobs de geração (job_manager):
+# 1. nunca mais que max_concorrentes pipelines ao mesmo tempo;
+# 2. quem espera publica a posição no progress ("Na fila (2º).") e ela anda;
+# 3. fila no teto recusa com FilaDeJobsCheia — e a rota responde 503 com
+#    Retry-After, encerrando o job para o dedup não prender o retry.
+
+import os
+import sys
+import threading
+import time
+import unittest.mock as mock
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+os.environ.pop("ANTHROPIC_API_KEY", None)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from backend.app import app  # noqa: E402
+import backend.services.job_manager as jm  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _limpa():
+    import backend.app as app_module
+
+    app_module._rate_limiter.limpar()
+    jm.limpar_jobs()
+    yield
+    jm.limpar_jobs()
+
+
+def _esperar(condicao, timeout=5.0):
+    prazo = time.monotonic() + timeout
+    while not condicao():
+        if time.monotonic() > prazo:
+            raise AssertionError("condição não atingida a tempo")
+        time.sleep(0.01)
+
+
+def test_pool_respeita_concorrencia_e_publica_posicao_na_fila():
+    executor = jm.ExecutorDeJobs(max_concorrentes=2, max_fila=3, retry_after_s=42)
+    liberar = threading.Event()
+    rodando = []
+    pico = []
+    trava = threading.Lock()
+
+    def pipeline(job):
+        with trava:
+            rodando.append(job.job_id)
+            pico.append(len(rodando))
+        liberar.wait(5)
+        with trava:
+            rodando.remove(job.job_id)
+        job.marcar_salvo("plan-" + job.job_id)
+
+    jobs = [jm.criar_job(user_id="u{}".format(i))[0] for i in range(5)]
+    for job in jobs:
+        executor.submeter(job, pipeline)
+
+    _esperar(lambda: len(rodando) == 2)
+    assert executor.estado()["ativos"] == 2
+    assert [job.to_dict()["progress"].get("detail") for job in jobs[2:]] == [
+        "Na fila (1º).", "Na fila (2º).", "Na fila (3º).",
+    ]
+
+    excedente, _ = jm.criar_job(user_id="u-excedente")
+    with pytest.raises(jm.FilaDeJobsCheia) as recusa:
+        executor.submeter(excedente, pipeline)
+    assert recusa.value.retry_after_s == 42
+
+    liberar.set()
+    _esperar(lambda: all(job.status == jm.JobStatus.SALVO for job in jobs))
+    # O job vira SALVO dentro do pipeline, um instante antes da vaga voltar.
+    _esperar(lambda: executor.estado()["ativos"] == 0)
+    assert max(pico) == 2
+    assert executor.estado() == {"ativos": 0, "na_fila": 0, "max_concorrentes": 2, "max_fila": 3}
+
+
+def test_posicao_anda_quando_alguem_sai_da_fila():
+    executor = jm.ExecutorDeJobs(max_concorrentes=1, max_fila=5)
+    liberar = [threading.Event() for _ in range(3)]
+
+    jobs = [jm.criar_job(user_id="u{}".format(i))[0] for i in range(3)]
+    for job, evento in zip(jobs, liberar):
+        executor.submeter(job, lambda j, e=evento: (e.wait(5), j.marcar_salvo("p")))
+
+    _esperar(lambda: executor.estado()["ativos"] == 1)
+    assert jobs[2].to_dict()["progress"]["posicao"] == 2
+
+    liberar[0].set()
+    _esperar(lambda: jobs[2].to_dict()["progress"].get("posicao") == 1)
+    assert jobs[1].to_dict()["progress"]["step"] != "na_fila"
+
+    liberar[1].set()
+    liberar[2].set()
+    _esperar(lambda: jobs[2].status == jm.JobStatus.SALVO)
+
+
+def test_posicao_atrasada_nao_sobrescreve_progresso_do_pipeline():
+    job, _ = jm.criar_job(user_id="u-atrasado")
+    job.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "Gerando.")
+    job.marcar_na_fila(3)
+    assert job.to_dict()["progress"]["step"] == "gerando_molde"
+
+
+def _fake_user_response(user_id="3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"):
+    response = mock.Mock()
+    response.status_code = 200
+    response.json.return_value = {"id": user_id, "email": "user@teste.com"}
+    return response
+
+
+def _post_generate_plan(client):
+    return client.post(
+        "/api/generate-plan",
+        json={
+            "questionnaireData": {"nivelExperiencia": "iniciante"},
+            "diretrizes": {"preferencias": [], "restricoes": [], "excecoes_estruturais": []},
+        },
+        headers={"Authorization": "Bearer token-valido"},
+    )
+
+
+def test_fila_cheia_responde_503_com_retry_after_e_libera_o_dedup(monkeypatch):
+    monkeypatch.setattr("backend.app.FORCA_USE_MOLDE_ARCHITECTURE", True)
+    app.config["TESTING"] = True
+
+    with app.test_client() as client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=_fake_user_response()), \
+         mock.patch("backend.app.executar_job", side_effect=jm.FilaDeJobsCheia(60)):
+        recusada = _post_generate_plan(client)
+
+    assert recusada.status_code == 503
+    assert recusada.headers["Retry-After"] == "60"
+    assert recusada.get_json()["retry_after"] == 60
+
+    with app.test_client() as client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=_fake_user_response()), \
+         mock.patch("backend.app.executar_job") as executar:
+        aceita = _post_generate_plan(client)
+
+    assert aceita.status_code == 202
+    assert executar.call_count == 1
@@ -0,0 +1,159 @@
+# backend/tests/test_job_long_poll.py
+# Long-poll do status do job (GET /api/generate-plan/<id>?since=&wait=):
+# 1. a resposta sai assim que o job muda (transition/marcar_salvo/set_error
+#    acordam a variável de condição), não no fim da espera;
+# 2. sem `since`, job terminal ou versão já nova: responde na hora;
+# 3. dono conferido antes de esperar; parâmetros inválidos são 400;
+# 4. acima do teto de long-polls simultâneos, degrada para poll comum;
+# 5. job de outro worker (store SQLite) é relido até mudar.
+
+import os
+import sys
+import threading
+import time
+import unittest.mock as mock
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+os.environ.pop("ANTHROPIC_API_KEY", None)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from backend.app import app  # noqa: E402
+import backend.app as app_module  # noqa: E402
+import backend.services.job_manager as jm  # noqa: E402
+from backend.services.job_store import JobStoreSqlite  # noqa: E402
+
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+
+
+@pytest.fixture(autouse=True)
+def _limpa():
+    app_module._rate_limiter.limpar()
+    jm.limpar_jobs()
+    yield
+    jm.limpar_jobs()
+
+
+@pytest.fixture()
+def client():
+    resposta_auth = mock.Mock(status_code=200)
+    resposta_auth.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    app.config["TESTING"] = True
+    with app.test_client() as test_client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=resposta_auth):
+        yield test_client
+
+
+def _status(client, job_id, **params):
+    return client.get(
+        "/api/generate-plan/{}".format(job_id),
+        query_string=params,
+        headers={"Authorization": "Bearer token-valido"},
+    )
+
+
+def _depois(segundos, acao):
+    t = threading.Timer(segundos, acao)
+    t.start()
+    return t
+
+
+def test_long_poll_acorda_na_transicao(client):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    versao = _status(client, job.job_id).get_json()["version"]
+
+    _depois(0.2, lambda: job.transition(jm.JobStatus.EXPANDINDO, "expandindo", "Expandindo."))
+    inicio = time.monotonic()
+    resposta = _status(client, job.job_id, since=versao, wait=10)
+    decorrido = time.monotonic() - inicio
+
+    assert resposta.status_code == 200
+    assert resposta.get_json()["status"] == "expandindo"
+    assert resposta.get_json()["version"] == versao + 1
+    assert 0.1 < decorrido < 5
+
+
+def test_long_poll_acorda_no_salvo_com_plan_id(client):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    _depois(0.1, lambda: job.marcar_salvo("plan-9"))
+
+    corpo = _status(client, job.job_id, since=0, wait=10).get_json()
+
+    assert corpo["status"] == "salvo"
+    assert corpo["plan_id"] == "plan-9"
+
+
+def test_long_poll_vence_o_prazo_sem_mudanca(client, monkeypatch):
+    monkeypatch.setattr(app_module, "JOB_LONG_POLL_MAX_WAIT_SECONDS", 1)
+    job, _ = jm.criar_job(user_id=USER_ID)
+
+    inicio = time.monotonic()
+    corpo = _status(client, job.job_id, since=0, wait=60).get_json()
+
+    assert 0.9 < time.monotonic() - inicio < 3, "wait acima do teto é cortado no teto"
+    assert corpo["version"] == 0
+    assert corpo["status"] == "created"
+
+
+@pytest.mark.parametrize("params", [{}, {"wait": 10}, {"since": 0, "wait": 0}])
+def test_sem_long_poll_responde_na_hora(client, params):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    with mock.patch.object(app_module, "aguardar_job", side_effect=AssertionError("não devia esperar")):
+        assert _status(client, job.job_id, **params).status_code == 200
+
+
+def test_versao_ja_nova_ou_job_terminal_respondem_na_hora(client):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    job.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "...")
+    with mock.patch.object(app_module, "aguardar_job", side_effect=AssertionError("não devia esperar")):
+        assert _status(client, job.job_id, since=0, wait=10).get_json()["version"] == 1
+        job.set_error("x", "falhou")
+        assert _status(client, job.job_id, since=2, wait=10).get_json()["status"] == "erro"
+
+
+def test_job_de_outro_usuario_e_403_sem_esperar(client):
+    job, _ = jm.criar_job(user_id="outro-usuario")
+    with mock.patch.object(app_module, "aguardar_job", side_effect=AssertionError("não devia esperar")):
+        assert _status(client, job.job_id, since=0, wait=10).status_code == 403
+
+
+@pytest.mark.parametrize("params", [{"since": "abc", "wait": 10}, {"since": 0, "wait": "x"}])
+def test_parametros_invalidos_sao_400(client, params):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    assert _status(client, job.job_id, **params).status_code == 400
+
+
+def test_sem_vaga_de_long_poll_degrada_para_poll_comum(client, monkeypatch):
+    vagas = threading.BoundedSemaphore(1)
+    vagas.acquire()
+    monkeypatch.setattr(app_module, "_long_poll_vagas", vagas)
+    job, _ = jm.criar_job(user_id=USER_ID)
+
+    inicio = time.monotonic()
+    resposta = _status(client, job.job_id, since=0, wait=10)
+
+    assert resposta.status_code == 200
+    assert time.monotonic() - inicio < 1
+
+
+def test_job_de_outro_worker_e_relido_ate_mudar(monkeypatch, tmp_path):
+    caminho = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(jm, "_store", JobStoreSqlite(caminho, dono="worker-a"))
+    monkeypatch.setattr(jm, "_INTERVALO_RELEITURA_STORE_S", 0.05)
+    job, _ = jm.criar_job(user_id=USER_ID)
+
+    # Este processo "esquece" o job: agora ele roda em outro worker.
+    with jm._jobs_lock:
+        jm._jobs.clear()
+
+    _depois(0.2, lambda: job.transition(jm.JobStatus.SALVANDO, "salvando", "Salvando."))
+    visto = jm.aguardar_job(job.job_id, desde=0, timeout=5)
+
+    assert visto is not job
+    assert visto.status == jm.JobStatus.SALVANDO
+    assert visto.versao == 1
@@ -0,0 +1,185 @@
+# backend/tests/test_job_store.py
+# Store durável dos jobs (JOB_STORE_BACKEND=sqlite, backend/services/job_store.py):
+# 1. toda transição é gravada; outro processo (ou o processo novo depois do
+#    restart) enxerga o job por uma leitura pela chave primária;
+# 2. o dedup por usuário vale entre processos;
+# 3. lease vencido = órfão: vira ERRO "job_interrompido" e libera o dedup;
+# 4. o heartbeat do dono renova o lease — só dos jobs dele;
+# 5. SQLite quebrado não derruba a geração (falha aberta, segue em memória).
+
+import os
+import sys
+import unittest.mock as mock
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+os.environ.pop("ANTHROPIC_API_KEY", None)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from backend.app import app  # noqa: E402
+import backend.services.job_manager as jm  # noqa: E402
+from backend.services.job_store import JobStoreSqlite  # noqa: E402
+
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+
+
+class _Relogio:
+    def __init__(self, agora=1_000_000.0):
+        self.agora = agora
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture()
+def relogio():
+    return _Relogio()
+
+
+@pytest.fixture()
+def caminho(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture(autouse=True)
+def _limpa(monkeypatch, caminho, relogio):
+    import backend.app as app_module
+
+    app_module._rate_limiter.limpar()
+    monkeypatch.setattr(jm, "_store", JobStoreSqlite(caminho, relogio=relogio, dono="worker-a", lease_s=90))
+    jm.limpar_jobs()
+    yield
+    _esquecer_memoria()
+
+
+def _esquecer_memoria():
+    """O que sobra depois de um restart: nada em memória, só o store."""
+    for fatia in jm._fatias:
+        with fatia.lock:
+            fatia.vivos.clear()
+    with jm._jobs_lock:
+        jm._jobs.clear()
+        jm._expiracoes.clear()
+
+
+def _outro_worker(monkeypatch, caminho, relogio):
+    _esquecer_memoria()
+    monkeypatch.setattr(jm, "_store", JobStoreSqlite(caminho, relogio=relogio, dono="worker-b", lease_s=90))
+
+
+def test_transicoes_sao_gravadas_e_outro_worker_le_pela_chave(monkeypatch, caminho, relogio):
+    job, created = jm.criar_job(user_id=USER_ID)
+    assert created is True
+    job.transition(jm.JobStatus.EXPANDINDO, "expandindo", "Expandindo o plano.")
+
+    _outro_worker(monkeypatch, caminho, relogio)
+    visto = jm.obter_job(job.job_id)
+
+    assert visto is not None and visto is not job
+    assert visto.to_dict() == {
+        "job_id": job.job_id,
+        "status": "expandindo",
+        "progress": {"step": "expandindo", "detail": "Expandindo o plano."},
+        "plan_id": None,
+        "error": None,
+        "version": 1,
+    }
+
+
+def test_marcar_salvo_chega_ao_store_com_plan_id(monkeypatch, caminho, relogio):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    job.marcar_salvo("plan-42")
+
+    _outro_worker(monkeypatch, caminho, relogio)
+    visto = jm.obter_job(job.job_id)
+    assert visto.status == jm.JobStatus.SALVO
+    assert visto.plan_id == "plan-42"
+
+
+def test_dedup_vale_entre_workers(monkeypatch, caminho, relogio):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    job.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "...")
+
+    _outro_worker(monkeypatch, caminho, relogio)
+    mesmo, created = jm.criar_job(user_id=USER_ID)
+
+    assert created is False
+    assert mesmo.job_id == job.job_id
+    assert mesmo.status == jm.JobStatus.GERANDO_MOLDE
+
+
+def test_lease_vencido_vira_erro_e_libera_o_dedup(monkeypatch, caminho, relogio):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    job.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "...")
+
+    # O worker-a morreu: ninguém renova o lease.
+    _outro_worker(monkeypatch, caminho, relogio)
+    relogio.agora += 91
+
+    orfao = jm.obter_job(job.job_id)
+    assert orfao.status == jm.JobStatus.ERRO
+    assert orfao.error["code"] == "job_interrompido"
+
+    novo, created = jm.criar_job(user_id=USER_ID)
+    assert created is True
+    assert novo.job_id != job.job_id
+
+
+def test_heartbeat_renova_so_os_jobs_do_dono(monkeypatch, caminho, relogio):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    job.transition(jm.JobStatus.GERANDO_MOLDE, "gerando_molde", "...")
+
+    relogio.agora += 60
+    jm._heartbeat()  # worker-a, dono do job, ainda vivo
+    relogio.agora += 60
+
+    alheio = JobStoreSqlite(caminho, relogio=relogio, dono="worker-b")
+    alheio.renovar_leases([job.job_id])  # não é dele: não pode renovar
+    assert alheio.obter(job.job_id)["status"] == "gerando_molde"
+
+    relogio.agora += 31
+    assert alheio.obter(job.job_id)["status"] == "erro"
+
+
+def test_varredura_apaga_linhas_alem_do_ttl(caminho, relogio):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    job.set_error("x", "acabou")
+
+    relogio.agora = job.created_at.timestamp() + jm._JOB_TTL_SECONDS + 1
+    jm._store.varrer()
+    assert jm._store.obter(job.job_id) is None
+
+
+def test_status_endpoint_responde_job_de_outro_worker(monkeypatch, caminho, relogio):
+    job, _ = jm.criar_job(user_id=USER_ID)
+    job.marcar_salvo("plan-7")
+    _outro_worker(monkeypatch, caminho, relogio)
+
+    resposta_auth = mock.Mock(status_code=200)
+    resposta_auth.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    app.config["TESTING"] = True
+    with app.test_client() as client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=resposta_auth):
+        resposta = client.get(
+            "/api/generate-plan/{}".format(job.job_id),
+            headers={"Authorization": "Bearer token-valido"},
+        )
+
+    assert resposta.status_code == 200
+    assert resposta.get_json()["status"] == "salvo"
+    assert resposta.get_json()["plan_id"] == "plan-7"
+
+
+def test_sqlite_quebrado_nao_derruba_a_geracao(caplog):
+    jm._store._conexao().execute("DROP TABLE plan_jobs")
+
+    job, created = jm.criar_job(user_id=USER_ID)
+    assert created is True
+    job.transition(jm.JobStatus.EXPANDINDO, "expandindo", "...")
+    assert jm.obter_job(job.job_id) is job
+    assert "store de jobs indisponível" in caplog.text.lower()
@@ -0,0 +1,174 @@
+# backend/tests/test_json_codec.py
+# Codec JSON (backend/utils/json_codec.py), com e sem orjson:
+# 1. o texto do prompt é byte a byte o do json.dumps(indent=2, ensure_ascii=False),
+#    inclusive com float fora do formato fixo do repr (1e-05, 1e+16) e NaN/inf;
+# 2. o compacto parseia no mesmo objeto e aceita o que a stdlib aceitava
+#    (default=str, chave não-texto, inteiro grande), e NaN/inf saem `NaN`/
+#    `Infinity` como na stdlib, não `null`;
+# 3. erros continuam TypeError/ValueError, que é o que os chamadores capturam;
+# 4. a constante é serializada uma vez por objeto;
+# 5. tamanho_ascii é o len(json.dumps(...)) de sempre (acentos, emoji, DEL,
+#    separadores, floats), que é onde os limites anti-abuso foram calibrados.
+
+import collections
+import datetime
+import json
+import math
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.utils.json_codec as json_codec  # noqa: E402
+from backend.schemas.molde_schema import MOLDE_SCHEMA  # noqa: E402
+
+AMOSTRA = {
+    "nome": "Plano ênfase técnica",
+    "vazio": [],
+    "objeto_vazio": {},
+    "numeros": [1, 2.5, -3, 0.1, 10**20],
+    "aninhado": {"dias": ["segunda", "terça"], "ativo": True, "nada": None},
+    "quando": datetime.datetime(2026, 3, 2, 10, 0),
+    7: "chave inteira",
+}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def codec(request, monkeypatch):
+    if request.param == "orjson":
+        if not json_codec.ORJSON_DISPONIVEL:
+            pytest.skip("orjson não instalado")
+    else:
+        monkeypatch.setattr(json_codec, "_orjson", None)
+    return json_codec
+
+
+def test_legivel_e_o_mesmo_texto_da_stdlib(codec):
+    assert codec.serializar_legivel(AMOSTRA, default=str) == json.dumps(
+        AMOSTRA, indent=2, ensure_ascii=False, default=str
+    )
+    assert codec.serializar_legivel(MOLDE_SCHEMA) == json.dumps(
+        MOLDE_SCHEMA, indent=2, ensure_ascii=False
+    )
+
+
+FLOATS = [1e-05, 1e16, -2.5e-07, 1.5e20, 0.0001, 9999999999999998.0, -0.0, 0.1,
+          float("nan"), float("inf"), float("-inf")]
+
+
+@pytest.mark.parametrize("numero", FLOATS, ids=repr)
+def test_legivel_escreve_float_como_a_stdlib(codec, numero):
+    valor = {"carga": numero, "serie": [1, {"distancia_km": numero}], "ok": 2.5}
+    assert codec.serializar_legivel(valor) == json.dumps(valor, indent=2, ensure_ascii=False)
+
+    # Também quando o float só aparece depois do `default`.
+    class Medida:
+        pass
+
+    embrulhado = {"medida": Medida()}
+    assert codec.serializar_legivel(embrulhado, default=lambda _o: [numero]) == json.dumps(
+        embrulhado, indent=2, ensure_ascii=False, default=lambda _o: [numero]
+    )
+
+
+@pytest.mark.parametrize("numero", [float("nan"), float("inf"), float("-inf")], ids=repr)
+def test_compacto_escreve_nan_e_inf_como_a_stdlib(codec, numero):
+    # Com orjson eles virariam `null`, indistinguível de None.
+    stdlib = lambda v, **kw: json.dumps(v, ensure_ascii=False, separators=(",", ":"), **kw).encode()  # noqa: E731
+    valor = {"carga": [1.5, {"km": numero}], "nada": None}
+    assert codec.serializar_compacto(valor) == stdlib(valor)
+    assert codec.serializar_compacto(numero) == stdlib(numero)
+    subclasse = {"linhas": [collections.OrderedDict(km=numero)]}
+    assert codec.serializar_compacto(subclasse) == stdlib(subclasse)
+    assert codec.serializar_compacto({numero: 1}) == stdlib({numero: 1})
+
+    class Medida:
+        pass
+
+    embrulhado = {"medida": Medida()}
+    assert codec.serializar_compacto(embrulhado, default=lambda _o: [numero]) == stdlib(
+        embrulhado, default=lambda _o: [numero]
+    )
+
+
+def test_compacto_e_utf8_sem_espacos_e_parseia_no_mesmo_objeto(codec):
+    corpo = codec.serializar_compacto(AMOSTRA, default=str)
+
+    assert isinstance(corpo, bytes)
+    assert "ênfase".encode("utf-8") in corpo
+    assert b", " not in corpo and b": " not in corpo
+    assert json.loads(corpo) == json.loads(json.dumps(AMOSTRA, default=str))
+
+
+def test_sem_default_tipo_desconhecido_continua_type_error(codec):
+    with pytest.raises(TypeError):
+        codec.serializar_compacto({"quando": datetime.date(2026, 3, 2)})
+    with pytest.raises(TypeError):
+        codec.serializar_legivel({"conjunto": {1, 2}})
+
+
+def test_desserializar_aceita_str_e_bytes_e_falha_com_json_decode_error(codec):
+    assert codec.desserializar('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert codec.desserializar(b'{"a": "\xc3\xa9"}') == {"a": "é"}
+    with pytest.raises(json.JSONDecodeError):
+        codec.desserializar("{quebrado")
+
+
+def test_desserializar_aceita_o_que_a_stdlib_aceitava(codec):
+    assert math.isnan(codec.desserializar('{"n": NaN}')["n"])
+    assert codec.desserializar('{"s": "\\ud800"}') == {"s": "\ud800"}
+
+
+def test_constante_e_serializada_uma_vez_por_objeto(codec, monkeypatch):
+    chamadas = []
+    original = codec.serializar_legivel
+
+    def contando(valor, default=None):
+        chamadas.append(valor)
+        return original(valor, default)
+
+    monkeypatch.setattr(codec, "_constantes", {})
+    monkeypatch.setattr(codec, "serializar_legivel", contando)
+    schema = {"type": "object", "titulo": "único"}
+
+    primeiro = codec.serializar_constante(schema)
+    assert codec.serializar_constante(schema) is primeiro
+    assert chamadas == [schema]
+    assert codec.serializar_constante(dict(schema)) == primeiro
+    assert len(chamadas) == 2, "outro objeto, outra entrada"
+
+
+class _Ponto:
+    pass
+
+
+TAMANHOS = [
+    AMOSTRA,
+    {"texto": "ação, ênfase: 😀 \x7f\x01\n\t\"aspas\" \\ /"},
+    {"vazios": [[], {}, ()], "tupla": (1, "dois", (3,)), "chave": {"a": {"b": [1, 2]}}},
+    {"floats": [0.1, 1e-05, 1e16, -0.0, 2.5]},
+    {"nan": float("nan"), "inf": float("inf")},
+    {"grande": 10**30},
+    {"ponto": _Ponto()},
+    ["só", "lista"],
+    "só texto com ç",
+    {},
+]
+
+
+@pytest.mark.parametrize("valor", TAMANHOS, ids=lambda v: repr(v)[:30])
+def test_tamanho_ascii_e_o_len_do_json_dumps(codec, valor):
+    estrutura = lambda _o: {"x": [1, "é", 1e-05]}  # noqa: E731
+
+    assert codec.tamanho_ascii(valor, default=str) == len(json.dumps(valor, default=str))
+    assert codec.tamanho_ascii(valor, default=estrutura) == len(json.dumps(valor, default=estrutura))
+
+
+def test_tamanho_ascii_sem_default_continua_type_error(codec):
+    with pytest.raises(TypeError):
+        codec.tamanho_ascii({"conjunto": {1, 2}})
@@ -41,9 +41,7 @@ def client():
 
 @pytest.fixture(autouse=True)
 def _limpa_rate_limits():
-    buckets = getattr(app_module, "_rate_buckets", None)
-    if isinstance(buckets, dict):
-        buckets.clear()
+    app_module._rate_limiter.limpar()
     yield
 
 
@@ -245,3 +243,33 @@ def test_poda_preserva_todo_campo_declarado():
     }
     assert podar_chaves_desconhecidas(completa) == completa
     jsonschema.validate(completa, DIRETRIZES_SCHEMA)
+
+
+# --- O limite mede o json.dumps com ASCII escapado, como sempre mediu ---
+
+def test_limite_do_questionario_conta_acento_escapado_e_separadores():
+    # Cada "ç" conta 6 bytes (\\u00e7), e o ": " conta o espaço. Em UTF-8
+    # compacto seriam 2 por "ç": o mesmo questionário passaria com folga.
+    moldura = len(json.dumps({"notas": ""}))
+    no_limite = (app_module.MAX_QUESTIONNAIRE_JSON_BYTES - moldura) // 6
+
+    def dados(n):
+        return {"questionnaireData": {"notas": "ç" * n}}
+
+    assert app_module._validate_context_fields(dados(no_limite))[1] is None
+    assert app_module._validate_context_fields(dados(no_limite + 1)) == (
+        None, "Campo 'questionnaireData' excede o limite de tamanho."
+    )
+
+
+def test_limite_das_diretrizes_fica_no_byte_do_json_dumps():
+    limite = app_module.MAX_DIRETRIZES_JSON_BYTES
+    moldura = len(json.dumps({"preferencias": ["ênfase"], "restricoes": [""]}))
+    diretrizes = {"preferencias": ["ênfase"], "restricoes": ["x" * (limite - moldura)]}
+
+    assert len(json.dumps(diretrizes)) == limite
+    assert app_module._validar_tamanho_serializado("diretrizes", diretrizes, limite) is None
+    diretrizes["restricoes"][0] += "x"
+    assert app_module._validar_tamanho_serializado("diretrizes", diretrizes, limite) == (
+        "Campo 'diretrizes' excede o limite de tamanho."
+    )
@@ -134,7 +134,7 @@ def client():
 
 @pytest.fixture(autouse=True)
 def _limpa_rate_limits():
-    app_module._rate_buckets.clear()
+    app_module._rate_limiter.limpar()
     yield
 
 
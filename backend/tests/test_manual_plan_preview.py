@@ -0,0 +1,62 @@
+# backend/tests/test_manual_plan_preview.py
+# Prévia sob demanda do plano manual (backend/services/manual_plan_preview.py).
+#
+# Teste DIFERENCIAL: a prévia de antes (pipeline completo + resumo das linhas
+# de banco) fica em scripts/bench_manual_preview.py como referência, e a
+# prévia sob demanda precisa dar exatamente a mesma resposta — ou o mesmo
+# ValueError — para rascunhos válidos sorteados de 1 a 52 semanas, inclusive
+# quando o teto de séries estoura numa semana que a prévia não mostra.
+
+import os
+import sys
+import unittest.mock as mock
+import uuid
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.services.plan_mapper as pm  # noqa: E402
+from backend.app import _validar_rascunho_manual  # noqa: E402
+from backend.services.manual_plan_preview import previa_do_rascunho, semanas_da_previa  # noqa: E402
+from scripts.bench_manual_preview import (  # noqa: E402
+    previa_referencia,
+    rascunho_de_benchmark,
+    resultado,
+)
+
+
+@pytest.mark.parametrize("semanas", [1, 2, 4, 12, 24, 52])
+@pytest.mark.parametrize("semente", range(8))
+def test_previa_igual_ao_pipeline_completo(semanas, semente):
+    rascunho = rascunho_de_benchmark(semanas, semente)
+    assert _validar_rascunho_manual(rascunho) is None
+
+    assert resultado(previa_do_rascunho, rascunho) == resultado(previa_referencia, rascunho)
+
+
+@pytest.mark.parametrize("teto", [1, 10, 60, 200])
+@pytest.mark.parametrize("semente", range(4))
+def test_teto_de_series_estoura_com_a_mesma_mensagem(monkeypatch, teto, semente):
+    monkeypatch.setattr(pm, "MAX_TOTAL_SETS", teto)
+    rascunho = rascunho_de_benchmark(24, semente)
+
+    esperado = resultado(previa_referencia, rascunho)
+    assert resultado(previa_do_rascunho, rascunho) == esperado
+    if teto == 1:
+        assert isinstance(esperado, str) and "séries" in esperado
+
+
+def test_previa_nao_gera_uuid():
+    rascunho = rascunho_de_benchmark(52, 3)
+    with mock.patch.object(uuid, "uuid4", wraps=uuid.uuid4) as gerados:
+        previa = previa_do_rascunho(rascunho)
+
+    assert gerados.call_count == 0
+    assert [s["semana"] for s in previa["semanas"]] == semanas_da_previa(52) == [1, 26, 52]
@@ -0,0 +1,89 @@
+# backend/tests/test_metricas.py
+# Registro de métricas de processo (backend/utils/metricas.py) e GET /api/metrics:
+# 1. sem METRICS_TOKEN a rota não existe; com ele, só o Bearer certo entra;
+# 2. a resposta traz as estatísticas de cada módulo registrado — todos os
+#    caches, pools e filas do backend;
+# 3. uma fonte que falha não derruba as outras, e limpar_todas zera todas.
+
+import os
+import sys
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app_module  # noqa: E402
+from backend.services import prompt_fragmentos  # noqa: E402
+from backend.utils import metricas  # noqa: E402
+
+
+@pytest.fixture()
+def client():
+    app_module.app.config["TESTING"] = True
+    with app_module.app.test_client() as test_client:
+        yield test_client
+
+
+def _metricas(client, token="segredo-de-metricas"):
+    return client.get("/api/metrics", headers={"Authorization": "Bearer " + token})
+
+
+def test_sem_metrics_token_a_rota_nao_existe(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "")
+    assert _metricas(client).status_code == 404
+
+
+def test_token_errado_ou_ausente_e_401(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "segredo-de-metricas")
+    assert _metricas(client, token="outro").status_code == 401
+    assert client.get("/api/metrics").status_code == 401
+
+
+def test_rota_devolve_as_estatisticas_registradas(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "segredo-de-metricas")
+    prompt_fragmentos.fragmento("chave-de-teste", lambda: "texto")
+    prompt_fragmentos.fragmento("chave-de-teste", lambda: "nunca")
+
+    resposta = _metricas(client)
+
+    assert resposta.status_code == 200
+    corpo = resposta.get_json()
+    assert corpo["fragmentos_de_prompt"] == {"acertos": 1, "faltas": 1, "entradas": 1}
+
+
+def test_todos_os_caches_e_filas_do_backend_estao_no_registro(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "segredo-de-metricas")
+
+    assert set(_metricas(client).get_json()) >= {
+        "acertos_de_quota",
+        "cache_de_consolidacao",
+        "cache_de_moldes",
+        "cache_de_prompt",
+        "clientes_anthropic",
+        "fragmentos_de_prompt",
+        "reservas_de_quota",
+        "sombra_de_quota",
+    }
+
+
+def test_fonte_que_falha_nao_derruba_as_outras_e_limpar_todas_zera(monkeypatch):
+    monkeypatch.setattr(metricas, "_fontes", dict(metricas._fontes))
+    contador = {"n": 3}
+
+    def quebrada():
+        raise RuntimeError("sem estado")
+
+    metricas.registrar("quebrada", quebrada, lambda: None)
+    metricas.registrar("contador", lambda: dict(contador), lambda: contador.update(n=0))
+
+    coletado = metricas.coletar()
+    assert coletado["quebrada"] is None
+    assert coletado["contador"] == {"n": 3}
+
+    metricas.limpar_todas()
+    assert metricas.coletar()["contador"] == {"n": 0}
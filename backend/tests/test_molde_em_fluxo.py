@@ -0,0 +1,244 @@
+# backend/tests/test_molde_em_fluxo.py
+# Molde em fluxo com validação incremental (FORCA_MOLDE_EM_FLUXO):
+# 1. molde válido em pedaços pequenos passa inteiro, contando os treinos;
+# 2. exercício sem alvo reprova ASSIM que fecha, com o caminho absoluto no
+#    molde — a mesma mensagem que o retry dirigido já entende;
+# 3. o que o normalizador repara (grupos vazios, metadados null) não corta;
+# 4. texto que não é JSON nunca corta: o leitor desiste e a validação final
+#    decide;
+# 5. no pipeline: o fluxo é cortado na violação, o retry recebe o erro e o
+#    parcial, o job mostra "N de M treinos prontos" e termina salvo;
+# 6. os validadores das subárvores saem do mesmo `compilar` do VALIDADOR_MOLDE,
+#    no draft que o MOLDE_SCHEMA declara.
+
+import copy
+import json
+import os
+import sys
+import types
+import unittest.mock as mock
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app_module  # noqa: E402
+import backend.services.job_manager as jm  # noqa: E402
+from backend.app import _detalhe_da_falha_de_schema, _executar_geracao_molde, app  # noqa: E402
+import backend.services.molde_em_fluxo as molde_em_fluxo  # noqa: E402
+from backend.schemas.validadores import VALIDADOR_MOLDE  # noqa: E402
+from backend.services.molde_em_fluxo import ValidadorIncrementalDoMolde  # noqa: E402
+
+EXERCICIO = {"nome": "Supino", "ordem": 1, "series": 3, "repeticoes": "10", "prioridade": "primario"}
+
+
+def _sessao(nome, dia):
+    return {
+        "nome": nome, "tipo": "Hipertrofia", "duracao_minutos": 60, "dia_offset": dia,
+        "grupos_musculares": [{"nome": "Peito"}],
+        "exercicios": [dict(EXERCICIO), {**EXERCICIO, "nome": "Crucifixo", "ordem": 2}],
+    }
+
+
+MOLDE_VALIDO = {
+    "nome": "Plano Teste",
+    "periodizacao": {"tipo": "Linear"},
+    "duracao_semanas": 4,
+    "frequencia_semanal": 2,
+    "semanas_tipo": [{"id": "tipo_a", "nome": "A", "sessoes": [_sessao("Treino A", 0), _sessao("Treino B", 3)]}],
+    "calendario": ["tipo_a"] * 4,
+    "progressao": {"regras": []},
+}
+
+
+def _molde_sem_alvo():
+    molde = copy.deepcopy(MOLDE_VALIDO)
+    del molde["semanas_tipo"][0]["sessoes"][1]["exercicios"][0]["repeticoes"]
+    return molde
+
+
+def _em_pedacos(texto, tamanho=7):
+    return [texto[i:i + tamanho] for i in range(0, len(texto), tamanho)]
+
+
+def _alimentar(validador, texto):
+    for pedaco in _em_pedacos(texto):
+        erro = validador.alimentar(pedaco)
+        if erro is not None:
+            return erro
+    return None
+
+
+# ==================== 1-4. Leitor incremental ====================
+
+def test_molde_valido_em_pedacos_passa_e_conta_os_treinos():
+    validador = ValidadorIncrementalDoMolde()
+    assert _alimentar(validador, json.dumps(MOLDE_VALIDO, ensure_ascii=False)) is None
+    assert validador.sessoes_prontas == 2
+    assert validador.sessoes_previstas == 2
+
+
+def test_exercicio_sem_alvo_reprova_quando_fecha_com_o_caminho_no_molde():
+    texto = json.dumps(_molde_sem_alvo())
+    validador = ValidadorIncrementalDoMolde()
+    lidos = 0
+    for pedaco in _em_pedacos(texto):
+        lidos += len(pedaco)
+        erro = validador.alimentar(pedaco)
+        if erro is not None:
+            break
+
+    assert erro is not None
+    assert list(erro.absolute_path) == ["semanas_tipo", 0, "sessoes", 1, "exercicios", 0]
+    assert lidos < texto.index("Crucifixo", texto.index("Treino B")) + 20, "não cortou no exercício"
+    detalhe = _detalhe_da_falha_de_schema(erro)
+    assert "semanas_tipo.0.sessoes.1.exercicios.0 ('Supino')" in detalhe
+    assert "faltou o alvo de prescrição" in detalhe
+    assert validador.alimentar("qualquer coisa") is None  # depois do corte, não lê mais
+
+
+def test_reparos_do_normalizador_nao_cortam_o_fluxo():
+    molde = copy.deepcopy(MOLDE_VALIDO)
+    molde["semanas_tipo"][0]["sessoes"][0]["grupos_musculares"] = []
+    molde["semanas_tipo"][0]["sessoes"][0]["exercicios"][0]["cadencia"] = None
+    assert _alimentar(ValidadorIncrementalDoMolde(), json.dumps(molde)) is None
+
+
+def test_texto_em_volta_e_chaves_com_escape_nao_confundem_o_leitor():
+    molde = copy.deepcopy(MOLDE_VALIDO)
+    molde["descricao"] = 'chaves {no} texto [e] aspas \\" escapadas'
+    texto = "Aqui está o molde:\n```json\n" + json.dumps(molde) + "\n```\n{depois}"
+    validador = ValidadorIncrementalDoMolde()
+    assert _alimentar(validador, texto) is None
+    assert validador.sessoes_prontas == 2
+
+
+def test_texto_que_nao_e_json_nunca_corta():
+    assert _alimentar(ValidadorIncrementalDoMolde(), '{"semanas_tipo": [{"sessoes": [}]}') is None
+
+
+# ==================== 5. Pipeline com FORCA_MOLDE_EM_FLUXO ====================
+
+class _FluxoFalso:
+    """messages.stream falso: entrega o texto em text_delta e conta quantos
+    eventos o consumidor chegou a ler."""
+
+    def __init__(self, texto):
+        self.pedacos = _em_pedacos(texto, 16)
+        self.lidos = 0
+        self.fechado = False
+        self.usage = types.SimpleNamespace(input_tokens=500, output_tokens=900)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.fechado = True
+        return False
+
+    def __iter__(self):
+        for pedaco in self.pedacos:
+            self.lidos += 1
+            yield types.SimpleNamespace(
+                type="content_block_delta", delta=types.SimpleNamespace(type="text_delta", text=pedaco),
+            )
+
+    def _mensagem(self, pedacos):
+        return types.SimpleNamespace(
+            content=[types.SimpleNamespace(type="text", text="".join(pedacos))],
+            stop_reason="end_turn", usage=self.usage,
+        )
+
+    @property
+    def current_message_snapshot(self):
+        return self._mensagem(self.pedacos[:self.lidos])
+
+    def get_final_message(self):
+        return self._mensagem(self.pedacos)
+
+
+def _rodar_em_fluxo(monkeypatch, textos):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
+    monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
+    monkeypatch.setattr(app_module, "FORCA_MOLDE_EM_FLUXO", True)
+    jm.limpar_jobs()
+    job, _ = jm.criar_job(user_id="user-fluxo")
+    fluxos = [_FluxoFalso(t) for t in textos]
+    cliente = mock.Mock()
+    cliente.messages.stream.side_effect = fluxos
+    progresso = []
+    marcar = job.marcar_treinos_prontos
+
+    def _marcar(prontos, previstos):
+        marcar(prontos, previstos)
+        progresso.append(job.to_dict()["progress"])
+
+    monkeypatch.setattr(job, "marcar_treinos_prontos", _marcar)
+    with mock.patch("backend.app.cliente_anthropic", return_value=cliente), \
+         mock.patch("backend.app.persistir_plano", return_value="db-plan-fluxo"), \
+         mock.patch("backend.app.ai_quota.acertar_custo_real") as acerto, \
+         app.app_context():
+        _executar_geracao_molde(
+            job,
+            questionnaire_data={"nivelExperiencia": "iniciante"},
+            diretrizes={"preferencias": [], "restricoes": [], "excecoes_estruturais": []},
+            user_id="user-fluxo",
+            access_token="fake-token",
+        )
+    return job, cliente, fluxos, progresso, acerto
+
+
+def test_violacao_corta_o_fluxo_e_vai_para_o_retry_dirigido(monkeypatch):
+    job, cliente, fluxos, progresso, acerto = _rodar_em_fluxo(
+        monkeypatch, [json.dumps(_molde_sem_alvo()), json.dumps(MOLDE_VALIDO)],
+    )
+
+    assert job.to_dict()["status"] == "salvo"
+    assert cliente.messages.stream.call_count == 2
+    assert fluxos[0].fechado and fluxos[0].lidos < len(fluxos[0].pedacos), "o fluxo não foi cortado"
+
+    retry = cliente.messages.stream.call_args_list[1].kwargs["messages"]
+    parcial = retry[1]["content"]
+    assert retry[1]["role"] == "assistant" and parcial.startswith('{"nome": "Plano Teste"')
+    assert "calendario" not in parcial
+    assert "faltou o alvo de prescrição" in retry[2]["content"]
+    assert "interrompida" in retry[2]["content"]
+
+    # Só a tentativa que foi até o fim tem usage de saída para acertar.
+    assert acerto.call_count == 1
+    assert progresso[-1] == {
+        "step": "gerando_molde", "detail": "2 de 2 treinos prontos.",
+        "treinos_prontos": 2, "treinos_previstos": 2,
+    }
+
+
+def test_sem_a_flag_o_molde_segue_sem_fluxo(monkeypatch):
+    monkeypatch.setattr(app_module, "FORCA_MOLDE_EM_FLUXO", False)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
+    jm.limpar_jobs()
+    job, _ = jm.criar_job(user_id="user-fluxo")
+    resposta = types.SimpleNamespace(
+        content=[types.SimpleNamespace(type="text", text=json.dumps(MOLDE_VALIDO))], stop_reason="end_turn",
+    )
+    cliente = mock.Mock()
+    cliente.messages.create.return_value = resposta
+    with mock.patch("backend.app.cliente_anthropic", return_value=cliente), \
+         mock.patch("backend.app.persistir_plano", return_value="db-plan-fluxo"), \
+         app.app_context():
+        _executar_geracao_molde(
+            job, {"nivelExperiencia": "iniciante"},
+            {"preferencias": [], "restricoes": [], "excecoes_estruturais": []},
+            "user-fluxo", "fake-token",
+        )
+
+    assert job.to_dict()["status"] == "salvo"
+    cliente.messages.stream.assert_not_called()
+
+
+def test_validadores_das_subarvores_usam_o_draft_do_molde_schema():
+    for validador in molde_em_fluxo._VALIDADORES.values():
+        assert type(validador) is type(VALIDADOR_MOLDE)
+        assert validador.schema["$schema"] == VALIDADOR_MOLDE.schema["$schema"]
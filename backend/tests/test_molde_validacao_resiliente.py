@@ -196,17 +196,37 @@ def _resposta(texto):
     )
 
 
+def _persistir_consumindo(plan_id):
+    """Dublê de persistir_plano que consome o fluxo semana a semana como o
+    real: o pipeline de molde entrega `{"plan", "semanas"}` e só quem grava
+    materializa as linhas (guardadas em `.gravados`, já em listas)."""
+    gravados = []
+
+    def persistir(mapeado, **_kwargs):
+        listas = {"plan": mapeado["plan"], "sessions": [], "exercises": [], "sets": []}
+        for semana in mapeado["semanas"]:
+            for chave in ("sessions", "exercises", "sets"):
+                listas[chave].extend(semana[chave])
+        gravados.append(listas)
+        return plan_id
+
+    duble = mock.Mock(side_effect=persistir)
+    duble.gravados = gravados
+    return duble
+
+
 def _rodar_pipeline(monkeypatch, respostas, questionnaire_data=None):
     monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
     monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
     job, _ = jm.criar_job(user_id="user-retry")
     with mock.patch(
         "backend.utils.anthropic_retry.criar_mensagem_com_deadline",
         autospec=True,
         side_effect=respostas,
-    ) as chamada, mock.patch("backend.app.persistir_plano", return_value="db-plan-retry"):
+    ) as chamada, mock.patch(
+        "backend.app.persistir_plano", new=_persistir_consumindo("db-plan-retry")
+    ):
         with app.app_context():
             _executar_geracao_molde(
                 job,
@@ -394,15 +414,14 @@ def test_molde_com_cardio_por_tempo_salva_sem_retry(monkeypatch):
 
     monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
     monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
     job, _ = jm.criar_job(user_id="user-cardio")
     with mock.patch(
         "backend.utils.anthropic_retry.criar_mensagem_com_deadline",
         autospec=True,
         side_effect=[_resposta(json.dumps(molde))],
     ) as chamada, mock.patch(
-        "backend.app.persistir_plano", return_value="db-plan-cardio"
+        "backend.app.persistir_plano", new=_persistir_consumindo("db-plan-cardio")
     ) as persistir:
         with app.app_context():
             _executar_geracao_molde(
@@ -418,7 +437,7 @@ def test_molde_com_cardio_por_tempo_salva_sem_retry(monkeypatch):
     assert chamada.call_count == 1  # nenhuma geração extra paga
 
     # O cardio chega ao banco medido por TEMPO, não por repetição.
-    mapeado = persistir.call_args.args[0]
+    (mapeado,) = persistir.gravados
     caminhadas = [e for e in mapeado["exercises"] if e["name"] == "Caminhada"]
     assert caminhadas, "o exercício de cardio sumiu do payload persistido"
     assert {e["metric"] for e in caminhadas} == {"tempo_distancia"}
@@ -447,15 +466,14 @@ def test_cardio_fora_do_catalogo_honra_a_duracao_em_vez_de_inventar_repeticoes(m
 
     monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
     monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
     job, _ = jm.criar_job(user_id="user-sprint")
     with mock.patch(
         "backend.utils.anthropic_retry.criar_mensagem_com_deadline",
         autospec=True,
         side_effect=[_resposta(json.dumps(molde))],
     ), mock.patch(
-        "backend.app.persistir_plano", return_value="db-plan-sprint"
+        "backend.app.persistir_plano", new=_persistir_consumindo("db-plan-sprint")
     ) as persistir:
         with app.app_context():
             _executar_geracao_molde(
@@ -467,7 +485,7 @@ def test_cardio_fora_do_catalogo_honra_a_duracao_em_vez_de_inventar_repeticoes(m
             )
 
     assert job.to_dict()["status"] == "salvo"
-    mapeado = persistir.call_args.args[0]
+    (mapeado,) = persistir.gravados
     sprints = [e for e in mapeado["exercises"] if e["name"] == "Sprint na Esteira"]
     assert sprints, "o exercício sumiu do payload persistido"
     assert {e["metric"] for e in sprints} == {"tempo"}
@@ -489,15 +507,14 @@ def test_exercicio_de_carga_fora_do_catalogo_continua_com_repeticoes(monkeypatch
 
     monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
     monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
     job, _ = jm.criar_job(user_id="user-carga")
     with mock.patch(
         "backend.utils.anthropic_retry.criar_mensagem_com_deadline",
         autospec=True,
         side_effect=[_resposta(json.dumps(molde))],
     ), mock.patch(
-        "backend.app.persistir_plano", return_value="db-plan-carga"
+        "backend.app.persistir_plano", new=_persistir_consumindo("db-plan-carga")
     ) as persistir:
         with app.app_context():
             _executar_geracao_molde(
@@ -508,7 +525,7 @@ def test_exercicio_de_carga_fora_do_catalogo_continua_com_repeticoes(monkeypatch
                 access_token="fake-token",
             )
 
-    mapeado = persistir.call_args.args[0]
+    (mapeado,) = persistir.gravados
     proprietarios = [
         e for e in mapeado["exercises"] if e["name"] == "Movimento Proprietário XYZ"
     ]
@@ -523,8 +540,7 @@ def test_exercicio_de_carga_fora_do_catalogo_continua_com_repeticoes(monkeypatch
 def test_pipeline_passa_apenas_restricoes_estruturadas_de_lesao_ao_mapper(monkeypatch):
     monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
     monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
     job, _ = jm.criar_job(user_id="user-lesao")
     diretrizes = {
         "preferencias": [],
@@ -538,10 +554,10 @@ def test_pipeline_passa_apenas_restricoes_estruturadas_de_lesao_ao_mapper(monkey
     with mock.patch(
         "backend.utils.anthropic_retry.criar_mensagem_com_deadline",
         return_value=_resposta(json.dumps(MOLDE_VALIDO)),
-    ), mock.patch("backend.app.mapear_plano_ia", wraps=__import__(
-        "backend.services.plan_mapper", fromlist=["mapear_plano_ia"]
-    ).mapear_plano_ia) as mapper, mock.patch(
-        "backend.app.persistir_plano", return_value="db-plan-lesao"
+    ), mock.patch("backend.app.mapear_plano_ia_em_fluxo", wraps=__import__(
+        "backend.services.plan_mapper", fromlist=["mapear_plano_ia_em_fluxo"]
+    ).mapear_plano_ia_em_fluxo) as mapper, mock.patch(
+        "backend.app.persistir_plano", new=_persistir_consumindo("db-plan-lesao")
     ):
         with app.app_context():
             _executar_geracao_molde(
@@ -0,0 +1,77 @@
+# backend/tests/test_plan_expander_compilado.py
+# Expansão compilada por semana-tipo (plan_expander._SemanaTipoCompilada).
+#
+# Teste DIFERENCIAL: a expansão semana a semana de antes (deepcopy + todas as
+# regras reavaliadas em cada semana) fica em scripts/bench_plan_expander.py
+# como referência, e a expansão compilada precisa produzir exatamente o mesmo
+# plano, fora os UUIDs, para moldes sorteados de 1 a 52 semanas.
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.services.plan_expander as pe  # noqa: E402
+from backend.services.exercise_catalog import ContextoDeResolucao  # noqa: E402
+from scripts.bench_plan_expander import (  # noqa: E402
+    construir_ciclos_referencia,
+    molde_de_benchmark,
+    sem_ids,
+)
+
+
+def _argumentos(molde):
+    return (
+        molde["calendario"],
+        {st["id"]: st for st in molde["semanas_tipo"]},
+        molde["progressao"]["regras"],
+        molde.get("semanas_avulsas") or {},
+    )
+
+
+@pytest.mark.parametrize("semanas", [1, 4, 12, 24, 52])
+@pytest.mark.parametrize("semente", range(8))
+def test_expansao_compilada_igual_a_semana_a_semana(semanas, semente):
+    molde = molde_de_benchmark(semanas, semente)
+    argumentos = _argumentos(molde)
+
+    compilado = pe._construir_ciclos(*argumentos, ContextoDeResolucao())
+    referencia = construir_ciclos_referencia(*argumentos)
+
+    assert sem_ids(compilado) == sem_ids(referencia)
+
+
+def test_molde_de_benchmark_e_valido():
+    # O expandir_plano valida contra o MOLDE_SCHEMA: se o gerador sair do
+    # schema, o diferencial passa a comparar moldes que nunca chegam aqui.
+    plano = pe.expandir_plano(molde_de_benchmark(52, 3), {"id": "u1"})
+    assert plano["plano_principal"]["duracao_semanas"] == 52
+
+
+def _exercicios(ciclos):
+    return [
+        ex
+        for ciclo in ciclos
+        for micro in ciclo["microciclos"]
+        for sessao in micro["sessoes"]
+        for ex in sessao["exercicios"]
+    ]
+
+
+def test_semanas_tem_ids_proprios_e_nao_apontam_para_o_molde():
+    molde = molde_de_benchmark(12)
+    exercicios = _exercicios(pe._construir_ciclos(*_argumentos(molde), ContextoDeResolucao()))
+
+    assert len({ex["exercicio_id"] for ex in exercicios}) == len(exercicios)
+    assert len({id(ex) for ex in exercicios}) == len(exercicios)
+
+    exercicios[0]["series"] = 99
+    exercicios[0]["nome"] = "Outro"
+    originais = [ex for st in molde["semanas_tipo"] for s in st["sessoes"] for ex in s["exercicios"]]
+    assert all(ex["nome"] != "Outro" and ex.get("series") != 99 for ex in originais)
+    assert molde == molde_de_benchmark(12)
@@ -22,7 +22,7 @@ REPO_ROOT = os.path.dirname(BACKEND_DIR)
 if REPO_ROOT not in sys.path:
     sys.path.insert(0, REPO_ROOT)
 
-from backend.services.plan_mapper import mapear_plano_ia  # noqa: E402
+from backend.services.plan_mapper import mapear_plano_ia, mapear_plano_ia_em_fluxo  # noqa: E402
 
 USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
 START = datetime.date(2026, 7, 20)  # segunda-feira
@@ -397,6 +397,29 @@ def test_duration_weeks_reflete_cobertura_real_nao_a_declarada():
     assert resultado["plan"]["duration_weeks"] == 2
 
 
+def test_em_fluxo_entrega_uma_semana_por_vez_e_fecha_a_duracao_no_fim():
+    plano = _plano_exemplo()
+    plano["plano_principal"]["duracao_semanas"] = 12
+    em_fluxo = mapear_plano_ia_em_fluxo(plano, user_id=USER_ID, start_date=START)
+    assert em_fluxo["plan"]["duration_weeks"] == 12  # ainda a declarada
+
+    semanas = list(em_fluxo["semanas"])
+
+    assert [{s["week_number"] for s in semana["sessions"]} for semana in semanas] == [{1}, {2}]
+    assert sum(len(semana["sets"]) for semana in semanas) == 17
+    assert em_fluxo["plan"]["duration_weeks"] == 2
+
+
+def test_em_fluxo_estoura_o_teto_antes_de_mapear_o_resto(monkeypatch):
+    import backend.services.plan_mapper as pm
+
+    monkeypatch.setattr(pm, "MAX_TOTAL_SETS", 14)  # semana 1 tem 12 séries; a 2 passa do teto
+    semanas = mapear_plano_ia_em_fluxo(_plano_exemplo(), user_id=USER_ID, start_date=START)["semanas"]
+    assert len(next(semanas)["sets"]) == 12
+    with pytest.raises(ValueError, match="teto"):
+        next(semanas)
+
+
 # ---------- Catálogo canônico de exercícios (migration 0013) ----------
 
 def _plano_com_exercicio(nome, equipamento=None, observacoes=None):
@@ -3,6 +3,8 @@
 # 0006. Os testes não fingem transação com compensação mockada: falha = uma RPC
 # rejeitada e nenhum PATCH/DELETE separado.
 
+import copy
+import json
 import os
 import sys
 import unittest.mock as mock
@@ -33,6 +35,11 @@ def _mapeado(num_sets=3):
     }
 
 
+def _corpo(call):
+    """Corpo JSON enviado à RPC (bytes do codec, não mais `json=`)."""
+    return json.loads(call.kwargs["data"])
+
+
 def _response(status=200, body="plan-1"):
     response = mock.Mock()
     response.status_code = status
@@ -54,7 +61,7 @@ def test_uma_rpc_recebe_arvore_completa_e_jwt_do_usuario():
     assert call.args[0] == "https://teste.supabase.co/rest/v1/rpc/save_training_plan"
     assert call.kwargs["headers"]["Authorization"] == "Bearer {}".format(TOKEN)
     assert call.kwargs["headers"]["apikey"] == "anon-key-teste"
-    assert call.kwargs["json"] == {
+    assert _corpo(call) == {
         "p_plan": _mapeado()["plan"],
         "p_sessions": _mapeado()["sessions"],
         "p_exercises": _mapeado()["exercises"],
@@ -72,7 +79,7 @@ def test_payload_grande_continua_em_uma_unica_transacao_http():
         persistir_plano(mapped, access_token=TOKEN)
 
     assert post.call_count == 1
-    assert len(post.call_args.kwargs["json"]["p_sets"]) == 450
+    assert len(_corpo(post.call_args)["p_sets"]) == 450
 
 
 def test_progression_rules_nao_somem_do_payload_da_rpc():
@@ -85,7 +92,7 @@ def test_progression_rules_nao_somem_do_payload_da_rpc():
     ) as post:
         persistir_plano(mapped, access_token=TOKEN)
 
-    assert post.call_args.kwargs["json"]["p_plan"]["progression_rules"] == mapped["plan"][
+    assert _corpo(post.call_args)["p_plan"]["progression_rules"] == mapped["plan"][
         "progression_rules"
     ]
 
@@ -129,6 +136,72 @@ def test_mapeamento_incompleto_falha_antes_da_rede():
     post.assert_not_called()
 
 
+def _em_fluxo(mapeado, semanas=3):
+    """O mesmo mapeamento partido em semanas, como mapear_plano_ia_em_fluxo entrega."""
+    def gerar():
+        for i in range(semanas):
+            yield {
+                tabela: mapeado[tabela][i::semanas]
+                for tabela in ("sessions", "exercises", "sets")
+            }
+        mapeado["plan"]["duration_weeks"] = semanas
+
+    return {"plan": mapeado["plan"], "semanas": gerar()}
+
+
+def _reunir(mapeado, semanas=3):
+    return {
+        tabela: [linha for i in range(semanas) for linha in mapeado[tabela][i::semanas]]
+        for tabela in ("sessions", "exercises", "sets")
+    }
+
+
+def test_corpo_em_fluxo_e_o_mesmo_json_da_rpc_com_content_length():
+    mapeado = _mapeado(num_sets=450)
+    mapeado["sessions"][0]["notes"] = "Ênfase em técnica"
+    with mock.patch(
+        "backend.services.plan_repository.requests.post", return_value=_response()
+    ) as post:
+        assert persistir_plano(_em_fluxo(copy.deepcopy(mapeado)), access_token=TOKEN) == "plan-1"
+
+    assert post.call_count == 1
+    corpo = post.call_args.kwargs["data"]
+    enviado = b"".join(bytes(pedaco) for pedaco in corpo)
+    assert len(corpo) == len(enviado)
+    linhas = _reunir(mapeado)
+    assert json.loads(enviado.decode("utf-8")) == {
+        "p_plan": {**mapeado["plan"], "duration_weeks": 3},
+        "p_sessions": linhas["sessions"],
+        "p_exercises": linhas["exercises"],
+        "p_sets": linhas["sets"],
+    }
+
+
+def test_corpo_em_fluxo_e_fatiado_sem_copiar_tudo_numa_string(monkeypatch):
+    import backend.services.plan_repository as plan_repository
+
+    monkeypatch.setattr(plan_repository, "_TAMANHO_DO_PEDACO", 100)
+    with mock.patch(
+        "backend.services.plan_repository.requests.post", return_value=_response()
+    ) as post:
+        persistir_plano(_em_fluxo(_mapeado(num_sets=50)), access_token=TOKEN)
+
+    pedacos = list(post.call_args.kwargs["data"])
+    assert len(pedacos) > 10
+    assert all(len(pedaco) <= 100 for pedaco in pedacos)
+
+
+def test_erro_de_conteudo_no_fluxo_falha_antes_da_rede():
+    def semanas():
+        yield {"sessions": [], "exercises": [], "sets": []}
+        raise ValueError("Plano inválido: excede o teto de 2000 séries totais.")
+
+    with mock.patch("backend.services.plan_repository.requests.post") as post:
+        with pytest.raises(ValueError, match="teto"):
+            persistir_plano({"plan": {"id": "plan-1"}, "semanas": semanas()}, access_token=TOKEN)
+    post.assert_not_called()
+
+
 def test_migration_declara_serializacao_rls_e_todas_as_insercoes():
     sql = (
         Path(REPO_ROOT) / "supabase" / "migrations" / "0006_save_training_plan.sql"
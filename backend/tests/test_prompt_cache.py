@@ -0,0 +1,152 @@
+# backend/tests/test_prompt_cache.py
+# Breakpoints de prompt caching nas três rotas pagas e métricas de cache por
+# rota (backend/services/prompt_cache.py):
+# 1. chat: o system inteiro (instruções + questionário) é um prefixo cacheado;
+# 2. consolidate: o breakpoint fica no fim do system, DEPOIS do questionário —
+#    só as instruções ficam abaixo do prefixo mínimo cacheável de todo modelo;
+# 3. o texto enviado não muda — só ganha a divisão em blocos;
+# 4. tokens de escrita/leitura de cache somados por rota, com taxa de acerto
+#    e economia real (leitura a 0,1x, escrita a 1,25x).
+
+import json
+import os
+import sys
+import types
+import unittest.mock as mock
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app_module  # noqa: E402
+from backend.app import app  # noqa: E402
+from backend.services import ai_quota  # noqa: E402
+from backend.services.prompt_cache import (  # noqa: E402
+    bloco,
+    estatisticas_de_cache,
+    limpar_metricas_de_cache,
+    registrar_uso,
+    system_com_cache,
+    texto_do_system,
+)
+
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+
+
+@pytest.fixture(autouse=True)
+def _limpa():
+    app_module._rate_limiter.limpar()
+    limpar_metricas_de_cache()
+    yield
+    limpar_metricas_de_cache()
+
+
+@pytest.fixture()
+def client():
+    resposta_auth = mock.Mock(status_code=200)
+    resposta_auth.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    app.config["TESTING"] = True
+    with app.test_client() as test_client, \
+         mock.patch("backend.utils.auth.requests.get", return_value=resposta_auth):
+        yield test_client
+
+
+def _usage(entrada=100, escrita=0, leitura=0):
+    return types.SimpleNamespace(
+        input_tokens=entrada, output_tokens=20,
+        cache_creation_input_tokens=escrita, cache_read_input_tokens=leitura,
+    )
+
+
+def _anthropic(texto, usage):
+    cliente = mock.Mock()
+    cliente.messages.create.return_value = types.SimpleNamespace(
+        content=[types.SimpleNamespace(type="text", text=texto)], usage=usage,
+    )
+    return cliente
+
+
+def _post(client, rota, anthropic, questionario):
+    with mock.patch("backend.app._get_chat_anthropic_client", return_value=anthropic):
+        return client.post(
+            rota,
+            json={"messages": [{"role": "user", "content": "Quero focar em peito"}],
+                  "questionnaireData": questionario},
+            headers={"Authorization": "Bearer token-valido"},
+        )
+
+
+def test_chat_manda_o_system_inteiro_como_prefixo_cacheado(client):
+    anthropic = _anthropic("Resposta", _usage(leitura=900))
+    assert _post(client, "/api/chat", anthropic, {"idade": 30}).status_code == 200
+
+    system = anthropic.messages.create.call_args.kwargs["system"]
+    assert len(system) == 1
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    assert system[0]["text"] == app_module._build_chat_system_prompt({"idade": 30})
+
+
+def test_consolidate_cacheia_o_system_inteiro_com_o_questionario(client):
+    diretrizes = json.dumps({"preferencias": [], "restricoes": [], "excecoes_estruturais": []})
+    anthropic = _anthropic(diretrizes, _usage())
+    assert _post(client, "/api/consolidate-chat", anthropic, {"idade": 61}).status_code == 200
+
+    system = anthropic.messages.create.call_args.kwargs["system"]
+    assert len(system) == 1
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    assert "Use o schema:" in system[0]["text"]
+    assert system[0]["text"].endswith(json.dumps({"idade": 61}, indent=2, ensure_ascii=False))
+
+
+def test_system_com_cache_descarta_vazio_e_respeita_o_teto_da_api():
+    assert system_com_cache(bloco("fixo", cachear=True), bloco("")) == [
+        {"type": "text", "text": "fixo", "cache_control": {"type": "ephemeral"}}
+    ]
+    with pytest.raises(ValueError, match="breakpoints"):
+        system_com_cache(*[bloco(str(i), cachear=True) for i in range(5)])
+    assert texto_do_system([bloco("a", cachear=True), bloco("b")]) == "ab"
+    assert texto_do_system("só texto") == "só texto"
+
+
+def test_economia_desconta_o_premio_da_escrita():
+    # Haiku 4.5: entrada a US$ 1,00/M. Ler 1M do cache economiza 0,90; escrever
+    # 1M custa 0,25 a mais do que mandar a entrada sem cache.
+    assert ai_quota.economia_de_cache_usd("claude-haiku-4-5", _usage(leitura=1_000_000)) == pytest.approx(0.90)
+    assert ai_quota.economia_de_cache_usd("claude-haiku-4-5", _usage(escrita=1_000_000)) == pytest.approx(-0.25)
+    assert ai_quota.economia_de_cache_usd("claude-haiku-4-5", None) == 0.0
+
+
+def test_metricas_por_rota_com_taxa_de_acerto_e_economia():
+    registrar_uso("chat", "claude-haiku-4-5", _usage(entrada=100, escrita=900))
+    registrar_uso("chat", "claude-haiku-4-5", _usage(entrada=100, leitura=900))
+    registrar_uso("consolidate", "claude-haiku-4-5", _usage(entrada=500))
+    registrar_uso("chat", "claude-haiku-4-5", None)
+
+    chat = estatisticas_de_cache()["chat"]
+    assert chat["chamadas"] == 2
+    assert chat["tokens_escrita_cache"] == 900 and chat["tokens_leitura_cache"] == 900
+    assert chat["taxa_de_acerto"] == pytest.approx(900 / 2000)
+    assert chat["economia_usd"] == pytest.approx((900 * 0.90 - 900 * 0.25) / 1_000_000)
+    assert estatisticas_de_cache()["consolidate"]["taxa_de_acerto"] == 0.0
+
+
+def test_rotas_registram_o_usage_da_resposta(client):
+    _post(client, "/api/chat", _anthropic("Resposta", _usage(entrada=50, leitura=1500)), {"idade": 30})
+    _post(client, "/api/chat", _anthropic("Resposta", _usage(entrada=50, escrita=1500)), {"idade": 30})
+
+    chat = estatisticas_de_cache()["chat"]
+    assert chat["chamadas"] == 2
+    assert chat["tokens_leitura_cache"] == 1500
+    assert chat["tokens_escrita_cache"] == 1500
+
+
+def test_metricas_de_cache_saem_no_registro_de_metricas():
+    from backend.utils import metricas
+
+    registrar_uso("chat", "claude-haiku-4-5", _usage(entrada=100, leitura=900))
+    assert metricas.coletar()["cache_de_prompt"] == estatisticas_de_cache()
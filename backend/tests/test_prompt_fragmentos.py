@@ -0,0 +1,139 @@
+# backend/tests/test_prompt_fragmentos.py
+# Fragmentos do prompt do molde em cache (backend/services/prompt_fragmentos.py):
+# 1. o mesmo cardápio/bloco estável sai do cache (acerto), sem remontar;
+# 2. a chave separa o que muda o texto (flags do aluno, ETag do catálogo,
+#    layout/structured output) e ignora o que não muda (ordem das modalidades);
+# 3. o prompt montado do cache é byte a byte o montado do zero, nos 4 layouts;
+# 4. quem altera o `system` recebido não contamina o próximo job;
+# 5. LRU com teto.
+
+import os
+import sys
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app  # noqa: E402
+import backend.services.prompt_fragmentos as pf  # noqa: E402
+
+QUESTIONARIO = '{"objetivo": "hipertrofia"}'
+DIRETRIZES = '{"preferencias": []}'
+
+
+@pytest.fixture(autouse=True)
+def _cache_limpo():
+    pf.limpar_fragmentos()
+    yield
+    pf.limpar_fragmentos()
+
+
+@pytest.fixture()
+def montagens(monkeypatch):
+    """Conta as vezes que o cardápio foi montado de verdade."""
+    import backend.services.exercise_catalog as exercise_catalog
+
+    chamadas = []
+    original = exercise_catalog.catalogo_para_prompt
+
+    def contando(**kwargs):
+        chamadas.append(kwargs)
+        return original(**kwargs)
+
+    monkeypatch.setattr(exercise_catalog, "catalogo_para_prompt", contando)
+    return chamadas
+
+
+def test_mesmo_questionario_monta_o_cardapio_uma_vez(montagens):
+    q = {"inclui_cardio": "sim", "cardio_modalidades": ["Corrida", "Caminhada"]}
+
+    primeiro = app._catalogo_para_questionario(q)
+    segundo = app._catalogo_para_questionario(dict(q))
+
+    assert segundo is primeiro
+    assert len(montagens) == 1
+    assert pf.estatisticas_de_fragmentos() == {"acertos": 1, "faltas": 1, "entradas": 1}
+
+
+def test_ordem_das_modalidades_nao_muda_a_chave(montagens):
+    a = app._catalogo_para_questionario({"cardio_modalidades": ["Corrida", "Caminhada"]})
+    b = app._catalogo_para_questionario({"cardio_modalidades": ["Caminhada", "Corrida"]})
+    assert a is b
+    assert len(montagens) == 1
+
+
+@pytest.mark.parametrize("outro", [
+    {"inclui_cardio": "nao"},
+    {"inclui_alongamento": False},
+    {"cardio_modalidades": ["Corrida"]},
+])
+def test_flag_que_muda_o_cardapio_e_outra_entrada(montagens, outro):
+    base = app._catalogo_para_questionario({})
+    diferente = app._catalogo_para_questionario(outro)
+    assert diferente != base
+    assert len(montagens) == 2
+
+
+def test_catalogo_novo_nao_reaproveita_cardapio(montagens, monkeypatch):
+    app._catalogo_para_questionario({})
+    monkeypatch.setattr(app, "etag_catalogo", lambda: "catalogo-v999-outro")
+    app._catalogo_para_questionario({})
+    assert len(montagens) == 2
+
+
+@pytest.mark.parametrize("v2", [False, True])
+@pytest.mark.parametrize("structured", [False, True])
+def test_prompt_do_cache_e_o_mesmo_montado_do_zero(monkeypatch, v2, structured):
+    monkeypatch.setattr(app, "FORCA_PROMPT_MOLDE_V2", v2)
+    monkeypatch.setattr(app, "FORCA_STRUCTURED_OUTPUT", structured)
+    catalogo = app._catalogo_para_questionario({})
+
+    frio = app._montar_chamada_do_molde(QUESTIONARIO, DIRETRIZES, catalogo)
+    quente = app._montar_chamada_do_molde(QUESTIONARIO, DIRETRIZES, catalogo)
+
+    assert quente == frio
+    assert pf.estatisticas_de_fragmentos()["acertos"] == 1
+    pf.limpar_fragmentos()
+    assert app._montar_chamada_do_molde(QUESTIONARIO, DIRETRIZES, catalogo) == frio
+
+
+def test_flags_do_layout_fazem_parte_da_chave(monkeypatch):
+    catalogo = app._catalogo_para_questionario({})
+    monkeypatch.setattr(app, "FORCA_PROMPT_MOLDE_V2", True)
+    monkeypatch.setattr(app, "FORCA_STRUCTURED_OUTPUT", False)
+    com_schema = app._montar_chamada_do_molde(QUESTIONARIO, DIRETRIZES, catalogo)
+    monkeypatch.setattr(app, "FORCA_STRUCTURED_OUTPUT", True)
+    sem_schema = app._montar_chamada_do_molde(QUESTIONARIO, DIRETRIZES, catalogo)
+
+    assert "SCHEMA DO MOLDE:" in com_schema["system"][0]["text"]
+    assert "SCHEMA DO MOLDE:" not in sem_schema["system"][0]["text"]
+
+
+def test_alterar_o_system_recebido_nao_contamina_o_proximo_job(monkeypatch):
+    monkeypatch.setattr(app, "FORCA_PROMPT_MOLDE_V2", True)
+    catalogo = app._catalogo_para_questionario({})
+
+    primeira = app._montar_chamada_do_molde(QUESTIONARIO, DIRETRIZES, catalogo)
+    primeira["system"][0]["cache_control"]["ttl"] = "1h"
+    primeira["system"].append({"type": "text", "text": "extra"})
+    segunda = app._montar_chamada_do_molde(QUESTIONARIO, DIRETRIZES, catalogo)
+
+    assert len(segunda["system"]) == 1
+    assert segunda["system"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_lru_tem_teto_e_descarta_o_menos_usado(monkeypatch):
+    monkeypatch.setattr(pf, "_FRAGMENTOS_MAX", 2)
+    pf.fragmento("a", lambda: "A")
+    pf.fragmento("b", lambda: "B")
+    pf.fragmento("a", lambda: "nunca")  # volta a ser o mais recente
+    pf.fragmento("c", lambda: "C")  # empurra o "b" para fora
+
+    assert pf.fragmento("a", lambda: "nunca") == "A"
+    assert pf.fragmento("b", lambda: "B de novo") == "B de novo"
+    assert pf.estatisticas_de_fragmentos() == {"acertos": 2, "faltas": 4, "entradas": 2}
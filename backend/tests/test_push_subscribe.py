@@ -31,9 +31,7 @@ def client():
 def _limpa_rate_limits():
     import backend.app as app_module
 
-    buckets = getattr(app_module, "_rate_buckets", None)
-    if isinstance(buckets, dict):
-        buckets.clear()
+    app_module._rate_limiter.limpar()
     yield
 
 
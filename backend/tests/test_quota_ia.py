@@ -8,8 +8,10 @@
 # Todos os testes deste arquivo carregam `quota_real`: o fixture autouse do
 # conftest neutraliza a quota para o resto da suíte, e aqui a queremos viva.
 
+import datetime
 import os
 import sys
+import time
 import types
 import unittest.mock as mock
 
@@ -23,7 +25,8 @@ if REPO_ROOT not in sys.path:
     sys.path.insert(0, REPO_ROOT)
 
 from backend.app import app  # noqa: E402
-from backend.services import ai_quota  # noqa: E402
+from backend.services import ai_quota, estimativa_tokens  # noqa: E402
+from backend.utils import metricas  # noqa: E402
 
 pytestmark = pytest.mark.quota_real
 
@@ -42,9 +45,7 @@ def _limpa_rate_limits():
     """O bucket em memória não pode mascarar (nem ser mascarado por) a quota."""
     import backend.app as app_module
 
-    buckets = getattr(app_module, "_rate_buckets", None)
-    if isinstance(buckets, dict):
-        buckets.clear()
+    app_module._rate_limiter.limpar()
     yield
 
 
@@ -170,6 +171,7 @@ def test_reserva_precede_a_chamada_e_o_acerto_a_sucede(client):
                   "questionnaireData": {"idade": 30}},
             headers={"Authorization": "Bearer token-valido"},
         )
+        ai_quota.drenar_acertos()  # o acerto sai em segundo plano, depois da resposta
 
     assert resposta.status_code == 200
     assert ordem == ["reserva", "anthropic", "acerto"]
@@ -302,6 +304,7 @@ def test_falha_no_acerto_de_custo_nao_derruba_a_resposta(client):
                   "questionnaireData": {"idade": 30}},
             headers={"Authorization": "Bearer token-valido"},
         )
+        ai_quota.drenar_acertos()
 
     assert resposta.status_code == 200
     assert chamadas["n"] == 2  # reserva + tentativa de acerto
@@ -325,8 +328,7 @@ def _pipeline_do_molde(monkeypatch, respostas, rpc_quota):
 
     monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
     monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
-    with jm._jobs_lock:
-        jm._jobs.clear()
+    jm.limpar_jobs()
     job, _ = jm.criar_job(user_id="user-quota")
 
     corpos = []
@@ -406,3 +408,244 @@ def test_reserva_de_pior_caso_cobre_o_gasto_real_do_molde():
     )
     real = ai_quota.custo_real_usd(modelo, usage_pior_caso)
     assert reservado >= real
+
+
+# --- 8. O acerto sai do caminho da resposta e é coalescido ---
+
+def _rpc_de_acerto_capturando(capturados):
+    def _rpc(access_token, payload):
+        if payload["p_forcar"]:
+            capturados.append((access_token, payload["p_rota"], payload["p_custo_usd"]))
+        return _rpc_resposta(True)
+    return _rpc
+
+
+def test_resposta_do_chat_nao_espera_o_acerto(client):
+    acertos = []
+    with mock.patch("backend.utils.auth.requests.get", return_value=_fake_user_response()), \
+         mock.patch("backend.app._get_chat_anthropic_client", return_value=_fake_anthropic_client()), \
+         mock.patch.object(ai_quota, "_chamar_rpc", side_effect=_rpc_de_acerto_capturando(acertos)):
+        resposta = client.post(
+            "/api/chat",
+            json={"messages": [{"role": "user", "content": "Oi"}],
+                  "questionnaireData": {"idade": 30}},
+            headers={"Authorization": "Bearer token-valido"},
+        )
+        assert resposta.status_code == 200
+        assert acertos == []  # só a reserva foi à rede antes da resposta
+        assert ai_quota.profundidade_da_fila_de_acertos() == 1
+        assert ai_quota.drenar_acertos() == 1
+
+    assert len(acertos) == 1 and acertos[0][2] < 0  # devolve a sobra da reserva
+    assert ai_quota.profundidade_da_fila_de_acertos() == 0
+
+
+def test_deltas_do_mesmo_token_e_rota_viram_uma_rpc():
+    acertos = []
+    with mock.patch.object(ai_quota, "_chamar_rpc", side_effect=_rpc_de_acerto_capturando(acertos)):
+        for delta in (-0.010, -0.020, -0.005):
+            ai_quota.ajustar("token-a", "chat", delta)
+        ai_quota.ajustar("token-a", "consolidate", -0.1)
+        ai_quota.ajustar("token-b", "chat", 0.3)
+        ai_quota.ajustar("token-b", "chat", -0.3)  # anulou: nada a gravar
+        assert ai_quota.profundidade_da_fila_de_acertos() == 3
+        assert ai_quota.drenar_acertos() == 2
+
+    assert sorted(acertos) == [("token-a", "chat", -0.035), ("token-a", "consolidate", -0.1)]
+    assert ai_quota.estatisticas_de_acertos() == {
+        "enfileirados": 6, "enviados": 2, "falhas": 0, "profundidade": 0,
+    }
+
+
+def test_fila_envia_sozinha_depois_da_janela():
+    fila = ai_quota.FilaDeAcertos(janela_s=0.01)
+    enviado = mock.Mock(return_value=True)
+    with mock.patch.object(ai_quota, "_enviar_ajuste", enviado):
+        fila.enfileirar("token-a", "plan", -0.5)
+        for _ in range(200):
+            if fila.profundidade() == 0 and enviado.called:
+                break
+            time.sleep(0.01)
+
+    enviado.assert_called_once_with("token-a", "plan", -0.5, None)
+    assert fila.estatisticas()["enviados"] == 1
+
+
+def test_falha_no_envio_da_fila_e_contada_e_nao_levanta(caplog):
+    with mock.patch.object(ai_quota, "_chamar_rpc",
+                           side_effect=ai_quota.QuotaIndisponivel("banco caiu")), \
+         caplog.at_level("WARNING", logger=ai_quota.__name__):
+        ai_quota.ajustar("token-a", "chat", -0.01)
+        assert ai_quota.drenar_acertos() == 0
+
+    assert ai_quota.estatisticas_de_acertos()["falhas"] == 1
+    assert metricas.coletar()["acertos_de_quota"] == ai_quota.estatisticas_de_acertos()
+    assert "1 de 1 ajustes falharam" in caplog.text
+
+
+# --- 9. Sombra local: quem já estourou não custa mais RPC ---
+
+def _reservar_chat(user_id=USER_ID, custo=0.01):
+    return ai_quota.reservar("token-valido", "chat", custo, user_id=user_id)
+
+
+def test_teto_de_chamadas_estourado_recusa_sem_rpc_ate_a_virada_do_dia(monkeypatch):
+    limite = ai_quota.LIMITE_CHAMADAS_POR_ROTA["chat"]
+    rpc = mock.Mock(return_value=_rpc_resposta(False, "chamadas", chamadas=limite))
+    monkeypatch.setattr(ai_quota, "_chamar_rpc", rpc)
+    monkeypatch.setattr(ai_quota, "_dia_da_quota", lambda: datetime.date(2026, 10, 17))
+
+    for _ in range(5):  # o app re-tentando
+        with pytest.raises(ai_quota.QuotaExcedida) as excedida:
+            _reservar_chat()
+    assert excedida.value.motivo == "chamadas"
+    assert rpc.call_count == 1
+    assert ai_quota.estatisticas_da_sombra() == {"acertos": 4, "desvios": 1, "usuarios": 1}
+    assert metricas.coletar()["sombra_de_quota"] == {"acertos": 4, "desvios": 1, "usuarios": 1}
+
+    # A RPC é quem decide a outra rota e o dia seguinte.
+    rpc.return_value = _rpc_resposta(True, chamadas=1)
+    ai_quota.reservar("token-valido", "plan", 0.5, user_id=USER_ID)
+    monkeypatch.setattr(ai_quota, "_dia_da_quota", lambda: datetime.date(2026, 10, 18))
+    _reservar_chat()
+    assert rpc.call_count == 3
+
+
+def test_perto_do_teto_a_rpc_continua_decidindo(monkeypatch):
+    limite = ai_quota.LIMITE_CHAMADAS_POR_ROTA["chat"]
+    rpc = mock.Mock(return_value=_rpc_resposta(True, chamadas=limite - 1, custo=4.99))
+    monkeypatch.setattr(ai_quota, "_chamar_rpc", rpc)
+
+    _reservar_chat()
+    _reservar_chat()
+    assert rpc.call_count == 2
+    assert ai_quota.estatisticas_da_sombra()["acertos"] == 0
+
+
+def test_custo_estourado_recusa_localmente_so_dentro_do_ttl(monkeypatch):
+    rpc = mock.Mock(return_value=_rpc_resposta(False, "custo", chamadas=3, custo=5.01))
+    monkeypatch.setattr(ai_quota, "_chamar_rpc", rpc)
+    relogio = [1000.0]
+    monkeypatch.setattr(ai_quota.time, "monotonic", lambda: relogio[0])
+
+    for _ in range(3):
+        with pytest.raises(ai_quota.QuotaExcedida):
+            _reservar_chat()
+    assert rpc.call_count == 1
+
+    # Um ajuste pode ter devolvido folga: passado o TTL, a RPC confere de novo.
+    relogio[0] += ai_quota.AI_QUOTA_SOMBRA_TTL_CUSTO_SECONDS + 1
+    rpc.return_value = _rpc_resposta(True, chamadas=4, custo=4.20)
+    _reservar_chat()
+    assert rpc.call_count == 2
+
+
+def test_resposta_do_ajuste_tira_da_recusa_quem_voltou_a_ter_folga(monkeypatch):
+    rpc = mock.Mock(return_value=_rpc_resposta(False, "custo", chamadas=3, custo=5.01))
+    monkeypatch.setattr(ai_quota, "_chamar_rpc", rpc)
+    with pytest.raises(ai_quota.QuotaExcedida):
+        _reservar_chat()
+
+    # O molde que estava em voo terminou e devolveu a sobra da reserva.
+    rpc.return_value = _rpc_resposta(True, chamadas=3, custo=3.10)
+    ai_quota.ajustar("token-valido", "chat", -1.91, user_id=USER_ID)
+    ai_quota.drenar_acertos()
+
+    _reservar_chat()
+    assert rpc.call_count == 3  # reserva recusada, ajuste, reserva aceita
+
+
+def test_sem_user_id_a_sombra_fica_de_fora(monkeypatch):
+    rpc = mock.Mock(return_value=_rpc_resposta(False, "custo", custo=9.0))
+    monkeypatch.setattr(ai_quota, "_chamar_rpc", rpc)
+    for _ in range(2):
+        with pytest.raises(ai_quota.QuotaExcedida):
+            ai_quota.reservar("token-valido", "chat", 0.01)
+    assert rpc.call_count == 2
+    assert ai_quota.estatisticas_da_sombra() == {"acertos": 0, "desvios": 0, "usuarios": 0}
+
+
+def test_rota_recusada_pela_sombra_devolve_429_sem_chamar_o_modelo(client):
+    anthropic = _fake_anthropic_client()
+    with mock.patch("backend.utils.auth.requests.get", return_value=_fake_user_response()), \
+         mock.patch("backend.app._get_chat_anthropic_client", return_value=anthropic), \
+         mock.patch.object(ai_quota, "_chamar_rpc",
+                           return_value=_rpc_resposta(False, "custo", custo=5.01)) as rpc:
+        for _ in range(3):
+            resposta = client.post(
+                "/api/chat",
+                json={"messages": [{"role": "user", "content": "Oi"}],
+                      "questionnaireData": {"idade": 30}},
+                headers={"Authorization": "Bearer token-valido"},
+            )
+            assert resposta.status_code == 429
+
+    assert rpc.call_count == 1
+    anthropic.messages.create.assert_not_called()
+
+
+# --- 10. Reserva calibrada pelo `usage` real (p95 por rota) ---
+
+def _usage(entrada, saida):
+    return types.SimpleNamespace(
+        input_tokens=entrada, output_tokens=saida,
+        cache_creation_input_tokens=0, cache_read_input_tokens=0,
+    )
+
+
+def _calibrar(rota, modelo, saidas, caracteres=40_000, tokens_por_caractere=0.3):
+    for saida in saidas:
+        estimativa_tokens.registrar_uso(
+            rota, modelo, caracteres, _usage(int(caracteres * tokens_por_caractere), saida)
+        )
+
+
+def test_sem_amostras_suficientes_a_reserva_e_o_pior_caso():
+    _calibrar("plan", "claude-opus-5", [4000] * (estimativa_tokens.AMOSTRAS_MINIMAS - 1))
+    assert ai_quota.custo_reservado_usd("plan", "claude-opus-5", 40_000, 32_768) == pytest.approx(
+        ai_quota.custo_estimado_usd("claude-opus-5", 40_000, 32_768)
+    )
+
+
+def test_reserva_do_molde_usa_o_p95_da_saida_e_nao_o_teto():
+    # 95 gerações de ~4k tokens e 5 que pensaram muito: o p95 fica nas comuns.
+    _calibrar("plan", "claude-opus-5", [4000 + i for i in range(95)] + [30_000] * 5)
+
+    reservado = ai_quota.custo_reservado_usd("plan", "claude-opus-5", 40_000, 32_768)
+    esperado = (40_000 * 0.3 * 5.00 + 4094 * 25.00) / 1_000_000
+    assert reservado == pytest.approx(esperado)
+    assert reservado < ai_quota.custo_estimado_usd("claude-opus-5", 40_000, 32_768) / 4
+    # Outra rota e outro modelo seguem no pior caso.
+    assert ai_quota.custo_reservado_usd("plan", "claude-haiku-4-5", 40_000, 32_768) == pytest.approx(
+        ai_quota.custo_estimado_usd("claude-haiku-4-5", 40_000, 32_768)
+    )
+
+
+def test_p95_nunca_passa_do_max_tokens_da_chamada():
+    _calibrar("chat", "claude-haiku-4-5", [3000] * 50)
+    so_saida = ai_quota.custo_reservado_usd("chat", "claude-haiku-4-5", 0, 1024)
+    assert so_saida == pytest.approx(1024 * 5.00 / 1_000_000)
+
+
+def test_entrada_calibrada_pelo_tokens_por_caractere_real():
+    # Prompt em português com JSON: 1 token a cada ~2,5 caracteres, não 4.
+    _calibrar("consolidate", "claude-haiku-4-5", [500] * 30, caracteres=10_000, tokens_por_caractere=0.4)
+    assert estimativa_tokens.tokens_por_caractere("consolidate", "claude-haiku-4-5") == pytest.approx(0.4)
+    reservado = ai_quota.custo_reservado_usd("consolidate", "claude-haiku-4-5", 10_000, 2048)
+    assert reservado == pytest.approx((4000 * 1.00 + 500 * 5.00) / 1_000_000)
+
+
+def test_acerto_alimenta_a_calibracao_e_a_razao_reservado_real():
+    with mock.patch.object(ai_quota, "_chamar_rpc", return_value=_rpc_resposta(True)):
+        for saida in (1000, 1000, 3000):
+            ai_quota.acertar_custo_real(
+                "token", "chat", "claude-haiku-4-5", 0.01, _usage(2000, saida),
+                caracteres_prompt=8000,
+            )
+
+    stats = estimativa_tokens.estatisticas_de_reserva()["chat"]
+    assert stats["amostras"] == 3
+    # real = 2000*1/1M + saída*5/1M: 0,007 / 0,007 / 0,017
+    assert stats["razao_mediana"] == pytest.approx(0.01 / 0.007)
+    assert stats["subreservas"] == 1  # a de 3000 tokens gastou mais que o reservado
+    assert metricas.coletar()["reservas_de_quota"]["chat"] == stats
@@ -0,0 +1,140 @@
+# backend/tests/test_rate_limiter.py
+# Backends do rate limiter (backend/services/rate_limiter.py):
+# 1. o limite vale dentro da janela e a chamada recusada NÃO é contada;
+# 2. a janela anterior pesa proporcionalmente ao que resta dela (deslizante);
+# 3. memória O(1) por chave e despejo das chaves ociosas;
+# 4. dois "workers" apontando para o mesmo SQLite dividem o MESMO limite;
+# 5. concorrência: N threads nunca deixam passar mais que o limite.
+
+import threading
+
+import pytest
+
+from backend.services import rate_limiter
+from backend.services.rate_limiter import (
+    JanelaDeslizanteEmMemoria,
+    JanelaDeslizanteSqlite,
+    criar_rate_limiter,
+)
+
+
+class _Relogio:
+    def __init__(self, agora=1_000.0):
+        self.agora = agora
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def limitador_e_relogio(request, tmp_path):
+    relogio = _Relogio()
+    if request.param == "memoria":
+        return JanelaDeslizanteEmMemoria(shards=4, relogio=relogio), relogio
+    return JanelaDeslizanteSqlite(str(tmp_path / "rl.sqlite3"), relogio=relogio), relogio
+
+
+def test_limite_vale_na_janela_e_recusa_nao_conta(limitador_e_relogio):
+    limitador, relogio = limitador_e_relogio
+    resultados = [limitador.hit("chat", "u1", 3, 60) for _ in range(5)]
+    assert resultados == [False, False, False, True, True]
+
+    # Outro usuário e outro balde não dividem o contador.
+    assert limitador.hit("chat", "u2", 3, 60) is False
+    assert limitador.hit("plan", "u1", 3, 60) is False
+
+
+def test_janela_anterior_pesa_pelo_que_resta_dela(limitador_e_relogio):
+    limitador, relogio = limitador_e_relogio
+    relogio.agora = 1_020.0  # índice 17 da janela de 60s começa em 1020
+    for _ in range(4):
+        assert limitador.hit("chat", "u1", 4, 60) is False
+    assert limitador.hit("chat", "u1", 4, 60) is True
+
+    # 15s na janela seguinte: 4 × 0,75 = 3 ainda pesam → sobra 1 vaga.
+    relogio.agora = 1_080.0 + 15
+    assert limitador.hit("chat", "u1", 4, 60) is False
+    assert limitador.hit("chat", "u1", 4, 60) is True
+
+    # Duas janelas depois o passado não pesa mais nada.
+    relogio.agora = 1_200.0
+    assert [limitador.hit("chat", "u1", 4, 60) for _ in range(4)] == [False] * 4
+
+
+def test_chaves_ociosas_sao_despejadas(limitador_e_relogio):
+    limitador, relogio = limitador_e_relogio
+    for usuario in range(50):
+        limitador.hit("chat", "u{}".format(usuario), 3, 60)
+    assert len(limitador) == 50
+
+    relogio.agora += 30
+    limitador.despejar_ociosos()
+    assert len(limitador) == 50
+
+    relogio.agora += 120
+    limitador.despejar_ociosos()
+    assert len(limitador) == 0
+
+
+def test_despejo_acontece_sozinho_no_caminho_da_requisicao(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "VARREDURA_A_CADA", 10)
+    relogio = _Relogio()
+    limitador = JanelaDeslizanteEmMemoria(shards=1, relogio=relogio)
+    for usuario in range(9):
+        limitador.hit("chat", "u{}".format(usuario), 3, 60)
+    relogio.agora += 1_000
+    limitador.hit("chat", "novo", 3, 60)
+    assert len(limitador) == 1
+
+
+def test_estado_por_chave_e_constante_no_backend_em_memoria():
+    limitador = JanelaDeslizanteEmMemoria(shards=1)
+    for _ in range(1_000):
+        limitador.hit("chat", "u1", 10_000, 60)
+    (estado,) = limitador._fatias[0].entradas.values()
+    assert len(estado) == 4
+
+
+def test_dois_workers_no_mesmo_sqlite_dividem_o_limite(tmp_path):
+    caminho = str(tmp_path / "compartilhado.sqlite3")
+    relogio = _Relogio()
+    worker_a = JanelaDeslizanteSqlite(caminho, relogio=relogio)
+    worker_b = JanelaDeslizanteSqlite(caminho, relogio=relogio)
+
+    assert worker_a.hit("plan", "u1", 3, 3600) is False
+    assert worker_b.hit("plan", "u1", 3, 3600) is False
+    assert worker_a.hit("plan", "u1", 3, 3600) is False
+    assert worker_b.hit("plan", "u1", 3, 3600) is True
+
+
+@pytest.mark.parametrize("backend", ["memoria", "sqlite"])
+def test_threads_concorrentes_nunca_passam_do_limite(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_SQLITE_PATH", str(tmp_path / "rl.sqlite3"))
+    limitador = criar_rate_limiter(backend)
+    liberadas = []
+    trava = threading.Lock()
+
+    def _disparar():
+        for _ in range(20):
+            if not limitador.hit("chat", "u1", 25, 60):
+                with trava:
+                    liberadas.append(1)
+
+    threads = [threading.Thread(target=_disparar) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(liberadas) == 25
+
+
+def test_sqlite_indisponivel_falha_aberto(tmp_path, caplog):
+    limitador = JanelaDeslizanteSqlite(str(tmp_path / "rl.sqlite3"))
+    limitador._conexao().execute("DROP TABLE rate_limit")
+    assert limitador.hit("chat", "u1", 1, 60) is False
+    assert "indisponível" in caplog.text
+
+
+def test_backend_desconhecido_cai_no_em_memoria():
+    assert isinstance(criar_rate_limiter("redis"), JanelaDeslizanteEmMemoria)
@@ -0,0 +1,166 @@
+# backend/tests/test_resolucao_memo.py
+# Memo de resolver_exercicio e contexto de resolução por plano:
+# 1. a mesma (nome, equipamento) devolve a mesma resolução, sem re-resolver;
+# 2. o memo é chaveado pelo ETag do catálogo e tem teto (LRU);
+# 3. expansor + mapper do mesmo plano, com um contexto só, resolvem cada
+#    exercício distinto UMA vez — e gravam o mesmo que sem contexto.
+
+import datetime
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.services.exercise_catalog as exercise_catalog  # noqa: E402
+from backend.services.exercise_catalog import (  # noqa: E402
+    ContextoDeResolucao,
+    limpar_cache_de_resolucao,
+    resolver_exercicio,
+)
+from backend.services.plan_expander import expandir_plano  # noqa: E402
+from backend.services.plan_mapper import mapear_plano_ia  # noqa: E402
+
+INICIO = datetime.date(2026, 3, 2)
+
+
+@pytest.fixture(autouse=True)
+def _memo_limpo():
+    limpar_cache_de_resolucao()
+    yield
+    limpar_cache_de_resolucao()
+
+
+@pytest.fixture()
+def contagem(monkeypatch):
+    """Conta as resoluções que chegaram ao casamento de verdade."""
+    chamadas = []
+    original = exercise_catalog._resolver_sem_memo
+
+    def contando(nome, equipamento):
+        chamadas.append((nome, equipamento))
+        return original(nome, equipamento)
+
+    monkeypatch.setattr(exercise_catalog, "_resolver_sem_memo", contando)
+    return chamadas
+
+
+def test_mesma_consulta_e_resolvida_uma_vez(contagem):
+    primeira = resolver_exercicio("Supino Reto (Deload)", "Barra")
+    segunda = resolver_exercicio("Supino Reto (Deload)", "Barra")
+
+    assert segunda is primeira
+    assert contagem == [("Supino Reto (Deload)", "Barra")]
+    assert resolver_exercicio("Supino Reto (Deload)", "Halteres").nome_original == "Supino Reto (Deload)"
+    assert len(contagem) == 2, "equipamento faz parte da chave"
+
+
+def test_catalogo_novo_nao_reaproveita_resolucao_antiga(contagem, monkeypatch):
+    resolver_exercicio("Agachamento Livre")
+    monkeypatch.setattr(exercise_catalog, "etag_catalogo", lambda: "catalogo-v999-outro")
+    resolver_exercicio("Agachamento Livre")
+    assert len(contagem) == 2
+
+
+def test_memo_tem_teto_e_descarta_o_menos_usado(contagem, monkeypatch):
+    monkeypatch.setattr(exercise_catalog, "_RESOLUCOES_MAX", 2)
+    resolver_exercicio("Supino Reto")
+    resolver_exercicio("Agachamento Livre")
+    resolver_exercicio("Supino Reto")  # volta a ser o mais recente
+    resolver_exercicio("Remada Curvada")  # empurra o Agachamento para fora
+
+    assert len(exercise_catalog._resolucoes) == 2
+    contagem.clear()
+    resolver_exercicio("Supino Reto")
+    assert contagem == []
+    resolver_exercicio("Agachamento Livre")
+    assert contagem == [("Agachamento Livre", None)]
+
+
+def test_argumento_que_nao_e_texto_nao_entra_no_memo(contagem):
+    assert resolver_exercicio(1).nome_original == "1"
+    assert resolver_exercicio(True).nome_original == "True"
+    assert len(exercise_catalog._resolucoes) == 0
+
+
+def _molde_12_semanas():
+    exercicios = [
+        {"nome": "Supino Reto", "equipamento": "Barra", "ordem": 1, "series": 4,
+         "repeticoes": "8-12", "percentual_rm": 70, "prioridade": "primario"},
+        {"nome": "Prancha", "ordem": 2, "series": 3, "repeticoes": "30s"},
+        {"nome": "Corrida na Esteira", "ordem": 3, "series": 1, "duracao_minutos": 20},
+        {"nome": "Movimento Inventado", "ordem": 4, "series": 3, "repeticoes": "10"},
+    ]
+    return {
+        "nome": "Plano Memo",
+        "descricao": "",
+        "periodizacao": {"tipo": "Linear"},
+        "duracao_semanas": 12,
+        "frequencia_semanal": 2,
+        "semanas_tipo": [{
+            "id": "tipo_a",
+            "nome": "Base",
+            "sessoes": [
+                {"nome": "A", "tipo": "Força", "duracao_minutos": 60, "dia_offset": 0,
+                 "grupos_musculares": [{"nome": "Peito"}], "exercicios": exercicios},
+                {"nome": "B", "tipo": "Força", "duracao_minutos": 60, "dia_offset": 2,
+                 "grupos_musculares": [{"nome": "Peito"}], "exercicios": exercicios},
+            ],
+        }],
+        "calendario": ["tipo_a"] * 12,
+        "progressao": {"regras": [
+            {"tipo": "delta_rm_percentual", "semana_inicio": 1, "semana_fim": 11, "valor": 2},
+            {"tipo": "delta_series", "semana_inicio": 2, "semana_fim": 6, "valor": 1},
+            {"tipo": "delta_cardio_percentual", "semana_inicio": 1, "semana_fim": 11, "valor": 5},
+            {"tipo": "deload_percentual", "semana": 12, "fator_rm": 0.8, "fator_series": 0.8},
+        ]},
+    }
+
+
+def _gravado(mapeado):
+    """Linhas de exercício e série sem os UUIDs gerados a cada execução."""
+    ids = ("id", "session_id", "exercise_id")
+    return (
+        [{k: v for k, v in ex.items() if k not in ids} for ex in mapeado["exercises"]],
+        [{k: v for k, v in s.items() if k not in ids} for s in mapeado["sets"]],
+    )
+
+
+def test_pipeline_com_contexto_resolve_cada_exercicio_uma_vez(monkeypatch):
+    resolvidos = []
+    original = exercise_catalog.resolver_exercicio
+
+    def contando(nome, equipamento=None):
+        resolvidos.append((nome, equipamento))
+        return original(nome, equipamento)
+
+    monkeypatch.setattr(exercise_catalog, "resolver_exercicio", contando)
+    contexto = ContextoDeResolucao()
+    plano = expandir_plano(_molde_12_semanas(), {"id": "u1"}, start_date=INICIO, contexto=contexto)
+    mapeado = mapear_plano_ia(plano, user_id="u1", start_date=INICIO, contexto=contexto)
+
+    assert sorted(resolvidos, key=str) == sorted({
+        ("Supino Reto", "Barra"),
+        ("Prancha", None),
+        ("Corrida na Esteira", None),
+        ("Movimento Inventado", None),
+    }, key=str)
+    assert len(contexto) == 4
+    assert len(mapeado["exercises"]) == 12 * 2 * 4
+
+
+def test_contexto_nao_muda_o_que_e_gravado():
+    com = mapear_plano_ia(
+        expandir_plano(_molde_12_semanas(), {"id": "u1"}, start_date=INICIO, contexto=ContextoDeResolucao()),
+        user_id="u1", start_date=INICIO,
+    )
+    limpar_cache_de_resolucao()
+    sem = mapear_plano_ia(
+        expandir_plano(_molde_12_semanas(), {"id": "u1"}, start_date=INICIO),
+        user_id="u1", start_date=INICIO,
+    )
+    assert _gravado(com) == _gravado(sem)
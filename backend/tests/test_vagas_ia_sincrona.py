@@ -0,0 +1,114 @@
+# backend/tests/test_vagas_ia_sincrona.py
+# Teto de chamadas síncronas à IA em voo (AI_SYNC_MAX_CONCURRENT):
+# 1. com as vagas ocupadas por chats lentos, o próximo chat/consolidate
+#    recebe 503 + Retry-After NA HORA, sem esperar vaga;
+# 2. /api/health continua respondendo enquanto as chamadas lentas estão em voo
+#    — o que o teto existe para garantir;
+# 3. 503 por lotação não reserva quota;
+# 4. a vaga volta quando a chamada termina, inclusive com erro da IA.
+
+import os
+import sys
+import threading
+import time
+import types
+import unittest.mock as mock
+
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.app as app_module  # noqa: E402
+from backend.app import app  # noqa: E402
+
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+VAGAS = 2
+
+
+@pytest.fixture(autouse=True)
+def _vagas(monkeypatch):
+    app_module._rate_limiter.limpar()
+    monkeypatch.setattr(app_module, "_ia_sincrona_vagas", threading.BoundedSemaphore(VAGAS))
+    monkeypatch.setattr(app_module, "AI_SYNC_RETRY_AFTER_SECONDS", 7)
+    resposta_auth = mock.Mock(status_code=200)
+    resposta_auth.json.return_value = {"id": USER_ID, "email": "user@teste.com"}
+    app.config["TESTING"] = True
+    with mock.patch("backend.utils.auth.requests.get", return_value=resposta_auth):
+        yield
+
+
+class _IaLenta:
+    """Cliente Anthropic falso que segura cada chamada até `soltar`."""
+
+    def __init__(self):
+        self.soltar = threading.Event()
+        self.em_voo = threading.Semaphore(0)
+        self.messages = types.SimpleNamespace(create=self._create)
+
+    def _create(self, **_kwargs):
+        self.em_voo.release()
+        assert self.soltar.wait(10), "o teste esqueceu de soltar a IA"
+        return types.SimpleNamespace(content=[types.SimpleNamespace(type="text", text="ok")], usage=None)
+
+
+def _chat(rota="/api/chat"):
+    with app.test_client() as cliente:
+        return cliente.post(
+            rota,
+            json={"messages": [{"role": "user", "content": "Oi"}], "questionnaireData": {}},
+            headers={"Authorization": "Bearer token-valido"},
+        )
+
+
+def _ocupar_vagas(ia):
+    respostas = []
+    threads = [threading.Thread(target=lambda: respostas.append(_chat())) for _ in range(VAGAS)]
+    for t in threads:
+        t.start()
+    for _ in range(VAGAS):
+        assert ia.em_voo.acquire(timeout=5), "chat lento não chegou na IA"
+    return threads, respostas
+
+
+@pytest.mark.parametrize("rota", ["/api/chat", "/api/consolidate-chat"])
+def test_vagas_cheias_respondem_503_na_hora_e_health_segue_vivo(rota):
+    ia = _IaLenta()
+    with mock.patch("backend.app._get_chat_anthropic_client", return_value=ia), \
+         mock.patch("backend.app._reservar_quota_ia", wraps=app_module._reservar_quota_ia) as reserva:
+        threads, respostas = _ocupar_vagas(ia)
+        try:
+            inicio = time.monotonic()
+            lotado = _chat(rota)
+            with app.test_client() as cliente:
+                health = cliente.get("/api/health")
+            decorrido = time.monotonic() - inicio
+        finally:
+            ia.soltar.set()
+            for t in threads:
+                t.join(5)
+
+    assert lotado.status_code == 503
+    assert lotado.headers["Retry-After"] == "7"
+    assert lotado.get_json()["retry_after"] == 7
+    assert health.status_code == 200
+    assert decorrido < 2, "a rota lotada esperou vaga em vez de responder na hora"
+    assert reserva.call_count == VAGAS  # o 503 não reservou quota
+    assert [r.status_code for r in respostas] == [200] * VAGAS
+
+
+def test_vaga_volta_depois_de_erro_da_ia():
+    quebrado = mock.Mock()
+    quebrado.messages.create.side_effect = RuntimeError("api fora")
+    with mock.patch("backend.app._get_chat_anthropic_client", return_value=quebrado):
+        for _ in range(VAGAS + 1):
+            assert _chat().status_code == 502
+
+    ia = _IaLenta()
+    ia.soltar.set()
+    with mock.patch("backend.app._get_chat_anthropic_client", return_value=ia):
+        assert _chat().status_code == 200
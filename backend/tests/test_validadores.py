@@ -0,0 +1,205 @@
+# backend/tests/test_validadores.py
+# Validadores compilados (backend/schemas/validadores.py):
+# 1. cada schema é compilado uma vez, no draft que ele declara;
+# 2. para instância válida ou inválida, `validar` levanta EXATAMENTE o erro
+#    de `jsonschema.validate` — mensagem, regra e caminho — porque o mapeamento
+#    pt-BR do rascunho manual e o retry dirigido do molde leem esses campos;
+# 3. a mensagem pt-BR do rascunho manual sai igual pelos dois caminhos;
+# 4. MoldeValidado: o expansor pula a revalidação só com a prova do validador
+#    atual; dict cru continua validado, e o pipeline do molde valida uma vez.
+
+import copy
+import json
+import os
+import sys
+import types
+import unittest.mock as mock
+
+import jsonschema
+import pytest
+
+os.environ["SUPABASE_URL"] = "https://teste.supabase.co"
+os.environ["SUPABASE_ANON_KEY"] = "anon-key-teste"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import backend.services.job_manager as jm  # noqa: E402
+import backend.services.plan_expander as pe  # noqa: E402
+from backend.app import (  # noqa: E402
+    _executar_geracao_molde,
+    _mensagem_de_validacao,
+    _validar_rascunho_manual,
+    app,
+)
+from backend.schemas.diretrizes_schema import DIRETRIZES_SCHEMA  # noqa: E402
+from backend.schemas.molde_schema import MOLDE_SCHEMA  # noqa: E402
+from backend.schemas.plano_manual_schema import PLANO_MANUAL_SCHEMA  # noqa: E402
+from backend.schemas.validadores import (  # noqa: E402
+    VALIDADOR_DIRETRIZES,
+    VALIDADOR_MOLDE,
+    VALIDADOR_PLANO_MANUAL,
+    MoldeValidado,
+    compilar,
+    validar,
+    validar_molde,
+)
+
+EXERCICIO = {"nome": "Supino", "ordem": 1, "series": 3, "repeticoes": "10"}
+MOLDE = {
+    "nome": "Plano Teste",
+    "frequencia_semanal": 1,
+    "semanas_tipo": [{
+        "id": "tipo_a", "nome": "A",
+        "sessoes": [{
+            "nome": "Treino A", "tipo": "Hipertrofia", "dia_offset": 0,
+            "grupos_musculares": [{"nome": "Peito"}],
+            "exercicios": [dict(EXERCICIO), {**EXERCICIO, "nome": "Crucifixo", "ordem": 2}],
+        }],
+    }],
+    "calendario": ["tipo_a"] * 4,
+    "progressao": {"regras": []},
+}
+DIRETRIZES = {"preferencias": ["focar em peito"], "restricoes": [], "excecoes_estruturais": []}
+RASCUNHO = {
+    "nome": "Meu plano manual",
+    "duracao_semanas": 12,
+    "progressao": {"series": None, "cardio": None, "intensidade": None, "deload": None},
+    "treinos": [{
+        "nome": "Treino A", "dia_offset": 0, "duracao_minutos": None,
+        "incluir_aquecimento": False, "incluir_alongamento": False,
+        "exercicios": [{
+            "exercise_key": "supino_reto_barra", "nome": "Supino Reto com Barra",
+            "equipamento": "Barra", "series": 3, "repeticoes": "8-12",
+            "duracao_minutos": None, "distancia_km": None, "tempo_descanso": 90,
+            "prioridade": "primario", "percentual_rm": None, "observacoes": None,
+            "tem_limitacao": False,
+        }],
+    }],
+}
+
+_REMOVER = object()
+
+
+def _com(base, caminho, valor):
+    instancia = copy.deepcopy(base)
+    alvo = instancia
+    for chave in caminho[:-1]:
+        alvo = alvo[chave]
+    if valor is _REMOVER:
+        del alvo[caminho[-1]]
+    else:
+        alvo[caminho[-1]] = valor
+    return instancia
+
+
+_EXERCICIO_DO_MOLDE = ("semanas_tipo", 0, "sessoes", 0, "exercicios", 1)
+_EXERCICIO_DO_RASCUNHO = ("treinos", 0, "exercicios", 0)
+
+CASOS = [
+    ("molde válido", MOLDE_SCHEMA, VALIDADOR_MOLDE, MOLDE),
+    ("molde sem alvo", MOLDE_SCHEMA, VALIDADOR_MOLDE,
+     _com(MOLDE, _EXERCICIO_DO_MOLDE + ("repeticoes",), _REMOVER)),
+    ("molde com séries demais", MOLDE_SCHEMA, VALIDADOR_MOLDE,
+     _com(MOLDE, _EXERCICIO_DO_MOLDE + ("series",), 99)),
+    ("molde sem calendário", MOLDE_SCHEMA, VALIDADOR_MOLDE, _com(MOLDE, ("calendario",), _REMOVER)),
+    ("diretrizes válidas", DIRETRIZES_SCHEMA, VALIDADOR_DIRETRIZES, DIRETRIZES),
+    ("diretrizes com chave extra", DIRETRIZES_SCHEMA, VALIDADOR_DIRETRIZES,
+     _com(DIRETRIZES, ("extra",), 1)),
+    ("restrição fora do enum", DIRETRIZES_SCHEMA, VALIDADOR_DIRETRIZES,
+     _com(DIRETRIZES, ("restricoes",), [{"descricao": "x", "tipo": "outra"}])),
+    ("rascunho válido", PLANO_MANUAL_SCHEMA, VALIDADOR_PLANO_MANUAL, RASCUNHO),
+    ("séries demais no rascunho", PLANO_MANUAL_SCHEMA, VALIDADOR_PLANO_MANUAL,
+     _com(RASCUNHO, _EXERCICIO_DO_RASCUNHO + ("series",), 11)),
+    ("distância curta no rascunho", PLANO_MANUAL_SCHEMA, VALIDADOR_PLANO_MANUAL,
+     _com(RASCUNHO, _EXERCICIO_DO_RASCUNHO + ("distancia_km",), 0.001)),
+    ("treino sem exercícios", PLANO_MANUAL_SCHEMA, VALIDADOR_PLANO_MANUAL,
+     _com(RASCUNHO, ("treinos", 0, "exercicios"), [])),
+]
+
+
+def _erro(funcao):
+    try:
+        funcao()
+    except jsonschema.exceptions.ValidationError as e:
+        return e
+    return None
+
+
+def _descricao(erro):
+    if erro is None:
+        return None
+    return (erro.message, erro.validator, list(erro.path), list(erro.schema_path))
+
+
+def test_cada_schema_compila_no_draft_que_declara():
+    for validador in (VALIDADOR_MOLDE, VALIDADOR_DIRETRIZES, VALIDADOR_PLANO_MANUAL):
+        assert isinstance(validador, jsonschema.Draft7Validator)
+
+
+@pytest.mark.parametrize("nome,schema,validador,instancia", CASOS, ids=[c[0] for c in CASOS])
+def test_mesmo_erro_que_jsonschema_validate(nome, schema, validador, instancia):
+    esperado = _erro(lambda: jsonschema.validate(instance=instancia, schema=schema))
+    obtido = _erro(lambda: validar(validador, instancia))
+
+    assert _descricao(obtido) == _descricao(esperado)
+    assert (obtido is None) == nome.endswith(("válido", "válidas"))
+
+
+def test_mensagem_pt_br_do_rascunho_manual_nao_muda():
+    for nome, schema, _validador, instancia in CASOS:
+        if schema is not PLANO_MANUAL_SCHEMA or nome == "rascunho válido":
+            continue
+        esperado = _erro(lambda: jsonschema.validate(instance=instancia, schema=schema))
+        assert _validar_rascunho_manual(instancia) == _mensagem_de_validacao(esperado)
+
+
+def test_expansor_aceita_a_prova_e_continua_validando_dict_cru():
+    with mock.patch.object(pe, "validar", wraps=validar) as validacoes:
+        com_prova = pe.expandir_plano(validar_molde(copy.deepcopy(MOLDE)), {"id": "u1"})
+        assert validacoes.call_count == 0
+        cru = pe.expandir_plano(copy.deepcopy(MOLDE), {"id": "u1"})
+        assert validacoes.call_count == 1
+        # Prova de outro validador (schema recompilado) não vale.
+        pe.expandir_plano(MoldeValidado(copy.deepcopy(MOLDE), compilar(MOLDE_SCHEMA)), {"id": "u1"})
+        assert validacoes.call_count == 2
+
+    assert len(com_prova["plano_principal"]["ciclos"]) == len(cru["plano_principal"]["ciclos"])
+    with pytest.raises(ValueError, match="Molde inválido"):
+        pe.expandir_plano(CASOS[1][3], {"id": "u1"})
+    with pytest.raises(jsonschema.exceptions.ValidationError):
+        validar_molde(CASOS[1][3])
+
+
+def test_copia_da_prova_continua_valendo():
+    prova = validar_molde(copy.deepcopy(MOLDE))
+    copia = copy.deepcopy(prova)
+
+    assert copia.molde == prova.molde and copia.molde is not prova.molde
+    assert copia.e_valido_para(VALIDADOR_MOLDE)
+
+
+def test_pipeline_do_molde_valida_o_schema_uma_vez(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-fake-para-teste")
+    monkeypatch.setenv("PLAN_MODEL_NAME", "claude-haiku-4-5")
+    jm.limpar_jobs()
+    job, _ = jm.criar_job(user_id="user-validado")
+    resposta = types.SimpleNamespace(
+        content=[types.SimpleNamespace(type="text", text=json.dumps(MOLDE))], stop_reason="end_turn",
+    )
+    with mock.patch(
+        "backend.utils.anthropic_retry.criar_mensagem_com_deadline", return_value=resposta,
+    ), mock.patch("backend.app.persistir_plano", return_value="db-plan-validado"), \
+         mock.patch("backend.app.validar_molde", wraps=validar_molde) as no_pipeline, \
+         mock.patch.object(pe, "validar", wraps=validar) as no_expansor, \
+         app.app_context():
+        _executar_geracao_molde(
+            job, {"nivelExperiencia": "iniciante"},
+            {"preferencias": [], "restricoes": [], "excecoes_estruturais": []},
+            job.user_id, "fake-token",
+        )
+
+    assert job.to_dict()["status"] == "salvo"
+    assert no_pipeline.call_count == 1
+    assert no_expansor.call_count == 0
@@ -12,7 +12,11 @@ Este helper devolve o meio-termo (achado #1 do review externo):
 - impõe deadline ABSOLUTO: a 2ª tentativa herda só o tempo restante;
 - NUNCA re-tenta timeout ou erro de conexão — lentidão não é transitória
   dentro do orçamento de uma requisição síncrona.
+
+As variantes `_async` (modo ASGI, backend/asgi.py) seguem a MESMA política:
+só a espera entre tentativas troca `time.sleep` por `asyncio.sleep`.
 """
+import asyncio
 import time
 
 import anthropic
@@ -36,26 +40,70 @@ def _atraso_sugerido(excecao: anthropic.APIStatusError) -> float:
         return 1.0
 
 
+def _atraso_do_retry(excecao: anthropic.APIStatusError, tentativa: int, deadline: float):
+    """Espera antes da 2ª tentativa, ou None quando a política manda desistir."""
+    if tentativa >= 2 or excecao.status_code not in STATUS_RETRYAVEIS:
+        return None
+    atraso = _atraso_sugerido(excecao)
+    if atraso > ATRASO_MAXIMO_SEGUNDOS:
+        return None
+    if (deadline - time.monotonic()) - atraso < ORCAMENTO_MINIMO_SEGUNDOS:
+        return None
+    return atraso
+
+
+def executar_com_deadline(chamada, orcamento_segundos: float):
+    """Roda `chamada(restante)` com deadline absoluto e retry seletivo.
+
+    `chamada` recebe o tempo RESTANTE do orçamento e deve usá-lo como timeout
+    da tentativa — a soma das tentativas nunca ultrapassa o orçamento.
+    Exceções são propagadas como vieram (o chamador mantém seu tratamento).
+    """
+    deadline = time.monotonic() + orcamento_segundos
+    tentativa = 1
+    while True:
+        restante = deadline - time.monotonic()
+        try:
+            return chamada(restante)
+        except anthropic.APIStatusError as e:
+            atraso = _atraso_do_retry(e, tentativa, deadline)
+            if atraso is None:
+                raise
+            time.sleep(atraso)
+            tentativa += 1
+
+
 def criar_mensagem_com_deadline(cliente, orcamento_segundos: float, **kwargs):
     """Chama cliente.messages.create com deadline absoluto e retry seletivo.
 
     O timeout de cada tentativa é o tempo RESTANTE do orçamento, passado como
-    request option — a soma das tentativas nunca ultrapassa o orçamento.
-    Exceções são propagadas como vieram (o chamador mantém seu tratamento).
+    request option.
     """
+    return executar_com_deadline(
+        lambda restante: cliente.messages.create(timeout=restante, **kwargs),
+        orcamento_segundos,
+    )
+
+
+async def executar_com_deadline_async(chamada, orcamento_segundos: float):
+    """`executar_com_deadline` para `chamada(restante)` que devolve awaitable."""
     deadline = time.monotonic() + orcamento_segundos
     tentativa = 1
     while True:
         restante = deadline - time.monotonic()
         try:
-            return cliente.messages.create(timeout=restante, **kwargs)
+            return await chamada(restante)
         except anthropic.APIStatusError as e:
-            if tentativa >= 2 or e.status_code not in STATUS_RETRYAVEIS:
-                raise
-            atraso = _atraso_sugerido(e)
-            if atraso > ATRASO_MAXIMO_SEGUNDOS:
-                raise
-            if (deadline - time.monotonic()) - atraso < ORCAMENTO_MINIMO_SEGUNDOS:
+            atraso = _atraso_do_retry(e, tentativa, deadline)
+            if atraso is None:
                 raise
-            time.sleep(atraso)
+            await asyncio.sleep(atraso)
             tentativa += 1
+
+
+async def criar_mensagem_com_deadline_async(cliente, orcamento_segundos: float, **kwargs):
+    """`criar_mensagem_com_deadline` sobre um `anthropic.AsyncAnthropic`."""
+    return await executar_com_deadline_async(
+        lambda restante: cliente.messages.create(timeout=restante, **kwargs),
+        orcamento_segundos,
+    )
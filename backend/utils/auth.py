@@ -1,21 +1,40 @@
 # backend/utils/auth.py
 # Decorador de autenticação para os endpoints da API.
-# Valida o JWT emitido pelo Supabase chamando GET /auth/v1/user do projeto.
+# Valida o JWT emitido pelo Supabase de um de dois jeitos (SUPABASE_AUTH_VERIFICATION):
+#   remote (default): GET /auth/v1/user do projeto a cada request;
+#   local: assinatura e claims conferidas no próprio backend (jwt_local.py),
+#          com cache dos tokens já validados — o poll do job deixa de custar
+#          um salto de rede. SUPABASE_AUTH_REVOCATION_CHECK=true mantém a
+#          consulta remota para cada token NOVO (revogação/logout).
+# `validate_token_async` é o mesmo contrato para o modo ASGI (backend/asgi.py),
+# sem prender o event loop na rede.
 # Compatível com Python 3.9+.
 
+import asyncio
 import functools
 import os
 import uuid
 
+import httpx
 import requests
 from flask import g, jsonify, request
 
+from .http_async import cliente_http_async
+from .jwt_local import CacheDeTokens, TokenInvalido, usuario_das_claims, verificar_jwt
 from .logger import WrapperLogger
 
 logger = WrapperLogger("Auth")
 
 REQUEST_TIMEOUT_SECONDS = 10
 
+# Teto do cache de tokens validados (modo local). O TTL é o que limita por
+# quanto tempo um token revogado ainda passa quando a checagem de revogação
+# está ligada; o `exp` do próprio JWT sempre vence se vier antes.
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_TTL_SECONDS = int(os.environ.get("AUTH_CACHE_TTL_SECONDS", "60"))
+
+_cache_de_tokens = CacheDeTokens(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
 
 def _supabase_config():
     """Lê a configuração do Supabase do ambiente."""
@@ -42,22 +61,135 @@ def _is_valid_user_payload(payload):
     return True
 
 
+def _modo_de_verificacao():
+    modo = (os.environ.get("SUPABASE_AUTH_VERIFICATION") or "remote").strip().lower()
+    return "local" if modo == "local" else "remote"
+
+
+def _checar_revogacao():
+    return (os.environ.get("SUPABASE_AUTH_REVOCATION_CHECK") or "false").strip().lower() == "true"
+
+
 def validate_token(token):
     """
-    Valida um access_token junto ao Supabase Auth.
+    Valida um access_token no modo configurado (ver cabeçalho do módulo).
 
     Retorna o dict do usuário quando válido, None quando inválido.
     Levanta RuntimeError quando a configuração está ausente ou o
     serviço de autenticação está inacessível.
     """
+    if _modo_de_verificacao() == "local":
+        return _validar_localmente(token)
+    return _validar_remotamente(token)
+
+
+async def validate_token_async(token):
+    """`validate_token` para o modo ASGI. Mesmos retornos e exceções."""
+    if _modo_de_verificacao() == "local":
+        return await _validar_localmente_async(token)
+    return await _validar_remotamente_async(token)
+
+
+def _validar_localmente(token):
+    """
+    Verificação local + cache. Só o caminho feliz é cacheado: token inválido
+    não ocupa entrada, senão um atacante enchia o LRU e expulsava os válidos.
+    """
+    usuario = _cache_de_tokens.obter(token)
+    if usuario is not None:
+        return usuario
+
+    claims, usuario = _verificar_assinatura(token)
+    if usuario is None:
+        return None
+
+    if _checar_revogacao():
+        usuario = _conferir_revogacao(_validar_remotamente(token), usuario)
+        if usuario is None:
+            return None
+
+    _cache_de_tokens.guardar(token, usuario, claims["exp"])
+    return dict(usuario)
+
+
+async def _validar_localmente_async(token):
+    usuario = _cache_de_tokens.obter(token)
+    if usuario is not None:
+        return usuario
+
+    # Numa thread: a verificação pode buscar o JWKS com `requests` (cache frio).
+    claims, usuario = await asyncio.to_thread(_verificar_assinatura, token)
+    if usuario is None:
+        return None
+
+    if _checar_revogacao():
+        usuario = _conferir_revogacao(await _validar_remotamente_async(token), usuario)
+        if usuario is None:
+            return None
+
+    _cache_de_tokens.guardar(token, usuario, claims["exp"])
+    return dict(usuario)
+
+
+def _verificar_assinatura(token):
+    """(claims, usuário) da verificação local, ou (None, None) se recusado."""
+    try:
+        claims = verificar_jwt(token)
+    except TokenInvalido as exc:
+        logger.warning("JWT recusado na verificação local: {}".format(exc))
+        return None, None
+
+    usuario = usuario_das_claims(claims)
+    if usuario is None:
+        logger.warning("JWT com assinatura válida, mas sem sub UUID.")
+        return None, None
+    return claims, usuario
+
+
+def _conferir_revogacao(remoto, usuario):
+    """O usuário remoto se ele confirma o `sub` local; None se revogado."""
+    if remoto is None or remoto.get("id") != usuario["id"]:
+        return None
+    return remoto
+
+
+def _config_remota():
     base_url, anon_key = _supabase_config()
     if not base_url or not anon_key:
         logger.error("SUPABASE_URL/SUPABASE_ANON_KEY não configurados no backend.")
         raise RuntimeError("Autenticação não configurada no servidor.")
+    return "{}/auth/v1/user".format(base_url), anon_key
+
+
+def _usuario_da_resposta(response):
+    """Payload do usuário num 200 bem formado (requests ou httpx), senão None."""
+    if response.status_code != 200:
+        return None
+
+    try:
+        payload = response.json()
+    except ValueError:
+        return None
+
+    if not _is_valid_user_payload(payload):
+        logger.warning("Resposta 200 do Supabase Auth com payload malformado (sem id UUID).")
+        return None
+
+    return payload
+
 
+def _validar_remotamente(token):
+    """
+    Valida um access_token junto ao Supabase Auth (GET /auth/v1/user).
+
+    Retorna o dict do usuário quando válido, None quando inválido.
+    Levanta RuntimeError quando a configuração está ausente ou o
+    serviço de autenticação está inacessível.
+    """
+    url, anon_key = _config_remota()
     try:
         response = requests.get(
-            "{}/auth/v1/user".format(base_url),
+            url,
             headers={
                 "apikey": anon_key,
                 "Authorization": "Bearer {}".format(token),
@@ -68,19 +200,30 @@ def validate_token(token):
         logger.error("Falha ao contatar o Supabase Auth: {}".format(exc))
         raise RuntimeError("Serviço de autenticação indisponível.") from exc
 
-    if response.status_code != 200:
-        return None
+    return _usuario_da_resposta(response)
+
 
+async def _validar_remotamente_async(token):
+    url, anon_key = _config_remota()
     try:
-        payload = response.json()
-    except ValueError:
-        return None
+        response = await cliente_http_async().get(
+            url,
+            headers={
+                "apikey": anon_key,
+                "Authorization": "Bearer {}".format(token),
+            },
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+    except httpx.HTTPError as exc:
+        logger.error("Falha ao contatar o Supabase Auth: {}".format(exc))
+        raise RuntimeError("Serviço de autenticação indisponível.") from exc
 
-    if not _is_valid_user_payload(payload):
-        logger.warning("Resposta 200 do Supabase Auth com payload malformado (sem id UUID).")
-        return None
+    return _usuario_da_resposta(response)
 
-    return payload
+
+def token_do_cabecalho(auth_header):
+    """O token de 'Authorization: Bearer <token>', ou None."""
+    return auth_header[7:].strip() if auth_header.startswith("Bearer ") else None
 
 
 def token_required(view_func):
@@ -91,8 +234,7 @@ def token_required(view_func):
 
     @functools.wraps(view_func)
     def wrapper(*args, **kwargs):
-        auth_header = request.headers.get("Authorization", "")
-        token = auth_header[7:].strip() if auth_header.startswith("Bearer ") else None
+        token = token_do_cabecalho(request.headers.get("Authorization", ""))
 
         if not token:
             return jsonify({"error": "Autenticação necessária."}), 401
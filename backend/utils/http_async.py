@@ -0,0 +1,38 @@
+# backend/utils/http_async.py
+# Cliente httpx assíncrono compartilhado para as chamadas ao Supabase do modo
+# ASGI (backend/asgi.py): auth, RPC da quota e gravação do plano.
+#
+# No modo WSGI cada uma dessas chamadas é um `requests` que prende a thread
+# do gunicorn enquanto espera a rede. No ASGI elas precisam ser awaitable, ou
+# um Supabase lento congelaria o event loop inteiro — pior que a thread presa.
+#
+# Um cliente por event loop (conexões httpx assíncronas pertencem ao loop que
+# as abriu). O timeout fica em cada chamada, como nos módulos síncronos.
+
+import asyncio
+import threading
+import weakref
+from typing import Any
+
+import httpx
+
+_clientes: "weakref.WeakKeyDictionary[Any, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def cliente_http_async() -> httpx.AsyncClient:
+    """O httpx.AsyncClient do event loop corrente, criado no primeiro uso."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        cliente = _clientes.get(loop)
+        if cliente is None or cliente.is_closed:
+            cliente = _clientes[loop] = httpx.AsyncClient()
+        return cliente
+
+
+async def fechar_cliente_http_async() -> None:
+    """Fecha o cliente do loop corrente (shutdown do ASGI)."""
+    with _lock:
+        cliente = _clientes.pop(asyncio.get_running_loop(), None)
+    if cliente is not None:
+        await cliente.aclose()
@@ -0,0 +1,181 @@
+# backend/utils/json_codec.py
+"""Codec JSON único do backend: orjson quando instalado, stdlib quando não.
+
+Três formas de saída, uma por uso:
+- `serializar_compacto`: bytes UTF-8 sem espaços — corpo de RPC, evento SSE e
+  material das chaves de cache. É o que vai para a rede.
+- `serializar_legivel`: texto com indentação de 2 e acentos literais — o que
+  entra no prompt. Byte a byte igual a `json.dumps(indent=2,
+  ensure_ascii=False)`, com ou sem orjson: o texto do prompt (e as chaves de
+  cache montadas a partir dele) não muda de forma conforme a máquina.
+- `serializar_constante`: `serializar_legivel` de um objeto estático do módulo
+  (MOLDE_SCHEMA, DIRETRIZES_SCHEMA), calculado uma vez por processo.
+
+E uma medida: `tamanho_ascii` é o `len(json.dumps(valor))` — ASCII escapado,
+separadores com espaço — em que os limites anti-abuso foram calibrados. Essa
+fica na stdlib com ou sem orjson.
+
+O orjson está no requirements.txt e no lock (é o que a imagem instala); sem
+ele, tudo cai na stdlib e o codec só não acelera nada. Onde ele recusa o que
+a stdlib aceita — inteiro acima de 64 bits na saída, surrogate solto ou NaN
+na entrada — a chamada cai na stdlib em vez de falhar: trocar de codec não
+pode mudar o que é aceito.
+
+Float é onde os dois ESCREVEM diferente sem recusar nada: fora de
+[1e-4, 1e16) a stdlib usa o `repr` (`1e-05`, `1e+16`) e o orjson não
+(`0.00001`, `1e16`), e NaN/inf viram `null` no orjson onde a stdlib escreve
+`NaN`/`Infinity`. No legível, qualquer float desses manda a chamada inteira
+para a stdlib. No compacto, só NaN/inf: ali o que importa é o valor parseado,
+que o formato do número não muda — mas `null` no lugar de `NaN` muda, e o
+`get_json` do Flask aceita o literal `NaN`.
+A outra diferença que sobra é na leitura de inteiro acima de 64 bits, que o
+orjson devolve como float; nenhum contrato daqui chega perto disso.
+"""
+
+import json
+import math
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    _orjson = None
+
+ORJSON_DISPONIVEL = _orjson is not None
+
+# Datas passam pelo `default` (como na stdlib, onde `default=str` dá
+# "2026-03-02 10:00:00"). Sem OPT_NON_STR_KEYS: chave não-texto faz o orjson
+# levantar TypeError e a stdlib escrever a chave do jeito dela (float em chave
+# sai `NaN`/`1e-05` lá e `null`/`0.00001` no orjson). Nenhum payload daqui tem.
+_OPCOES_ORJSON = (
+    _orjson.OPT_PASSTHROUGH_DATETIME | _orjson.OPT_PASSTHROUGH_DATACLASS
+    if _orjson is not None
+    else 0
+)
+
+_constantes: Dict[int, Tuple[Any, str]] = {}
+_constantes_lock = threading.Lock()
+
+
+_ESCALARES = frozenset((str, int, bool, type(None)))
+
+
+def _fora_do_repr(numero: float) -> bool:
+    """Float que o orjson escreve diferente da stdlib (NaN cai aqui também)."""
+    return not (numero == 0.0 or 1e-4 <= abs(numero) < 1e16)
+
+
+def _nao_finito(numero: float) -> bool:
+    """NaN/inf: o orjson escreve `null`, a stdlib `NaN`/`Infinity`."""
+    return not math.isfinite(numero)
+
+
+def _algum_float(valor: Any, diverge: Callable[[float], bool]) -> bool:
+    """True se `valor` tem algum float, em qualquer nível, com `diverge`.
+
+    Só olha valores: chave não-texto já manda a chamada para a stdlib (ver
+    `_OPCOES_ORJSON`), então float em chave nunca chega ao orjson.
+    """
+    if type(valor) is float:
+        return diverge(valor)
+    pilha = [valor]
+    while pilha:
+        item = pilha.pop()
+        if isinstance(item, dict):
+            item = item.values()
+        elif not isinstance(item, (list, tuple)):
+            continue
+        for filho in item:
+            tipo = type(filho)
+            if tipo in _ESCALARES:
+                continue
+            if tipo is float:
+                if diverge(filho):
+                    return True
+            elif tipo is dict or tipo is list or tipo is tuple or isinstance(filho, (dict, list)):
+                pilha.append(filho)  # subclasse também: o orjson serializa como a base
+    return False
+
+
+def _conferindo_floats(default: Optional[Callable[[Any], Any]], diverge: Callable[[float], bool]):
+    """`default` que desiste (TypeError → stdlib) se devolver um float com `diverge`."""
+    if default is None:
+        return None
+
+    def conferido(valor):
+        convertido = default(valor)
+        if _algum_float(convertido, diverge):
+            raise TypeError("float que o orjson escreveria diferente")
+        return convertido
+
+    return conferido
+
+
+def serializar_compacto(valor: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    JSON compacto em UTF-8 (acentos literais). TypeError/ValueError como na
+    stdlib; NaN/inf saem `NaN`/`Infinity` como na stdlib (ver o cabeçalho).
+    """
+    if _orjson is not None and not _algum_float(valor, _nao_finito):
+        try:
+            return _orjson.dumps(
+                valor, default=_conferindo_floats(default, _nao_finito), option=_OPCOES_ORJSON
+            )
+        except TypeError:
+            pass  # a stdlib decide: ou serializa, ou levanta o erro dela
+    return json.dumps(
+        valor, default=default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def serializar_legivel(valor: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """O mesmo texto de `json.dumps(valor, indent=2, ensure_ascii=False)`."""
+    if _orjson is not None and not _algum_float(valor, _fora_do_repr):
+        try:
+            return _orjson.dumps(
+                valor,
+                default=_conferindo_floats(default, _fora_do_repr),
+                option=_OPCOES_ORJSON | _orjson.OPT_INDENT_2,
+            ).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(valor, default=default, indent=2, ensure_ascii=False)
+
+
+def tamanho_ascii(valor: Any, default: Optional[Callable[[Any], Any]] = None) -> int:
+    """
+    `len(json.dumps(valor, default=default))`. TypeError/ValueError como na stdlib.
+
+    Fica na stdlib de propósito: o orjson não escapa para ASCII, e recontar
+    a partir da saída dele (espaço por separador, 6 bytes por acento) custou
+    mais que o próprio json.dumps no scripts/bench_json_codec.py.
+    """
+    return len(json.dumps(valor, default=default))
+
+
+def serializar_constante(valor: Any) -> str:
+    """`serializar_legivel` memorizado pela identidade do objeto.
+
+    Só para objetos que não mudam depois do import: a chave é o `id()`, e o
+    objeto fica referenciado aqui para o id não ser reaproveitado.
+    """
+    chave = id(valor)
+    with _constantes_lock:
+        guardado = _constantes.get(chave)
+    if guardado is not None and guardado[0] is valor:
+        return guardado[1]
+    texto = serializar_legivel(valor)
+    with _constantes_lock:
+        _constantes[chave] = (valor, texto)
+    return texto
+
+
+def desserializar(texto: Any) -> Any:
+    """`json.loads` de str ou bytes. Falha com `json.JSONDecodeError`."""
+    if _orjson is not None:
+        try:
+            return _orjson.loads(texto)
+        except _orjson.JSONDecodeError:
+            pass  # a stdlib é mais permissiva (NaN, inteiros grandes); ela decide
+    return json.loads(texto)
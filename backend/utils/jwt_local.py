@@ -0,0 +1,390 @@
+# backend/utils/jwt_local.py
+"""Verificação LOCAL dos JWTs do Supabase Auth e cache de tokens validados.
+
+O `token_required` validava todo request com um GET /auth/v1/user (10s de
+timeout): cada poll de GET /api/generate-plan/<job_id> pagava um salto de rede
+e passava a depender do Supabase Auth estar de pé. O access_token do Supabase
+é um JWT assinado — a assinatura, o `exp` e o `aud` podem ser conferidos aqui
+mesmo, com o segredo HS256 do projeto (`SUPABASE_JWT_SECRET`) ou com as chaves
+públicas publicadas em /auth/v1/.well-known/jwks.json (ES256/RS256).
+
+O que a verificação local NÃO enxerga é revogação: um logout ou um usuário
+apagado continua com um JWT de assinatura válida até o `exp`. Quem precisa
+disso liga SUPABASE_AUTH_REVOCATION_CHECK e o backend confirma cada token novo
+junto ao Supabase — o cache abaixo limita a janela a AUTH_CACHE_TTL_SECONDS.
+
+Sem dependência nova: HS256 é stdlib (hmac); ES256/RS256 usam a
+`cryptography`, que já vem na árvore pelo pywebpush e só é importada quando um
+token assimétrico aparece.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import requests
+
+from .logger import WrapperLogger
+
+logger = WrapperLogger("AuthLocal")
+
+JWKS_TIMEOUT_SECONDS = 10
+# As chaves públicas mudam só em rotação manual no painel do Supabase. Um kid
+# desconhecido força uma releitura antes disso (com piso, ver abaixo).
+JWKS_TTL_SECONDS = int(os.environ.get("SUPABASE_JWKS_TTL_SECONDS", "600"))
+# Piso entre releituras provocadas por kid desconhecido (e entre tentativas
+# depois de uma falha): sem ele, um token forjado com kid aleatório em loop
+# vira um proxy de DoS contra o Supabase.
+JWKS_REFRESH_MIN_INTERVAL_SECONDS = 30
+# Se a releitura do TTL falha, as chaves que já estavam aqui continuam valendo
+# por mais este tempo: o Supabase fora do ar por um minuto não pode virar 503
+# para todo token ES256 que acabou de ser conferido com essas mesmas chaves.
+JWKS_STALE_GRACE_SECONDS = int(os.environ.get("SUPABASE_JWKS_GRACE_SECONDS", "3600"))
+
+# Folga de relógio para `nbf`/`iat` (não para `exp`: token vencido é vencido).
+LEEWAY_SECONDS = 30
+
+ALGORITMOS_ASSIMETRICOS = ("ES256", "RS256")
+
+
+class TokenInvalido(ValueError):
+    """O JWT não passou na verificação local — a resposta é 401, nunca 503."""
+
+
+def _b64url_decode(segmento: str) -> bytes:
+    preenchimento = "=" * (-len(segmento) % 4)
+    try:
+        return base64.urlsafe_b64decode(segmento + preenchimento)
+    except (ValueError, TypeError) as exc:
+        raise TokenInvalido("Segmento base64url inválido.") from exc
+
+
+def _b64url_para_int(segmento: str) -> int:
+    return int.from_bytes(_b64url_decode(segmento), "big")
+
+
+def decodificar(token: str):
+    """Separa o JWT em (header, claims, entrada_assinada, assinatura) SEM verificar."""
+    if not isinstance(token, str) or token.count(".") != 2:
+        raise TokenInvalido("Token fora do formato JWT.")
+    header_b64, claims_b64, assinatura_b64 = token.split(".")
+    try:
+        header = json.loads(_b64url_decode(header_b64))
+        claims = json.loads(_b64url_decode(claims_b64))
+    except ValueError as exc:
+        raise TokenInvalido("Header ou claims não são JSON.") from exc
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise TokenInvalido("Header ou claims não são objetos.")
+    entrada_assinada = "{}.{}".format(header_b64, claims_b64).encode("ascii")
+    return header, claims, entrada_assinada, _b64url_decode(assinatura_b64)
+
+
+def _chave_publica(jwk: Dict[str, Any]):
+    """Converte um JWK (EC P-256 ou RSA) em chave pública da `cryptography`."""
+    try:
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    except ImportError as exc:  # pragma: no cover - a lib vem pelo pywebpush
+        raise RuntimeError("Verificação local de JWT assimétrico indisponível.") from exc
+
+    if jwk.get("kty") == "EC" and jwk.get("crv") == "P-256":
+        return ec.EllipticCurvePublicNumbers(
+            _b64url_para_int(jwk["x"]), _b64url_para_int(jwk["y"]), ec.SECP256R1()
+        ).public_key()
+    if jwk.get("kty") == "RSA":
+        return rsa.RSAPublicNumbers(
+            _b64url_para_int(jwk["e"]), _b64url_para_int(jwk["n"])
+        ).public_key()
+    raise TokenInvalido("Tipo de chave do JWKS não suportado.")
+
+
+def _assinatura_assimetrica_confere(alg, jwk, entrada_assinada, assinatura) -> bool:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, padding
+    from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
+    chave = _chave_publica(jwk)
+    try:
+        if alg == "ES256":
+            # JWS carrega r||s crus (32 + 32 bytes); a `cryptography` quer DER.
+            if len(assinatura) != 64:
+                return False
+            der = encode_dss_signature(
+                int.from_bytes(assinatura[:32], "big"), int.from_bytes(assinatura[32:], "big")
+            )
+            chave.verify(der, entrada_assinada, ec.ECDSA(hashes.SHA256()))
+        else:
+            chave.verify(assinatura, entrada_assinada, padding.PKCS1v15(), hashes.SHA256())
+    except (InvalidSignature, TypeError, ValueError):
+        return False
+    return True
+
+
+class ChavesJwks:
+    """
+    Chaves públicas do projeto, lidas de /auth/v1/.well-known/jwks.json.
+
+    A busca HTTP roda FORA do lock e uma thread por vez: enquanto ela espera
+    o Supabase (até JWKS_TIMEOUT_SECONDS), quem já tem a chave do seu `kid`
+    segue com a guardada, e só quem não tem espera o resultado. Releitura que
+    falha mantém as chaves antigas por JWKS_STALE_GRACE_SECONDS além do TTL.
+    """
+
+    def __init__(
+        self, ttl_seconds: int = JWKS_TTL_SECONDS, carencia_seconds: int = JWKS_STALE_GRACE_SECONDS
+    ):
+        self._ttl = ttl_seconds
+        self._carencia = carencia_seconds
+        self._lock = threading.Lock()
+        self._url: Optional[str] = None
+        self._chaves: Dict[str, Dict[str, Any]] = {}
+        self._lido_em = 0.0
+        # Última tentativa de busca (com ou sem sucesso) e se ela falhou.
+        self._tentado_em = 0.0
+        self._falhou = False
+        # Busca em andamento: as outras threads esperam neste Event.
+        self._busca: Optional[threading.Event] = None
+
+    def _buscar(self, url: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            resposta = requests.get(url, timeout=JWKS_TIMEOUT_SECONDS)
+        except requests.RequestException as exc:
+            logger.error("Falha ao buscar o JWKS do Supabase: {}".format(exc))
+            raise RuntimeError("Serviço de autenticação indisponível.") from exc
+        if resposta.status_code != 200:
+            raise RuntimeError("Serviço de autenticação indisponível.")
+        try:
+            corpo = resposta.json()
+        except ValueError as exc:
+            raise RuntimeError("Serviço de autenticação indisponível.") from exc
+        chaves = corpo.get("keys") if isinstance(corpo, dict) else None
+        if not isinstance(chaves, list):
+            raise RuntimeError("Serviço de autenticação indisponível.")
+        return {
+            chave["kid"]: chave
+            for chave in chaves
+            if isinstance(chave, dict) and isinstance(chave.get("kid"), str)
+        }
+
+    def chave(self, url: str, kid: str) -> Optional[Dict[str, Any]]:
+        """
+        JWK do `kid`, ou None se o JWKS (lido há pouco) não o tem.
+
+        Raises:
+            RuntimeError: o JWKS não pôde ser lido e não há chave guardada
+                dentro da carência para este `kid`.
+        """
+        while True:
+            agora = time.monotonic()
+            with self._lock:
+                mesma_url = self._url == url
+                guardada = self._chaves.get(kid) if mesma_url else None
+                idade = agora - self._lido_em
+                if guardada is not None and idade <= self._ttl:
+                    return guardada
+                em_carencia = guardada is not None and idade <= self._ttl + self._carencia
+                recente = agora - self._tentado_em <= JWKS_REFRESH_MIN_INTERVAL_SECONDS
+                if self._falhou and recente:
+                    buscar = False
+                elif not mesma_url or idade > self._ttl:
+                    buscar = True
+                else:
+                    buscar = not recente  # kid desconhecido, com piso
+
+                if not buscar:
+                    if em_carencia:
+                        return guardada
+                    if self._falhou:
+                        raise RuntimeError("Serviço de autenticação indisponível.")
+                    return None
+
+                busca = self._busca
+                if busca is None:
+                    busca = self._busca = threading.Event()
+                    dono = True
+                else:
+                    if em_carencia:
+                        return guardada  # não enfileira atrás da busca de outra thread
+                    dono = False
+
+            if not dono:
+                busca.wait(JWKS_TIMEOUT_SECONDS)
+                continue
+
+            chaves = None
+            try:
+                chaves = self._buscar(url)
+            except RuntimeError:
+                pass  # a volta do laço decide: chave em carência ou 503
+            finally:
+                with self._lock:
+                    self._tentado_em = time.monotonic()
+                    self._falhou = chaves is None
+                    if chaves is not None:
+                        self._chaves, self._url, self._lido_em = chaves, url, self._tentado_em
+                    elif em_carencia:
+                        logger.warning(
+                            "Releitura do JWKS falhou; usando as chaves lidas há {:.0f}s.".format(idade)
+                        )
+                    self._busca = None
+                busca.set()
+            if chaves is not None:
+                return chaves.get(kid)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._url = None
+            self._chaves = {}
+            self._lido_em = 0.0
+            self._tentado_em = 0.0
+            self._falhou = False
+
+
+_jwks = ChavesJwks()
+
+
+def _config():
+    base_url = (os.environ.get("SUPABASE_URL") or "").rstrip("/")
+    segredo = os.environ.get("SUPABASE_JWT_SECRET") or ""
+    audiencia = os.environ.get("SUPABASE_JWT_AUDIENCE") or "authenticated"
+    return base_url, segredo, audiencia
+
+
+def verificar_jwt(token: str, agora: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Confere assinatura e claims do access_token e devolve as claims.
+
+    Levanta TokenInvalido (→ 401) para qualquer token que não prove ter sido
+    emitido pelo Supabase Auth deste projeto para um usuário logado, e
+    RuntimeError (→ 503) quando a verificação em si não pôde ser feita.
+    """
+    base_url, segredo, audiencia = _config()
+    header, claims, entrada_assinada, assinatura = decodificar(token)
+
+    alg = header.get("alg")
+    if alg == "HS256":
+        if not segredo:
+            # Sem segredo não há como provar nada — e aceitar seria aceitar
+            # qualquer token HS256 que alguém resolvesse assinar.
+            logger.warning("JWT HS256 recebido sem SUPABASE_JWT_SECRET configurado.")
+            raise TokenInvalido("Algoritmo sem chave configurada.")
+        esperada = hmac.new(segredo.encode("utf-8"), entrada_assinada, hashlib.sha256).digest()
+        if not hmac.compare_digest(esperada, assinatura):
+            raise TokenInvalido("Assinatura inválida.")
+    elif alg in ALGORITMOS_ASSIMETRICOS:
+        if not base_url:
+            raise RuntimeError("Autenticação não configurada no servidor.")
+        kid = header.get("kid")
+        if not isinstance(kid, str) or not kid:
+            raise TokenInvalido("JWT assimétrico sem kid.")
+        jwk = _jwks.chave("{}/auth/v1/.well-known/jwks.json".format(base_url), kid)
+        if jwk is None or jwk.get("alg", alg) != alg:
+            raise TokenInvalido("Chave do JWT desconhecida.")
+        if not _assinatura_assimetrica_confere(alg, jwk, entrada_assinada, assinatura):
+            raise TokenInvalido("Assinatura inválida.")
+    else:
+        # Inclui "none": a lista é fechada, nunca derivada do próprio token.
+        raise TokenInvalido("Algoritmo de JWT não aceito.")
+
+    agora = time.time() if agora is None else agora
+    exp = claims.get("exp")
+    if isinstance(exp, bool) or not isinstance(exp, (int, float)) or exp <= agora:
+        raise TokenInvalido("Token expirado ou sem exp.")
+    for campo in ("nbf", "iat"):
+        valor = claims.get(campo)
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool) and valor > agora + LEEWAY_SECONDS:
+            raise TokenInvalido("Token emitido no futuro.")
+
+    aud = claims.get("aud")
+    audiencias = aud if isinstance(aud, list) else [aud]
+    if audiencia not in audiencias:
+        raise TokenInvalido("Audiência inesperada.")
+    # A anon key e a service role são JWTs assinados com o MESMO segredo:
+    # só `role=authenticated` representa um usuário logado.
+    if claims.get("role") != "authenticated":
+        raise TokenInvalido("Papel do token não é de usuário autenticado.")
+    if base_url and claims.get("iss") not in (None, "{}/auth/v1".format(base_url)):
+        raise TokenInvalido("Emissor inesperado.")
+    return claims
+
+
+def usuario_das_claims(claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Mesmo contrato do payload de /auth/v1/user: dict com `id` UUID, ou None."""
+    sub = claims.get("sub")
+    if not isinstance(sub, str) or not sub.strip():
+        return None
+    try:
+        uuid.UUID(sub)
+    except ValueError:
+        return None
+    return {
+        "id": sub,
+        "email": claims.get("email"),
+        "phone": claims.get("phone"),
+        "role": claims.get("role"),
+        "aud": claims.get("aud"),
+        "app_metadata": claims.get("app_metadata") or {},
+        "user_metadata": claims.get("user_metadata") or {},
+    }
+
+
+class CacheDeTokens:
+    """
+    Cache LRU limitado de tokens já validados, com validade própria.
+
+    A chave é o SHA-256 do token, nunca o token: um dump de memória ou um
+    log acidental do dicionário não entrega credencial nenhuma. Cada entrada
+    vence no que vier primeiro — o `exp` do próprio JWT ou o TTL do cache —
+    então o cache nunca estende a vida de um token.
+    """
+
+    def __init__(self, max_entradas: int, ttl_seconds: float):
+        self._max = max(1, int(max_entradas))
+        self._ttl = float(ttl_seconds)
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @staticmethod
+    def _chave(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def obter(self, token: str, agora: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        agora = time.time() if agora is None else agora
+        chave = self._chave(token)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            usuario, expira_em = entrada
+            if expira_em <= agora:
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+        # Cópia: a view não pode alterar o que o próximo request vai receber.
+        return dict(usuario)
+
+    def guardar(self, token: str, usuario: Dict[str, Any], exp: float, agora: Optional[float] = None) -> None:
+        agora = time.time() if agora is None else agora
+        expira_em = min(float(exp), agora + self._ttl)
+        if expira_em <= agora:
+            return
+        chave = self._chave(token)
+        with self._lock:
+            self._entradas[chave] = (dict(usuario), expira_em)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self._max:
+                self._entradas.popitem(last=False)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entradas)
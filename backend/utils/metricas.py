@@ -0,0 +1,49 @@
+# backend/utils/metricas.py
+# Registro único dos contadores de processo (caches, pools, filas).
+#
+# Cada módulo com estado próprio — fragmentos de prompt, cache de diretrizes,
+# memo de moldes, pools Anthropic, fila de acertos da quota... — expõe um par
+# `estatisticas_*()` / `limpar_*()`. Em vez de cada consumidor conhecer a lista
+# toda, o módulo se registra aqui na importação:
+#
+#   - GET /api/metrics (backend/app.py) devolve `coletar()`;
+#   - o conftest chama `limpar_todas()` depois de cada teste.
+#
+# Módulo que não foi importado não tem estado, então não faz falta no registro.
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+_fontes: Dict[str, Tuple[Callable[[], Any], Callable[[], None]]] = {}
+_lock = threading.Lock()
+
+
+def registrar(nome: str, estatisticas: Callable[[], Any], limpar: Callable[[], None]) -> None:
+    """Registra uma fonte. Registrar o mesmo nome de novo troca a anterior (reload)."""
+    with _lock:
+        _fontes[nome] = (estatisticas, limpar)
+
+
+def coletar() -> Dict[str, Any]:
+    """`estatisticas()` de cada fonte, por nome. Uma fonte que falha não derruba as outras."""
+    with _lock:
+        fontes = dict(_fontes)
+    saida: Dict[str, Any] = {}
+    for nome in sorted(fontes):
+        try:
+            saida[nome] = fontes[nome][0]()
+        except Exception:
+            logger.exception("Falha ao coletar as métricas de %s.", nome)
+            saida[nome] = None
+    return saida
+
+
+def limpar_todas() -> None:
+    """Zera o estado de todas as fontes (testes)."""
+    with _lock:
+        fontes = list(_fontes.values())
+    for _estatisticas, limpar in fontes:
+        limpar()
@@ -21,7 +21,10 @@ except ImportError:
 # pelo próprio `python -m`), então backend.utils.* resolve sem fallback.
 from backend.utils.logger import WrapperLogger
 from backend.utils.config import get_api_key, get_model_name, get_anthropic_timeout_seconds
-from backend.utils.anthropic_retry import criar_mensagem_com_deadline
+from backend.utils.anthropic_retry import (
+    criar_mensagem_com_deadline, criar_mensagem_com_deadline_async,
+)
+from backend.services.anthropic_clients import cliente_anthropic, cliente_anthropic_async
 
 
 class TreinadorEspecialista:
@@ -53,10 +56,10 @@ class TreinadorEspecialista:
             # no helper de deadline (anthropic_retry.py), que re-tenta 1x só
             # falha transitória rápida e NUNCA timeout — o retry automático do
             # SDK re-tentava timeouts (150s x 3 = 450s de thread presa).
-            self.anthropic_client = anthropic.Anthropic(
-                api_key=self.api_key,
-                timeout=get_anthropic_timeout_seconds(),
-                max_retries=0,
+            # O pool keep-alive do perfil "treinador" é do registro
+            # (backend/services/anthropic_clients.py), não desta instância.
+            self.anthropic_client = cliente_anthropic(
+                "treinador", self.MODEL_NAME, self.api_key, get_anthropic_timeout_seconds()
             )
             self.logger.info(f"Cliente Anthropic inicializado para o modelo: {self.MODEL_NAME}")
         except Exception as e:
@@ -525,6 +528,51 @@ TEMPLATE JSON ESPERADO (Preencha os valores, não retorne este template literalm
             self.logger.error(f"Erro inesperado durante a validação do JSON: {e}", exc_info=True)
             return False
 
+    def _texto_da_resposta(self, response: Any) -> Optional[str]:
+        """Texto do primeiro bloco `text`; RuntimeError se a saída foi truncada."""
+        # Truncamento não é falha genérica: diagnóstico explícito evita
+        # aceitar JSON cortado e explica a geração paga perdida (review #7)
+        if getattr(response, "stop_reason", None) == "max_tokens":
+            self.logger.error(
+                f"Resposta truncada pelo limite de tokens (max_tokens={self.MAX_TOKENS}). "
+                "O plano gerado está incompleto e será descartado."
+            )
+            raise RuntimeError(
+                "Resposta da IA truncada pelo limite de tokens — plano incompleto."
+            )
+
+        # Modelos com adaptive thinking (Opus 5) devolvem blocos `thinking`
+        # antes do `text`; um bloco thinking não tem atributo `.text`. Iteramos
+        # e pegamos o primeiro bloco de texto — nunca logamos conteúdo (PII).
+        resposta_texto = None
+        if response.content and isinstance(response.content, list):
+            for block in response.content:
+                if getattr(block, "type", None) == "text" and getattr(block, "text", None):
+                    resposta_texto = block.text
+                    break
+        if resposta_texto:
+            self.logger.info("Resposta recebida da API Claude.")
+            self.logger.debug(f"Resposta bruta ({len(resposta_texto)} chars).")
+            return resposta_texto
+        tipos = [getattr(b, "type", "?") for b in response.content] if isinstance(response.content, list) else []
+        self.logger.error(f"Resposta da API Claude sem bloco de texto (tipos: {tipos}).")
+        return None
+
+    def _erro_da_chamada(self, e: Exception) -> Exception:
+        """Traduz a exceção do SDK para ConnectionError/RuntimeError (já logada)."""
+        if isinstance(e, anthropic.APIConnectionError):
+            self.logger.error(f"Erro de conexão com a API Anthropic: {e}", exc_info=True)
+            return ConnectionError(f"Falha ao conectar à API Anthropic: {e}")
+        if isinstance(e, anthropic.RateLimitError):
+            self.logger.error(f"Erro de limite de taxa da API Anthropic: {e}", exc_info=True)
+            return ConnectionError(f"Limite de taxa da API Anthropic excedido: {e}")
+        if isinstance(e, anthropic.APIStatusError):
+            # Não logar o corpo da resposta: pode ecoar o prompt com dados pessoais
+            self.logger.error(f"Erro de status da API Anthropic: status={e.status_code}", exc_info=True)
+            return ConnectionError(f"Erro na API Anthropic (Status {e.status_code}): {e}")
+        self.logger.error(f"Erro inesperado ao chamar a API Claude: {e}", exc_info=True)
+        return RuntimeError(f"Erro inesperado durante a chamada da API: {e}")
+
     def _chamar_api_claude(self, prompt: str) -> Optional[str]:
         """
         Encapsula a chamada à API Anthropic Claude.
@@ -544,50 +592,45 @@ TEMPLATE JSON ESPERADO (Preencha os valores, não retorne este template literalm
                     {"role": "user", "content": prompt}
                 ],
             )
-            # Truncamento não é falha genérica: diagnóstico explícito evita
-            # aceitar JSON cortado e explica a geração paga perdida (review #7)
-            if getattr(response, "stop_reason", None) == "max_tokens":
-                self.logger.error(
-                    f"Resposta truncada pelo limite de tokens (max_tokens={self.MAX_TOKENS}). "
-                    "O plano gerado está incompleto e será descartado."
-                )
-                raise RuntimeError(
-                    "Resposta da IA truncada pelo limite de tokens — plano incompleto."
-                )
-
-            # Modelos com adaptive thinking (Opus 5) devolvem blocos `thinking`
-            # antes do `text`; um bloco thinking não tem atributo `.text`. Iteramos
-            # e pegamos o primeiro bloco de texto — nunca logamos conteúdo (PII).
-            resposta_texto = None
-            if response.content and isinstance(response.content, list):
-                for block in response.content:
-                    if getattr(block, "type", None) == "text" and getattr(block, "text", None):
-                        resposta_texto = block.text
-                        break
-            if resposta_texto:
-                self.logger.info("Resposta recebida da API Claude.")
-                self.logger.debug(f"Resposta bruta ({len(resposta_texto)} chars).")
-                return resposta_texto
-            tipos = [getattr(b, "type", "?") for b in response.content] if isinstance(response.content, list) else []
-            self.logger.error(f"Resposta da API Claude sem bloco de texto (tipos: {tipos}).")
-            return None
-
-        except anthropic.APIConnectionError as e:
-            self.logger.error(f"Erro de conexão com a API Anthropic: {e}", exc_info=True)
-            raise ConnectionError(f"Falha ao conectar à API Anthropic: {e}") from e
-        except anthropic.RateLimitError as e:
-            self.logger.error(f"Erro de limite de taxa da API Anthropic: {e}", exc_info=True)
-            raise ConnectionError(f"Limite de taxa da API Anthropic excedido: {e}") from e
-        except anthropic.APIStatusError as e:
-            # Não logar o corpo da resposta: pode ecoar o prompt com dados pessoais
-            self.logger.error(f"Erro de status da API Anthropic: status={e.status_code}", exc_info=True)
-            raise ConnectionError(f"Erro na API Anthropic (Status {e.status_code}): {e}") from e
+            return self._texto_da_resposta(response)
         except RuntimeError:
             # Erros já diagnosticados acima (ex.: truncamento) sobem sem re-embrulhar
             raise
         except Exception as e:
-            self.logger.error(f"Erro inesperado ao chamar a API Claude: {e}", exc_info=True)
-            raise RuntimeError(f"Erro inesperado durante a chamada da API: {e}") from e
+            raise self._erro_da_chamada(e) from e
+
+    async def _chamar_api_claude_async(self, prompt: str) -> Optional[str]:
+        """`_chamar_api_claude` no modo ASGI, pelo cliente assíncrono do perfil."""
+        self.logger.info(f"Enviando prompt para o modelo {self.MODEL_NAME}...")
+        try:
+            # O cliente assíncrono é do event loop corrente: pedido a cada
+            # chamada, e não guardado na instância como o síncrono.
+            cliente = cliente_anthropic_async(
+                "treinador", self.MODEL_NAME, self.api_key, get_anthropic_timeout_seconds()
+            )
+            response = await criar_mensagem_com_deadline_async(
+                cliente,
+                get_anthropic_timeout_seconds(),
+                model=self.MODEL_NAME,
+                max_tokens=self.MAX_TOKENS,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+            )
+            return self._texto_da_resposta(response)
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise self._erro_da_chamada(e) from e
+
+    def _prompt_do_plano(self, dados_usuario: Dict[str, Any]) -> Optional[str]:
+        """Passo 1 de gerar_plano: o prompt, ou None se não deu para montar."""
+        self.logger.info(f"Iniciando geração de plano para usuário ID: {dados_usuario.get('id', 'N/A')}")
+        try:
+            return self._preparar_prompt(dados_usuario)
+        except Exception as e:
+            self.logger.error(f"Erro ao preparar o prompt: {e}", exc_info=True)
+            return None
 
     def gerar_plano(self, dados_usuario: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -598,21 +641,14 @@ TEMPLATE JSON ESPERADO (Preencha os valores, não retorne este template literalm
         4. Adiciona metadados.
         5. Retorna o plano validado ou None em caso de falha.
         """
-        self.logger.info(f"Iniciando geração de plano para usuário ID: {dados_usuario.get('id', 'N/A')}")
-
         # 1. Preparar Prompt
-        try:
-            prompt = self._preparar_prompt(dados_usuario)
-        except Exception as e:
-            self.logger.error(f"Erro ao preparar o prompt: {e}", exc_info=True)
+        prompt = self._prompt_do_plano(dados_usuario)
+        if prompt is None:
             return None
 
         # 2. Chamar API Claude
         try:
             resposta_texto = self._chamar_api_claude(prompt)
-            if not resposta_texto:
-                self.logger.error("Não foi possível obter uma resposta válida da API Claude.")
-                return None
         except (ConnectionError, RuntimeError) as e:
             # Erros já logados em _chamar_api_claude
             self.logger.error(f"Falha na comunicação com a API: {e}")
@@ -621,6 +657,33 @@ TEMPLATE JSON ESPERADO (Preencha os valores, não retorne este template literalm
             self.logger.error(f"Erro inesperado durante a chamada da API: {e}", exc_info=True)
             return None
 
+        return self._plano_da_resposta(dados_usuario, resposta_texto)
+
+    async def gerar_plano_async(self, dados_usuario: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """`gerar_plano` no modo ASGI: só a chamada ao modelo é awaitable."""
+        prompt = self._prompt_do_plano(dados_usuario)
+        if prompt is None:
+            return None
+
+        try:
+            resposta_texto = await self._chamar_api_claude_async(prompt)
+        except (ConnectionError, RuntimeError) as e:
+            self.logger.error(f"Falha na comunicação com a API: {e}")
+            return None
+        except Exception as e:
+            self.logger.error(f"Erro inesperado durante a chamada da API: {e}", exc_info=True)
+            return None
+
+        return self._plano_da_resposta(dados_usuario, resposta_texto)
+
+    def _plano_da_resposta(
+        self, dados_usuario: Dict[str, Any], resposta_texto: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Passos 3 a 5 de gerar_plano, a partir do texto do modelo."""
+        if not resposta_texto:
+            self.logger.error("Não foi possível obter uma resposta válida da API Claude.")
+            return None
+
         # 3. Extrair JSON da Resposta
         plano_bruto = self._extrair_json_da_resposta(resposta_texto)
         if not plano_bruto:
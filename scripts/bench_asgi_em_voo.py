@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Mede chamadas de IA em voo com N chats simultâneos: gunicorn gthread vs ASGI.
+
+Sobe uma API de mensagens e um Supabase de mentira em 127.0.0.1 (o modelo
+segura cada chamada por --latencia-ms, que é o que um chat lento custa de
+verdade; auth e RPC da quota respondem na hora) e depois, um de cada vez, os
+dois servidores do Dockerfile como subprocessos:
+
+  gunicorn  --worker-class gthread --threads 16 backend.app:app
+            (AI_SYNC_MAX_CONCURRENT=8, o default do compose)
+  uvicorn   backend.asgi:app       (FORCA_SERVIDOR_ASGI=true)
+
+Dispara --chats POST /api/chat ao mesmo tempo contra cada um e mostra o pico
+de chamadas em voo no modelo, quantos receberam 200 e 503 e o tempo total.
+Nada sai da máquina; nenhuma chave real é usada.
+
+Uso:
+    python3 scripts/bench_asgi_em_voo.py
+    python3 scripts/bench_asgi_em_voo.py --chats 128 --latencia-ms 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+THREADS_GUNICORN = 16
+
+
+class _EmVoo:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        self.agora = 0
+        self.pico = 0
+
+    def entrar(self):
+        with self._lock:
+            self.agora += 1
+            self.pico = max(self.pico, self.agora)
+
+    def sair(self):
+        with self._lock:
+            self.agora -= 1
+
+
+def _servidor_de_mentira(latencia_s, em_voo):
+    mensagem = json.dumps({
+        "id": "msg_bench", "type": "message", "role": "assistant", "model": "claude-haiku-4-5",
+        "content": [{"type": "text", "text": "Bora treinar!"}], "stop_reason": "end_turn",
+        "stop_sequence": None, "usage": {"input_tokens": 120, "output_tokens": 8},
+    }).encode()
+    usuario = json.dumps({"id": USER_ID, "email": "bench@teste.com"}).encode()
+    quota = json.dumps({"permitido": True, "chamadas_dia": 1, "custo_dia_usd": 0.0}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _responder(self, corpo):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_GET(self):  # noqa: N802 - nome imposto pelo http.server
+            self._responder(usuario)
+
+        def do_POST(self):  # noqa: N802
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not self.path.startswith("/v1/messages"):
+                return self._responder(quota)
+            em_voo.entrar()
+            try:
+                time.sleep(latencia_s)
+            finally:
+                em_voo.sair()
+            self._responder(mensagem)
+
+        def log_message(self, *args):
+            pass
+
+    class Servidor(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    servidor = Servidor(("127.0.0.1", 0), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _subir(comando, env, porta):
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    prazo = time.monotonic() + 30
+    while time.monotonic() < prazo:
+        try:
+            if httpx.get("http://127.0.0.1:{}/api/health".format(porta), timeout=1).status_code == 200:
+                return processo
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    processo.kill()
+    raise SystemExit("Servidor não subiu: {}".format(" ".join(comando)))
+
+
+async def _disparar(porta, chats):
+    corpo = {"messages": [{"role": "user", "content": "Quero focar em peito"}], "questionnaireData": {"idade": 30}}
+    limites = httpx.Limits(max_connections=chats, max_keepalive_connections=chats)
+    async with httpx.AsyncClient(
+        base_url="http://127.0.0.1:{}".format(porta), limits=limites, timeout=120,
+    ) as cliente:
+        inicio = time.perf_counter()
+        respostas = await asyncio.gather(*(
+            cliente.post("/api/chat", json=corpo, headers={"Authorization": "Bearer token-do-bench"})
+            for _ in range(chats)
+        ), return_exceptions=True)
+        total = time.perf_counter() - inicio
+    status = Counter(r.status_code if isinstance(r, httpx.Response) else "erro" for r in respostas)
+    return status, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=64)
+    parser.add_argument("--latencia-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    em_voo = _EmVoo()
+    falso = _servidor_de_mentira(args.latencia_ms / 1000, em_voo)
+    base_url = "http://127.0.0.1:{}".format(falso.server_address[1])
+    env = dict(
+        os.environ,
+        FORCA_SKIP_DOTENV="1",
+        SUPABASE_URL=base_url,
+        SUPABASE_ANON_KEY="anon-do-benchmark",
+        SUPABASE_AUTH_VERIFICATION="remote",
+        ANTHROPIC_API_KEY="sk-do-benchmark",
+        ANTHROPIC_BASE_URL=base_url,
+        CHAT_RATE_LIMIT="1000000",
+        NO_PROXY="127.0.0.1",
+        PYTHONPATH=RAIZ,
+    )
+    env.pop("SUPABASE_JWT_SECRET", None)
+
+    porta = _porta_livre()
+    servidores = {
+        "gunicorn gthread": [
+            sys.executable, "-m", "gunicorn", "--worker-class", "gthread", "--workers", "1",
+            "--threads", str(THREADS_GUNICORN), "--timeout", "240",
+            "--bind", "127.0.0.1:{}".format(porta), "backend.app:app",
+        ],
+        "uvicorn (ASGI)": [
+            sys.executable, "-m", "uvicorn", "backend.asgi:app",
+            "--host", "127.0.0.1", "--port", str(porta), "--log-level", "warning",
+        ],
+    }
+
+    print("{} chats simultâneos, modelo de mentira com {:.0f} ms por chamada:".format(
+        args.chats, args.latencia_ms
+    ))
+    print("  {:<17} {:>9} {:>6} {:>6} {:>9}".format("servidor", "pico voo", "200", "503", "total s"))
+    for nome, comando in servidores.items():
+        processo = _subir(comando, env, porta)
+        try:
+            em_voo.zerar()
+            status, total = asyncio.run(_disparar(porta, args.chats))
+        finally:
+            processo.terminate()
+            processo.wait(10)
+        print("  {:<17} {:>9} {:>6} {:>6} {:>9.2f}{}".format(
+            nome, em_voo.pico, status.get(200, 0), status.get(503, 0), total,
+            "  outros: {}".format(dict(status - Counter({200: status[200], 503: status[503]})))
+            if set(status) - {200, 503} else "",
+        ))
+    falso.shutdown()
+
+
+if __name__ == "__main__":
+    main()
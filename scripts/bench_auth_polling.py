@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Mede polls/s de GET /api/generate-plan/<job_id> nos dois modos de auth.
+
+Sobe um Supabase Auth de mentira em 127.0.0.1 (GET /auth/v1/user com latência
+artificial, que é o que o salto de rede custa de verdade) e faz o mesmo poll
+pelo test client do Flask com SUPABASE_AUTH_VERIFICATION=remote e depois
+=local. Nada sai da máquina; nenhuma chave real é usada.
+
+Uso:
+    python3 scripts/bench_auth_polling.py
+    python3 scripts/bench_auth_polling.py --latencia-ms 40 --polls 500
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+SEGREDO = "segredo-do-benchmark-com-32-bytes!!"
+USER_ID = "3f6b8f2e-9c4a-4d2e-a1b5-7c8d9e0f1a2b"
+
+
+def _b64(dados):
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode("ascii")
+
+
+def _token(base_url):
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    corpo = _b64(json.dumps({
+        "sub": USER_ID,
+        "role": "authenticated",
+        "aud": "authenticated",
+        "iss": "{}/auth/v1".format(base_url),
+        "exp": int(time.time()) + 3600,
+    }).encode())
+    entrada = "{}.{}".format(header, corpo).encode()
+    return "{}.{}.{}".format(
+        header, corpo, _b64(hmac.new(SEGREDO.encode(), entrada, hashlib.sha256).digest())
+    )
+
+
+def _servidor_de_auth(latencia_s):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802 - nome imposto pelo http.server
+            time.sleep(latencia_s)
+            corpo = json.dumps({"id": USER_ID, "email": "bench@teste.com"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def _medir(client, job_id, token, polls):
+    headers = {"Authorization": "Bearer {}".format(token)}
+    inicio = time.perf_counter()
+    for _ in range(polls):
+        resposta = client.get("/api/generate-plan/{}".format(job_id), headers=headers)
+        if resposta.status_code != 200:
+            raise SystemExit("Poll falhou com HTTP {}.".format(resposta.status_code))
+    return polls / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latencia-ms", type=float, default=20.0)
+    parser.add_argument("--polls", type=int, default=300)
+    args = parser.parse_args()
+
+    servidor = _servidor_de_auth(args.latencia_ms / 1000)
+    base_url = "http://127.0.0.1:{}".format(servidor.server_address[1])
+    os.environ.update({
+        "FORCA_SKIP_DOTENV": "1",
+        "SUPABASE_URL": base_url,
+        "SUPABASE_ANON_KEY": "anon-do-benchmark",
+        "SUPABASE_JWT_SECRET": SEGREDO,
+    })
+    os.environ.pop("ANTHROPIC_API_KEY", None)
+
+    import logging
+
+    logging.disable(logging.CRITICAL)
+    from backend.app import app
+    from backend.services.job_manager import criar_job
+
+    job, _ = criar_job(USER_ID)
+    token = _token(base_url)
+
+    resultados = {}
+    with app.test_client() as client:
+        for modo in ("remote", "local"):
+            os.environ["SUPABASE_AUTH_VERIFICATION"] = modo
+            _medir(client, job.job_id, token, 5)  # aquecimento (e 1ª entrada do cache)
+            resultados[modo] = _medir(client, job.job_id, token, args.polls)
+    servidor.shutdown()
+
+    print("Auth de mentira com {:.0f} ms de latência, {} polls por modo:".format(
+        args.latencia_ms, args.polls
+    ))
+    for modo, valor in resultados.items():
+        print("  {:<6} {:>9.1f} polls/s".format(modo, valor))
+    print("  ganho  {:>9.1f}x".format(resultados["local"] / resultados["remote"]))
+
+
+if __name__ == "__main__":
+    main()
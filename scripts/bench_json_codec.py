@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Mede o codec JSON (backend/utils/json_codec.py) contra a stdlib, por ponto de uso.
+
+Um caso por lugar do backend que trocou `json` pelo codec:
+
+- prompt_questionario   questionário com indent=2 no prompt (chat, consolidação, molde)
+- tamanho_questionario  medição de _validar_tamanho_serializado (fica na stdlib: ~1x)
+- schema_no_retry       MOLDE_SCHEMA inteiro colado na correção do retry
+- corpo_rpc             corpo de save_training_plan de um plano de 52 semanas
+- extrair_molde         json.loads do texto devolvido pelo modelo
+
+Antes de medir, confere que a saída é a mesma (texto igual no prompt, objeto
+igual depois de parsear no resto). Sem orjson instalado o "depois" é a própria
+stdlib: o script mostra isso em vez de fingir ganho.
+
+Uso:
+    python3 scripts/bench_json_codec.py
+    python3 scripts/bench_json_codec.py --repeticoes 200
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# O plano de 52 semanas do benchmark passa do teto padrão de 2000 séries.
+os.environ.setdefault("PLAN_MAX_TOTAL_SETS", "100000")
+
+from backend.schemas.molde_schema import MOLDE_SCHEMA  # noqa: E402
+from backend.services.plan_expander import expandir_plano  # noqa: E402
+from backend.services.plan_mapper import mapear_plano_ia  # noqa: E402
+from backend.utils import json_codec  # noqa: E402
+from scripts.bench_plan_expander import molde_de_benchmark  # noqa: E402
+
+
+def _questionario():
+    return {
+        "nome": "Aluno de Benchmark",
+        "idade": 34,
+        "nivelExperiencia": "intermediário",
+        "objetivo": "hipertrofia com condicionamento",
+        "diasDisponiveis": ["segunda", "terça", "quinta", "sábado"],
+        "lesoes": [{"regiao": "ombro", "descricao": "Tendinite antiga, sem dor há 6 meses."}],
+        "cardio_modalidades": ["corrida", "bicicleta"],
+        "cardio_pratica_atualmente": True,
+        "cardio_distancia_confortavel_km": 5.5,
+        "historico": [
+            {"semana": i, "observacao": "Treino {} concluído com ênfase em técnica.".format(i)}
+            for i in range(120)
+        ],
+        "respondido_em": datetime.datetime(2026, 3, 2, 10, 0),
+    }
+
+
+def _mapeado_52_semanas():
+    inicio = datetime.date(2026, 3, 2)
+    plano = expandir_plano(molde_de_benchmark(52), {"id": "u1"}, start_date=inicio)
+    mapeado = mapear_plano_ia(plano, user_id="u1", start_date=inicio)
+    return {
+        "p_plan": mapeado["plan"],
+        "p_sessions": mapeado["sessions"],
+        "p_exercises": mapeado["exercises"],
+        "p_sets": mapeado["sets"],
+    }
+
+
+def _casos():
+    questionario = _questionario()
+    corpo = _mapeado_52_semanas()
+    texto_molde = "Segue o molde:\n" + json.dumps(molde_de_benchmark(12), ensure_ascii=False) + "\nFim."
+    trecho_molde = texto_molde[texto_molde.index("{"):texto_molde.rindex("}") + 1]
+    return [
+        (
+            "prompt_questionario",
+            lambda: json.dumps(questionario, indent=2, ensure_ascii=False, default=str),
+            lambda: json_codec.serializar_legivel(questionario, default=str),
+            lambda antes, depois: antes == depois,
+        ),
+        (
+            "tamanho_questionario",
+            lambda: len(json.dumps(questionario, default=str).encode("utf-8")),
+            lambda: json_codec.tamanho_ascii(questionario, default=str),
+            lambda antes, depois: antes == depois,
+        ),
+        (
+            "schema_no_retry",
+            lambda: json.dumps(MOLDE_SCHEMA, indent=2, ensure_ascii=False),
+            lambda: json_codec.serializar_constante(MOLDE_SCHEMA),
+            lambda antes, depois: antes == depois,
+        ),
+        (
+            "corpo_rpc",
+            # O que o `requests.post(json=...)` fazia por dentro.
+            lambda: json.dumps(corpo, allow_nan=False).encode("utf-8"),
+            lambda: json_codec.serializar_compacto(corpo),
+            lambda antes, depois: json.loads(antes) == json.loads(depois),
+        ),
+        (
+            "extrair_molde",
+            lambda: json.loads(trecho_molde),
+            lambda: json_codec.desserializar(trecho_molde),
+            lambda antes, depois: antes == depois,
+        ),
+    ]
+
+
+def _medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    print("orjson: {}".format("sim" if json_codec.ORJSON_DISPONIVEL else "não (codec = stdlib)"))
+    print("{:>22} {:>12} {:>12} {:>7}".format("caso", "stdlib (ms)", "codec (ms)", "ganho"))
+    for nome, antes, depois, iguais in _casos():
+        if not iguais(antes(), depois()):
+            raise SystemExit("Saída divergente em {}.".format(nome))
+        t_antes = _medir(antes, args.repeticoes)
+        t_depois = _medir(depois, args.repeticoes)
+        print("{:>22} {:>12.3f} {:>12.3f} {:>6.1f}x".format(nome, t_antes, t_depois, t_antes / t_depois))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Compara a prévia sob demanda do plano manual com a prévia pelo pipeline completo.
+
+A prévia de antes rodava construir_molde_manual → expandir_plano →
+mapear_plano_ia para o plano inteiro e resumia três semanas das linhas de
+banco; ela fica guardada aqui, sem mudança, como referência. O script sorteia
+rascunhos válidos de 4, 12 e 52 semanas, confere que as duas prévias dão a
+MESMA resposta (ou o mesmo erro) e mede o tempo de cada uma.
+
+Uso:
+    python3 scripts/bench_manual_preview.py
+    python3 scripts/bench_manual_preview.py --repeticoes 50 --semanas 12 52
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.services.exercise_catalog import ContextoDeResolucao  # noqa: E402
+from backend.services.manual_plan_builder import construir_molde_manual  # noqa: E402
+from backend.services.manual_plan_preview import previa_do_rascunho  # noqa: E402
+from backend.services.plan_expander import expandir_plano  # noqa: E402
+from backend.services.plan_mapper import mapear_plano_ia  # noqa: E402
+
+_EXERCICIOS = [
+    {"exercise_key": "supino_reto_barra", "nome": "Supino Reto com Barra", "equipamento": "Barra",
+     "repeticoes": "8-12", "percentual_rm": 70},
+    {"exercise_key": None, "nome": "Agachamento Livre", "equipamento": None, "repeticoes": "6",
+     "percentual_rm": 75},
+    {"exercise_key": None, "nome": "Remada Curvada", "equipamento": "Halteres", "repeticoes": "AMRAP"},
+    {"exercise_key": None, "nome": "Elevação Lateral", "equipamento": None, "repeticoes": None},
+    {"exercise_key": "prancha", "nome": "Prancha", "equipamento": "Peso corporal",
+     "repeticoes": None, "duracao_minutos": 0.75},
+    {"exercise_key": "corrida", "nome": "Corrida", "equipamento": None, "repeticoes": None,
+     "duracao_minutos": 20, "distancia_km": 3.5},
+    {"exercise_key": None, "nome": "Circuito de escada do professor", "equipamento": None,
+     "repeticoes": None, "duracao_minutos": 15, "distancia_km": 1, "metrica": "tempo_distancia"},
+    {"exercise_key": None, "nome": "Movimento Inventado", "equipamento": None, "repeticoes": "10",
+     "metrica": "carga_reps"},
+    {"exercise_key": None, "nome": "Sprint", "equipamento": None, "repeticoes": None,
+     "duracao_minutos": 0.5, "metrica": "tempo"},
+]
+
+
+def rascunho_de_benchmark(semanas: int, semente: int = 0) -> Dict[str, Any]:
+    """Rascunho válido de `semanas` semanas, com treinos e progressão sorteados."""
+    sorteio = random.Random(semente)
+    n_treinos = sorteio.randint(1, 6)
+    dias = sorteio.sample(range(7), n_treinos)
+
+    def exercicio():
+        base = sorteio.choice(_EXERCICIOS)
+        return {
+            "exercise_key": base["exercise_key"],
+            "nome": base["nome"],
+            "equipamento": base["equipamento"],
+            "series": sorteio.randint(1, 6),
+            "repeticoes": base["repeticoes"],
+            "duracao_minutos": base.get("duracao_minutos"),
+            "distancia_km": base.get("distancia_km"),
+            "tempo_descanso": sorteio.choice([None, 60, "90s", "2min"]),
+            "prioridade": sorteio.choice(["primario", "secundario", "acessorio"]),
+            "percentual_rm": base.get("percentual_rm"),
+            "observacoes": None,
+            "tem_limitacao": sorteio.random() < 0.1,
+            **({"metrica": base["metrica"]} if "metrica" in base else {}),
+        }
+
+    treinos = [
+        {
+            "nome": "Treino {}".format(i + 1),
+            "dia_offset": dias[i] if sorteio.random() < 0.7 else None,
+            "duracao_minutos": sorteio.choice([None, None, 45, 60]),
+            "incluir_aquecimento": sorteio.random() < 0.5,
+            "incluir_alongamento": sorteio.random() < 0.5,
+            "exercicios": [exercicio() for _ in range(sorteio.randint(1, 8))],
+        }
+        for i in range(n_treinos)
+    ]
+    # Um dia explícito repetido é outro erro de formulário, não o que se mede aqui.
+    explicitos = set()
+    for treino in treinos:
+        if treino["dia_offset"] in explicitos:
+            treino["dia_offset"] = None
+        explicitos.add(treino["dia_offset"])
+
+    inicio_series = sorteio.randint(1, semanas)
+    progressao = {
+        "series": {
+            "ativa": True, "valor": sorteio.randint(-2, 3),
+            "semana_inicio": inicio_series, "semana_fim": sorteio.randint(inicio_series, semanas),
+        } if sorteio.random() < 0.6 else None,
+        "cardio": {
+            "ativa": True, "valor": sorteio.choice([1, 2.5, 5, 10]),
+            "alvo": sorteio.choice(["duracao", "distancia", "ambos"]),
+        } if sorteio.random() < 0.6 else None,
+        "intensidade": {
+            "ativa": True, "valor": sorteio.choice([0.5, 1, 2.5, 5]),
+        } if sorteio.random() < 0.6 else None,
+        "deload": {
+            "ativa": True, "semana": sorteio.randint(1, semanas),
+            "fator_rm": sorteio.choice([0.5, 0.7, 0.9]), "fator_series": sorteio.choice([0.5, 0.8]),
+        } if sorteio.random() < 0.5 else None,
+    }
+    return {
+        "nome": "Benchmark {} semanas".format(semanas),
+        "duracao_semanas": semanas,
+        "progressao": progressao,
+        "treinos": treinos,
+    }
+
+
+# --- Prévia de antes: pipeline completo + resumo das linhas de banco ---------
+
+def _numero_legivel(valor):
+    numero = float(valor)
+    return str(int(numero)) if numero.is_integer() else str(round(numero, 2)).replace(".", ",")
+
+
+def _alvo_preview(exercicio, series_exercicio):
+    quantidade = exercicio["sets_planned"]
+    rotulo_series = "série" if quantidade == 1 else "séries"
+    primeira_serie = series_exercicio[0] if series_exercicio else {}
+    duracao = primeira_serie.get("target_duration_seconds")
+    distancia = primeira_serie.get("target_distance_m")
+    if duracao is not None:
+        if duracao >= 60:
+            alvo = "{} min".format(_numero_legivel(duracao / 60))
+        else:
+            alvo = "{} s".format(_numero_legivel(duracao))
+        if distancia is not None:
+            alvo += " / {} km".format(_numero_legivel(float(distancia) / 1000))
+    else:
+        alvo = exercicio.get("reps_raw")
+        if not alvo:
+            minimo = primeira_serie.get("target_reps_min")
+            maximo = primeira_serie.get("target_reps_max")
+            alvo = str(minimo) if minimo == maximo else "{}-{}".format(minimo, maximo)
+        alvo = "{} reps".format(alvo)
+    return "{} {} × {}".format(quantidade, rotulo_series, alvo)
+
+
+def _resumo_preview(mapeado):
+    exercicios_por_sessao = {}
+    for exercicio in mapeado["exercises"]:
+        exercicios_por_sessao.setdefault(exercicio["session_id"], []).append(exercicio)
+    sets_por_exercicio = {}
+    for serie in mapeado["sets"]:
+        sets_por_exercicio.setdefault(serie["exercise_id"], []).append(serie)
+
+    duracao = mapeado["plan"]["duration_weeks"]
+    semanas_escolhidas = []
+    for semana in (1, (duracao + 1) // 2, duracao):
+        if semana not in semanas_escolhidas:
+            semanas_escolhidas.append(semana)
+
+    resposta = []
+    for numero_semana in semanas_escolhidas:
+        sessoes = sorted(
+            (
+                sessao
+                for sessao in mapeado["sessions"]
+                if sessao["week_number"] == numero_semana
+            ),
+            key=lambda sessao: sessao["order_in_week"],
+        )
+        treinos = []
+        for sessao in sessoes:
+            exercicios = sorted(
+                exercicios_por_sessao.get(sessao["id"], []),
+                key=lambda exercicio: exercicio["exercise_order"],
+            )
+            treinos.append(
+                {
+                    "nome": sessao["title"],
+                    "dia": sessao["day_of_week"],
+                    "exercicios": [
+                        {
+                            "nome": exercicio["name"],
+                            "alvo": _alvo_preview(
+                                exercicio,
+                                sets_por_exercicio.get(exercicio["id"], []),
+                            ),
+                        }
+                        for exercicio in exercicios
+                    ],
+                    "minutos": sessao["estimated_minutes"],
+                }
+            )
+        resposta.append({"semana": numero_semana, "treinos": treinos})
+    return {"semanas": resposta}
+
+
+def previa_referencia(rascunho: Dict[str, Any]) -> Dict[str, Any]:
+    """A prévia de antes: o pipeline de gravação inteiro, sem persistir."""
+    inicio = datetime.date(2026, 7, 20)
+    molde = construir_molde_manual(rascunho)
+    contexto = ContextoDeResolucao()
+    plano = expandir_plano(molde, {"id": "u1", "nivel": "iniciante"}, start_date=inicio, contexto=contexto)
+    mapeado = mapear_plano_ia(plano, user_id="u1", start_date=inicio, created_by="user", contexto=contexto)
+    return _resumo_preview(mapeado)
+
+
+def resultado(previa, rascunho):
+    """Resposta da prévia, ou o texto do ValueError."""
+    try:
+        return previa(rascunho)
+    except ValueError as exc:
+        return str(exc)
+
+
+def _medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--semanas", type=int, nargs="+", default=[4, 12, 52])
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    print("{:>8} {:>12} {:>12} {:>7}".format("semanas", "antes (ms)", "depois (ms)", "ganho"))
+    for semanas in args.semanas:
+        # Mede o caminho feliz: o primeiro rascunho sorteado que cabe no teto.
+        rascunho = next(
+            r for r in (rascunho_de_benchmark(semanas, semente) for semente in range(100))
+            if isinstance(resultado(previa_do_rascunho, r), dict)
+        )
+        if resultado(previa_referencia, rascunho) != resultado(previa_do_rascunho, rascunho):
+            raise SystemExit("Divergência no rascunho de {} semanas.".format(semanas))
+
+        t_antes = _medir(lambda: resultado(previa_referencia, rascunho), args.repeticoes)
+        t_depois = _medir(lambda: resultado(previa_do_rascunho, rascunho), args.repeticoes)
+        print("{:>8} {:>12.2f} {:>12.2f} {:>6.1f}x".format(semanas, t_antes, t_depois, t_antes / t_depois))
+
+
+if __name__ == "__main__":
+    main()
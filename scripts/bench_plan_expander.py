@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""Compara a expansão compilada por semana-tipo com a expansão semana a semana.
+
+Gera moldes sintéticos de 12, 24 e 52 semanas (catálogo, cardio, isometria,
+nome livre, exercício não progressível; %RM, séries, cardio e deloads), roda
+o `_construir_ciclos` atual e a implementação anterior, guardada aqui como
+referência, confere que as duas produzem o MESMO plano (fora os UUIDs) e mede
+o tempo de cada uma.
+
+Depois mede o `expandir_plano` inteiro com o molde como o pipeline entrega:
+dict cru (o expansor valida o schema de novo) contra MoldeValidado (a
+validação do pipeline vale e o expansor pula a segunda passada).
+
+Uso:
+    python3 scripts/bench_plan_expander.py
+    python3 scripts/bench_plan_expander.py --repeticoes 50 --semanas 12 52
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import backend.services.plan_expander as pe  # noqa: E402
+from backend.schemas.validadores import validar_molde  # noqa: E402
+from backend.services.exercise_catalog import ContextoDeResolucao  # noqa: E402
+
+_EXERCICIOS = [
+    {"nome": "Supino Reto", "equipamento": "Barra", "series": 4, "repeticoes": "6-8",
+     "percentual_rm": 75, "prioridade": "primario"},
+    {"nome": "Agachamento Livre", "series": 4, "repeticoes": "8-10", "percentual_rm": 70,
+     "prioridade": "primario"},
+    {"nome": "Remada Curvada", "equipamento": "Halteres", "series": 3, "repeticoes": "10-12",
+     "percentual_rm": 65, "prioridade": "secundario"},
+    {"nome": "Elevação Lateral", "series": 3, "repeticoes": "12-15", "prioridade": "acessorio"},
+    {"nome": "Prancha", "series": 3, "duracao_minutos": 0.75},
+    {"nome": "Corrida na Esteira", "series": 1, "duracao_minutos": 20, "distancia_km": 3.5},
+    {"nome": "Bicicleta Ergométrica", "series": 1, "duracao_minutos": 15},
+    {"nome": "Movimento Inventado", "series": 3, "repeticoes": "10", "percentual_rm": 60},
+    {"nome": "Caminhada Livre", "series": 1, "repeticoes": "5 km"},
+    {"nome": "Alongamento Geral", "series": 1, "duracao_minutos": 5, "progressivel": False},
+]
+
+
+def molde_de_benchmark(semanas: int, semente: int = 0) -> Dict[str, Any]:
+    """Molde válido de `semanas` semanas, com regras sorteadas pela `semente`."""
+    sorteio = random.Random(semente)
+
+    def sessoes(n):
+        return [
+            {
+                "nome": "Treino {}".format(i + 1),
+                "tipo": "Hipertrofia",
+                "duracao_minutos": 60,
+                "dia_offset": i,
+                "grupos_musculares": [{"nome": "Peito"}, {"nome": "Costas"}],
+                "aquecimento": {"duracao_minutos": 5, "exercicios": ["Mobilidade"]},
+                "exercicios": [
+                    dict(ex, ordem=ordem)
+                    for ordem, ex in enumerate(sorteio.sample(_EXERCICIOS, 6), start=1)
+                ],
+            }
+            for i in range(n)
+        ]
+
+    regras: List[Dict[str, Any]] = []
+    for inicio in range(1, semanas + 1, 4):
+        fim = min(inicio + sorteio.randint(1, 5), semanas)
+        regras.append({"tipo": "delta_rm_percentual", "semana_inicio": inicio, "semana_fim": fim,
+                       "valor": sorteio.choice([0.5, 1, 2.5, 5]),
+                       "grupo_alvo": sorteio.choice(["todos", "primario", "secundario"])})
+        regras.append({"tipo": "delta_series", "semana_inicio": inicio, "semana_fim": fim,
+                       "valor": sorteio.randint(-2, 3),
+                       "grupo_alvo": sorteio.choice(["todos", "primario", "secundario"])})
+        regras.append({"tipo": "delta_cardio_percentual", "semana_inicio": inicio, "semana_fim": fim,
+                       "valor": sorteio.choice([1, 5, 10]),
+                       "alvo": sorteio.choice(["duracao", "distancia", "ambos"])})
+        regras.append({"tipo": "deload_percentual", "semana": min(inicio + 3, semanas),
+                       "fator_rm": sorteio.choice([0.5, 0.7, 0.9]),
+                       "fator_series": sorteio.choice([0.5, 0.8])})
+    sorteio.shuffle(regras)
+
+    tipos = ["tipo_a", "tipo_b", "tipo_c"]
+    return {
+        "nome": "Benchmark {} semanas".format(semanas),
+        "periodizacao": {"tipo": "Ondulatória"},
+        "duracao_semanas": semanas,
+        "frequencia_semanal": 4,
+        "semanas_tipo": [{"id": t, "nome": t, "sessoes": sessoes(4)} for t in tipos],
+        "calendario": [sorteio.choice(tipos) for _ in range(semanas)],
+        "progressao": {"regras": regras},
+        "semanas_avulsas": {
+            "semana_{}".format(semanas): {"semana": semanas, "sessoes": sessoes(2)},
+        },
+    }
+
+
+def construir_ciclos_referencia(
+    calendario: List[str],
+    semanas_tipo: Dict[str, Dict[str, Any]],
+    regras: List[Dict[str, Any]],
+    semanas_avulsas: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """O `_construir_ciclos` de antes da compilação por semana-tipo, sem mudança."""
+
+    # Agrupa em ciclos de 4 semanas (simplificado; pode ser refinado depois)
+    total_semanas = len(calendario)
+    ciclos: List[Dict[str, Any]] = []
+    ordem_ciclo = 0
+
+    for semana_inicio in range(0, total_semanas, 4):
+        ordem_ciclo += 1
+        semana_fim = min(semana_inicio + 4, total_semanas)
+        duracao = semana_fim - semana_inicio
+
+        microciclos = []
+        for idx in range(semana_inicio, semana_fim):
+            num_semana = idx + 1
+            tipo_id = calendario[idx]
+
+            # Verifica se é uma semana avulsa (válvula de escape)
+            chave_avulsa = f"semana_{num_semana}"
+            if chave_avulsa in semanas_avulsas:
+                avulsa = semanas_avulsas[chave_avulsa]
+                if isinstance(avulsa, dict) and avulsa.get("sessoes"):
+                    sessoes = pe._copiar_sessoes(avulsa["sessoes"])
+                    microciclos.append({
+                        "semana": num_semana,
+                        "volume": pe._classificar_volume(sessoes),
+                        "intensidade": pe._classificar_intensidade(sessoes),
+                        "foco": None,
+                        "sessoes": sessoes,
+                    })
+                    continue
+
+            tipo = semanas_tipo.get(tipo_id)
+            if not tipo:
+                raise ValueError(f"Semana-tipo '{tipo_id}' referenciada no calendário mas não definida.")
+
+            sessoes = pe._copiar_sessoes(tipo.get("sessoes", []))
+
+            # Aplica regras de progressão
+            _aplicar_progressao_referencia(sessoes, regras, num_semana)
+
+            microciclos.append({
+                "semana": num_semana,
+                "volume": pe._classificar_volume(sessoes),
+                "intensidade": pe._classificar_intensidade(sessoes),
+                "foco": None,
+                "sessoes": sessoes,
+            })
+
+        ciclos.append({
+            "ciclo_id": str(uuid.uuid4()),
+            "nome": f"Ciclo {ordem_ciclo}",
+            "ordem": ordem_ciclo,
+            "duracao_semanas": duracao,
+            "objetivo": "Progressão estruturada",
+            "microciclos": microciclos,
+        })
+
+    return ciclos
+
+
+def _aplicar_progressao_referencia(
+    sessoes: List[Dict[str, Any]],
+    regras: List[Dict[str, Any]],
+    semana: int,
+) -> None:
+    """Aplica regras de progressão NUMÉRICAS às sessões de uma semana."""
+    for regra in regras:
+        tipo = regra.get("tipo")
+
+        if tipo == "delta_rm_percentual":
+            ini = regra.get("semana_inicio", 1)
+            fim = regra.get("semana_fim", 1)
+            valor = regra.get("valor", 0)
+            grupo_alvo = regra.get("grupo_alvo", "todos")
+            if ini <= semana <= fim:
+                semanas_decorridas = semana - ini + 1
+                incremento = valor * semanas_decorridas
+                for sessao in sessoes:
+                    for ex in sessao.get("exercicios", []):
+                        # Cardio não tem %RM: progride por tempo/distância.
+                        if not pe._progressivel(ex):
+                            continue
+                        if pe._atinge_grupo(ex, grupo_alvo) and not pe._e_por_tempo(ex):
+                            rm_atual = ex.get("percentual_rm")
+                            if isinstance(rm_atual, (int, float)):
+                                novo_rm = min(rm_atual + incremento, pe._TETO_PERCENTUAL_RM)
+                                ex["percentual_rm"] = round(novo_rm)
+
+        elif tipo == "delta_series":
+            ini = regra.get("semana_inicio", 1)
+            fim = regra.get("semana_fim", 1)
+            valor = regra.get("valor", 0)
+            grupo_alvo = regra.get("grupo_alvo", "todos")
+            if ini <= semana <= fim:
+                semanas_decorridas = semana - ini + 1
+                incremento = valor * semanas_decorridas
+                for sessao in sessoes:
+                    for ex in sessao.get("exercicios", []):
+                        # Multiplicar SÉRIE de cardio é sem sentido: uma corrida
+                        # de 20 min virava 5 corridas de 28 min e o aquecimento
+                        # de 5 min prometido pela UI virava 35. Cardio progride
+                        # por tempo/distância. Isometria CATALOGADA (prancha)
+                        # continua ganhando série: congelá-la deixaria o core
+                        # parado enquanto o resto do plano progride. A regra é
+                        # única e mora em exercise_catalog.progride_por_series.
+                        if not pe.progride_por_series(ex):
+                            continue
+                        if pe._atinge_grupo(ex, grupo_alvo):
+                            series_atual = ex.get("series", 1)
+                            if isinstance(series_atual, int):
+                                novo = max(series_atual + incremento, pe._PISO_SERIES)
+                                ex["series"] = min(novo, 10)  # schema max
+
+        elif tipo == "delta_cardio_percentual":
+            _aplicar_progressao_cardio_referencia(sessoes, regra, semana)
+
+        elif tipo == "deload_percentual":
+            semana_deload = regra.get("semana")
+            if semana == semana_deload:
+                fator_rm = regra.get("fator_rm", 0.8)
+                fator_series = regra.get("fator_series", 0.8)
+                for sessao in sessoes:
+                    for ex in sessao.get("exercicios", []):
+                        if not pe._progressivel(ex):
+                            continue
+                        if pe._e_por_tempo(ex):
+                            # Deload de cardio = menos tempo/distância.
+                            duracao = ex.get("duracao_minutos")
+                            if isinstance(duracao, (int, float)) and duracao > 0:
+                                ex["duracao_minutos"] = round(duracao * fator_rm, 1)
+                            distancia = ex.get("distancia_km")
+                            if isinstance(distancia, (int, float)) and distancia > 0:
+                                ex["distancia_km"] = round(distancia * fator_rm, 2)
+                            continue
+                        rm_atual = ex.get("percentual_rm")
+                        if isinstance(rm_atual, (int, float)):
+                            ex["percentual_rm"] = round(rm_atual * fator_rm)
+                        series_atual = ex.get("series")
+                        if isinstance(series_atual, int):
+                            ex["series"] = max(int(series_atual * fator_series), pe._PISO_SERIES)
+
+
+def _aplicar_progressao_cardio_referencia(
+    sessoes: List[Dict[str, Any]],
+    regra: Dict[str, Any],
+    semana: int,
+) -> None:
+    """Aumenta duração/distância do cardio em X% por semana, com teto."""
+    ini = regra.get("semana_inicio", 1)
+    fim = regra.get("semana_fim", 1)
+    valor = regra.get("valor", 0)
+    alvo = regra.get("alvo", "ambos")
+    if not (ini <= semana <= fim) or not valor:
+        return
+    semanas_decorridas = semana - ini + 1
+    fator = min(1 + (valor / 100.0) * semanas_decorridas, pe._TETO_CARDIO_MULTIPLICADOR)
+    for sessao in sessoes:
+        for ex in sessao.get("exercicios", []):
+            if not pe._e_por_tempo(ex) or not pe._progressivel(ex):
+                continue
+            if alvo in ("duracao", "ambos"):
+                duracao = ex.get("duracao_minutos")
+                if isinstance(duracao, (int, float)) and duracao > 0:
+                    ex["duracao_minutos"] = round(duracao * fator, 1)
+            if alvo in ("distancia", "ambos"):
+                distancia = ex.get("distancia_km")
+                if isinstance(distancia, (int, float)) and distancia > 0:
+                    ex["distancia_km"] = round(distancia * fator, 2)
+
+
+
+
+def _argumentos(molde):
+    return (
+        molde["calendario"],
+        {st["id"]: st for st in molde["semanas_tipo"]},
+        molde["progressao"]["regras"],
+        molde.get("semanas_avulsas") or {},
+    )
+
+
+def sem_ids(valor):
+    """O plano sem os UUIDs gerados a cada expansão, para comparação."""
+    if isinstance(valor, dict):
+        return {k: sem_ids(v) for k, v in valor.items() if k not in ("ciclo_id", "sessao_id", "exercicio_id")}
+    if isinstance(valor, list):
+        return [sem_ids(v) for v in valor]
+    return valor
+
+
+def _medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--semanas", type=int, nargs="+", default=[12, 24, 52])
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    print("{:>8} {:>12} {:>12} {:>7}".format("semanas", "antes (ms)", "depois (ms)", "ganho"))
+    for semanas in args.semanas:
+        molde = molde_de_benchmark(semanas)
+        calendario, semanas_tipo, regras, avulsas = _argumentos(molde)
+        antes = construir_ciclos_referencia(calendario, semanas_tipo, regras, avulsas)
+        depois = pe._construir_ciclos(calendario, semanas_tipo, regras, avulsas, ContextoDeResolucao())
+        if sem_ids(antes) != sem_ids(depois):
+            raise SystemExit("Divergência no molde de {} semanas.".format(semanas))
+
+        t_antes = _medir(lambda: construir_ciclos_referencia(calendario, semanas_tipo, regras, avulsas),
+                         args.repeticoes)
+        t_depois = _medir(
+            lambda: pe._construir_ciclos(calendario, semanas_tipo, regras, avulsas, ContextoDeResolucao()),
+            args.repeticoes,
+        )
+        print("{:>8} {:>12.2f} {:>12.2f} {:>6.1f}x".format(semanas, t_antes, t_depois, t_antes / t_depois))
+
+    print()
+    print("{:>8} {:>12} {:>15} {:>7}".format("semanas", "dict (ms)", "validado (ms)", "ganho"))
+    for semanas in args.semanas:
+        molde = molde_de_benchmark(semanas)
+        validado = validar_molde(molde)
+        planos = [pe.expandir_plano(m, {"id": "u1"}) for m in (molde, validado)]
+        if sem_ids(planos[0]["plano_principal"]) != sem_ids(planos[1]["plano_principal"]):
+            raise SystemExit("Divergência no molde validado de {} semanas.".format(semanas))
+
+        t_dict = _medir(lambda: pe.expandir_plano(molde, {"id": "u1"}), args.repeticoes)
+        t_validado = _medir(lambda: pe.expandir_plano(validado, {"id": "u1"}), args.repeticoes)
+        print("{:>8} {:>12.2f} {:>15.2f} {:>6.1f}x".format(semanas, t_dict, t_validado, t_dict / t_validado))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Mede a validação de schema por chamada: jsonschema.validate x validador compilado.
+
+Um caso por schema validado no backend (backend/schemas/validadores.py):
+
+- molde_12_semanas       MOLDE_SCHEMA num molde realista de 12 semanas
+- molde_52_semanas       o mesmo, no teto de duração
+- molde_invalido         molde com um exercício sem alvo (caminho do retry)
+- diretrizes             DIRETRIZES_SCHEMA (consolidação e generate-plan)
+- rascunho_manual        PLANO_MANUAL_SCHEMA com um rascunho de 5 treinos
+
+Antes de medir, confere que os dois caminhos dão o mesmo resultado: nenhum
+erro, ou o mesmo erro (mensagem, regra e caminho).
+
+Uso:
+    python3 scripts/bench_validadores.py
+    python3 scripts/bench_validadores.py --repeticoes 200
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import jsonschema  # noqa: E402
+
+from backend.schemas.diretrizes_schema import DIRETRIZES_SCHEMA  # noqa: E402
+from backend.schemas.molde_schema import MOLDE_SCHEMA  # noqa: E402
+from backend.schemas.plano_manual_schema import PLANO_MANUAL_SCHEMA  # noqa: E402
+from backend.schemas.validadores import (  # noqa: E402
+    VALIDADOR_DIRETRIZES,
+    VALIDADOR_MOLDE,
+    VALIDADOR_PLANO_MANUAL,
+    validar,
+)
+from scripts.bench_plan_expander import molde_de_benchmark  # noqa: E402
+
+
+def _molde_invalido():
+    molde = molde_de_benchmark(12)
+    exercicio = molde["semanas_tipo"][2]["sessoes"][3]["exercicios"][5]
+    for campo in ("repeticoes", "duracao_minutos", "distancia_km"):
+        exercicio.pop(campo, None)
+    return molde
+
+
+def _diretrizes():
+    return {
+        "preferencias": ["focar em peito", "treinos curtos"] * 5,
+        "restricoes": [
+            {"descricao": "sem impacto no joelho", "tipo": "lesao"},
+            {"descricao": "evitar desenvolvimento", "tipo": "exercicio_especifico",
+             "exercicio_afetado": "Desenvolvimento com Barra"},
+        ],
+        "excecoes_estruturais": [],
+    }
+
+
+def _rascunho_manual():
+    exercicio = {
+        "exercise_key": "supino_reto_barra", "nome": "Supino Reto", "equipamento": "Barra",
+        "series": 4, "repeticoes": "8-10",
+        "duracao_minutos": None, "distancia_km": None, "tempo_descanso": 90,
+        "prioridade": "primario", "percentual_rm": 70, "observacoes": None,
+        "tem_limitacao": False,
+    }
+    return {
+        "nome": "Plano manual de benchmark",
+        "duracao_semanas": 12,
+        "progressao": {"series": None, "cardio": None, "intensidade": None, "deload": None},
+        "treinos": [
+            {
+                "nome": "Treino {}".format(i + 1), "dia_offset": i, "duracao_minutos": None,
+                "incluir_aquecimento": False, "incluir_alongamento": False,
+                "exercicios": [dict(exercicio, nome="Exercício {}".format(j)) for j in range(8)],
+            }
+            for i in range(5)
+        ],
+    }
+
+
+def _casos():
+    return [
+        ("molde_12_semanas", MOLDE_SCHEMA, VALIDADOR_MOLDE, molde_de_benchmark(12)),
+        ("molde_52_semanas", MOLDE_SCHEMA, VALIDADOR_MOLDE, molde_de_benchmark(52)),
+        ("molde_invalido", MOLDE_SCHEMA, VALIDADOR_MOLDE, _molde_invalido()),
+        ("diretrizes", DIRETRIZES_SCHEMA, VALIDADOR_DIRETRIZES, _diretrizes()),
+        ("rascunho_manual", PLANO_MANUAL_SCHEMA, VALIDADOR_PLANO_MANUAL, _rascunho_manual()),
+    ]
+
+
+def _resultado(funcao):
+    try:
+        funcao()
+    except jsonschema.exceptions.ValidationError as e:
+        return (e.message, e.validator, list(e.path))
+    return None
+
+
+def _medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        _resultado(funcao)
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    print("{:>18} {:>14} {:>14} {:>7}".format("caso", "validate (ms)", "compilado (ms)", "ganho"))
+    for nome, schema, validador, instancia in _casos():
+        instancia = copy.deepcopy(instancia)
+
+        def antes():
+            jsonschema.validate(instance=instancia, schema=schema)
+
+        def depois():
+            validar(validador, instancia)
+
+        if _resultado(antes) != _resultado(depois):
+            raise SystemExit("Resultado divergente em {}.".format(nome))
+        t_antes = _medir(antes, args.repeticoes)
+        t_depois = _medir(depois, args.repeticoes)
+        print("{:>18} {:>14.3f} {:>14.3f} {:>6.1f}x".format(nome, t_antes, t_depois, t_antes / t_depois))
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,13 @@ const GENERATE_PLAN_TIMEOUT_MS = 190000;
 const POLL_INTERVAL_MS = 5000;
 const POLL_MAX_ATTEMPTS = 60;
 
+// Long-poll: o backend segura o GET até o job mudar de versão (ou ~25 s).
+// O timeout da requisição precisa passar da espera com folga. Backend antigo
+// (sem `version` na resposta) ignora os parâmetros e o loop volta a ser o
+// poll de 5 em 5 s.
+const LONG_POLL_WAIT_S = 25;
+const LONG_POLL_TIMEOUT_MS = (LONG_POLL_WAIT_S + 10) * 1000;
+
 // Rede de celular cai por dezenas de segundos e volta. Tolerar só 3 falhas
 // consecutivas (~15 s) descartava uma geração que o servidor estava
 // concluindo: em 27/07/2026 o plano foi salvo 11 s depois do app desistir,
@@ -63,6 +70,8 @@ export type JobProgress = {
   progress: { step: string; detail: string };
   plan_id: string | null;
   error: { code: string; message: string } | null;
+  // Incrementa a cada mudança do job; vai de volta em `since` no long-poll.
+  version?: number;
 };
 
 /**
@@ -123,12 +132,19 @@ export const startPlanJob = async (
 };
 
 /**
- * Polling do status de um job de geração.
+ * Polling do status de um job de geração. Com `since`, vira long-poll: o
+ * servidor só responde quando o job passar dessa versão (ou a espera vencer).
  */
-export const pollPlanJob = async (jobId: string): Promise<JobProgress> => {
-  const response = await apiClient.get(
-    `${ENDPOINTS.TRAINING.GENERATE_PLAN}/${jobId}`,
-  );
+export const pollPlanJob = async (jobId: string, since?: number): Promise<JobProgress> => {
+  const url = `${ENDPOINTS.TRAINING.GENERATE_PLAN}/${jobId}`;
+  if (since === undefined) {
+    const response = await apiClient.get(url);
+    return response.data as JobProgress;
+  }
+  const response = await apiClient.get(url, {
+    params: { since, wait: LONG_POLL_WAIT_S },
+    timeout: LONG_POLL_TIMEOUT_MS,
+  });
   return response.data as JobProgress;
 };
 
@@ -147,18 +163,30 @@ export const waitForPlanJob = async (
   onProgress?: (progress: JobProgress) => void,
 ): Promise<JobProgress> => {
   let consecutiveFailures = 0;
+  let versao: number | undefined;
 
   for (let attempt = 0; attempt < POLL_MAX_ATTEMPTS; attempt++) {
     let esperaMs = POLL_INTERVAL_MS;
 
     try {
-      const progress = await pollPlanJob(jobId);
+      const inicio = Date.now();
+      const progress = await pollPlanJob(jobId, versao);
       consecutiveFailures = 0;
       onProgress?.(progress);
 
       if (progress.status === 'salvo' || progress.status === 'erro') {
         return progress;
       }
+
+      // Versão nova: o próximo GET (já long-poll) sai na hora. Sem novidade,
+      // o tempo que o servidor segurou a requisição conta como espera — se
+      // ele respondeu rápido (sem vaga de long-poll), o intervalo normal vale
+      // e o app não martela o servidor.
+      if (typeof progress.version === 'number') {
+        const mudou = versao === undefined || progress.version > versao;
+        versao = progress.version;
+        esperaMs = mudou ? 0 : Math.max(0, POLL_INTERVAL_MS - (Date.now() - inicio));
+      }
     } catch (error: any) {
       consecutiveFailures++;
       const status = error?.response?.status;